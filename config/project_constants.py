@@ -4,6 +4,11 @@ import os
 DB_NAME = "vibrant-routing"
 ROLE_NAME = "vibrant-routing-role"
 
+# Database backend: `postgres` (shared server, credentials in the PG* environment variables) or `duckdb`
+# (embedded database saved in DUCKDB_PATH and loaded from parquet extracts, see `src/utils/local_db_util.py`).
+DB_BACKEND = os.getenv("DB_BACKEND") or "postgres"
+DUCKDB_PATH = os.getenv("DUCKDB_PATH") or "data/vibrant-routing.duckdb"
+
 # Source data configuration.
 SOURCE_DATA_SCHEMA_NAME = "processed"
 SOURCE_DATA_ROUTING_ATTEMTPS_TABLE_NAME = "routing_attempts"
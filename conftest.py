@@ -0,0 +1 @@
+"""Configuration of the tests, which import the modules from the root of the repository (see `tests/`)."""
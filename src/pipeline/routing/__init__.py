@@ -1,11 +1,12 @@
 from .split_data import split_data
 from .cohort_creator import cohort_creator
-from .evaluate import evaluate_routing
+from .evaluate import evaluate_routing, compare_routing_tables
 from .simulator import simulate_routing
 
 __all__ = [
     "split_data",
     "cohort_creator",
     "evaluate_routing",
+    "compare_routing_tables",
     "simulate_routing",
 ]
@@ -25,7 +25,8 @@ def cohort_creator(
     split_datetime,
 ):
     """Create active, historical, and simulated calls cohort table using datetime from <splits>.
-    The simulated calls cohort is an empty table.
+    The simulated calls cohort is an empty table. The snapshot table keeps the historical routing attempts
+    that the features of the simulated calls can look back at.
 
     Keyword arguments:
         db_conn (object) -- database connection.
@@ -71,6 +72,17 @@ def cohort_creator(
                 start_datetime_est=split_datetime["historical"]["start_datetime_est"],
                 end_datetime_est=split_datetime["historical"]["end_datetime_est"],
             )
+        elif table_tag == "snapshot":
+            table_content = table_query.format(
+                routing_level_schema_name=ROUTING_LEVEL_SCHEMA_NAME,
+                historical_table_name=config["feature_config"][
+                    "source_data_table_name"
+                ],
+                simulation_start_datetime_est=split_datetime["simulation"][
+                    "start_datetime_est"
+                ],
+                lookback_minutes=table["lookback_minutes"],
+            )
         elif table_tag == "future":
             table_content = table_query.format(
                 source_data_schema_name=SOURCE_DATA_SCHEMA_NAME,
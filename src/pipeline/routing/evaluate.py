@@ -1,5 +1,15 @@
 import logging
-from src.utils.sql_util import get_db_conn
+from datetime import datetime
+
+import pandas as pd
+from src.pipeline.routing.results_store import get_routing_metrics
+from src.utils.metric_util import get_mean_confidence_interval, get_paired_differences
+from src.utils.sql_util import (
+    copy_data_to_table,
+    get_db_conn,
+    get_network_metrics_from_db,
+    add_paired_comparison_to_db,
+)
 
 from config.project_constants import (
     EXPERIMENT_SCHEMA_NAME_ROUTING,
@@ -9,12 +19,23 @@ from config.project_constants import (
 )
 
 
-def evaluate_routing(db_conn, evaluation_id):
+def evaluate_routing(
+    db_conn,
+    evaluation_id,
+    simulated_routing_attempts_table_name="simulated_routing_attempts",
+    simulated_routing_attempts=None,
+):
     """Evaluate the routing simulator for a given evaluation_id.
 
     Keyword arguments:
         db_conn (object) -- database connection.
         evaluation_id (int) -- identifier that characterises the configuration of the evaluation.
+        simulated_routing_attempts_table_name (str, optional) -- name of the table with the simulated routing attempts
+                                                                 of the evaluation. Defaults to "simulated_routing_attempts".
+        simulated_routing_attempts (pd.DataFrame, optional) -- simulated routing attempts of the evaluation. If given,
+                                                               the metrics of the simulation are computed in memory
+                                                               (see `get_routing_metrics`) instead of in the database.
+                                                               Defaults to NoneType.
     """
     # Calculate values for the complete network and per call center:
     for table in ["metrics_network", "metrics_call_centers"]:
@@ -32,9 +53,30 @@ def evaluate_routing(db_conn, evaluation_id):
 
         # Loop to compute values for the 2 instances of interest: simulation and real.
         for instance_type in ["simulation", "real"]:
+            # Compute the metrics of the simulation in memory if its routing attempts are given.
+            if instance_type == "simulation" and simulated_routing_attempts is not None:
+                metrics = get_routing_metrics(
+                    routing_attempts=simulated_routing_attempts.assign(
+                        evaluation_id=evaluation_id
+                    ),
+                    instance=instance_type,
+                    by_center=table == "metrics_call_centers",
+                )
+                try:
+                    copy_data_to_table(
+                        data=metrics,
+                        db_conn=db_conn,
+                        schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING,
+                        table_name=table,
+                    )
+                    logging.debug(f"Entry succesfully added.")
+                except:
+                    logging.error(f"Entry failed to be added.")
+                continue
+
             # Set from filling based on the instance type.
             if instance_type == "simulation":
-                from_filling = f"from {ROUTING_LEVEL_SCHEMA_NAME}.simulated_routing_attempts where center_key <> 'National Backup'"
+                from_filling = f"from {ROUTING_LEVEL_SCHEMA_NAME}.{simulated_routing_attempts_table_name} where center_key <> 'National Backup'"
             elif instance_type == "real":
                 from_filling = (
                     f"from {ROUTING_LEVEL_SCHEMA_NAME}.active_calls_in_queue aciq "
@@ -99,4 +141,126 @@ def evaluate_routing(db_conn, evaluation_id):
                 logging.error(f"Entry failed to be added.")
 
 
+def compare_routing_tables(
+    db_conn,
+    evaluation_ids,
+    baseline_routing_table_path,
+    log_path,
+    confidence_level=0.95,
+):
+    """Compare several routing tables whose trials were simulated with common random numbers.
+    The trials with the same trial number share their random seed, so the difference of the network metrics
+    of each routing table with the baseline routing table is computed per trial.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials of all the routing tables.
+        baseline_routing_table_path (str) -- path to the routing table the others are compared with.
+        log_path (str) -- path to the experiment logs.
+        confidence_level (float, optional) -- confidence level of the intervals of the differences. Defaults to 0.95.
+
+    Returns:
+        paired comparison (pd.DataFrame) -- one row per routing table other than the baseline and network metric,
+                                            with the mean and confidence interval of the paired differences.
+    """
+    network_metrics = get_network_metrics_from_db(
+        db_conn=db_conn, evaluation_ids=evaluation_ids, instance="simulation"
+    )
+    metric_columns = [
+        column
+        for column in network_metrics.select_dtypes("number").columns
+        if column not in ["evaluation_id", "trial_number", "random_seed"]
+    ]
+    paired_comparison = get_paired_differences(
+        metrics=network_metrics,
+        metric_columns=metric_columns,
+        baseline_label=baseline_routing_table_path,
+        pair_column="trial_number",
+        label_column="routing_table_path",
+        confidence_level=confidence_level,
+    )
+    paired_comparison.insert(
+        0, "baseline_routing_table_path", baseline_routing_table_path
+    )
+    paired_comparison.insert(0, "creation_datetime_utc", datetime.now())
+    paired_comparison["log_path"] = log_path
+
+    for row in paired_comparison.itertuples():
+        logging.info(
+            f"{row.metric} of {row.routing_table_path} - {row.baseline_routing_table_path}: "
+            f"{row.mean_difference:.6f} [{row.ci_lower:.6f}, {row.ci_upper:.6f}] "
+            f"over {row.pair_count} paired trials."
+        )
+    add_paired_comparison_to_db(paired_comparison=paired_comparison)
+    return paired_comparison
+
+
+def get_metric_confidence_intervals(
+    db_conn,
+    evaluation_ids,
+    metric_columns,
+    baseline_routing_table_path=None,
+    confidence_level=0.95,
+):
+    """Compute the running means and confidence intervals of network metrics over the trials evaluated so far.
+    When several routing tables are compared, the intervals are the ones of the paired differences with
+    the baseline routing table, which is what the comparison needs to be precise.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials.
+        metric_columns (list[str]) -- network metrics of interest, e.g., answer_rate.
+        baseline_routing_table_path (str, optional) -- path to the routing table the others are compared with.
+                                                       Defaults to NoneType, i.e., no comparison.
+        confidence_level (float, optional) -- confidence level of the intervals. Defaults to 0.95.
+
+    Returns:
+        confidence intervals (pd.DataFrame) -- one row per routing table and metric with the number of trials,
+                                               and the mean and half-width of the confidence interval.
+    """
+    network_metrics = get_network_metrics_from_db(
+        db_conn=db_conn, evaluation_ids=evaluation_ids, instance="simulation"
+    )
+
+    if (
+        baseline_routing_table_path is not None
+        and network_metrics["routing_table_path"].nunique() > 1
+    ):
+        paired_differences = get_paired_differences(
+            metrics=network_metrics,
+            metric_columns=metric_columns,
+            baseline_label=baseline_routing_table_path,
+            pair_column="trial_number",
+            label_column="routing_table_path",
+            confidence_level=confidence_level,
+        )
+        return pd.DataFrame(
+            {
+                "routing_table_path": paired_differences["routing_table_path"],
+                "metric": paired_differences["metric"],
+                "trial_count": paired_differences["pair_count"],
+                "mean": paired_differences["mean_difference"],
+                "half_width": paired_differences["ci_upper"]
+                - paired_differences["mean_difference"],
+            }
+        )
+
+    confidence_intervals = []
+    for routing_table_path, metrics in network_metrics.groupby("routing_table_path"):
+        for metric in metric_columns:
+            mean, half_width = get_mean_confidence_interval(
+                values=metrics[metric], confidence_level=confidence_level
+            )
+            confidence_intervals.append(
+                {
+                    "routing_table_path": routing_table_path,
+                    "metric": metric,
+                    "trial_count": len(metrics),
+                    "mean": mean,
+                    "half_width": half_width,
+                }
+            )
+    return pd.DataFrame(confidence_intervals)
+
+
 # evaluate_routing(db_conn=get_db_conn(), evaluation_id=1)
@@ -0,0 +1,643 @@
+import heapq
+import logging
+import re
+from collections import deque
+from datetime import timedelta
+
+import dateutil.parser
+import pandas as pd
+
+
+# Feature families that only depend on the attributes of the routing attempt itself.
+# The value indicates how the `query_filling` of the family is evaluated in memory.
+ROW_FEATURE_FAMILIES = {
+    "subnetwork_properties": "column",
+    "datetime": "datetime_part",
+    "alphabet_soup": "coalesce",
+    "datetime_imputed": "one_hot",
+    "state_located": "one_hot",
+    "time_zone_located": "one_hot",
+    "center_key": "one_hot",
+}
+
+# Feature families that depend on the routing attempts previously routed to the same center.
+WINDOW_FEATURE_FAMILIES = {
+    "number_calls_at_center_past": "arrival_count",
+    "call_outcomes_at_center_past": "disposition_sum",
+    "fraction_call_outcomes_at_center_past": "disposition_fraction",
+    "talk_metrics_at_center_past": "disposition_aggregate",
+}
+
+# Columns of the routing-level feature tables that are used to join them to the cohort.
+FEATURE_TABLE_KEY_COLUMNS = [
+    "call_key",
+    "center_key",
+    "termination_number",
+    "arrived_datetime_est",
+]
+
+# Lower bound of the join between the cohort and the stacked table in `query_skeleton_routing_level_augment`.
+AUGMENT_JOIN_INTERVAL = timedelta(days=1)
+
+
+def expand_query_filling_parameters(feature_family_values):
+    """Expand the parameters of a feature family in the same order as `complete_query_fillings_for_skeleton`.
+
+    Keyword arguments:
+        feature_family_values (dict) -- dictionary of query filling name and content.
+
+    Returns:
+        parameters (list[dict]) -- list with one dictionary of parameters per feature.
+    """
+    parameter_1 = feature_family_values.get("parameter_1")
+    parameter_2 = feature_family_values.get("parameter_2")
+    parameter_3 = feature_family_values.get("parameter_3")
+
+    if not parameter_1:
+        return [{}]
+    if not parameter_2:
+        return [{"parameter_1": p_1} for p_1 in parameter_1]
+    if not parameter_3:
+        return [
+            {"parameter_1": p_1, "parameter_2": p_2}
+            for p_2 in parameter_2
+            for p_1 in parameter_1
+        ]
+    return [
+        {"parameter_1": p_1, "parameter_2": p_2, "parameter_3": p_3}
+        for p_3 in parameter_3
+        for p_2 in parameter_2
+        for p_1 in parameter_1
+    ]
+
+
+def get_column_name_from_query_filling(query_filling):
+    """Get the name that the database gives to the column created by a query filling.
+    Unquoted identifiers are lower-cased by postgres while quoted identifiers keep their case.
+
+    Keyword arguments:
+        query_filling (str) -- query filling with all its parameters already filled in.
+
+    Returns:
+        column_name (str) -- name of the column.
+    """
+    query_filling = query_filling.strip()
+    alias = re.search(r"\bas\s+(\"[^\"]+\"|\w+)$", query_filling, flags=re.IGNORECASE)
+    column_name = alias.group(1) if alias else query_filling
+
+    if column_name.startswith('"'):
+        return column_name.strip('"')
+    return column_name.lower()
+
+
+def get_routing_feature_specs(feature_config):
+    """Get the ordered list of routing-level features defined in the feature config.
+    The order matches the order of the columns of the matrix created by `matrix_creator`.
+
+    Keyword arguments:
+        feature_config (dict) -- information about the features to be created.
+
+    Raises:
+        NotImplementedError -- if a feature family can not be computed in memory.
+
+    Returns:
+        feature_specs (list[tuple]) -- list of (feature_family, column_name, kind, parameters) tuples.
+    """
+    feature_specs = []
+    for feature_config_key in ["query_fillings", "query_fillings_augment"]:
+        for feature_family, feature_family_values in feature_config[
+            feature_config_key
+        ].items():
+            if feature_family in ROW_FEATURE_FAMILIES:
+                kind = ROW_FEATURE_FAMILIES[feature_family]
+            elif feature_family in WINDOW_FEATURE_FAMILIES:
+                kind = WINDOW_FEATURE_FAMILIES[feature_family]
+            else:
+                raise NotImplementedError(
+                    f"Feature family {feature_family} can not be computed in memory."
+                )
+
+            for parameters in expand_query_filling_parameters(feature_family_values):
+                column_name = get_column_name_from_query_filling(
+                    feature_family_values["query_filling"].format(**parameters)
+                )
+                feature_specs.append((feature_family, column_name, kind, parameters))
+
+    return feature_specs
+
+
+def extract_datetime_part(datetime_value, part):
+    """Extract a part of a datetime the way postgres' `extract` does.
+
+    Keyword arguments:
+        datetime_value (datetime.datetime) -- datetime to extract the part from.
+        part (str) -- part of the datetime, e.g. hour, dow, day, doy, week.
+
+    Returns:
+        value (int) -- value of the part of the datetime.
+    """
+    if part == "hour":
+        return datetime_value.hour
+    elif part == "minute":
+        return datetime_value.minute
+    elif part == "dow":
+        # Postgres numbers the days of the week from Sunday (0) to Saturday (6).
+        return datetime_value.isoweekday() % 7
+    elif part == "isodow":
+        return datetime_value.isoweekday()
+    elif part == "day":
+        return datetime_value.day
+    elif part == "doy":
+        return datetime_value.timetuple().tm_yday
+    elif part == "week":
+        return datetime_value.isocalendar()[1]
+    elif part == "month":
+        return datetime_value.month
+    elif part == "quarter":
+        return (datetime_value.month - 1) // 3 + 1
+    elif part == "year":
+        return datetime_value.year
+    else:
+        raise NotImplementedError(f"Unknown datetime part: {part}.")
+
+
+def to_datetime(value):
+    """Convert a value read from the database or the simulator into a `datetime.datetime`."""
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, str):
+        return dateutil.parser.parse(value)
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+class WindowAggregate:
+    def __init__(self, window, value_columns, extremum_columns):
+        """Running aggregates of the routing attempts disposed within a sliding window.
+        * Routing attempts must be added in the order of their datetime of disposition.
+        * Counts, sums and sums of squares are updated in O(1) when a routing attempt enters or leaves the window.
+        * Minimums and maximums are kept with monotonic queues, which are also amortized O(1).
+
+        Keyword arguments:
+            window (datetime.timedelta) -- length of the window.
+            value_columns (list[str]) -- columns whose values are aggregated.
+            extremum_columns (list[str]) -- columns whose minimum and maximum are needed.
+        """
+        self.window = window
+        self.value_columns = value_columns
+        self.routing_attempts = deque()
+        self.count = dict.fromkeys(value_columns, 0)
+        self.sum = dict.fromkeys(value_columns, 0)
+        self.sum_squares = dict.fromkeys(value_columns, 0)
+        self.minimum = {column: deque() for column in extremum_columns}
+        self.maximum = {column: deque() for column in extremum_columns}
+
+    def add(self, datetime_to_disposition_est, values):
+        """Add a routing attempt that was disposed at <datetime_to_disposition_est>.
+
+        Keyword arguments:
+            datetime_to_disposition_est (datetime.datetime) -- time of the disposition of the call.
+            values (dict) -- non-null values of the aggregated columns.
+        """
+        self.routing_attempts.append((datetime_to_disposition_est, values))
+        for column, value in values.items():
+            self.count[column] += 1
+            self.sum[column] += value
+            self.sum_squares[column] += value * value
+
+            if column in self.minimum:
+                minimum = self.minimum[column]
+                while minimum and minimum[-1][1] >= value:
+                    minimum.pop()
+                minimum.append((datetime_to_disposition_est, value))
+
+                maximum = self.maximum[column]
+                while maximum and maximum[-1][1] <= value:
+                    maximum.pop()
+                maximum.append((datetime_to_disposition_est, value))
+
+    def evict(self, window_end):
+        """Remove the routing attempts that were disposed before the window that ends at <window_end>.
+
+        Keyword arguments:
+            window_end (datetime.datetime) -- end of the window.
+        """
+        window_start = window_end - self.window
+        while self.routing_attempts and self.routing_attempts[0][0] < window_start:
+            _, values = self.routing_attempts.popleft()
+            for column, value in values.items():
+                self.count[column] -= 1
+                if self.count[column] == 0:
+                    # Reset the sums to avoid accumulating floating point errors.
+                    self.sum[column] = 0
+                    self.sum_squares[column] = 0
+                else:
+                    self.sum[column] -= value
+                    self.sum_squares[column] -= value * value
+
+        for extremum in list(self.minimum.values()) + list(self.maximum.values()):
+            while extremum and extremum[0][0] < window_start:
+                extremum.popleft()
+
+    def get_aggregate(self, column, aggregation):
+        """Aggregate the values of a column like the postgres aggregate functions, coalescing NULL results to 0.
+
+        Keyword arguments:
+            column (str) -- column to aggregate.
+            aggregation (str) -- one of sum, min, max, avg, stddev, variance.
+
+        Returns:
+            aggregated value (float) -- aggregated value.
+        """
+        count = self.count[column]
+        if count == 0:
+            return 0
+        if aggregation == "sum":
+            return self.sum[column]
+        elif aggregation == "min":
+            return self.minimum[column][0][1]
+        elif aggregation == "max":
+            return self.maximum[column][0][1]
+        elif aggregation == "avg":
+            return self.sum[column] / count
+        elif aggregation in ("stddev", "variance"):
+            # Sample statistics are NULL for a single value.
+            if count < 2:
+                return 0
+            variance = max(
+                (self.sum_squares[column] - self.sum[column] ** 2 / count)
+                / (count - 1),
+                0,
+            )
+            return variance**0.5 if aggregation == "stddev" else variance
+        else:
+            raise NotImplementedError(f"Unknown aggregation: {aggregation}.")
+
+
+class CenterFeatureBuffer:
+    def __init__(self, windows, value_columns, extremum_columns):
+        """Bounded, time-ordered buffer with the routing attempts of a (center_key, termination_number) pair.
+        * Arrivals are kept per window and evicted as soon as they are older than the window.
+        * Dispositions are kept in a pending queue until the simulation clock reaches them,
+          and are then added to the running aggregates of each window.
+
+        Keyword arguments:
+            windows (list[datetime.timedelta]) -- lengths of the windows.
+            value_columns (list[str]) -- columns whose values are aggregated.
+            extremum_columns (list[str]) -- columns whose minimum and maximum are needed.
+        """
+        self.arrivals = {window: deque() for window in windows}
+        self.dispositions = {
+            window: WindowAggregate(
+                window=window,
+                value_columns=value_columns,
+                extremum_columns=extremum_columns,
+            )
+            for window in windows
+        }
+        self.pending_dispositions = []
+        self.number_pending_dispositions = 0
+
+    def add_arrival(self, arrived_datetime_est):
+        """Add a routing attempt that arrived at the center.
+        Routing attempts must be added in the order of their arrival datetime.
+
+        Keyword arguments:
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+        """
+        for window, arrivals in self.arrivals.items():
+            arrivals.append(arrived_datetime_est)
+            while arrivals[0] < arrived_datetime_est - window:
+                arrivals.popleft()
+
+    def add_disposition(self, arrived_datetime_est, datetime_to_disposition_est, values):
+        """Add the disposition of a routing attempt that arrived at the center.
+
+        Keyword arguments:
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+            datetime_to_disposition_est (datetime.datetime) -- time of the disposition of the call.
+            values (dict) -- non-null values of the aggregated columns.
+        """
+        # A counter breaks the ties between dispositions that happen at the same time.
+        heapq.heappush(
+            self.pending_dispositions,
+            (
+                datetime_to_disposition_est,
+                self.number_pending_dispositions,
+                arrived_datetime_est,
+                values,
+            ),
+        )
+        self.number_pending_dispositions += 1
+
+    def advance(self, current_datetime):
+        """Move the windows of the buffer so they end at <current_datetime>.
+
+        Keyword arguments:
+            current_datetime (datetime.datetime) -- time of the simulation clock.
+        """
+        while (
+            self.pending_dispositions
+            and self.pending_dispositions[0][0] <= current_datetime
+        ):
+            (
+                datetime_to_disposition_est,
+                _,
+                arrived_datetime_est,
+                values,
+            ) = heapq.heappop(self.pending_dispositions)
+
+            # The stacked table is only joined with the routing attempts that arrived in the previous day.
+            if datetime_to_disposition_est - arrived_datetime_est > AUGMENT_JOIN_INTERVAL:
+                continue
+
+            for window_aggregate in self.dispositions.values():
+                window_aggregate.add(
+                    datetime_to_disposition_est=datetime_to_disposition_est,
+                    values=values,
+                )
+
+        for window, arrivals in self.arrivals.items():
+            while arrivals and arrivals[0] < current_datetime - window:
+                arrivals.popleft()
+        for window_aggregate in self.dispositions.values():
+            window_aggregate.evict(window_end=current_datetime)
+
+
+class RoutingFeatureState:
+    def __init__(self, feature_config, historical_routing_attempts=None):
+        """Compute the routing-level features in memory.
+        * Keeps a `CenterFeatureBuffer` per (center_key, termination_number) pair, which only holds
+          the routing attempts of the largest window of the features.
+        * Produces the same columns as the `query_fillings` and `query_fillings_augment`
+          families of `feature_creator`, so that no query is needed per routing attempt.
+        * The routing attempts must be added in the order of their arrival datetime, which is the
+          order in which the simulator takes the calls out of its queue.
+
+        Keyword arguments:
+            feature_config (dict) -- information about the features to be created.
+            historical_routing_attempts (pd.DataFrame, optional) -- routing attempts that happened before
+                                                                    the simulation. Defaults to NoneType.
+        """
+        self.feature_specs = get_routing_feature_specs(feature_config)
+        self.column_names = FEATURE_TABLE_KEY_COLUMNS + [
+            column_name for _, column_name, _, _ in self.feature_specs
+        ]
+
+        # Columns whose values are aggregated over the routing attempts of a center.
+        self.value_columns = sorted(
+            {
+                parameters["parameter_2"]
+                for _, _, kind, parameters in self.feature_specs
+                if kind.startswith("disposition")
+            }
+        )
+        self.extremum_columns = sorted(
+            {
+                parameters["parameter_2"]
+                for _, _, kind, parameters in self.feature_specs
+                if kind == "disposition_aggregate"
+                and parameters["parameter_3"] in ("min", "max")
+            }
+        )
+
+        # Length of the windows of the features.
+        self.windows = sorted(
+            {
+                timedelta(minutes=int(parameters["parameter_1"]))
+                for _, _, kind, parameters in self.feature_specs
+                if kind in WINDOW_FEATURE_FAMILIES.values()
+            }
+        )
+        logging.debug(
+            f"The largest window of the routing-level features is {max(self.windows, default=None)}."
+        )
+
+        # Buffers per (center_key, termination_number) pair.
+        self.center_buffers = {}
+
+        # Center and arrival datetime of the routing attempts whose disposition is not known yet.
+        self.routing_attempts_by_id = {}
+
+        if historical_routing_attempts is not None:
+            self.add_historical_routing_attempts(historical_routing_attempts)
+
+    def get_center_buffer(self, center):
+        """Get the buffer of a (center_key, termination_number) pair, creating it if needed."""
+        center_buffer = self.center_buffers.get(center)
+        if center_buffer is None:
+            center_buffer = CenterFeatureBuffer(
+                windows=self.windows,
+                value_columns=self.value_columns,
+                extremum_columns=self.extremum_columns,
+            )
+            self.center_buffers[center] = center_buffer
+        return center_buffer
+
+    def get_historical_columns(self):
+        """Get the columns of the historical routing attempts needed to compute the features.
+
+        Returns:
+            columns (list[str]) -- names of the columns.
+        """
+        return [
+            "center_key",
+            "termination_number",
+            "arrived_datetime_est",
+            "datetime_to_disposition_est",
+        ] + self.value_columns
+
+    def add_historical_routing_attempts(self, historical_routing_attempts):
+        """Add the routing attempts that happened before the simulation.
+
+        Keyword arguments:
+            historical_routing_attempts (pd.DataFrame) -- routing attempts ordered by arrival datetime with,
+                                                          at least, the columns returned by `get_historical_columns`.
+        """
+        for row in historical_routing_attempts.to_dict(orient="records"):
+            self.add_routing_attempt(
+                center_key=row["center_key"],
+                termination_number=row["termination_number"],
+                arrived_datetime_est=to_datetime(row["arrived_datetime_est"]),
+                datetime_to_disposition_est=to_datetime(
+                    row["datetime_to_disposition_est"]
+                ),
+                disposition={column: row.get(column) for column in self.value_columns},
+            )
+
+    def add_routing_attempt(
+        self,
+        center_key,
+        termination_number,
+        arrived_datetime_est,
+        routing_attempt_key=None,
+        datetime_to_disposition_est=None,
+        disposition=None,
+    ):
+        """Add a routing attempt that arrived at a center.
+
+        Keyword arguments:
+            center_key (str) -- alphanumeric value that identifies a center.
+            termination_number (int) -- value that uniquely identifies a center.
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+            routing_attempt_key (hashable, optional) -- identifier used to later set the disposition.
+                                                        Defaults to NoneType.
+            datetime_to_disposition_est (datetime.datetime, optional) -- time of the disposition of the call.
+                                                                         Defaults to NoneType.
+            disposition (dict, optional) -- values of the aggregated columns. Defaults to NoneType.
+        """
+        center = (center_key, int(termination_number))
+        center_buffer = self.get_center_buffer(center)
+        center_buffer.add_arrival(arrived_datetime_est=arrived_datetime_est)
+
+        if datetime_to_disposition_est is not None and disposition is not None:
+            center_buffer.add_disposition(
+                arrived_datetime_est=arrived_datetime_est,
+                datetime_to_disposition_est=datetime_to_disposition_est,
+                values=self.get_disposition_values(disposition=disposition),
+            )
+
+        if routing_attempt_key is not None:
+            self.routing_attempts_by_id[routing_attempt_key] = (
+                center,
+                arrived_datetime_est,
+            )
+
+    def set_disposition(
+        self, routing_attempt_key, datetime_to_disposition_est, disposition
+    ):
+        """Set what happened to a routing attempt that was previously added.
+
+        Keyword arguments:
+            routing_attempt_key (hashable) -- identifier of the routing attempt.
+            datetime_to_disposition_est (datetime.datetime) -- time of the disposition of the call.
+            disposition (dict) -- values of the aggregated columns, e.g. answered_at_center.
+        """
+        center, arrived_datetime_est = self.routing_attempts_by_id.pop(
+            routing_attempt_key
+        )
+        self.center_buffers[center].add_disposition(
+            arrived_datetime_est=arrived_datetime_est,
+            datetime_to_disposition_est=datetime_to_disposition_est,
+            values=self.get_disposition_values(disposition=disposition),
+        )
+
+    def get_disposition_values(self, disposition):
+        """Keep the non-null values of the aggregated columns of a disposition."""
+        return {
+            column: disposition[column]
+            for column in self.value_columns
+            if disposition.get(column) is not None
+            and not pd.isna(disposition[column])
+        }
+
+    def get_window_features(self, center, arrived_datetime_est):
+        """Compute the features that depend on the routing attempts previously routed to the center.
+
+        Keyword arguments:
+            center (tuple) -- (center_key, termination_number) pair.
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+
+        Returns:
+            window_features (dict) -- value of each window feature.
+        """
+        center_buffer = self.get_center_buffer(center)
+        center_buffer.advance(current_datetime=arrived_datetime_est)
+
+        window_features = {}
+        for _, column_name, kind, parameters in self.feature_specs:
+            if kind not in WINDOW_FEATURE_FAMILIES.values():
+                continue
+
+            window = timedelta(minutes=int(parameters["parameter_1"]))
+            arrived_in_window = len(center_buffer.arrivals[window])
+            window_aggregate = center_buffer.dispositions[window]
+
+            if kind == "arrival_count":
+                # The routing attempt of interest is excluded from the count.
+                window_features[column_name] = arrived_in_window - 1
+            elif kind == "disposition_sum":
+                window_features[column_name] = window_aggregate.get_aggregate(
+                    column=parameters["parameter_2"], aggregation="sum"
+                )
+            elif kind == "disposition_fraction":
+                window_features[column_name] = (
+                    window_aggregate.get_aggregate(
+                        column=parameters["parameter_2"], aggregation="sum"
+                    )
+                    / arrived_in_window
+                    if arrived_in_window
+                    else 0
+                )
+            else:
+                window_features[column_name] = window_aggregate.get_aggregate(
+                    column=parameters["parameter_2"],
+                    aggregation=parameters["parameter_3"],
+                )
+
+        return window_features
+
+    def create_feature_row(self, routing_attempt, arrived_datetime_est):
+        """Compute all the features of a routing attempt that was already added.
+
+        Keyword arguments:
+            routing_attempt (dict) -- attributes of the routing attempt as inserted in the simulated table.
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+
+        Returns:
+            feature_row (dict) -- features of the routing attempt, keyed by column name.
+        """
+        center = (
+            routing_attempt["center_key"],
+            int(routing_attempt["termination_number"]),
+        )
+        window_features = self.get_window_features(
+            center=center, arrived_datetime_est=arrived_datetime_est
+        )
+
+        feature_row = {
+            column: routing_attempt[column] for column in FEATURE_TABLE_KEY_COLUMNS
+        }
+        for _, column_name, kind, parameters in self.feature_specs:
+            if column_name in window_features:
+                feature_row[column_name] = window_features[column_name]
+            elif kind == "column":
+                feature_row[column_name] = routing_attempt.get(column_name)
+            elif kind == "datetime_part":
+                datetime_column = parameters["parameter_1"].lower()
+                datetime_value = (
+                    arrived_datetime_est
+                    if datetime_column == "arrived_datetime_est"
+                    else to_datetime(routing_attempt.get(datetime_column))
+                )
+                feature_row[column_name] = (
+                    -1
+                    if datetime_value is None
+                    else extract_datetime_part(
+                        datetime_value=datetime_value,
+                        part=parameters["parameter_2"],
+                    )
+                )
+            elif kind == "coalesce":
+                value = routing_attempt.get(parameters["parameter_1"].lower())
+                feature_row[column_name] = -1 if value is None or pd.isna(value) else value
+            elif kind == "one_hot":
+                feature_row[column_name] = int(
+                    routing_attempt.get(parameters["parameter_2"].lower())
+                    == parameters["parameter_1"]
+                )
+
+        return feature_row
+
+    def create_matrix(self, feature_rows):
+        """Create the matrix with the features of one or more routing attempts.
+
+        Keyword arguments:
+            feature_rows (list[dict]) -- features of each routing attempt.
+
+        Returns:
+            matrix (pd.DataFrame) -- dataset containing features.
+        """
+        return pd.DataFrame(feature_rows, columns=self.column_names)
+
@@ -11,14 +11,59 @@ from src.utils.sql_util import (
     get_center_info,
     get_caller_info,
     get_number_nspl_in_state,
+    get_wait_time_from_center,
+    get_all_caller_info,
+    get_all_center_info,
+    get_all_number_nspl_in_state,
+    get_all_wait_times_from_center,
+    add_routing_attempts_to_db,
     get_abandonment_probability_by_minutes,
     center_historical_disposition_estimate,
 )
 from config.project_constants import ROUTING_LEVEL_SCHEMA_NAME, ROLE_NAME
 
+# Attributes of `PopulateSimulationTable` loaded from the database that do not depend on the routing table.
+LOOKUP_TABLE_ATTRIBUTES = [
+    "PROB_ABANDON_BY_MIN",
+    "ABANDON_HAZARD_BY_MIN",
+    "ABANDON_SURVIVAL_BY_MIN",
+    "CENTER_HISTORICAL_DISPOSITION_STAT",
+    "CALLER_INFO",
+    "CENTER_INFO",
+    "NUMBER_NSPL_IN_STATE",
+    "CENTER_WAIT_TIMES",
+]
+
+
+def get_abandonment_survival_table(prob_abandon_by_min):
+    """Compile the abandonment probabilities by minute into hazard and cumulative survival arrays.
+
+    Keyword arguments:
+        prob_abandon_by_min (dict) -- probability that a call abandons during each minute it waits,
+                                      indexed by the minute (starting at 1).
+
+    Returns:
+        (hazard, survival) (tuple) -- <hazard>[m] is the probability of abandoning during the minute m
+                                      (<hazard>[0] is 0). <survival>[m] is the probability of not having
+                                      abandoned after waiting m minutes, for m below the last minute.
+    """
+    last_minute = max(prob_abandon_by_min.keys())
+    hazard = np.zeros(last_minute + 1)
+    for minute, prob_abandon in prob_abandon_by_min.items():
+        hazard[minute] = prob_abandon
+    survival = np.cumprod(1 - hazard[:last_minute])
+    return hazard, survival
+
 
 class PopulateSimulationTable(ModifyDBTable):
-    def __init__(self, db_conn, schema_name, table_name):
+    def __init__(
+        self,
+        db_conn,
+        schema_name,
+        table_name,
+        use_lookup_cache=True,
+        lookup_tables=None,
+    ):
         """Populates the simulated data in the database.
         * Inherits the `ModifyDBTable` class from `src/utils/sql_util.py`.
         * Ensures that data is inserted for unique rows only.
@@ -26,11 +71,16 @@ class PopulateSimulationTable(ModifyDBTable):
         the pre-defined attributes that does not change during simulation but are
         needed for feature computation.
         * Get information needed for computing the features of the simulated calls.
+        * Loads the caller, center, state and waiting time lookup tables once, unless
+        <use_lookup_cache> is False, in which case every lookup queries the database.
+        * Reuses the <lookup_tables> of another instance, if given, instead of loading them again.
 
         Keyword arguments:
             db_conn (object) -- database connection.
             schema_name (str) -- name of schema where table is located.
             table_name (str) -- name of table to modify.
+            use_lookup_cache (bool, optional) -- whether to load the lookup tables in memory. Defaults to True.
+            lookup_tables (dict, optional) -- lookup tables returned by `get_lookup_tables`. Defaults to NoneType.
         """
         super(PopulateSimulationTable, self).__init__(
             db_conn, schema_name, table_name, ROLE_NAME
@@ -46,16 +96,55 @@ class PopulateSimulationTable(ModifyDBTable):
             "network_is_ddh_spanish": 0,
         }
 
+        self.use_lookup_cache = use_lookup_cache
+        if lookup_tables is not None:
+            for attribute, value in lookup_tables.items():
+                setattr(self, attribute, value)
+            return
+
         # Estimated call abandonment probability for waiting 19+ minutes.
         self.PROB_ABANDON_BY_MIN = get_abandonment_probability_by_minutes(
             db_conn=db_conn
         )
 
+        # Hazard and cumulative survival of the calls by minute waited.
+        (
+            self.ABANDON_HAZARD_BY_MIN,
+            self.ABANDON_SURVIVAL_BY_MIN,
+        ) = get_abandonment_survival_table(
+            prob_abandon_by_min=self.PROB_ABANDON_BY_MIN
+        )
+
         # Estimated call center statistics about what happened to past calls.
         self.CENTER_HISTORICAL_DISPOSITION_STAT = (
             center_historical_disposition_estimate(db_conn=db_conn)
         )
 
+        if self.use_lookup_cache:
+            # Information about the callers, indexed by call_key.
+            self.CALLER_INFO = get_all_caller_info(db_conn=db_conn)
+
+            # Information about the centers, indexed by (center_key, termination_number).
+            self.CENTER_INFO = get_all_center_info(db_conn=db_conn)
+
+            # Number of nspl centers indexed by state abbreviation.
+            self.NUMBER_NSPL_IN_STATE = get_all_number_nspl_in_state(db_conn=db_conn)
+
+            # Waiting times indexed by (center_key, termination_number).
+            self.CENTER_WAIT_TIMES = get_all_wait_times_from_center(db_conn=db_conn)
+
+    def get_lookup_tables(self):
+        """Get the lookup tables loaded from the database, to share them with other instances.
+
+        Returns:
+            lookup_tables (dict) -- lookup tables indexed by attribute name (see <LOOKUP_TABLE_ATTRIBUTES>).
+        """
+        return {
+            attribute: getattr(self, attribute)
+            for attribute in LOOKUP_TABLE_ATTRIBUTES
+            if hasattr(self, attribute)
+        }
+
     def insert_data_into_table(self, data):
         """Concatenate the zero_initialized attributes with the given data
         and insert the data_with_zero_initialized_attributes into the <schema_name>.<table_name>.
@@ -103,34 +192,57 @@ class PopulateSimulationTable(ModifyDBTable):
         else:
             super().update_rows_in_table(data=data, row_identifier=row_identifier)
 
+    def flush_to_database(self):
+        """Persist the pending changes into the <schema_name>.<table_name>.
+        The rows are written to the database as soon as they are modified, so there is nothing to persist.
+        """
+        pass
+
     def get_probability_abandonment(self, current_wait_minute=0, add1_wait_minute=1):
         """Calculate the probability a call will abandon within the next <add1_wait_minute> minutes,
         conditional on having already waited <current_wait_minutes>.
+        The calls that have waited for the last minute of the hazard table abandon with its
+        probability, whatever the number of minutes they keep waiting.
 
         Keyword arguments:
-            current_wait_minute (int, optional) -- current waiting time of caller (in minutes).
-                                                   Defaults to 0.
-            add1_wait_minute (int, optional) -- length of wait time of caller to be estimated (in minutes).
-                                                Defaults to 1.
+            current_wait_minute (Union(int, np.ndarray), optional) -- current waiting time of caller (in minutes).
+                                                                      Defaults to 0.
+            add1_wait_minute (Union(int, np.ndarray), optional) -- length of wait time of caller to be estimated (in minutes).
+                                                                   Defaults to 1.
 
         Returns:
-            total probability of abandonment (float) -- probability of abandonment of caller in the next
-                                                        <add1_wait_minute> minutes.
+            total probability of abandonment (Union(float, np.ndarray)) -- probability of abandonment of caller in the next
+                                                                           <add1_wait_minute> minutes. It is an array if
+                                                                           the waiting times are arrays.
         """
-        total_proba_abandon = 0
-        total_wait = 1
-        for _ in range(add1_wait_minute):
-            current_wait_minute += 1
-            if current_wait_minute >= max(self.PROB_ABANDON_BY_MIN.keys()):
-                total_proba_abandon = (
-                    total_proba_abandon
-                    + total_wait
-                    * self.PROB_ABANDON_BY_MIN[max(self.PROB_ABANDON_BY_MIN.keys())]
-                )
-                break
-            abandon_next_minute = self.PROB_ABANDON_BY_MIN.get(current_wait_minute)
-            total_proba_abandon = total_proba_abandon + total_wait * abandon_next_minute
-            total_wait = total_wait * (1 - abandon_next_minute)
+        current_wait_minute = np.asarray(current_wait_minute)
+        add1_wait_minute = np.asarray(add1_wait_minute)
+        last_minute = len(self.ABANDON_HAZARD_BY_MIN) - 1
+
+        # Probability of not abandoning from the current minute until the last minute waited
+        # within the hazard table.
+        start_minute = np.minimum(current_wait_minute, last_minute - 1)
+        end_minute = np.maximum(
+            np.minimum(current_wait_minute + add1_wait_minute, last_minute - 1),
+            start_minute,
+        )
+        total_wait = self.ABANDON_SURVIVAL_BY_MIN[end_minute] / np.maximum(
+            self.ABANDON_SURVIVAL_BY_MIN[start_minute], np.finfo(float).tiny
+        )
+        total_proba_abandon = 1 - total_wait
+
+        # Calls that reach the last minute of the hazard table.
+        reaches_last_minute = (add1_wait_minute > 0) & (
+            current_wait_minute + add1_wait_minute >= last_minute
+        )
+        total_proba_abandon = total_proba_abandon + np.where(
+            reaches_last_minute,
+            total_wait * self.ABANDON_HAZARD_BY_MIN[last_minute],
+            0,
+        )
+
+        if total_proba_abandon.ndim == 0:
+            return float(total_proba_abandon)
         return total_proba_abandon
 
     def get_routing_attempt_attributes(self, routing_attempt_id):
@@ -159,9 +271,7 @@ class PopulateSimulationTable(ModifyDBTable):
         ), f"{list(validation_keys[~key_is_valid])} not found in {routing_attempt_id}."
 
         # Get the information dictionary for the caller.
-        caller_info_dict = get_caller_info(
-            db_conn=self.db_conn, call_key=routing_attempt_id["call_key"]
-        )
+        caller_info_dict = self.get_caller_info(call_key=routing_attempt_id["call_key"])
 
         # If there is no center_key, the call is sent to the National Backup network.
         if routing_attempt_id["center_key"] is None:
@@ -171,8 +281,7 @@ class PopulateSimulationTable(ModifyDBTable):
             }
         else:
             # Get information about the center.
-            center_info_dict = get_center_info(
-                db_conn=self.db_conn,
+            center_info_dict = self.get_center_info(
                 center_key=routing_attempt_id["center_key"],
                 termination_number=routing_attempt_id["termination_number"],
             )
@@ -189,8 +298,7 @@ class PopulateSimulationTable(ModifyDBTable):
             )
 
             # Get the number of nspl centers in the state where the call center is located.
-            num_nspl_centers_in_center_state = get_number_nspl_in_state(
-                db_conn=self.db_conn,
+            num_nspl_centers_in_center_state = self.get_number_nspl_in_state(
                 state_abbrev=center_info_dict["center_state_abbrev"],
             )
 
@@ -217,6 +325,99 @@ class PopulateSimulationTable(ModifyDBTable):
 
         return routing_attempt_attributes_dict
 
+    def get_caller_info(self, call_key):
+        """Get information about a caller given the <call_key>.
+
+        Keyword arguments:
+            call_key (str) -- unique identifier of a caller.
+
+        Raises:
+            ValueError -- if the caller is not an active call.
+
+        Returns:
+            caller_info (dict) -- infomation about the caller with this <call_key>.
+        """
+        if not self.use_lookup_cache:
+            return get_caller_info(db_conn=self.db_conn, call_key=call_key)
+
+        try:
+            return self.CALLER_INFO[call_key].copy()
+        except KeyError:
+            logging.error(f"Failed to get caller info!")
+            raise ValueError(f"Failed to get caller info!")
+
+    def get_center_info(self, center_key, termination_number):
+        """Get information about a center.
+
+        Keyword arguments:
+            center_key (str) -- alphanumeric value that identifies a center.
+            termination_number (int) -- value that uniquely identifies a center.
+
+        Raises:
+            ValueError -- if the center is not in the center lookup.
+
+        Returns:
+            center infomation (dict) -- a dictionary with details about the center like timezone, state, etc.
+        """
+        if not self.use_lookup_cache:
+            return get_center_info(
+                db_conn=self.db_conn,
+                center_key=center_key,
+                termination_number=termination_number,
+            )
+
+        try:
+            return self.CENTER_INFO[(center_key, int(termination_number))].copy()
+        except KeyError:
+            logging.error(f"Failed to get center info!")
+            raise ValueError(f"Failed to get center info!")
+
+    def get_number_nspl_in_state(self, state_abbrev):
+        """Get the number of local (nspl) call centers in a state.
+
+        Keyword arguments:
+            state_abbrev (str) -- abbreviation of each state.
+
+        Raises:
+            ValueError -- if the state is not in the state center data.
+
+        Returns:
+            num_nspl_in_state (int) -- number of nspl call centers in <state_abbrev> state.
+        """
+        if not self.use_lookup_cache:
+            return get_number_nspl_in_state(
+                db_conn=self.db_conn, state_abbrev=state_abbrev
+            )
+
+        try:
+            return self.NUMBER_NSPL_IN_STATE[state_abbrev]
+        except KeyError:
+            logging.error(f"Failed to get the number of NSPL call centers in state!")
+            raise ValueError(
+                f"Failed to get the number of NSPL call centers in state!"
+            )
+
+    def get_wait_time_from_center(self, center_key, termination_number):
+        """Get the waiting time for a given combination of center_key and termination_number.
+        Disclaimer: in case the combination of center_key and termination_number doesn't exist,
+        the function will return '3 minutes' as it is the maximum waiting time.
+
+        Keyword arguments:
+            center_key (str) -- identifier of the call center.
+            termination_number (int) -- termination number.
+
+        Returns:
+            waiting time (int) -- anticipated waiting time in minutes.
+        """
+        if not self.use_lookup_cache:
+            return get_wait_time_from_center(
+                db_conn=self.db_conn,
+                center_key=center_key,
+                termination_number=termination_number,
+            )
+
+        return self.CENTER_WAIT_TIMES.get((center_key, int(termination_number)), 3)
+
     def get_initiated_datetime(
         self, completed_datetime, total_ring_time_sec, attempt_number
     ):
@@ -326,6 +527,242 @@ class PopulateSimulationTable(ModifyDBTable):
         return stats.round().astype(int)
 
 
+class InMemorySimulationTable(PopulateSimulationTable):
+    def __init__(
+        self,
+        db_conn,
+        schema_name,
+        table_name,
+        use_lookup_cache=True,
+        flush_interval=0,
+        lookup_tables=None,
+    ):
+        """Keeps the simulated data in memory and writes it behind to the database.
+        * Inherits the `PopulateSimulationTable` class.
+        * Stores the simulated routing attempts as a list of dictionaries indexed by call_key.
+        * Updates the rows in place and keeps track of the callers whose rows changed since the last flush.
+        * Persists the changed rows in bulk and in a single transaction every <flush_interval> routing
+          attempts, whenever `flush_to_database` is called, and at the end of the simulation.
+
+        Keyword arguments:
+            db_conn (object) -- database connection.
+            schema_name (str) -- name of schema where table is located.
+            table_name (str) -- name of table where the simulated data is persisted.
+            use_lookup_cache (bool, optional) -- whether to load the lookup tables in memory. Defaults to True.
+            flush_interval (int, optional) -- number of routing attempts inserted between two flushes.
+                                              Defaults to 0, i.e., the rows are only persisted when
+                                              `flush_to_database` is called.
+            lookup_tables (dict, optional) -- lookup tables returned by `get_lookup_tables`. Defaults to NoneType.
+        """
+        super(InMemorySimulationTable, self).__init__(
+            db_conn, schema_name, table_name, use_lookup_cache, lookup_tables
+        )
+        self.flush_interval = flush_interval
+
+        # Simulated routing attempts, in the order they were inserted, and indexed by call_key.
+        self.rows = []
+        self.rows_by_call_key = {}
+
+        # Callers whose rows changed since the last flush (in the order they changed), and callers
+        # with rows already persisted in the database.
+        self.dirty_call_keys = {}
+        self.persisted_call_keys = set()
+        self.number_inserted_since_flush = 0
+
+        # Whether the next flush replaces all the rows of the table, e.g., after restoring a checkpoint.
+        self.replace_all_rows = False
+
+    def insert_data_into_table(self, data):
+        """Concatenate the zero_initialized attributes with the given data and keep it in memory.
+
+        Keyword arguments:
+            data (dict) -- dictionary whose keys are the feature/column name(s) and value(s) to insert.
+
+        Returns:
+            row (dict) -- the row that was inserted.
+        """
+        row = self.INITIALIZED_ATTRIBUTES.copy()
+        row.update(data)
+        self.rows.append(row)
+        self.rows_by_call_key.setdefault(row["call_key"], []).append(row)
+        self.dirty_call_keys[row["call_key"]] = True
+
+        self.number_inserted_since_flush += 1
+        if (
+            self.flush_interval
+            and self.number_inserted_since_flush >= self.flush_interval
+        ):
+            self.flush_to_database()
+        return row
+
+    def select_row_from_table(self, row_identifier, columns_to_select="*"):
+        """Select the rows where <row_identifier> is true.
+
+        Keyword arguments:
+            row_identifier (dict) -- data that identifies a given row. It must contain the call_key.
+            columns_to_select (str, optional) -- comma-seperated columns to be selected.
+                                                 Defaults to "*" i.e all columns.
+
+        Returns:
+            result (pd.DataFrame) -- pandas dataframe of the specified columns and the associated values.
+        """
+        result = pd.DataFrame(self.get_rows(row_identifier=row_identifier))
+        if columns_to_select.strip(",").strip() != "*":
+            result = result.reindex(
+                columns=[
+                    column.strip() for column in columns_to_select.strip(",").split(",")
+                ]
+            )
+        return result
+
+    def update_row_in_table(self, data, row_identifier):
+        """Update given data in the row where <row_identifier> is true.
+        The <row_identifier> must be unique.
+
+        Keyword arguments:
+            data (dict) -- data to be updated.
+            row_identifier (dict) -- data that uniquely identifies a given row. It must contain the call_key.
+
+        Raises:
+            ValueError -- if the row_identifier is not unique.
+        """
+        rows = self.get_rows(row_identifier=row_identifier)
+        if len(rows) > 1:
+            logging.error(f"{row_identifier} is not unique!")
+            raise ValueError(f"{row_identifier} is not unique!")
+        for row in rows:
+            row.update(data)
+            self.dirty_call_keys[row["call_key"]] = True
+
+    def update_rows_in_table(self, data, row_identifier):
+        """Update given data in all the rows where <row_identifier> is true.
+
+        Keyword arguments:
+            data (dict) -- data to be updated.
+            row_identifier (dict) -- data that identifies the rows. It must contain the call_key.
+        """
+        for row in self.get_rows(row_identifier=row_identifier):
+            row.update(data)
+            self.dirty_call_keys[row["call_key"]] = True
+
+    def delete_row_from_table(self, row_identifier):
+        """Delete the rows where <row_identifier> is true.
+
+        Keyword arguments:
+            row_identifier (dict) -- data that identifies the rows. It must contain the call_key.
+        """
+        # The rows are dictionaries, so they are identified by their id instead of being compared by value.
+        row_ids_to_delete = {
+            id(row) for row in self.get_rows(row_identifier=row_identifier)
+        }
+        if not row_ids_to_delete:
+            return
+        self.rows = [row for row in self.rows if id(row) not in row_ids_to_delete]
+        self.rows_by_call_key[row_identifier["call_key"]] = [
+            row
+            for row in self.rows_by_call_key[row_identifier["call_key"]]
+            if id(row) not in row_ids_to_delete
+        ]
+        self.dirty_call_keys[row_identifier["call_key"]] = True
+
+    def get_rows(self, row_identifier):
+        """Get the rows where <row_identifier> is true.
+
+        Keyword arguments:
+            row_identifier (dict) -- data that identifies the rows. It must contain the call_key.
+
+        Returns:
+            rows (list[dict]) -- rows that match the <row_identifier>.
+        """
+        return [
+            row
+            for row in self.rows_by_call_key.get(row_identifier["call_key"], [])
+            if all(row.get(key) == value for key, value in row_identifier.items())
+        ]
+
+    def flush_to_database(self):
+        """Persist the rows of the callers that changed since the last flush into the <schema_name>.<table_name>.
+        The persisted rows of these callers are replaced in the same transaction, so the readers of the
+        table always see a consistent view of the simulation.
+        """
+        self.number_inserted_since_flush = 0
+        if not self.dirty_call_keys and not self.replace_all_rows:
+            logging.debug(f"There are no simulated routing attempts to persist.")
+            return
+
+        routing_attempts = pd.DataFrame(
+            [
+                row
+                for call_key in self.dirty_call_keys
+                for row in self.rows_by_call_key.get(call_key, [])
+            ]
+        )
+        call_keys_to_replace = [
+            call_key
+            for call_key in self.dirty_call_keys
+            if call_key in self.persisted_call_keys
+        ]
+        logging.debug(
+            f"Persisting {len(routing_attempts)} simulated routing attempts of {len(self.dirty_call_keys)} callers "
+            f"into {self.schema_name}.{self.table_name}."
+        )
+        add_routing_attempts_to_db(
+            routing_attempts=routing_attempts,
+            schema_name=self.schema_name,
+            table_name=self.table_name,
+            call_keys_to_replace=call_keys_to_replace,
+            delete_all_rows=self.replace_all_rows,
+        )
+        self.persisted_call_keys.update(self.dirty_call_keys)
+        self.dirty_call_keys = {}
+        self.replace_all_rows = False
+
+    def get_routing_attempts(self):
+        """Get the simulated routing attempts as `get_simulated_routing_attempts` reads them from the database,
+        without persisting them first. The rows keep their datetimes as strings, so they are parsed.
+
+        Returns:
+            simulated routing attempts (pd.DataFrame) -- simulated routing attempts, in the order they were inserted.
+        """
+        routing_attempts = pd.DataFrame(self.rows)
+        for column in routing_attempts.columns:
+            if "datetime" in column:
+                routing_attempts[column] = pd.to_datetime(
+                    [
+                        datetime.fromisoformat(value)
+                        if isinstance(value, str)
+                        else value
+                        for value in routing_attempts[column]
+                    ]
+                )
+        return routing_attempts
+
+    def get_state(self):
+        """Get the simulated routing attempts to save them in a checkpoint.
+
+        Returns:
+            state (dict) -- simulated routing attempts, in the order they were inserted.
+        """
+        return {"rows": self.rows}
+
+    def set_state(self, state):
+        """Restore the simulated routing attempts saved in a checkpoint.
+        The rows persisted after the checkpoint was saved are unknown, so the next flush
+        replaces all the rows of the table with the restored ones.
+
+        Keyword arguments:
+            state (dict) -- simulated routing attempts returned by `get_state`.
+        """
+        self.rows = state["rows"]
+        self.rows_by_call_key = {}
+        for row in self.rows:
+            self.rows_by_call_key.setdefault(row["call_key"], []).append(row)
+        self.dirty_call_keys = dict.fromkeys(self.rows_by_call_key, True)
+        self.persisted_call_keys = set()
+        self.number_inserted_since_flush = 0
+        self.replace_all_rows = True
+
+
 def main():
     """Main function to exemplify how to use the class."""
 
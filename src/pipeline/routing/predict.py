@@ -15,6 +15,7 @@ def predict(
     model,
     columns_to_remove=None,
     pos_label=1,
+    return_all=False,
 ):
     """Predict on the test data based on the trained model
 
@@ -25,9 +26,11 @@ def predict(
         columns_to_remove (list[str]) -- list of columns to remove from dataset matrix for training.
                                       Defaults to NoneType.
         pos_label (int) -- the label of the positive class.
+        return_all (bool, optional) -- whether to return the predicted probability of every row of the matrix.
+                                       Defaults to False, i.e., only the probability of the first row is returned.
 
     Returns:
-        y_pred (float) -- predicted probability.
+        y_pred (Union(float, np.ndarray)) -- predicted probability, or predicted probabilities if <return_all>.
     """
 
     X, _ = split_features_label(
@@ -36,6 +39,9 @@ def predict(
     )
 
     y_pred = model.predict_proba(X)[:, pos_label]
+
+    if return_all:
+        return y_pred
     return y_pred[0]
 
 
@@ -0,0 +1,264 @@
+import os
+import glob
+import logging
+
+import numpy as np
+import pandas as pd
+
+# Columns of the routing attempts whose sum is divided by the number of calls (see `evaluate_routing`).
+METRIC_FLAG_COLUMNS = [
+    "completed_at_center",
+    "answered_at_center",
+    "abandoned_at_center",
+    "flowout_from_center",
+    "answered_in_state",
+    "answered_out_state",
+]
+
+# Columns of the routing attempts that are summarized by their distribution.
+METRIC_TIME_COLUMNS = [
+    "time_to_abandon_center",
+    "time_to_leave_center",
+    "talk_time_center",
+    "ring_time_center",
+    "time_to_answer_center",
+]
+
+# Statistics of the time columns, named as the suffixes of the columns of the metrics tables.
+METRIC_TIME_STATISTICS = {
+    "avg": "mean",
+    "std": "std",
+    "var": "var",
+    "median": "median",
+    "min": "min",
+    "max": "max",
+}
+
+# Name of the file with the routing attempts in each partition of the results store.
+ROUTING_ATTEMPTS_FILE_NAME = "routing_attempts.parquet"
+
+
+def get_partition_path(results_folder_path, evaluation_id):
+    """Get the partition of the results store with the routing attempts of an evaluation.
+
+    Keyword arguments:
+        results_folder_path (str) -- folder of the results store.
+        evaluation_id (int) -- identifier of the evaluation of interest.
+
+    Returns:
+        partition_path (str) -- folder of the partition, named `evaluation_id=<evaluation_id>`.
+    """
+    return os.path.join(results_folder_path, f"evaluation_id={evaluation_id}")
+
+
+def save_routing_attempts(routing_attempts, results_folder_path, evaluation_id):
+    """Save the simulated routing attempts of an evaluation in the results store, a parquet dataset
+    partitioned by evaluation. The routing attempts that were saved before for the same evaluation
+    are replaced.
+
+    Keyword arguments:
+        routing_attempts (pd.DataFrame) -- simulated routing attempts of the evaluation.
+        results_folder_path (str) -- folder of the results store.
+        evaluation_id (int) -- identifier of the evaluation of interest.
+
+    Returns:
+        routing_attempts_path (str) -- path of the parquet file with the routing attempts.
+    """
+    partition_path = get_partition_path(
+        results_folder_path=results_folder_path, evaluation_id=evaluation_id
+    )
+    os.makedirs(partition_path, exist_ok=True)
+    routing_attempts_path = os.path.join(partition_path, ROUTING_ATTEMPTS_FILE_NAME)
+
+    # DuckDB is only needed by the results store, so it is imported when it is used.
+    import duckdb
+
+    # The file is written next to the partition and renamed, so a partial file is never read.
+    temporary_path = f"{routing_attempts_path}.tmp"
+    duckdb.from_df(
+        routing_attempts.drop(columns="evaluation_id", errors="ignore")
+    ).write_parquet(temporary_path)
+    os.replace(temporary_path, routing_attempts_path)
+    logging.info(
+        f"{len(routing_attempts)} routing attempts of evaluation {evaluation_id} saved in {routing_attempts_path}."
+    )
+    return routing_attempts_path
+
+
+def load_routing_attempts(results_folder_path, evaluation_ids):
+    """Load the simulated routing attempts of several evaluations from the results store.
+
+    Keyword arguments:
+        results_folder_path (str) -- folder of the results store.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of interest.
+
+    Raises:
+        ValueError -- if the routing attempts of an evaluation are not in the results store.
+
+    Returns:
+        routing_attempts (pd.DataFrame) -- routing attempts of the evaluations, with their evaluation_id.
+    """
+    routing_attempts_paths = [
+        os.path.join(
+            get_partition_path(
+                results_folder_path=results_folder_path, evaluation_id=evaluation_id
+            ),
+            ROUTING_ATTEMPTS_FILE_NAME,
+        )
+        for evaluation_id in evaluation_ids
+    ]
+    missing_evaluation_ids = [
+        evaluation_id
+        for evaluation_id, path in zip(evaluation_ids, routing_attempts_paths)
+        if not os.path.exists(path)
+    ]
+    if missing_evaluation_ids:
+        logging.error(
+            f"The routing attempts of the evaluations {missing_evaluation_ids} are not in {results_folder_path}."
+        )
+        raise ValueError(
+            f"The routing attempts of the evaluations {missing_evaluation_ids} are not in {results_folder_path}."
+        )
+
+    import duckdb
+
+    # The routing attempts read from the database and the ones of the in_memory mode can have different columns.
+    paths = ", ".join(f"'{path}'" for path in routing_attempts_paths)
+    return (
+        duckdb.query(
+            f"select * from read_parquet([{paths}], hive_partitioning = true, union_by_name = true)"
+        )
+        .df()
+        .astype({"evaluation_id": np.int64})
+    )
+
+
+def get_evaluation_ids(results_folder_path):
+    """Get the evaluations whose routing attempts are in the results store.
+
+    Keyword arguments:
+        results_folder_path (str) -- folder of the results store.
+
+    Returns:
+        evaluation_ids (list[int]) -- identifiers of the evaluations, in increasing order.
+    """
+    partition_paths = glob.glob(
+        os.path.join(results_folder_path, "evaluation_id=*", ROUTING_ATTEMPTS_FILE_NAME)
+    )
+    return sorted(
+        int(os.path.basename(os.path.dirname(path)).split("=")[1])
+        for path in partition_paths
+    )
+
+
+def get_routing_metrics(
+    routing_attempts, instance="simulation", by_center=False, pooled=False
+):
+    """Compute the statistics of the metrics_network or metrics_call_centers tables in a single pass,
+    as `evaluate_routing` does in the database.
+
+    Keyword arguments:
+        routing_attempts (pd.DataFrame) -- routing attempts with their evaluation_id.
+        instance (str, optional) -- "simulation" or "real". The simulated routing attempts that reach the
+                                    national backup, or no center, are not evaluated. Defaults to "simulation".
+        by_center (bool, optional) -- whether to compute the metrics per center (metrics_call_centers) or for
+                                      the complete network (metrics_network). Defaults to False.
+        pooled (bool, optional) -- whether to pool the routing attempts of all the evaluations, in which case
+                                   a call counts once per evaluation it was simulated in. Defaults to False.
+
+    Returns:
+        routing metrics (pd.DataFrame) -- one row per evaluation (unless pooled) and center (if by_center)
+                                          with the columns of the metrics tables. The pooled metrics also
+                                          have the number of evaluations that were pooled (evaluation_count).
+    """
+    if instance == "simulation":
+        routing_attempts = routing_attempts[
+            routing_attempts["center_key"].notna()
+            & (routing_attempts["center_key"] != "National Backup")
+        ]
+
+    # A call is identified by its key and the evaluation it was simulated in.
+    routing_attempts = routing_attempts.assign(
+        call_id=routing_attempts.groupby(["evaluation_id", "call_key"]).ngroup()
+    )
+    group_columns = ([] if pooled else ["evaluation_id"]) + (
+        ["center_key", "termination_number"] if by_center else []
+    )
+    if group_columns:
+        grouped = routing_attempts.groupby(group_columns, dropna=False, sort=True)
+    else:
+        grouped = routing_attempts.groupby(
+            np.zeros(len(routing_attempts), dtype=np.int8)
+        )
+
+    call_count = grouped["call_id"].nunique()
+    flag_sums = grouped[METRIC_FLAG_COLUMNS].sum(min_count=1)
+    time_statistics = grouped[METRIC_TIME_COLUMNS].agg(
+        list(METRIC_TIME_STATISTICS.values())
+    )
+
+    routing_metrics = pd.DataFrame(index=call_count.index)
+    routing_metrics["calls_flowout_network_count"] = (
+        call_count - flag_sums["completed_at_center"]
+    )
+    routing_metrics["calls_flowout_network_fraction"] = (
+        routing_metrics["calls_flowout_network_count"] / call_count
+    )
+    routing_metrics["answer_rate"] = flag_sums["answered_at_center"] / call_count
+    routing_metrics["abandonment_rate"] = flag_sums["abandoned_at_center"] / call_count
+    routing_metrics["flowout_rate"] = flag_sums["flowout_from_center"] / call_count
+    routing_metrics["answered_in_state_rate"] = (
+        flag_sums["answered_in_state"] / call_count
+    )
+    routing_metrics["answered_out_state_rate"] = (
+        flag_sums["answered_out_state"] / call_count
+    )
+    for column in METRIC_TIME_COLUMNS:
+        for suffix, statistic in METRIC_TIME_STATISTICS.items():
+            routing_metrics[f"{column}_{suffix}"] = time_statistics[(column, statistic)]
+
+    if group_columns:
+        routing_metrics = routing_metrics.reset_index()
+    else:
+        routing_metrics = routing_metrics.reset_index(drop=True)
+    if pooled:
+        routing_metrics.insert(
+            0, "evaluation_count", routing_attempts["evaluation_id"].nunique()
+        )
+    routing_metrics.insert(1, "instance", instance)
+    return routing_metrics
+
+
+def get_pooled_routing_metrics(results_folder_path, evaluation_ids, by_center=False):
+    """Compute the metrics of the simulated routing attempts of several trials pooled together.
+
+    Keyword arguments:
+        results_folder_path (str) -- folder of the results store.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials.
+        by_center (bool, optional) -- whether to compute the metrics per center. Defaults to False.
+
+    Returns:
+        routing metrics (pd.DataFrame) -- metrics of the pooled trials (see `get_routing_metrics`).
+    """
+    return get_routing_metrics(
+        routing_attempts=load_routing_attempts(
+            results_folder_path=results_folder_path, evaluation_ids=evaluation_ids
+        ),
+        instance="simulation",
+        by_center=by_center,
+        pooled=True,
+    )
+
+
+def main():
+    """Example function to show how to aggregate the trials of the results store."""
+    results_folder_path = "/mnt/data/projects/vibrant-routing/simulation_results/"
+    evaluation_ids = get_evaluation_ids(results_folder_path=results_folder_path)
+    print(
+        get_pooled_routing_metrics(
+            results_folder_path=results_folder_path, evaluation_ids=evaluation_ids
+        )
+    )
+
+
+# main()
@@ -0,0 +1,484 @@
+import os
+import shutil
+import logging
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.utils.util import create_file_hash
+
+# Name of the columns of the routing table that contain the center where to route the call per attempt number.
+CENTER_KEY_COLUMNS = ["center1id", "center2id", "center3id", "center4id"]
+TERMINATION_NUMBER_COLUMNS = [
+    "center1termination",
+    "center2termination",
+    "center3termination",
+    "center4termination",
+]
+
+# Value of the integer-coded arrays when there is no center for an attempt number or no row for an exchange code.
+MISSING_ID = -1
+
+# Name of the arrays of a compiled routing table. Each array is saved as a `.npy` file in the same directory.
+COMPILED_ROUTING_TABLE_ARRAYS = [
+    "exchange_codes",
+    "row_ids",
+    "center_key_ids",
+    "termination_numbers",
+    "center_keys",
+]
+
+# Name of the file with the parsed routing table in each directory of the routing table cache.
+PARSED_ROUTING_TABLE_FILE_NAME = "routing_table.pkl"
+
+
+class CompiledRoutingTable:
+    def __init__(
+        self, exchange_codes, row_ids, center_key_ids, termination_numbers, center_keys
+    ):
+        """Routing table stored as integer-coded NumPy arrays.
+        * Each exchange code (npanxx) is mapped to a dense row id by indexing the <row_ids> array.
+        * The center keys are interned: each row stores the position of its center keys in <center_keys>.
+        * The arrays can be saved in a directory and memory-mapped, so the table is only compiled once.
+
+        Keyword arguments:
+            exchange_codes (np.ndarray) -- sorted exchange codes of the routing table, one per row.
+            row_ids (np.ndarray) -- row id of each exchange code, indexed by the exchange code. It is -1
+                                    for the exchange codes that are not in the routing table.
+            center_key_ids (np.ndarray) -- (rows x attempts) position of the center key in <center_keys>.
+                                           It is -1 if there is no center for the attempt number.
+            termination_numbers (np.ndarray) -- (rows x attempts) termination number of the center.
+                                                It is -1 if there is no center for the attempt number.
+            center_keys (np.ndarray) -- distinct center keys of the routing table.
+        """
+        self.exchange_codes = exchange_codes
+        self.row_ids = row_ids
+        self.center_key_ids = center_key_ids
+        self.termination_numbers = termination_numbers
+        self.center_keys = center_keys
+        self.number_of_attempts = center_key_ids.shape[1]
+
+        # Python copy of the interned center keys, to return built-in strings on lookups.
+        self.center_key_list = [str(center_key) for center_key in center_keys]
+
+        # Exchange codes that are not in the routing table, which are only reported once.
+        self.unknown_exchange_codes = set()
+
+    @classmethod
+    def from_dataframe(cls, routing_table):
+        """Compile a routing table.
+
+        Keyword arguments:
+            routing_table (pd.DataFrame) -- routing table with the column npanxx and the center columns
+                                            in lower case.
+
+        Raises:
+            ValueError -- if an exchange code is negative.
+
+        Returns:
+            compiled routing table (CompiledRoutingTable) -- routing table stored as integer-coded arrays.
+        """
+        routing_table = routing_table.copy()
+        routing_table["npanxx"] = pd.to_numeric(routing_table["npanxx"]).astype(
+            np.int64
+        )
+        routing_table = routing_table.drop_duplicates(
+            subset="npanxx", keep="first"
+        ).sort_values("npanxx")
+
+        exchange_codes = routing_table["npanxx"].to_numpy(dtype=np.int64)
+        if len(exchange_codes) and exchange_codes[0] < 0:
+            logging.error(
+                f"The exchange codes of the routing table can not be negative."
+            )
+            raise ValueError(
+                f"The exchange codes of the routing table can not be negative."
+            )
+
+        # Dense row id of each exchange code.
+        row_ids = np.full(
+            exchange_codes[-1] + 1 if len(exchange_codes) else 0,
+            MISSING_ID,
+            dtype=np.int32,
+        )
+        row_ids[exchange_codes] = np.arange(len(exchange_codes), dtype=np.int32)
+
+        # A center is missing if either its key or its termination number is missing.
+        center_key_values = routing_table[CENTER_KEY_COLUMNS]
+        termination_number_values = routing_table[TERMINATION_NUMBER_COLUMNS].apply(
+            pd.to_numeric
+        )
+        is_missing = (
+            center_key_values.isna().to_numpy()
+            | termination_number_values.isna().to_numpy()
+        )
+
+        # Intern the center keys.
+        center_keys, center_key_ids = np.unique(
+            center_key_values.where(~is_missing, "").to_numpy(dtype=str),
+            return_inverse=True,
+        )
+        center_key_ids = center_key_ids.reshape(is_missing.shape).astype(np.int32)
+        termination_numbers = (
+            termination_number_values.fillna(MISSING_ID).to_numpy().astype(np.int64)
+        )
+
+        # Remove the empty center key that stands for the missing centers.
+        if len(center_keys) and center_keys[0] == "" and is_missing.any():
+            center_keys = center_keys[1:]
+            center_key_ids = center_key_ids - 1
+        center_key_ids[is_missing] = MISSING_ID
+        termination_numbers[is_missing] = MISSING_ID
+
+        return cls(
+            exchange_codes=exchange_codes,
+            row_ids=row_ids,
+            center_key_ids=center_key_ids,
+            termination_numbers=termination_numbers,
+            center_keys=center_keys,
+        )
+
+    @classmethod
+    def from_csv(cls, routing_table_path):
+        """Load and compile a routing table from a csv file.
+
+        Keyword arguments:
+            routing_table_path (str) -- path where to find the routing table of interest.
+
+        Returns:
+            compiled routing table (CompiledRoutingTable) -- routing table stored as integer-coded arrays.
+        """
+        return cls.from_dataframe(read_routing_table_csv(routing_table_path))
+
+    @classmethod
+    def load(cls, compiled_routing_table_path, mmap_mode="r"):
+        """Load a compiled routing table saved with `save`.
+
+        Keyword arguments:
+            compiled_routing_table_path (str) -- directory where the arrays of the compiled routing table are saved.
+            mmap_mode (str, optional) -- memory-map mode of the arrays (see `np.load`). Defaults to "r".
+
+        Returns:
+            compiled routing table (CompiledRoutingTable) -- routing table stored as integer-coded arrays.
+        """
+        arrays = {
+            array_name: np.load(
+                os.path.join(compiled_routing_table_path, f"{array_name}.npy"),
+                mmap_mode=mmap_mode,
+            )
+            for array_name in COMPILED_ROUTING_TABLE_ARRAYS
+        }
+        return cls(**arrays)
+
+    def save(self, compiled_routing_table_path):
+        """Save the arrays of the compiled routing table in a directory.
+
+        Keyword arguments:
+            compiled_routing_table_path (str) -- directory where to save the arrays of the compiled routing table.
+        """
+        os.makedirs(compiled_routing_table_path, exist_ok=True)
+        for array_name in COMPILED_ROUTING_TABLE_ARRAYS:
+            np.save(
+                os.path.join(compiled_routing_table_path, f"{array_name}.npy"),
+                np.asarray(getattr(self, array_name)),
+            )
+        logging.info(f"Compiled routing table saved in {compiled_routing_table_path}.")
+
+    def get_row_id(self, exchange_code):
+        """Get the row id of an exchange code.
+
+        Keyword arguments:
+            exchange_code (float) -- exchange code (npanxx) of the caller.
+
+        Returns:
+            row_id (int) -- row of the exchange code in the arrays, or -1 if it is not in the routing table.
+        """
+        exchange_code = int(exchange_code)
+        if not 0 <= exchange_code < len(self.row_ids):
+            return MISSING_ID
+        return int(self.row_ids[exchange_code])
+
+    def get_center(self, exchange_code, attempt_number):
+        """Get the center where to route a call given its exchange code and attempt number.
+
+        Keyword arguments:
+            exchange_code (float) -- exchange code (npanxx) of the caller.
+            attempt_number (int) -- number of times the call has already been routed.
+
+        Returns:
+            (center_key, termination_number) (tuple) -- center where to route the call. Both values are None
+                                                        if the exchange code is not in the routing table or
+                                                        there are no centers left for this attempt number.
+        """
+        row_id = self.get_row_id(exchange_code)
+        if row_id == MISSING_ID:
+            # The calls of the exchange code flow out to the national backup.
+            if exchange_code not in self.unknown_exchange_codes:
+                self.unknown_exchange_codes.add(exchange_code)
+                logging.warning(
+                    f"Exchange code {exchange_code} is not in the routing table, "
+                    f"so its calls are routed to the national backup."
+                )
+            return None, None
+        if attempt_number >= self.number_of_attempts:
+            return None, None
+
+        center_key_id = self.center_key_ids[row_id, attempt_number]
+        if center_key_id == MISSING_ID:
+            return None, None
+        return (
+            self.center_key_list[center_key_id],
+            int(self.termination_numbers[row_id, attempt_number]),
+        )
+
+    def get_connected_components(self):
+        """Get the connected components of the bipartite graph between the exchange codes and the centers
+        they are routed to. The calls of different components never reach the same center, so they do not
+        affect each other's features and can be simulated independently.
+
+        Returns:
+            component_ids (np.ndarray) -- component of each row of the routing table, numbered from 0.
+            centers_by_component (list[set]) -- (center_key, termination_number) pairs of each component.
+        """
+        # Union-find over the rows of the routing table: the rows that share a center are merged.
+        parents = list(range(len(self.exchange_codes)))
+
+        def find(row_id):
+            while parents[row_id] != row_id:
+                parents[row_id] = parents[parents[row_id]]
+                row_id = parents[row_id]
+            return row_id
+
+        center_key_ids = np.asarray(self.center_key_ids)
+        first_row_id_by_center = {}
+        for row_id, attempt_number in zip(*np.nonzero(center_key_ids != MISSING_ID)):
+            center = (
+                self.center_key_list[center_key_ids[row_id, attempt_number]],
+                int(self.termination_numbers[row_id, attempt_number]),
+            )
+            root = find(int(row_id))
+            first_root = find(first_row_id_by_center.setdefault(center, root))
+            if root != first_root:
+                parents[root] = first_root
+
+        roots = np.array([find(row_id) for row_id in range(len(parents))])
+        _, component_ids = np.unique(roots, return_inverse=True)
+        centers_by_component = [
+            set() for _ in range(int(component_ids.max(initial=-1)) + 1)
+        ]
+        for center, row_id in first_row_id_by_center.items():
+            centers_by_component[component_ids[row_id]].add(center)
+        return component_ids, centers_by_component
+
+
+def read_routing_table_csv(routing_table_path):
+    """Read a routing table from a csv file and validate its columns.
+
+    Keyword arguments:
+        routing_table_path (str) -- path where to find the routing table of interest.
+
+    Raises:
+        ValueError -- if the routing table misses the exchange code or a center column.
+
+    Returns:
+        routing_table (pd.DataFrame) -- routing table with the column names in lower case.
+    """
+    routing_table = pd.read_csv(routing_table_path, low_memory=False)
+    routing_table.columns = routing_table.columns.str.lower()
+
+    missing_columns = [
+        column
+        for column in ["npanxx"] + CENTER_KEY_COLUMNS + TERMINATION_NUMBER_COLUMNS
+        if column not in routing_table.columns
+    ]
+    if missing_columns:
+        logging.error(
+            f"The routing table {routing_table_path} misses the columns {missing_columns}."
+        )
+        raise ValueError(
+            f"The routing table {routing_table_path} misses the columns {missing_columns}."
+        )
+
+    routing_table["npanxx"] = pd.to_numeric(routing_table["npanxx"])
+    return routing_table
+
+
+def get_cached_routing_table_path(routing_table_path, cache_folder_path):
+    """Get the directory of the routing table cache with the parsed and compiled routing table.
+    The directory is named after the hash of the csv file, so a routing table is parsed only once
+    and its cache is invalidated as soon as the file changes.
+
+    Keyword arguments:
+        routing_table_path (str) -- path where to find the routing table of interest.
+        cache_folder_path (str) -- folder of the routing table cache.
+
+    Returns:
+        cached_routing_table_path (str) -- directory with the parsed routing table and the arrays
+                                           of the compiled routing table.
+    """
+    cached_routing_table_path = os.path.join(
+        cache_folder_path, create_file_hash(routing_table_path)
+    )
+    if os.path.isdir(cached_routing_table_path):
+        logging.info(
+            f"Routing table {routing_table_path} found in the cache {cached_routing_table_path}."
+        )
+        return cached_routing_table_path
+
+    # The cache is written in a temporary directory and renamed, so a partially written cache is never read.
+    logging.info(f"Caching the routing table {routing_table_path}.")
+    os.makedirs(cache_folder_path, exist_ok=True)
+    temporary_path = tempfile.mkdtemp(prefix="routing_table_", dir=cache_folder_path)
+    routing_table = read_routing_table_csv(routing_table_path)
+    routing_table.to_pickle(
+        os.path.join(temporary_path, PARSED_ROUTING_TABLE_FILE_NAME)
+    )
+    CompiledRoutingTable.from_dataframe(routing_table).save(
+        compiled_routing_table_path=temporary_path
+    )
+    try:
+        os.rename(temporary_path, cached_routing_table_path)
+    except OSError:
+        # Another process cached the same routing table first.
+        shutil.rmtree(temporary_path, ignore_errors=True)
+    return cached_routing_table_path
+
+
+def compile_routing_table(routing_table_path, cache_folder_path=None):
+    """Compile a routing table once, so the trials can memory-map its arrays.
+
+    Keyword arguments:
+        routing_table_path (str) -- path where to find the routing table of interest.
+        cache_folder_path (str, optional) -- folder of the routing table cache. If None, the routing table
+                                             is compiled in a temporary directory that the caller has to
+                                             remove. Defaults to NoneType.
+
+    Returns:
+        compiled_routing_table_path (str) -- directory with the arrays of the compiled routing table.
+    """
+    if cache_folder_path is not None:
+        return get_cached_routing_table_path(
+            routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+        )
+
+    compiled_routing_table_path = tempfile.mkdtemp(prefix="compiled_routing_table_")
+    CompiledRoutingTable.from_csv(routing_table_path=routing_table_path).save(
+        compiled_routing_table_path=compiled_routing_table_path
+    )
+    return compiled_routing_table_path
+
+
+def compile_routing_tables(routing_table_paths, cache_folder_path=None):
+    """Compile each routing table of an experiment once, so its trials can memory-map the arrays.
+    If a routing table fails to compile, the routing tables compiled before it are removed.
+
+    Keyword arguments:
+        routing_table_paths (list[str]) -- paths to the routing tables of interest.
+        cache_folder_path (str, optional) -- folder of the routing table cache. If None, the routing tables
+                                             are compiled in temporary directories that the caller has to
+                                             remove with `remove_compiled_routing_tables`. Defaults to NoneType.
+
+    Returns:
+        compiled_routing_table_paths (dict) -- directory of the compiled routing table by routing table path.
+    """
+    compiled_routing_table_paths = {}
+    try:
+        for routing_table_path in routing_table_paths:
+            if routing_table_path not in compiled_routing_table_paths:
+                compiled_routing_table_paths[
+                    routing_table_path
+                ] = compile_routing_table(
+                    routing_table_path=routing_table_path,
+                    cache_folder_path=cache_folder_path,
+                )
+    except Exception:
+        remove_compiled_routing_tables(
+            compiled_routing_table_paths=compiled_routing_table_paths,
+            cache_folder_path=cache_folder_path,
+        )
+        raise
+    return compiled_routing_table_paths
+
+
+def remove_compiled_routing_tables(
+    compiled_routing_table_paths, cache_folder_path=None
+):
+    """Remove the routing tables compiled in temporary directories. The cached routing tables are kept
+    for the next experiments.
+
+    Keyword arguments:
+        compiled_routing_table_paths (dict) -- directory of each compiled routing table, by any key.
+        cache_folder_path (str, optional) -- folder of the routing table cache the routing tables were
+                                             compiled in. Defaults to NoneType, i.e., no cache.
+    """
+    if cache_folder_path is not None:
+        return
+
+    for compiled_routing_table_path in compiled_routing_table_paths.values():
+        shutil.rmtree(compiled_routing_table_path, ignore_errors=True)
+
+
+def load_routing_table_dataframe(routing_table_path, cache_folder_path=None):
+    """Load a routing table as a data frame, from the routing table cache if there is one.
+
+    Keyword arguments:
+        routing_table_path (str) -- path where to find the routing table of interest.
+        cache_folder_path (str, optional) -- folder of the routing table cache. If None, the csv file
+                                             is parsed. Defaults to NoneType.
+
+    Returns:
+        routing_table (pd.DataFrame) -- routing table with the column names in lower case.
+    """
+    if cache_folder_path is None:
+        return read_routing_table_csv(routing_table_path)
+
+    cached_routing_table_path = get_cached_routing_table_path(
+        routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+    )
+    return pd.read_pickle(
+        os.path.join(cached_routing_table_path, PARSED_ROUTING_TABLE_FILE_NAME)
+    )
+
+
+def load_routing_table(
+    routing_table_path, compiled_routing_table_path=None, cache_folder_path=None
+):
+    """Load the routing table to be simulated.
+
+    Keyword arguments:
+        routing_table_path (str) -- path where to find the routing table of interest.
+        compiled_routing_table_path (str, optional) -- directory where the routing table has already been
+                                                       compiled. If None, the routing table is loaded from
+                                                       the cache or compiled from the csv file.
+                                                       Defaults to NoneType.
+        cache_folder_path (str, optional) -- folder of the routing table cache. If None, the csv file
+                                             is compiled. Defaults to NoneType.
+
+    Returns:
+        compiled routing table (CompiledRoutingTable) -- routing table stored as integer-coded arrays.
+    """
+    if compiled_routing_table_path is None and cache_folder_path is not None:
+        compiled_routing_table_path = get_cached_routing_table_path(
+            routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+        )
+
+    if compiled_routing_table_path is not None:
+        logging.info(
+            f"Loading the compiled routing table from {compiled_routing_table_path}."
+        )
+        return CompiledRoutingTable.load(compiled_routing_table_path)
+
+    logging.info(f"Compiling the routing table {routing_table_path}.")
+    return CompiledRoutingTable.from_csv(routing_table_path)
+
+
+def main():
+    """Example function to show how to compile a routing table."""
+    routing_table_path = "/mnt/data/projects/vibrant-routing/data/20220604/vibrant_RoutingTable_202206031725.csv"
+    compiled_routing_table = CompiledRoutingTable.from_csv(routing_table_path)
+    compiled_routing_table.save("/tmp/compiled_routing_table")
+    print(compiled_routing_table.get_center(exchange_code=201200, attempt_number=0))
+
+
+# main()
@@ -1,27 +1,638 @@
+import copy
+import os
 import logging
+import time
 import yaml
 import json
 import click
 import joblib
+from concurrent.futures import ProcessPoolExecutor
 
-from config.project_constants import MODELING_CONFIG_FILE
+from config.project_constants import MODELING_CONFIG_FILE, ROUTING_LEVEL_SCHEMA_NAME
 from src.pipeline.routing import (
     split_data,
     cohort_creator,
     simulate_routing,
     evaluate_routing,
+    compare_routing_tables,
+)
+from src.pipeline.routing.evaluate import get_metric_confidence_intervals
+from src.pipeline.routing.results_store import save_routing_attempts
+from src.pipeline.routing.routing_table import (
+    compile_routing_tables,
+    remove_compiled_routing_tables,
 )
 from src.utils.logging_util import set_logging_configuration
+from src.utils.checkpoint_util import (
+    get_checkpoint_path,
+    load_checkpoint,
+    remove_checkpoint,
+    save_checkpoint,
+)
+from src.utils.profiling_util import SimulationProfiler
+from src.utils.random_util import get_trial_random_seeds
 from src.utils.sql_util import (
     get_db_conn,
     add_routing_evaluation_entry_to_db,
+    add_simulation_profile_to_db,
+    add_stopping_reason_to_db,
+    get_last_evaluation_id,
+    drop_table,
+    get_simulated_routing_attempts,
+    is_evaluation_in_db,
 )
+from src.utils.util import create_file_hash, create_hash
+
+# Resources loaded once by each worker of the pool of processes that run the trials.
+TRIAL_WORKER_RESOURCES = {}
+
+# Network metrics whose confidence intervals decide when the adaptive mode stops running trials.
+DEFAULT_STOPPING_METRICS = [
+    "answer_rate",
+    "abandonment_rate",
+    "calls_flowout_network_fraction",
+]
+
+
+def get_trial_config(routing_level_config, simulated_routing_attempts_table_name):
+    """Get the routing level configuration of a trial.
+    Only the table with the simulated routing attempts is (re)created for each trial. The other tables keep
+    whether they were created by the experiment in `is_created`, so the trial still reads them (e.g., the
+    snapshot of the historical routing attempts, see `get_historical_table_name`).
+
+    Keyword arguments:
+        routing_level_config (dict) -- dictionary with the routing level configuration.
+        simulated_routing_attempts_table_name (str) -- name of the table where the trial stores the simulated routing attempts.
+
+    Returns:
+        trial_config (dict) -- copy of the routing level configuration for the trial.
+    """
+    trial_config = copy.deepcopy(routing_level_config)
+    original_table_name = routing_level_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ]
+
+    # Recreate the simulation table by setting off the table_flag for the other tables.
+    for table in trial_config["tables_to_create"]:
+        if table["name"] != original_table_name:
+            table["is_created"] = table.get("is_created", table["table_flag"])
+            table["table_flag"] = False
+        else:
+            table["table_flag"] = True
+            table["name"] = simulated_routing_attempts_table_name
+
+    trial_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ] = simulated_routing_attempts_table_name
+    return trial_config
+
+
+def get_trial_kwargs(
+    best_model_path,
+    routing_table_path,
+    routing_level_config,
+    feature_config,
+    split_datetime,
+    trial_number,
+    number_of_trials,
+    log_path,
+    compiled_routing_table_path,
+    random_seed,
+    is_parallel,
+    table_name_suffix=None,
+    checkpoint_path=None,
+    resume=False,
+):
+    """Get the keyword arguments of `run_trial` for a trial, other than the model and the database connection.
+    Trials that run in parallel can not share the table with the simulated routing attempts, so each of them
+    gets its own table, named after the trial number and <table_name_suffix>.
+
+    Keyword arguments:
+        best_model_path (str) -- path to the model.
+        routing_table_path (str) -- path to routing table to be tested.
+        routing_level_config (dict) -- dictionary with the routing level configuration.
+        feature_config (dict) -- information about the features to be created.
+        split_datetime (dict) -- dictionary with the time splits.
+        trial_number (int) -- number of the trial, starting at 1.
+        number_of_trials (int) -- number of trials of the experiment.
+        log_path (str) -- path to the experiment logs.
+        compiled_routing_table_path (str) -- directory where the routing table has already been compiled.
+        random_seed (int) -- random seed of the trial.
+        is_parallel (bool) -- whether the trial runs in parallel with other trials.
+        table_name_suffix (str, optional) -- suffix of the table with the simulated routing attempts of the trial,
+                                             which must be unique among the trials with the same trial number that
+                                             can run at the same time. Defaults to NoneType, i.e., no suffix.
+        checkpoint_path (str, optional) -- path of the checkpoint file of the trial. Defaults to NoneType.
+        resume (bool, optional) -- whether to restart the trial from its checkpoint, if there is one.
+                                   Defaults to False.
+
+    Returns:
+        trial_kwargs (dict) -- keyword arguments of `run_trial`.
+    """
+    simulated_routing_attempts_table_name = routing_level_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ]
+    if is_parallel:
+        simulated_routing_attempts_table_name = "_".join(
+            [simulated_routing_attempts_table_name]
+            + ([table_name_suffix] if table_name_suffix is not None else [])
+            + [f"trial_{trial_number}"]
+        )
+
+    return {
+        "best_model_path": best_model_path,
+        "routing_table_path": routing_table_path,
+        "routing_level_config": routing_level_config,
+        "feature_config": feature_config,
+        "split_datetime": split_datetime,
+        "trial_number": trial_number,
+        "number_of_trials": number_of_trials,
+        "log_path": log_path,
+        "simulated_routing_attempts_table_name": simulated_routing_attempts_table_name,
+        "compiled_routing_table_path": compiled_routing_table_path,
+        "checkpoint_path": checkpoint_path,
+        "resume": resume,
+        "random_seed": random_seed,
+    }
+
+
+def get_memoization_key(
+    best_model_path,
+    routing_table_path,
+    routing_level_config,
+    feature_config,
+    split_datetime,
+    trial_number,
+    random_seed,
+):
+    """Get the key of a trial in the memoization folder. Trials with the same model, routing table,
+    configuration, trial number and random seed simulate the same routing attempts, so they share the key.
+    The path of the routing table is part of the key too, because its evaluation is compared with the ones of
+    the other routing tables by path, even when two routing table files have the same content.
+
+    Keyword arguments:
+        best_model_path (str) -- path to the model.
+        routing_table_path (str) -- path to routing table to be tested.
+        routing_level_config (dict) -- dictionary with the routing level configuration.
+        feature_config (dict) -- information about the features to be created.
+        split_datetime (dict) -- dictionary with the time splits.
+        trial_number (int) -- number of the trial, starting at 1.
+        random_seed (int) -- random seed of the trial.
+
+    Returns:
+        memoization key (str) -- hash of the content of the files and of the configuration of the trial.
+    """
+    # The configuration is hashed with the name of the shared table, as in the evaluation entry.
+    config_routing = get_trial_config(
+        routing_level_config=routing_level_config,
+        simulated_routing_attempts_table_name=routing_level_config["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ],
+    )
+    return create_hash(
+        {
+            "model_hash": create_file_hash(best_model_path),
+            "routing_table_path": str(routing_table_path),
+            "routing_table_hash": create_file_hash(routing_table_path),
+            "config_routing": str(config_routing),
+            "config_feature": str(feature_config),
+            "split_datetime": str(split_datetime),
+            "trial_number": str(trial_number),
+            "random_seed": str(random_seed),
+        }
+    )
+
+
+def load_memoized_trial(db_conn, memoization_path, trajectory_path=None):
+    """Get the evaluation of a trial that was already simulated with the same key.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        memoization_path (str) -- path of the memoized trial (see `get_memoization_key`).
+        trajectory_path (str, optional) -- path where to save the trajectory of the simulation, which is
+                                           restored from the memoized trial. Defaults to NoneType.
+
+    Returns:
+        evaluation_id (int) -- identifier of the evaluation of the memoized trial, or None if the trial has to
+                               be simulated: it was never simulated, its metrics are no longer in the database,
+                               or its trajectory is needed but was not saved.
+    """
+    memoized_trial = load_checkpoint(checkpoint_path=memoization_path)
+    if memoized_trial is None:
+        return None
+    if not is_evaluation_in_db(
+        db_conn=db_conn, evaluation_id=memoized_trial["evaluation_id"]
+    ):
+        logging.info(
+            f"Evaluation {memoized_trial['evaluation_id']} of {memoization_path} is no longer in the database."
+        )
+        return None
+    if trajectory_path is not None:
+        if memoized_trial["trajectory"] is None:
+            return None
+        save_checkpoint(
+            checkpoint_path=trajectory_path, state=memoized_trial["trajectory"]
+        )
+    return memoized_trial["evaluation_id"]
+
+
+def save_memoized_trial(memoization_path, evaluation_id, trajectory_path=None):
+    """Save the evaluation of a trial, and its trajectory if there is one, in the memoization folder.
+
+    Keyword arguments:
+        memoization_path (str) -- path of the memoized trial (see `get_memoization_key`).
+        evaluation_id (int) -- identifier of the evaluation of the trial.
+        trajectory_path (str, optional) -- path where the trajectory of the simulation was saved.
+                                           Defaults to NoneType.
+    """
+    save_checkpoint(
+        checkpoint_path=memoization_path,
+        state={
+            "evaluation_id": evaluation_id,
+            "trajectory": (
+                load_checkpoint(checkpoint_path=trajectory_path)
+                if trajectory_path is not None
+                else None
+            ),
+        },
+    )
+
+
+def run_trial(
+    db_conn,
+    model,
+    best_model_path,
+    routing_table_path,
+    routing_level_config,
+    feature_config,
+    split_datetime,
+    trial_number,
+    number_of_trials,
+    log_path,
+    simulated_routing_attempts_table_name,
+    compiled_routing_table_path=None,
+    checkpoint_path=None,
+    resume=False,
+    random_seed=None,
+    shared_resources=None,
+    trajectory_path=None,
+    baseline_trajectory_path=None,
+):
+    """Simulate and evaluate one trial of the routing table.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        model (object) -- model used to predict whether a call will be picked up or not at a given call center.
+        best_model_path (str) -- path to the model.
+        routing_table_path (str) -- path to routing table to be tested.
+        routing_level_config (dict) -- dictionary with the routing level configuration.
+        feature_config (dict) -- information about the features to be created.
+        split_datetime (dict) -- dictionary with the time splits.
+        trial_number (int) -- number of the trial, starting at 1.
+        number_of_trials (int) -- number of trials of the experiment.
+        log_path (str) -- path to the experiment logs.
+        simulated_routing_attempts_table_name (str) -- name of the table where the trial stores the simulated routing attempts.
+        compiled_routing_table_path (str, optional) -- directory where the routing table has already been compiled.
+                                                       Defaults to NoneType.
+        checkpoint_path (str, optional) -- path of the checkpoint file of the trial. Defaults to NoneType.
+        resume (bool, optional) -- whether to restart the trial from its checkpoint, if there is one.
+                                   Defaults to False.
+        random_seed (int, optional) -- random seed of the trial. Trials of different routing tables with the same
+                                       random seed draw the same random numbers for each call. Defaults to NoneType,
+                                       i.e., a new random seed.
+        shared_resources (dict, optional) -- inputs of the simulation shared by several routing tables
+                                             (see `load_simulation_resources`). Defaults to NoneType.
+        trajectory_path (str, optional) -- path where to save the trajectory of the simulation. Defaults to NoneType.
+        baseline_trajectory_path (str, optional) -- path of the trajectory of a baseline simulation to simulate
+                                                    the trial incrementally from. Defaults to NoneType.
+
+    Returns:
+        evaluation_id (int) -- identifier of the evaluation of the trial.
+    """
+    trial_config = get_trial_config(
+        routing_level_config=routing_level_config,
+        simulated_routing_attempts_table_name=simulated_routing_attempts_table_name,
+    )
+
+    # Check whether the trial was already finished or can restart from a checkpoint.
+    checkpoint_state = None
+    if resume and checkpoint_path is not None:
+        checkpoint_state = load_checkpoint(checkpoint_path=checkpoint_path)
+        if (
+            checkpoint_state is not None
+            and checkpoint_state["routing_table_path"] != routing_table_path
+        ):
+            checkpoint_state = None
+    if checkpoint_state is not None and "evaluation_id" in checkpoint_state:
+        logging.info(
+            f"Trial # {trial_number}/{number_of_trials} already finished. Evaluation: {checkpoint_state['evaluation_id']}."
+        )
+        return checkpoint_state["evaluation_id"]
+
+    # Reuse the evaluation of an identical trial. Only the trials with a known random seed can be reused.
+    memoization_folder_path = routing_level_config.get("simulator_config", {}).get(
+        "memoization_folder_path"
+    )
+    memoization_path = None
+    if (
+        memoization_folder_path is not None
+        and random_seed is not None
+        and checkpoint_state is None
+    ):
+        memoization_key = get_memoization_key(
+            best_model_path=best_model_path,
+            routing_table_path=routing_table_path,
+            routing_level_config=routing_level_config,
+            feature_config=feature_config,
+            split_datetime=split_datetime,
+            trial_number=trial_number,
+            random_seed=random_seed,
+        )
+        memoization_path = os.path.join(
+            memoization_folder_path, f"{memoization_key}.pkl"
+        )
+        evaluation_id = load_memoized_trial(
+            db_conn=db_conn,
+            memoization_path=memoization_path,
+            trajectory_path=trajectory_path,
+        )
+        if evaluation_id is not None:
+            logging.info(
+                f"Trial # {trial_number}/{number_of_trials} already simulated. Evaluation: {evaluation_id}."
+            )
+            if checkpoint_path is not None:
+                save_checkpoint(
+                    checkpoint_path=checkpoint_path,
+                    state={
+                        "evaluation_id": evaluation_id,
+                        "routing_table_path": routing_table_path,
+                    },
+                )
+            return evaluation_id
+
+    # The table with the simulated routing attempts of a checkpoint is kept.
+    if checkpoint_state is None:
+        logging.info(
+            f"Creation of simulated routing attempt table {simulated_routing_attempts_table_name}."
+        )
+        cohort_creator(
+            db_conn=db_conn,
+            split_datetime=split_datetime,
+            config=trial_config,
+        )
+        logging.info(
+            "Creation of cohort and lookup tables needed for simulation finished."
+        )
+
+    # Simulate the routing of calls, timing its phases and SQL statements if profiling is enabled.
+    profiler = SimulationProfiler(
+        enabled=routing_level_config.get("simulator_config", {}).get("profiling", False)
+    )
+    logging.info(
+        f"Call simulation started. # {trial_number}/{number_of_trials} re-runs."
+    )
+    profiler.listen_to_sql()
+    try:
+        random_seed, simulated_routing_attempts = simulate_routing(
+            db_conn=db_conn,
+            model=model,
+            routing_table_path=routing_table_path,
+            config_routing_level=trial_config,
+            config_feature=feature_config,
+            random_seed=random_seed,
+            compiled_routing_table_path=compiled_routing_table_path,
+            checkpoint_path=checkpoint_path,
+            resume=checkpoint_state is not None,
+            profiler=profiler,
+            shared_resources=shared_resources,
+            trajectory_path=trajectory_path,
+            baseline_trajectory_path=baseline_trajectory_path,
+        )
+    finally:
+        profiler.stop_listening_to_sql()
+    logging.info("Call simulation finished.")
+
+    # The configuration is logged with the name of the shared table so that the trials
+    # of the same experiment have the same configuration hash.
+    logging.info("Adding routing evaluation entry to db.")
+    evaluation_id = add_routing_evaluation_entry_to_db(
+        db_conn=db_conn,
+        model_path=best_model_path,
+        trial_number=trial_number,
+        routing_table_path=routing_table_path,
+        config_routing=get_trial_config(
+            routing_level_config=routing_level_config,
+            simulated_routing_attempts_table_name=routing_level_config[
+                "feature_config"
+            ]["simulated_routing_attempts_table_name"],
+        ),
+        config_feature=feature_config,
+        random_seed=random_seed,
+        log_path=log_path,
+    )
+    logging.info("Finished adding routing evaluation entry to db.")
+
+    # Save the profile of the simulation in the database and next to the logs.
+    if profiler.enabled:
+        profiler.log_summary()
+        add_simulation_profile_to_db(
+            evaluation_id=evaluation_id, simulation_profile=profiler.get_summary()
+        )
+        profiler.save_summary(
+            profile_path=f"{os.path.splitext(log_path)[0]}_evaluation_{evaluation_id}_profile.json"
+        )
+
+    # Keep the simulated routing attempts of the trial in the results store, since the table is recreated
+    # by the next trial. The metrics of the simulation are then computed from them in memory. The in_memory
+    # mode returns them, and the database mode only has them in the database.
+    results_folder_path = routing_level_config.get("simulator_config", {}).get(
+        "results_folder_path"
+    )
+    if results_folder_path is None:
+        simulated_routing_attempts = None
+    else:
+        if simulated_routing_attempts is None:
+            simulated_routing_attempts = get_simulated_routing_attempts(
+                db_conn=db_conn,
+                schema_name=ROUTING_LEVEL_SCHEMA_NAME,
+                table_name=simulated_routing_attempts_table_name,
+            )
+        save_routing_attempts(
+            routing_attempts=simulated_routing_attempts,
+            results_folder_path=results_folder_path,
+            evaluation_id=evaluation_id,
+        )
+
+    logging.info(
+        f"Evaluation started: \npath to best model:{best_model_path} \npath to routing table: {routing_table_path}"
+    )
+    evaluate_routing(
+        db_conn=db_conn,
+        evaluation_id=evaluation_id,
+        simulated_routing_attempts_table_name=simulated_routing_attempts_table_name,
+        simulated_routing_attempts=simulated_routing_attempts,
+    )
+    logging.info(
+        f"Evaluation finished: \npath to best model:{best_model_path} \npath to routing table: {routing_table_path}"
+    )
+    logging.info(
+        f"Call simulation finished. # {trial_number}/{number_of_trials} re-runs."
+    )
+
+    # Memoize the trial, so it is not simulated again with the same key.
+    if memoization_path is not None:
+        save_memoized_trial(
+            memoization_path=memoization_path,
+            evaluation_id=evaluation_id,
+            trajectory_path=trajectory_path,
+        )
+
+    # Mark the trial as finished, so it is not run again when resuming.
+    if checkpoint_path is not None:
+        save_checkpoint(
+            checkpoint_path=checkpoint_path,
+            state={
+                "evaluation_id": evaluation_id,
+                "routing_table_path": routing_table_path,
+            },
+        )
+
+    # The table of a trial that ran in parallel is not needed once the trial is evaluated, and its
+    # simulated routing attempts are in the results store, if any. The table shared by the trials is kept.
+    if (
+        simulated_routing_attempts_table_name
+        != routing_level_config["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ]
+    ):
+        drop_table(
+            db_conn=db_conn,
+            schema_name=ROUTING_LEVEL_SCHEMA_NAME,
+            table_name=simulated_routing_attempts_table_name,
+        )
+    return evaluation_id
+
+
+def initialize_trial_worker(best_model_path, shared_resources=None):
+    """Load the model and open a database connection once per worker of the pool of processes.
+
+    Keyword arguments:
+        best_model_path (str) -- path to the model.
+        shared_resources (dict, optional) -- inputs of the simulation shared by several routing tables
+                                             (see `load_simulation_resources`). Defaults to NoneType.
+    """
+    TRIAL_WORKER_RESOURCES["model"] = joblib.load(best_model_path)
+    TRIAL_WORKER_RESOURCES["db_conn"] = get_db_conn()
+    TRIAL_WORKER_RESOURCES["shared_resources"] = shared_resources
+
+
+def run_trial_in_worker(trial_kwargs):
+    """Run a trial in a worker of the pool of processes.
+
+    Keyword arguments:
+        trial_kwargs (dict) -- keyword arguments of `run_trial` other than the model and the database connection.
+
+    Returns:
+        evaluation_id (int) -- identifier of the evaluation of the trial.
+    """
+    return run_trial(
+        db_conn=TRIAL_WORKER_RESOURCES["db_conn"],
+        model=TRIAL_WORKER_RESOURCES["model"],
+        shared_resources=TRIAL_WORKER_RESOURCES["shared_resources"],
+        **trial_kwargs,
+    )
+
+
+def run_trials(
+    trials_kwargs, db_conn=None, model=None, executor=None, shared_resources=None
+):
+    """Run several trials, either one after the other or in a pool of processes.
+
+    Keyword arguments:
+        trials_kwargs (list[dict]) -- keyword arguments of `run_trial` other than the model and the database connection.
+        db_conn (object, optional) -- database connection, if the trials are run one after the other.
+                                      Defaults to NoneType.
+        model (object, optional) -- model, if the trials are run one after the other. Defaults to NoneType.
+        executor (ProcessPoolExecutor, optional) -- pool of processes that run the trials in parallel.
+                                                    Defaults to NoneType.
+        shared_resources (dict, optional) -- inputs of the simulation shared by several routing tables, if the
+                                             trials are run one after the other. Defaults to NoneType.
+
+    Returns:
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials.
+    """
+    if executor is not None:
+        return list(executor.map(run_trial_in_worker, trials_kwargs))
+    return [
+        run_trial(
+            db_conn=db_conn,
+            model=model,
+            shared_resources=shared_resources,
+            **trial_kwargs,
+        )
+        for trial_kwargs in trials_kwargs
+    ]
+
+
+def get_stopping_reason(
+    db_conn,
+    evaluation_ids,
+    stopping_config,
+    number_of_finished_trials,
+    maximum_number_of_trials,
+    elapsed_time_sec,
+    baseline_routing_table_path=None,
+    confidence_level=0.95,
+):
+    """Decide whether the adaptive mode should stop running trials.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials run so far.
+        stopping_config (dict) -- configuration of the adaptive mode (see `adaptive_stopping` in the configuration file).
+        number_of_finished_trials (int) -- number of trials run so far, per routing table.
+        maximum_number_of_trials (int) -- maximum number of trials, per routing table.
+        elapsed_time_sec (float) -- time since the first trial started (in seconds).
+        baseline_routing_table_path (str, optional) -- path to the routing table the others are compared with.
+                                                       Defaults to NoneType, i.e., no comparison.
+        confidence_level (float, optional) -- confidence level of the intervals. Defaults to 0.95.
+
+    Returns:
+        stopping_reason (str) -- "target_half_width", "time_budget" or "maximum_number_of_trials",
+                                 or None if more trials are needed.
+    """
+    if number_of_finished_trials >= stopping_config.get("minimum_number_of_trials", 2):
+        confidence_intervals = get_metric_confidence_intervals(
+            db_conn=db_conn,
+            evaluation_ids=evaluation_ids,
+            metric_columns=stopping_config.get("metrics", DEFAULT_STOPPING_METRICS),
+            baseline_routing_table_path=baseline_routing_table_path,
+            confidence_level=confidence_level,
+        )
+        for row in confidence_intervals.itertuples():
+            logging.info(
+                f"{row.metric} of {row.routing_table_path} after {row.trial_count} trials: "
+                f"{row.mean:.6f} +/- {row.half_width:.6f}."
+            )
+        target_half_width = stopping_config["target_half_width"]
+        if (
+            len(confidence_intervals)
+            and (confidence_intervals["half_width"] <= target_half_width).all()
+        ):
+            return "target_half_width"
+
+    time_budget_minutes = stopping_config.get("time_budget_minutes")
+    if time_budget_minutes is not None and elapsed_time_sec >= time_budget_minutes * 60:
+        return "time_budget"
+    if number_of_finished_trials >= maximum_number_of_trials:
+        return "maximum_number_of_trials"
+    return None
 
 
 @click.command()
 @click.option(
     "--routing_table_path",
-    prompt="Path to routing table to be tested.",
+    prompt="Path to routing table to be tested. Separate several paths by commas to compare them with the first one.",
     default="/mnt/data/projects/vibrant-routing/data/20220604/vibrant_RoutingTable_202206031725.csv",
 )
 @click.option(
@@ -29,12 +640,38 @@ from src.utils.sql_util import (
     prompt="How many times to re-run each experiment.",
     default=3,
 )
-def run(routing_table_path, number_of_trials):
+@click.option(
+    "--number_of_workers",
+    prompt="How many trials to run in parallel.",
+    default=1,
+)
+@click.option(
+    "--resume",
+    prompt="Resume the experiment from the latest checkpoints.",
+    default=False,
+    is_flag=True,
+)
+@click.option(
+    "--random_seed",
+    help="Random seed of the experiment, from which the random seed of each trial is derived.",
+    default=None,
+    type=int,
+)
+def run(routing_table_path, number_of_trials, number_of_workers, resume, random_seed):
     """Function that runs the routing-level pipeline.
 
     Keyword arguments:
-        routing_table_path (str) -- Path to routing table to be tested.
+        routing_table_path (str) -- Path to routing table to be tested. Several paths separated by commas are
+                                    compared with the first one: the trials with the same number use the same
+                                    random numbers for all the routing tables, and the paired differences of
+                                    their metrics are reported.
         number_of_trials (int) -- Number of time to re-run the experiment.
+        number_of_workers (int) -- Number of trials to run in parallel. If greater than 1, each trial
+                                   stores its simulated routing attempts in its own table.
+        resume (bool) -- Whether to skip the finished trials and restart the others from their latest checkpoint.
+        random_seed (int) -- Random seed of the experiment. If set, the trials draw the same random numbers
+                             every time the experiment is run, so their evaluations can be reused from the
+                             memoization folder. Defaults to NoneType, i.e., new random seeds.
     """
     # Read yaml file containing database configuration for modeling.
     with open(MODELING_CONFIG_FILE) as f:
@@ -57,6 +694,29 @@ def run(routing_table_path, number_of_trials):
     db_conn = get_db_conn()
 
     routing_level_config = modeling_config["routing_level_config"]
+
+    # The database simulation mode shares the feature and cohort tables between trials.
+    simulation_mode = routing_level_config.get("simulator_config", {}).get(
+        "simulation_mode", "database"
+    )
+    if number_of_workers > 1 and simulation_mode != "in_memory":
+        logging.error(
+            f"Trials can only run in parallel in the in_memory simulation mode, not in {simulation_mode}."
+        )
+        raise ValueError(
+            f"Trials can only run in parallel in the in_memory simulation mode, not in {simulation_mode}."
+        )
+    if resume and simulation_mode != "in_memory":
+        logging.error(
+            f"Trials can only resume from checkpoints in the in_memory simulation mode, not in {simulation_mode}."
+        )
+        raise ValueError(
+            f"Trials can only resume from checkpoints in the in_memory simulation mode, not in {simulation_mode}."
+        )
+    checkpoint_folder_path = routing_level_config.get("simulator_config", {}).get(
+        "checkpoint_folder_path"
+    )
+
     # Create time splits.
     logging.info("Creation of time splits started.")
     split_datetime = split_data(
@@ -69,36 +729,11 @@ def run(routing_table_path, number_of_trials):
     best_model_path = routing_level_config["best_model_config"]["model_pickle_path"]
     logging.info(f"Path to best model: {best_model_path}")
 
-    # Load the best model from from model_path.
-    logging.info("Loading of best model started.")
-    model = joblib.load(best_model_path)
-    logging.info("Loading of best model finished.")
-
-    # Create cohort.
-    logging.info(
-        "Creation of cohort and lookup tables needed because simulation started."
-    )
-    cohort_creator(
-        db_conn=get_db_conn(),
-        split_datetime=split_datetime,
-        config=routing_level_config,
-    )
-    logging.info("Creation of cohort and lookup tables needed for simulation finished.")
-
-    for trial_number in range(number_of_trials):
-        # Recreate the simulation table by setting off the table_flag
-        # for the other tables.
-        tables_to_create = routing_level_config["tables_to_create"]
-        for i in range(len(tables_to_create)):
-            if tables_to_create[i]["name"] != "simulated_routing_attempts":
-                tables_to_create[i]["table_flag"] = False
-            else:
-                tables_to_create[i]["table_flag"] = True
-
-        # Overwrite the tables_to_create config parameters.
-        routing_level_config["tables_to_create"] = tables_to_create
-
-        logging.info("Creation of simulated routing attempt tables.")
+    # Create cohort. When resuming, the lookup tables of the interrupted experiment are kept.
+    if not resume:
+        logging.info(
+            "Creation of cohort and lookup tables needed because simulation started."
+        )
         cohort_creator(
             db_conn=get_db_conn(),
             split_datetime=split_datetime,
@@ -108,39 +743,188 @@ def run(routing_table_path, number_of_trials):
             "Creation of cohort and lookup tables needed for simulation finished."
         )
 
-        # Simulate the routing of calls.
+    # Several routing tables are compared trial by trial with common random numbers.
+    routing_table_paths = [
+        path.strip() for path in routing_table_path.split(",") if path.strip()
+    ]
+    is_comparison = len(routing_table_paths) > 1
+    if is_comparison:
         logging.info(
-            f"Call simulation started. # {trial_number+1}/{number_of_trials} re-runs."
+            f"Comparing {routing_table_paths[1:]} with {routing_table_paths[0]} over {number_of_trials} paired trials."
+        )
+
+    # Draw the random seed of each trial number, shared by all the routing tables. When resuming, the random
+    # seeds of the interrupted experiment are reused so the trials stay paired. With --random_seed, the
+    # random seeds are derived from it instead of drawn.
+    random_seeds_path = (
+        os.path.join(checkpoint_folder_path, "random_seeds.pkl")
+        if checkpoint_folder_path is not None
+        else None
+    )
+    random_seeds = []
+    if resume and random_seeds_path is not None:
+        random_seeds_state = load_checkpoint(checkpoint_path=random_seeds_path)
+        if random_seeds_state is not None:
+            random_seeds = random_seeds_state["random_seeds"][:number_of_trials]
+    random_seeds += get_trial_random_seeds(
+        number_of_trials=number_of_trials, random_seed=random_seed
+    )[len(random_seeds) :]
+    if random_seeds_path is not None:
+        save_checkpoint(
+            checkpoint_path=random_seeds_path, state={"random_seeds": random_seeds}
+        )
+
+    # Compile each routing table once. The trials memory-map the compiled arrays.
+    routing_table_cache_folder_path = routing_level_config.get(
+        "simulator_config", {}
+    ).get("routing_table_cache_folder_path")
+    compiled_routing_table_paths = compile_routing_tables(
+        routing_table_paths=routing_table_paths,
+        cache_folder_path=routing_table_cache_folder_path,
+    )
+
+    # The trials of the routing tables are interleaved, so the paired trials run close to each other.
+    trials_kwargs = []
+    for trial_number in range(1, number_of_trials + 1):
+        for routing_table_number, path in enumerate(routing_table_paths, start=1):
+            trials_kwargs.append(
+                get_trial_kwargs(
+                    best_model_path=best_model_path,
+                    routing_table_path=path,
+                    routing_level_config=routing_level_config,
+                    feature_config=modeling_config["feature_config"],
+                    split_datetime=split_datetime,
+                    trial_number=trial_number,
+                    number_of_trials=number_of_trials,
+                    log_path=log_path,
+                    compiled_routing_table_path=compiled_routing_table_paths[path],
+                    random_seed=random_seeds[trial_number - 1],
+                    is_parallel=number_of_workers > 1,
+                    table_name_suffix=(
+                        f"table_{routing_table_number}" if is_comparison else None
+                    ),
+                    checkpoint_path=(
+                        get_checkpoint_path(
+                            checkpoint_folder_path=checkpoint_folder_path,
+                            trial_number=trial_number,
+                            routing_table_number=(
+                                routing_table_number if is_comparison else None
+                            ),
+                        )
+                        if checkpoint_folder_path is not None
+                        else None
+                    ),
+                    resume=resume,
+                )
+            )
+
+    # Remove the checkpoints of previous experiments, so they are not resumed by mistake.
+    if not resume:
+        for trial_kwargs in trials_kwargs:
+            if trial_kwargs["checkpoint_path"] is not None:
+                remove_checkpoint(checkpoint_path=trial_kwargs["checkpoint_path"])
+
+    # In the adaptive mode, the trials are run in rounds until the confidence intervals of the
+    # metrics are narrow enough or the budget is spent. Otherwise, they are run in a single round.
+    stopping_config = routing_level_config.get("simulator_config", {}).get(
+        "adaptive_stopping", {}
+    )
+    is_adaptive = stopping_config.get("enabled", False)
+    trials_per_round = max(number_of_workers, 1) if is_adaptive else number_of_trials
+    confidence_level = routing_level_config.get("simulator_config", {}).get(
+        "confidence_level", 0.95
+    )
+
+    # The evaluations reused from the memoization folder were added before the trials of this run.
+    last_evaluation_id = get_last_evaluation_id(db_conn=db_conn)
+
+    executor = None
+    model = None
+    try:
+        if number_of_workers > 1:
+            logging.info(
+                f"Running {len(trials_kwargs)} trials with {number_of_workers} parallel workers."
+            )
+            executor = ProcessPoolExecutor(
+                max_workers=min(number_of_workers, len(trials_kwargs)),
+                initializer=initialize_trial_worker,
+                initargs=(best_model_path,),
+            )
+        else:
+            # Load the best model from from model_path.
+            logging.info("Loading of best model started.")
+            model = joblib.load(best_model_path)
+            logging.info("Loading of best model finished.")
+
+        evaluation_ids = []
+        stopping_reason = None
+        start_time = time.time()
+        for first_trial_number in range(1, number_of_trials + 1, trials_per_round):
+            last_trial_number = min(
+                first_trial_number + trials_per_round - 1, number_of_trials
+            )
+            evaluation_ids += run_trials(
+                trials_kwargs=[
+                    trial_kwargs
+                    for trial_kwargs in trials_kwargs
+                    if first_trial_number
+                    <= trial_kwargs["trial_number"]
+                    <= last_trial_number
+                ],
+                db_conn=db_conn,
+                model=model,
+                executor=executor,
+            )
+            if not is_adaptive:
+                stopping_reason = "maximum_number_of_trials"
+                break
+
+            stopping_reason = get_stopping_reason(
+                db_conn=db_conn,
+                evaluation_ids=evaluation_ids,
+                stopping_config=stopping_config,
+                number_of_finished_trials=last_trial_number,
+                maximum_number_of_trials=number_of_trials,
+                elapsed_time_sec=time.time() - start_time,
+                baseline_routing_table_path=(
+                    routing_table_paths[0] if is_comparison else None
+                ),
+                confidence_level=confidence_level,
+            )
+            if stopping_reason is not None:
+                logging.info(
+                    f"Stopping after {last_trial_number} trials. Reason: {stopping_reason}."
+                )
+                break
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        remove_compiled_routing_tables(
+            compiled_routing_table_paths=compiled_routing_table_paths,
+            cache_folder_path=routing_table_cache_folder_path,
         )
-        random_seed = simulate_routing(
+
+    # The reason why the adaptive mode stopped is only recorded for the trials it simulated.
+    if is_adaptive:
+        add_stopping_reason_to_db(
             db_conn=db_conn,
-            model=model,
-            routing_table_path=routing_table_path,
-            config_routing_level=routing_level_config,
-            config_feature=modeling_config["feature_config"],
-            random_seed=None,
+            evaluation_ids=[
+                evaluation_id
+                for evaluation_id in evaluation_ids
+                if evaluation_id > last_evaluation_id
+            ],
+            stopping_reason=stopping_reason,
         )
-        logging.info("Call simulation finished.")
-        logging.info("Adding routing evaluation entry to db.")
-        evaluation_id = add_routing_evaluation_entry_to_db(
+
+    # Report the paired differences of the metrics of each routing table with the first one.
+    if is_comparison:
+        compare_routing_tables(
             db_conn=db_conn,
-            model_path=best_model_path,
-            trial_number=trial_number + 1,
-            routing_table_path=routing_table_path,
-            config_routing=routing_level_config,
-            config_feature=modeling_config["feature_config"],
-            random_seed=random_seed,
+            evaluation_ids=evaluation_ids,
+            baseline_routing_table_path=routing_table_paths[0],
             log_path=log_path,
+            confidence_level=confidence_level,
         )
-        logging.info("Finished adding routing evaluation entry to db.")
-        logging.info(
-            f"Evaluation started: \npath to best model:{best_model_path} \npath to routing table: {routing_table_path}"
-        )
-        evaluate_routing(db_conn=db_conn, evaluation_id=evaluation_id)
-        logging.info(
-            f"Evaluation finished: \npath to best model:{best_model_path} \npath to routing table: {routing_table_path}"
-        )
-        logging.info(
-            f"Call simulation finished. # {trial_number+1}/{number_of_trials} re-runs."
-        )
+
+    logging.info(f"Evaluations of the trials: {evaluation_ids}.")
     logging.info("Pipeline execution finished.")
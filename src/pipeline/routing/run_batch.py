@@ -0,0 +1,296 @@
+import os
+import glob
+import shutil
+import logging
+import tempfile
+import yaml
+import json
+import click
+import joblib
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+from config.project_constants import MODELING_CONFIG_FILE
+from src.pipeline.routing import split_data, cohort_creator, compare_routing_tables
+from src.pipeline.routing.routing_table import (
+    compile_routing_tables,
+    remove_compiled_routing_tables,
+)
+from src.pipeline.routing.results_store import get_pooled_routing_metrics
+from src.pipeline.routing.run import (
+    get_trial_kwargs,
+    initialize_trial_worker,
+    run_trials,
+)
+from src.pipeline.routing.simulator import load_simulation_resources
+from src.utils.logging_util import set_logging_configuration
+from src.utils.random_util import get_random_seed
+from src.utils.sql_util import get_db_conn
+
+
+def get_routing_table_paths(routing_tables, baseline_routing_table_path):
+    """Get the paths of the routing tables of a batch, starting with the baseline routing table.
+
+    Keyword arguments:
+        routing_tables (str) -- directory with the routing tables (csv files) or glob pattern of their paths.
+        baseline_routing_table_path (str) -- path to the routing table the others are compared with.
+
+    Raises:
+        ValueError -- if there is no routing table to compare with the baseline.
+
+    Returns:
+        routing_table_paths (list[str]) -- sorted paths of the routing tables, the baseline being the first one.
+    """
+    if os.path.isdir(routing_tables):
+        routing_tables = os.path.join(routing_tables, "*.csv")
+
+    routing_table_paths = [
+        path
+        for path in sorted(glob.glob(routing_tables))
+        if os.path.abspath(path) != os.path.abspath(baseline_routing_table_path)
+    ]
+    if len(routing_table_paths) == 0:
+        logging.error(f"No routing table found in {routing_tables}.")
+        raise ValueError(f"No routing table found in {routing_tables}.")
+    return [baseline_routing_table_path] + routing_table_paths
+
+
+@click.command()
+@click.option(
+    "--routing_tables",
+    prompt="Directory or glob pattern of the routing tables to be tested.",
+    default="/mnt/data/projects/vibrant-routing/data/generated_routing_tables/",
+)
+@click.option(
+    "--baseline_routing_table_path",
+    prompt="Path to the routing table the others are compared with.",
+    default="/mnt/data/projects/vibrant-routing/data/20220604/vibrant_RoutingTable_202206031725.csv",
+)
+@click.option(
+    "--number_of_trials",
+    prompt="How many times to simulate each routing table.",
+    default=3,
+)
+@click.option(
+    "--number_of_workers",
+    prompt="How many routing tables to simulate in parallel.",
+    default=1,
+)
+def run_batch(
+    routing_tables, baseline_routing_table_path, number_of_trials, number_of_workers
+):
+    """Function that evaluates a batch of routing tables in a single session.
+    The configuration, the cohort and lookup tables, the model and the historical feature state are loaded once
+    and shared by all the routing tables. The trials with the same number use the same random seed for all the
+    routing tables, and the paired differences with the baseline routing table are saved in a summary table.
+    With `delta_resimulation`, the trials of the baseline routing table run first and save their trajectory,
+    and the other routing tables only simulate again the calls that can be routed differently.
+
+    Keyword arguments:
+        routing_tables (str) -- Directory or glob pattern of the routing tables to be tested.
+        baseline_routing_table_path (str) -- Path to the routing table the others are compared with.
+        number_of_trials (int) -- Number of times to simulate each routing table.
+        number_of_workers (int) -- Number of trials to run in parallel. Each worker loads the model
+                                   and the shared inputs of the simulation once.
+    """
+    # Read yaml file containing database configuration for modeling.
+    with open(MODELING_CONFIG_FILE) as f:
+        modeling_config = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Set logging configuration and return the complete path where the logs are saved.
+    log_path = set_logging_configuration(
+        log_folder_path=modeling_config["log_folder_path"]
+    )
+    logging.info("Execution of the batch evaluation started.")
+    logging.debug(json.dumps(modeling_config, indent=4))
+
+    routing_level_config = modeling_config["routing_level_config"]
+    simulation_mode = routing_level_config.get("simulator_config", {}).get(
+        "simulation_mode", "database"
+    )
+    if simulation_mode != "in_memory":
+        logging.error(
+            f"Batches of routing tables can only be evaluated in the in_memory simulation mode, not in {simulation_mode}."
+        )
+        raise ValueError(
+            f"Batches of routing tables can only be evaluated in the in_memory simulation mode, not in {simulation_mode}."
+        )
+
+    routing_table_paths = get_routing_table_paths(
+        routing_tables=routing_tables,
+        baseline_routing_table_path=baseline_routing_table_path,
+    )
+    logging.info(
+        f"Comparing {len(routing_table_paths) - 1} routing tables with {baseline_routing_table_path}."
+    )
+
+    # Get database connection.
+    db_conn = get_db_conn()
+
+    # Create time splits, cohort and lookup tables once for all the routing tables.
+    split_datetime = split_data(
+        temporal_config=routing_level_config["temporal_config"],
+        output_filename=None,
+    )
+    cohort_creator(
+        db_conn=db_conn,
+        split_datetime=split_datetime,
+        config=routing_level_config,
+    )
+    logging.info("Creation of cohort and lookup tables needed for simulation finished.")
+
+    # Load the active calls, lookup tables and historical feature state once.
+    logging.info("Loading of the shared inputs of the simulation started.")
+    shared_resources = load_simulation_resources(
+        db_conn=db_conn,
+        config_routing_level=routing_level_config,
+        config_feature=modeling_config["feature_config"],
+    )
+    logging.info("Loading of the shared inputs of the simulation finished.")
+
+    best_model_path = routing_level_config["best_model_config"]["model_pickle_path"]
+    random_seeds = [get_random_seed() for _ in range(number_of_trials)]
+    delta_resimulation = routing_level_config.get("simulator_config", {}).get(
+        "delta_resimulation", False
+    )
+
+    routing_table_cache_folder_path = routing_level_config.get(
+        "simulator_config", {}
+    ).get("routing_table_cache_folder_path")
+
+    compiled_routing_table_paths = {}
+    trajectory_folder_path = None
+    executor = None
+    try:
+        # Compile each routing table once. The trials memory-map the compiled arrays.
+        compiled_routing_table_paths = compile_routing_tables(
+            routing_table_paths=routing_table_paths,
+            cache_folder_path=routing_table_cache_folder_path,
+        )
+
+        trials_kwargs = [
+            get_trial_kwargs(
+                best_model_path=best_model_path,
+                routing_table_path=path,
+                routing_level_config=routing_level_config,
+                feature_config=modeling_config["feature_config"],
+                split_datetime=split_datetime,
+                trial_number=trial_number,
+                number_of_trials=number_of_trials,
+                log_path=log_path,
+                compiled_routing_table_path=compiled_routing_table_paths[path],
+                random_seed=random_seeds[trial_number - 1],
+                is_parallel=number_of_workers > 1,
+                table_name_suffix=f"table_{routing_table_number}",
+            )
+            for trial_number in range(1, number_of_trials + 1)
+            for routing_table_number, path in enumerate(routing_table_paths, start=1)
+        ]
+
+        # The baseline trials save their trajectory, and the other trials are simulated from it.
+        if delta_resimulation:
+            trajectory_folder_path = tempfile.mkdtemp(prefix="trajectories_")
+            for trial_kwargs in trials_kwargs:
+                trajectory_path = os.path.join(
+                    trajectory_folder_path,
+                    f"trial_{trial_kwargs['trial_number']}.pkl",
+                )
+                if trial_kwargs["routing_table_path"] == baseline_routing_table_path:
+                    trial_kwargs["trajectory_path"] = trajectory_path
+                else:
+                    trial_kwargs["baseline_trajectory_path"] = trajectory_path
+
+        model = None
+        if number_of_workers > 1:
+            logging.info(
+                f"Running {len(trials_kwargs)} trials with {number_of_workers} parallel workers."
+            )
+            executor = ProcessPoolExecutor(
+                max_workers=min(number_of_workers, len(trials_kwargs)),
+                initializer=initialize_trial_worker,
+                initargs=(best_model_path, shared_resources),
+            )
+        else:
+            logging.info("Loading of best model started.")
+            model = joblib.load(best_model_path)
+            logging.info("Loading of best model finished.")
+
+        # The baseline trials must finish before the trials that are simulated from their trajectory.
+        trials_kwargs_by_stage = (
+            [
+                [kwargs for kwargs in trials_kwargs if "trajectory_path" in kwargs],
+                [kwargs for kwargs in trials_kwargs if "trajectory_path" not in kwargs],
+            ]
+            if delta_resimulation
+            else [trials_kwargs]
+        )
+        evaluation_ids = []
+        evaluation_routing_table_paths = []
+        for stage_trials_kwargs in trials_kwargs_by_stage:
+            evaluation_ids += run_trials(
+                trials_kwargs=stage_trials_kwargs,
+                db_conn=db_conn,
+                model=model,
+                executor=executor,
+                shared_resources=shared_resources,
+            )
+            evaluation_routing_table_paths += [
+                kwargs["routing_table_path"] for kwargs in stage_trials_kwargs
+            ]
+    finally:
+        if executor is not None:
+            executor.shutdown()
+        remove_compiled_routing_tables(
+            compiled_routing_table_paths=compiled_routing_table_paths,
+            cache_folder_path=routing_table_cache_folder_path,
+        )
+        if trajectory_folder_path is not None:
+            shutil.rmtree(trajectory_folder_path, ignore_errors=True)
+
+    # Summarize the batch in a single comparison table.
+    paired_comparison = compare_routing_tables(
+        db_conn=db_conn,
+        evaluation_ids=evaluation_ids,
+        baseline_routing_table_path=baseline_routing_table_path,
+        log_path=log_path,
+        confidence_level=routing_level_config.get("simulator_config", {}).get(
+            "confidence_level", 0.95
+        ),
+    )
+    summary_path = f"{os.path.splitext(log_path)[0]}_batch_summary.csv"
+    paired_comparison.to_csv(summary_path, index=False)
+    logging.info(f"Summary of the batch saved in {summary_path}.")
+
+    # Pool the simulated routing attempts of the trials of each routing table in the results store.
+    results_folder_path = routing_level_config.get("simulator_config", {}).get(
+        "results_folder_path"
+    )
+    if results_folder_path is not None:
+        pooled_metrics = pd.concat(
+            [
+                get_pooled_routing_metrics(
+                    results_folder_path=results_folder_path,
+                    evaluation_ids=[
+                        evaluation_id
+                        for evaluation_id, evaluation_routing_table_path in zip(
+                            evaluation_ids, evaluation_routing_table_paths
+                        )
+                        if evaluation_routing_table_path == path
+                    ],
+                ).assign(routing_table_path=path)
+                for path in routing_table_paths
+            ],
+            ignore_index=True,
+        )
+        pooled_metrics_path = (
+            f"{os.path.splitext(log_path)[0]}_batch_pooled_metrics.csv"
+        )
+        pooled_metrics.to_csv(pooled_metrics_path, index=False)
+        logging.info(f"Pooled metrics of the batch saved in {pooled_metrics_path}.")
+
+    logging.info(f"Evaluations of the trials: {evaluation_ids}.")
+    logging.info("Batch evaluation finished.")
+
+
+if __name__ == "__main__":
+    run_batch()
@@ -0,0 +1,905 @@
+import heapq
+import logging
+import time
+from datetime import timedelta
+
+import dateutil.parser
+from config.project_constants import FEATURES_COLUMNS_TO_RENAME
+from src.pipeline.routing.predict import predict
+from src.utils.checkpoint_util import save_checkpoint
+from src.utils.profiling_util import SimulationProfiler
+from src.utils.random_util import draw_bernoulli
+
+# Center where the calls flow out to when there is no center left in the routing table.
+NATIONAL_BACKUP_CENTER_KEY = "National Backup"
+NATIONAL_BACKUP_TERMINATION_NUMBER = -1
+
+# Columns that identify a routing attempt, which are not used as features by the model.
+ROUTING_ATTEMPT_ID_COLUMNS = [
+    "call_key",
+    "caller_npanxx",
+    "arrived_datetime_est",
+    "center_key",
+    "termination_number",
+]
+
+# 1 second is added to the ring time of a call to get its datetime of disposition. See `raw_to_processed.sql` file.
+# Hence, a routing attempt can not affect the features of the routing attempts that arrive at the
+# same center less than 1 second later.
+MINIMUM_TIME_TO_DISPOSITION = timedelta(seconds=1)
+
+# Shortest waiting time of a call at a center before it flows out (in seconds). Calls that flow out
+# re-enter the queue at least this long after they arrived, so batches must be shorter than this.
+MINIMUM_WAIT_TIME_AT_CENTER_SEC = 60
+
+
+class RoutingSimulationEngine:
+    def __init__(
+        self,
+        model,
+        routing_table,
+        simulated_routing_attempts_table,
+        feature_state,
+        random_seed,
+        batch_window_seconds=0,
+        profiler=None,
+    ):
+        """Discrete-event simulator of the routing of calls that runs in memory.
+        * Keeps the queue of calls, the simulated routing attempts and their disposition in memory.
+        * Computes the features of each routing attempt with a `RoutingFeatureState` instead of
+          recreating the feature, cohort and matrix tables in the database.
+        * Follows the same logic, and draws from the same random streams, as the database simulator.
+          The random draws of a call only depend on the random seed, the call and its attempt number,
+          so they do not depend on the batches.
+        * Scores the routing attempts in batches of calls that arrive close in time and
+          do not affect each other's features.
+        * Records the trajectory of the simulation, i.e., the center, arrival datetime and score of each
+          routing attempt. Given the trajectory of a baseline simulation of another routing table with the
+          same random seed (see `set_baseline_trajectory`), only the calls whose routing attempts can differ
+          from the baseline are scored again; the scores of the other routing attempts are reused.
+
+        Keyword arguments:
+            model (object) -- model used to predict whether a call will be picked up or not at a given call center.
+            routing_table (CompiledRoutingTable) -- compiled routing table.
+            simulated_routing_attempts_table (InMemorySimulationTable) -- in-memory simulated routing attempts table.
+            feature_state (RoutingFeatureState) -- in-memory state of the routing-level features.
+            random_seed (int) -- random seed of the simulation, from which the random draws of each call are derived.
+            batch_window_seconds (float, optional) -- length of the window (in seconds) of the calls that are scored
+                                                      together by the model. Defaults to 0, i.e., no batches.
+            profiler (SimulationProfiler, optional) -- profiler that times the phases of the simulation.
+                                                       Defaults to NoneType, i.e., no profiling.
+
+        Raises:
+            ValueError -- if the batch window is negative or not shorter than the shortest waiting time at a center.
+        """
+        if not 0 <= batch_window_seconds < MINIMUM_WAIT_TIME_AT_CENTER_SEC:
+            logging.error(
+                f"The batch window should be between 0 and {MINIMUM_WAIT_TIME_AT_CENTER_SEC} seconds, "
+                f"not {batch_window_seconds}."
+            )
+            raise ValueError(
+                f"The batch window should be between 0 and {MINIMUM_WAIT_TIME_AT_CENTER_SEC} seconds, "
+                f"not {batch_window_seconds}."
+            )
+
+        self.model = model
+        self.batch_window = timedelta(seconds=batch_window_seconds)
+        self.routing_table = routing_table
+        self.simulated_routing_attempts_table = simulated_routing_attempts_table
+        self.feature_state = feature_state
+        self.random_seed = random_seed
+        self.profiler = (
+            profiler if profiler is not None else SimulationProfiler(enabled=False)
+        )
+
+        # Queue of calls. The priority is based on the first element of each call:
+        #   datetime [EST] of the call, call_key, exchange code (caller_npanxx),
+        #   attempt number, and total_ring_time_sec.
+        self.calls_queue = []
+
+        # Center, arrival datetime, pick up score and datetime of disposition of each routing attempt,
+        # by (call_key, attempt number).
+        self.trajectory = {}
+
+        # Trajectory of the baseline simulation, the calls whose routing attempts can differ from the
+        # baseline from some attempt on, and the intervals of time when the features of each center can differ.
+        self.baseline_trajectory = None
+        self.baseline_attempt_numbers_by_call_key = {}
+        self.affected_call_keys = set()
+        self.affected_centers = {}
+        self.number_reused_routing_attempts = 0
+
+    def add_active_calls(self, active_calls):
+        """Add the active calls to the queue of calls.
+
+        Keyword arguments:
+            active_calls (pd.DataFrame) -- active calls with, at least, the columns
+                                           initiated_datetime_est, call_key and caller_npanxx.
+        """
+        for initiated_datetime_est, call_key, caller_npanxx in zip(
+            active_calls["initiated_datetime_est"],
+            active_calls["call_key"],
+            active_calls["caller_npanxx"],
+        ):
+            heapq.heappush(
+                self.calls_queue,
+                (
+                    dateutil.parser.parse(str(initiated_datetime_est)),
+                    call_key,
+                    caller_npanxx,
+                    0,
+                    0,
+                ),
+            )
+
+    def get_center(self, exchange_code, attempt_number):
+        """Get the center where to route a call given its exchange code and attempt number.
+
+        Keyword arguments:
+            exchange_code (float) -- exchange code (npanxx) of the caller.
+            attempt_number (int) -- number of times the call has already been routed.
+
+        Returns:
+            (center_key, termination_number) (tuple) -- center where to route the call. Both values are None
+                                                        if the exchange code is not in the routing table or
+                                                        there are no centers left for this attempt number.
+        """
+        return self.routing_table.get_center(
+            exchange_code=exchange_code, attempt_number=attempt_number
+        )
+
+    def run(self, checkpoint_path=None, checkpoint_interval=0, checkpoint_info=None):
+        """Simulate the routing of all the calls in the queue.
+
+        Keyword arguments:
+            checkpoint_path (str, optional) -- path of the checkpoint file. Defaults to NoneType, i.e., no checkpoints.
+            checkpoint_interval (int, optional) -- number of routing attempts simulated between two checkpoints.
+                                                   Defaults to 0, i.e., no checkpoints.
+            checkpoint_info (dict, optional) -- information saved with each checkpoint, e.g., the random seed.
+                                                Defaults to NoneType.
+
+        Returns:
+            number of routing attempts (int) -- number of routing attempts simulated.
+        """
+        logging.info(
+            f"Calls simulation started. Initial number of calls to simulate: {len(self.calls_queue)}",
+        )
+        start_time = time.time()
+        number_routing_attempts = 0
+        number_batches = 0
+        number_routing_attempts_since_checkpoint = 0
+        while self.calls_queue:
+            batch = self.get_next_batch()
+            self.simulate_batch(batch=batch)
+            number_routing_attempts += len(batch)
+            number_batches += 1
+
+            # Save the state of the simulation between two batches.
+            number_routing_attempts_since_checkpoint += len(batch)
+            if (
+                checkpoint_path is not None
+                and checkpoint_interval
+                and number_routing_attempts_since_checkpoint >= checkpoint_interval
+                and self.calls_queue
+            ):
+                state = self.get_state()
+                state.update(checkpoint_info or {})
+                with self.profiler.phase("save_checkpoint"):
+                    save_checkpoint(checkpoint_path=checkpoint_path, state=state)
+                number_routing_attempts_since_checkpoint = 0
+
+        # End the timer.
+        end_time = time.time() - start_time
+        logging.info(
+            f"Calls simulation ended. {number_routing_attempts} routing attempts simulated "
+            f"in {number_batches} batches. Total elapsed time: {end_time} seconds"
+        )
+        if self.baseline_trajectory is not None:
+            logging.info(
+                f"{self.number_reused_routing_attempts} routing attempts reused from the baseline simulation. "
+                f"{len(self.affected_call_keys)} calls re-simulated."
+            )
+        return number_routing_attempts
+
+    def get_state(self):
+        """Get the state of the simulation to save it in a checkpoint.
+        The checkpoints are taken between two batches, so the state is made of the queue of calls,
+        the simulated routing attempts, the feature state, the trajectory and, for the simulations
+        from a baseline trajectory, the affected calls and centers and the number of reused routing attempts. The random draws are keyed by call and attempt
+        number, so there is no state of the random number generator to save.
+
+        Returns:
+            state (dict) -- state of the simulation.
+        """
+        return {
+            "calls_queue": self.calls_queue,
+            "simulated_routing_attempts": self.simulated_routing_attempts_table.get_state(),
+            "feature_state": self.feature_state,
+            "trajectory": self.trajectory,
+            "affected_call_keys": self.affected_call_keys,
+            "affected_centers": self.affected_centers,
+            "number_reused_routing_attempts": self.number_reused_routing_attempts,
+        }
+
+    def set_state(self, state):
+        """Restore the state of the simulation saved in a checkpoint.
+
+        Keyword arguments:
+            state (dict) -- state of the simulation returned by `get_state`.
+        """
+        self.calls_queue = state["calls_queue"]
+        self.simulated_routing_attempts_table.set_state(
+            state=state["simulated_routing_attempts"]
+        )
+        self.feature_state = state["feature_state"]
+        self.trajectory = state.get("trajectory", {})
+        self.affected_call_keys = state.get("affected_call_keys", set())
+        self.affected_centers = state.get("affected_centers", {})
+        self.number_reused_routing_attempts = state.get(
+            "number_reused_routing_attempts", 0
+        )
+        logging.info(
+            f"Simulation restored from a checkpoint. {len(self.calls_queue)} calls left in the queue."
+        )
+
+    def set_baseline_trajectory(self, baseline_trajectory):
+        """Set the trajectory of a baseline simulation whose scores can be reused.
+        The baseline must have been simulated with the same random seed, active calls and model.
+
+        Keyword arguments:
+            baseline_trajectory (dict) -- trajectory of the baseline simulation (see <trajectory>).
+        """
+        self.baseline_trajectory = baseline_trajectory
+        self.baseline_attempt_numbers_by_call_key = {}
+        for call_key, attempt_number in baseline_trajectory:
+            self.baseline_attempt_numbers_by_call_key.setdefault(call_key, []).append(
+                attempt_number
+            )
+
+    def is_center_affected(self, center, arrived_datetime_est):
+        """Check whether the features of a center can differ from the baseline at a given datetime.
+        The calls are taken out of the queue in the order of their datetime, so the intervals that
+        ended before <arrived_datetime_est> are dropped.
+        """
+        intervals = [
+            (start, end)
+            for start, end in self.affected_centers.get(center, [])
+            if end >= arrived_datetime_est
+        ]
+        if center in self.affected_centers:
+            self.affected_centers[center] = intervals
+        return any(start <= arrived_datetime_est for start, _ in intervals)
+
+    def set_center_affected(self, center, affected_datetime_est):
+        """Mark the features of a center as possibly different from the baseline during the largest
+        window of the features after an arrival or a disposition that differs from the baseline.
+
+        Keyword arguments:
+            center (tuple) -- (center_key, termination_number) pair.
+            affected_datetime_est (datetime.datetime) -- datetime of the arrival or the disposition.
+        """
+        if center[0] is None or affected_datetime_est is None:
+            return
+        largest_window = max(self.feature_state.windows, default=timedelta(0))
+        self.affected_centers.setdefault(center, []).append(
+            (affected_datetime_est, affected_datetime_est + largest_window)
+        )
+
+    def set_call_affected(self, call_key, attempt_number):
+        """Mark a call as possibly different from the baseline from an attempt number on.
+        The centers of its remaining routing attempts in the baseline lose them, so their features
+        can differ from the datetime of these routing attempts on.
+
+        Keyword arguments:
+            call_key (str) -- key of the call.
+            attempt_number (int) -- first attempt number of the call that can differ from the baseline.
+        """
+        self.affected_call_keys.add(call_key)
+        for baseline_attempt_number in self.baseline_attempt_numbers_by_call_key.get(
+            call_key, []
+        ):
+            if baseline_attempt_number >= attempt_number:
+                (
+                    center,
+                    arrived_datetime_est,
+                    _,
+                    datetime_to_disposition_est,
+                ) = self.baseline_trajectory[(call_key, baseline_attempt_number)]
+                self.set_center_affected(
+                    center=center, affected_datetime_est=arrived_datetime_est
+                )
+                self.set_center_affected(
+                    center=center, affected_datetime_est=datetime_to_disposition_est
+                )
+
+    def get_baseline_pick_up_score(
+        self, call_key, attempt_number, center, arrived_datetime_est
+    ):
+        """Get the score of a routing attempt in the baseline simulation, if it can be reused.
+        The score can be reused if the call was not affected before, and the routing attempt arrives at
+        the same center at the same datetime as in the baseline, and the features of the center have not
+        been affected yet. Otherwise, the call is affected from this routing attempt on.
+
+        Keyword arguments:
+            call_key (str) -- key of the call.
+            attempt_number (int) -- number of times the call has already been routed.
+            center (tuple) -- (center_key, termination_number) pair, which are None for the national backup.
+            arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+
+        Returns:
+            pick_up_score (float) -- score of the routing attempt in the baseline simulation, or None if it
+                                     has to be scored again (or if there is no baseline).
+        """
+        if self.baseline_trajectory is None:
+            return None
+
+        if call_key not in self.affected_call_keys:
+            baseline_routing_attempt = self.baseline_trajectory.get(
+                (call_key, attempt_number)
+            )
+            if (
+                baseline_routing_attempt is not None
+                and baseline_routing_attempt[0] == center
+                and baseline_routing_attempt[1] == arrived_datetime_est
+                and not self.is_center_affected(
+                    center=center, arrived_datetime_est=arrived_datetime_est
+                )
+            ):
+                # The routing attempts to the national backup network are not scored.
+                if center[0] is not None:
+                    self.number_reused_routing_attempts += 1
+                return baseline_routing_attempt[2]
+            self.set_call_affected(call_key=call_key, attempt_number=attempt_number)
+
+        # The arrivals of the affected calls affect the features of their centers.
+        self.set_center_affected(center=center, affected_datetime_est=arrived_datetime_est)
+        return None
+
+    def get_next_batch(self):
+        """Take out of the queue the next calls whose routing attempts can be scored together.
+        The calls of a batch arrive within <batch_window> of the first call of the batch and do not
+        affect each other's features, i.e., no call of the batch arrives at a center after the disposition
+        of a previous call of the batch at the same center could have happened.
+
+        Returns:
+            batch (list[tuple]) -- calls taken out of the queue of calls, in the order of the queue.
+        """
+        batch = [heapq.heappop(self.calls_queue)]
+        batch_end = batch[0][0] + self.batch_window
+
+        # Arrival datetime of the first call of the batch at each center.
+        first_arrival_by_center = {}
+        center = self.get_center(exchange_code=batch[0][2], attempt_number=batch[0][3])
+        if center[0] is not None:
+            first_arrival_by_center[center] = batch[0][0]
+
+        while self.calls_queue and self.calls_queue[0][0] < batch_end:
+            next_call = self.calls_queue[0]
+            center = self.get_center(
+                exchange_code=next_call[2], attempt_number=next_call[3]
+            )
+            if (
+                center[0] is not None
+                and center in first_arrival_by_center
+                and next_call[0]
+                >= first_arrival_by_center[center] + MINIMUM_TIME_TO_DISPOSITION
+            ):
+                break
+            batch.append(heapq.heappop(self.calls_queue))
+            if center[0] is not None:
+                first_arrival_by_center.setdefault(center, next_call[0])
+
+        return batch
+
+    def simulate_batch(self, batch):
+        """Simulate what happens to a batch of calls when they are routed to their centers.
+        The routing attempts are scored with a single call to the model, and the random draws
+        are done afterwards in the order of the queue, so the simulation is reproducible.
+
+        Keyword arguments:
+            batch (list[tuple]) -- calls taken out of the queue of calls.
+        """
+        routing_attempts = [
+            self.prepare_routing_attempt(next_call=next_call) for next_call in batch
+        ]
+        routing_attempts = [
+            routing_attempt
+            for routing_attempt in routing_attempts
+            if routing_attempt is not None
+        ]
+        if not routing_attempts:
+            return
+
+        # Only the routing attempts whose score is not reused from the baseline are scored.
+        routing_attempts_to_score = [
+            routing_attempt
+            for routing_attempt in routing_attempts
+            if routing_attempt["pick_up_score"] is None
+        ]
+        if routing_attempts_to_score:
+            with self.profiler.phase("create_matrix"):
+                matrix = self.feature_state.create_matrix(
+                    feature_rows=[
+                        routing_attempt["feature_row"]
+                        for routing_attempt in routing_attempts_to_score
+                    ]
+                )
+
+            # Rename feature columns if needed.
+            matrix.rename(columns=FEATURES_COLUMNS_TO_RENAME, inplace=True)
+
+            # Compute the score of the calls being picked up at the given call centers.
+            with self.profiler.phase("predict"):
+                pick_up_scores = predict(
+                    matrix=matrix,
+                    model=self.model,
+                    columns_to_remove=ROUTING_ATTEMPT_ID_COLUMNS,
+                    return_all=True,
+                )
+            logging.debug(
+                f"{len(routing_attempts_to_score)} routing attempts scored in a batch."
+            )
+            for routing_attempt, pick_up_score in zip(
+                routing_attempts_to_score, pick_up_scores
+            ):
+                routing_attempt["pick_up_score"] = pick_up_score
+
+        for routing_attempt in routing_attempts:
+            with self.profiler.phase("dispose_routing_attempt"):
+                self.dispose_routing_attempt(
+                    routing_attempt=routing_attempt,
+                    pick_up_score=routing_attempt["pick_up_score"],
+                )
+
+    def prepare_routing_attempt(self, next_call):
+        """Insert the routing attempt of a call and compute its features.
+        Calls that can not be routed to a center are routed to the national backup network.
+
+        Keyword arguments:
+            next_call (tuple) -- call taken out of the queue of calls.
+
+        Returns:
+            routing_attempt (dict) -- call, identifier, attributes and features of the routing attempt.
+                                      NoneType if the call was routed to the national backup network.
+        """
+        logging.debug(f"Next call: {next_call}.")
+        (
+            call_arrived_datetime_est,
+            call_key,
+            exchange_code,
+            attempt_number,
+            total_ring_time_sec,
+        ) = next_call
+
+        # Get the center_key and termination_number where to route the call.
+        center_key, termination_number = self.get_center(
+            exchange_code=exchange_code, attempt_number=attempt_number
+        )
+        logging.debug(
+            f"Exchange code {exchange_code} at attempt number {attempt_number+1} "
+            f"will be routed to center_key: {center_key} and termination_number: {termination_number}. "
+            f"This call has been ringing for {total_ring_time_sec} seconds."
+        )
+
+        routing_attempt_id = {
+            "call_key": call_key,
+            "caller_npanxx": exchange_code,
+            "arrived_datetime_est": str(call_arrived_datetime_est),
+            "center_key": center_key,
+            "termination_number": termination_number,
+        }
+
+        # Reuse the score of the baseline simulation if the routing attempt can not differ from it.
+        center = (center_key, termination_number)
+        pick_up_score = self.get_baseline_pick_up_score(
+            call_key=call_key,
+            attempt_number=attempt_number,
+            center=center,
+            arrived_datetime_est=call_arrived_datetime_est,
+        )
+
+        if center_key is None:
+            self.trajectory[(call_key, attempt_number)] = (
+                center,
+                call_arrived_datetime_est,
+                None,
+                None,
+            )
+            self.route_to_national_backup(
+                routing_attempt_id=routing_attempt_id,
+                call_arrived_datetime_est=call_arrived_datetime_est,
+                attempt_number=attempt_number,
+                total_ring_time_sec=total_ring_time_sec,
+            )
+            return None
+
+        # Get the attributes needed for feature computation for this call's routing attempt
+        # and insert them into the simulated routing attempts table.
+        with self.profiler.phase("routing_attempt_attributes"):
+            routing_attempt_attributes_dict = (
+                self.simulated_routing_attempts_table.get_routing_attempt_attributes(
+                    routing_attempt_id=routing_attempt_id
+                )
+            )
+        routing_attempt_attributes_dict.update(routing_attempt_id)
+        with self.profiler.phase("insert_routing_attempt"):
+            routing_attempt_row = (
+                self.simulated_routing_attempts_table.insert_data_into_table(
+                    data=routing_attempt_attributes_dict
+                )
+            )
+
+        # Add the routing attempt to the feature state and compute its features, unless its score is reused.
+        routing_attempt_key = (call_key, attempt_number)
+        feature_row = None
+        with self.profiler.phase("feature_state"):
+            self.feature_state.add_routing_attempt(
+                center_key=center_key,
+                termination_number=termination_number,
+                arrived_datetime_est=call_arrived_datetime_est,
+                routing_attempt_key=routing_attempt_key,
+            )
+            if pick_up_score is None:
+                feature_row = self.feature_state.create_feature_row(
+                    routing_attempt=routing_attempt_row,
+                    arrived_datetime_est=call_arrived_datetime_est,
+                )
+
+        return {
+            "next_call": next_call,
+            "routing_attempt_id": routing_attempt_id,
+            "routing_attempt_attributes_dict": routing_attempt_attributes_dict,
+            "routing_attempt_key": routing_attempt_key,
+            "feature_row": feature_row,
+            "pick_up_score": pick_up_score,
+        }
+
+    def dispose_routing_attempt(self, routing_attempt, pick_up_score):
+        """Decide what happens to a call at the center it was routed to.
+
+        Keyword arguments:
+            routing_attempt (dict) -- routing attempt returned by `prepare_routing_attempt`.
+            pick_up_score (float) -- score (probability) of the call being picked up at the center.
+        """
+        (
+            call_arrived_datetime_est,
+            call_key,
+            exchange_code,
+            attempt_number,
+            total_ring_time_sec,
+        ) = routing_attempt["next_call"]
+        routing_attempt_id = routing_attempt["routing_attempt_id"]
+        center_key = routing_attempt_id["center_key"]
+        termination_number = routing_attempt_id["termination_number"]
+
+        assert (
+            pick_up_score <= 1.0 and pick_up_score >= 0.0
+        ), f"The score (probability) of call being picked up should be between 0 and 1, not {pick_up_score}"
+
+        # Check if the call would be picked up.
+        call_was_picked_up = draw_bernoulli(
+            random_seed=self.random_seed,
+            call_key=call_key,
+            attempt_number=attempt_number,
+            purpose="pick_up",
+            probability=pick_up_score,
+        )
+        if call_was_picked_up:
+            incoming_call_disposition_dict = self.get_answered_disposition(
+                routing_attempt_attributes_dict=routing_attempt[
+                    "routing_attempt_attributes_dict"
+                ],
+                call_arrived_datetime_est=call_arrived_datetime_est,
+                attempt_number=attempt_number,
+            )
+            call_is_completed = True
+        else:
+            wait_time_at_center_minute = (
+                self.simulated_routing_attempts_table.get_wait_time_from_center(
+                    center_key=center_key,
+                    termination_number=termination_number,
+                )
+            )
+            wait_time_at_center_sec = wait_time_at_center_minute * 60
+            current_wait_minute = int(total_ring_time_sec / 60)
+
+            # Check if the call was abandoned.
+            proba_abandonment = (
+                self.simulated_routing_attempts_table.get_probability_abandonment(
+                    current_wait_minute=current_wait_minute,
+                    add1_wait_minute=wait_time_at_center_minute,
+                )
+            )
+
+            # Update the total ring time of the caller.
+            total_ring_time_sec += wait_time_at_center_sec
+
+            call_was_abandoned = draw_bernoulli(
+                random_seed=self.random_seed,
+                call_key=call_key,
+                attempt_number=attempt_number,
+                purpose="abandonment",
+                probability=proba_abandonment,
+            )
+            if call_was_abandoned:
+                incoming_call_disposition_dict = self.get_abandoned_disposition(
+                    call_arrived_datetime_est=call_arrived_datetime_est,
+                    wait_time_at_center_sec=wait_time_at_center_sec,
+                    attempt_number=attempt_number,
+                )
+                call_is_completed = True
+            else:
+                # The call flows out and will be routed again.
+                heapq.heappush(
+                    self.calls_queue,
+                    (
+                        (
+                            call_arrived_datetime_est
+                            + timedelta(seconds=wait_time_at_center_sec)
+                        ).replace(microsecond=0),
+                        call_key,
+                        exchange_code,
+                        attempt_number + 1,
+                        total_ring_time_sec,
+                    ),
+                )
+                incoming_call_disposition_dict = self.get_flowout_disposition(
+                    call_arrived_datetime_est=call_arrived_datetime_est,
+                    wait_time_at_center_sec=wait_time_at_center_sec,
+                    attempt_number=attempt_number,
+                )
+                call_is_completed = False
+
+        logging.debug(
+            f"Updating... {routing_attempt_id} with {incoming_call_disposition_dict}",
+        )
+        self.simulated_routing_attempts_table.update_row_in_table(
+            data=incoming_call_disposition_dict,
+            row_identifier=routing_attempt_id,
+        )
+        datetime_to_disposition_est = call_arrived_datetime_est + timedelta(
+            seconds=incoming_call_disposition_dict["ring_time_center"] + 1
+        )
+        self.feature_state.set_disposition(
+            routing_attempt_key=routing_attempt["routing_attempt_key"],
+            datetime_to_disposition_est=datetime_to_disposition_est,
+            disposition=incoming_call_disposition_dict,
+        )
+        self.trajectory[(call_key, attempt_number)] = (
+            (center_key, termination_number),
+            call_arrived_datetime_est,
+            pick_up_score,
+            datetime_to_disposition_est,
+        )
+
+        # The dispositions of the affected calls affect the features of their centers.
+        if call_key in self.affected_call_keys:
+            self.set_center_affected(
+                center=(center_key, termination_number),
+                affected_datetime_est=datetime_to_disposition_est,
+            )
+
+        if call_is_completed:
+            self.update_caller_routing_attempts(
+                call_key=call_key,
+                call_arrived_datetime_est=call_arrived_datetime_est,
+                total_ring_time_sec=total_ring_time_sec,
+                attempt_number=attempt_number,
+            )
+
+    def get_answered_disposition(
+        self, routing_attempt_attributes_dict, call_arrived_datetime_est, attempt_number
+    ):
+        """Get the details of what happened to a call that was answered at the center.
+
+        Keyword arguments:
+            routing_attempt_attributes_dict (dict) -- attributes of the routing attempt.
+            call_arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+            attempt_number (int) -- number of times the call has already been routed.
+
+        Returns:
+            incoming_call_disposition_dict (dict) -- details of what happened to the call.
+        """
+        # Average ring_time_center and time_to_answer_center are not consistent.
+        # When in doubt, choose time to time_to_answer_center.
+        (
+            time_to_leave_center,
+            time_to_answer_center,
+        ) = self.simulated_routing_attempts_table.get_center_historical_disposition_estimate(
+            center_key=routing_attempt_attributes_dict["center_key"],
+            termination_number=routing_attempt_attributes_dict["termination_number"],
+            stats_of_interest=[
+                "answered_avg_time_to_leave",
+                "answered_avg_time_to_answer",
+            ],
+        )
+        ring_time_center = time_to_answer_center
+        talk_time_center = time_to_leave_center - time_to_answer_center
+
+        call_is_answered_in_state = int(
+            routing_attempt_attributes_dict["center_state_abbrev"]
+            == routing_attempt_attributes_dict["caller_state_abbrev"]
+        )
+
+        # 1 seconds was added in the original definition of this attribute. See `raw_to_processed.sql` file.
+        return {
+            "arrived_datetime_est": str(call_arrived_datetime_est),
+            "completed_at_center": 1,
+            "answered_at_center": 1,
+            "flowout_from_center": 0,
+            "abandoned_at_center": 0,
+            "time_to_abandon_center": 0,
+            "ring_time_center": ring_time_center,
+            "time_to_answer_center": time_to_answer_center,
+            "talk_time_center": talk_time_center,
+            "time_to_leave_center": time_to_leave_center,
+            "attempt_number": attempt_number + 1,
+            "datetime_to_disposition_est": str(
+                call_arrived_datetime_est + timedelta(seconds=ring_time_center + 1)
+            ),
+            "datetime_to_leave_center_est": str(
+                call_arrived_datetime_est + timedelta(seconds=time_to_leave_center + 1)
+            ),
+            "answered_in_state": call_is_answered_in_state,
+            "answered_out_state": 1 - call_is_answered_in_state,
+        }
+
+    def get_abandoned_disposition(
+        self, call_arrived_datetime_est, wait_time_at_center_sec, attempt_number
+    ):
+        """Get the details of what happened to a call that was abandoned at the center.
+
+        Keyword arguments:
+            call_arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+            wait_time_at_center_sec (int) -- time the call waited at the center (in seconds).
+            attempt_number (int) -- number of times the call has already been routed.
+
+        Returns:
+            incoming_call_disposition_dict (dict) -- details of what happened to the call.
+        """
+        # Assume that call rung for 4 seconds before leaving the center.
+        # This behavior was observed from historical data.
+        time_to_leave_center = wait_time_at_center_sec + 4
+        ring_time_center = time_to_leave_center
+        return {
+            "arrived_datetime_est": str(call_arrived_datetime_est),
+            "completed_at_center": 1,
+            "answered_at_center": 0,
+            "flowout_from_center": 0,
+            "abandoned_at_center": 1,
+            "time_to_abandon_center": wait_time_at_center_sec,
+            "ring_time_center": ring_time_center,
+            "time_to_answer_center": 0,
+            "talk_time_center": 0,
+            "time_to_leave_center": time_to_leave_center,
+            "attempt_number": attempt_number + 1,
+            "datetime_to_disposition_est": str(
+                call_arrived_datetime_est + timedelta(seconds=ring_time_center + 1)
+            ),
+            "datetime_to_leave_center_est": str(
+                call_arrived_datetime_est + timedelta(seconds=time_to_leave_center + 1)
+            ),
+            "answered_in_state": 0,
+            "answered_out_state": 0,
+        }
+
+    def get_flowout_disposition(
+        self, call_arrived_datetime_est, wait_time_at_center_sec, attempt_number
+    ):
+        """Get the details of what happened to a call that flowed out of the center.
+
+        Keyword arguments:
+            call_arrived_datetime_est (datetime.datetime) -- time the call arrived at the center.
+            wait_time_at_center_sec (int) -- time the call waited at the center (in seconds).
+            attempt_number (int) -- number of times the call has already been routed.
+
+        Returns:
+            incoming_call_disposition_dict (dict) -- details of what happened to the call.
+        """
+        time_to_leave_center = wait_time_at_center_sec
+        ring_time_center = time_to_leave_center
+        return {
+            "arrived_datetime_est": str(call_arrived_datetime_est),
+            "completed_at_center": 0,
+            "answered_at_center": 0,
+            "flowout_from_center": 1,
+            "abandoned_at_center": 0,
+            "time_to_abandon_center": 0,
+            "ring_time_center": ring_time_center,
+            "time_to_answer_center": 0,
+            "talk_time_center": 0,
+            "time_to_leave_center": time_to_leave_center,
+            "attempt_number": attempt_number + 1,
+            "datetime_to_disposition_est": str(
+                call_arrived_datetime_est + timedelta(seconds=ring_time_center + 1)
+            ),
+            "datetime_to_leave_center_est": str(
+                call_arrived_datetime_est + timedelta(seconds=time_to_leave_center + 1)
+            ),
+            "answered_in_state": 0,
+            "answered_out_state": 0,
+        }
+
+    def route_to_national_backup(
+        self,
+        routing_attempt_id,
+        call_arrived_datetime_est,
+        attempt_number,
+        total_ring_time_sec,
+    ):
+        """Route a call to the national backup network.
+        We don't know what happened to the call once it flows out to the national backup network.
+
+        Keyword arguments:
+            routing_attempt_id (dict) -- unique identifier for a routing attempt.
+            call_arrived_datetime_est (datetime.datetime) -- time the call arrived at the national backup network.
+            attempt_number (int) -- number of times the call has already been routed.
+            total_ring_time_sec (int) -- how long the call has been ringing for.
+        """
+        logging.debug("This is the backup network.")
+
+        with self.profiler.phase("routing_attempt_attributes"):
+            routing_attempt_attributes_dict = (
+                self.simulated_routing_attempts_table.get_routing_attempt_attributes(
+                    routing_attempt_id=routing_attempt_id
+                )
+            )
+        routing_attempt_id.update(
+            {
+                "center_key": NATIONAL_BACKUP_CENTER_KEY,
+                "termination_number": NATIONAL_BACKUP_TERMINATION_NUMBER,
+            }
+        )
+        routing_attempt_attributes_dict.update(routing_attempt_id)
+        routing_attempt_attributes_dict.update(
+            {
+                "arrived_datetime_est": str(call_arrived_datetime_est),
+                "completed_at_center": 0,
+                "answered_at_center": 0,
+                "flowout_from_center": 0,
+                "abandoned_at_center": 0,
+                "time_to_abandon_center": 0,
+                "attempt_number": attempt_number + 1,
+            }
+        )
+        self.simulated_routing_attempts_table.insert_data_into_table(
+            data=routing_attempt_attributes_dict
+        )
+
+        self.update_caller_routing_attempts(
+            call_key=routing_attempt_id["call_key"],
+            call_arrived_datetime_est=call_arrived_datetime_est,
+            total_ring_time_sec=total_ring_time_sec,
+            attempt_number=attempt_number,
+        )
+
+    def update_caller_routing_attempts(
+        self, call_key, call_arrived_datetime_est, total_ring_time_sec, attempt_number
+    ):
+        """Update the max_attempt_num, initiated_datetime_est, and initiated_part_of_day
+        of all the routing attempts of a caller once the call is completed.
+
+        Keyword arguments:
+            call_key (str) -- unique identifier of a caller.
+            call_arrived_datetime_est (datetime.datetime) -- time the call arrived at the last center.
+            total_ring_time_sec (int) -- how long the call rung for.
+            attempt_number (int) -- number of times the call has already been routed.
+        """
+        initiated_datetime_est = str(
+            self.simulated_routing_attempts_table.get_initiated_datetime(
+                completed_datetime=call_arrived_datetime_est,
+                total_ring_time_sec=total_ring_time_sec,
+                attempt_number=attempt_number,
+            )
+        )
+        initiated_part_of_day = self.simulated_routing_attempts_table.get_part_of_day(
+            datetime_to_extract=initiated_datetime_est
+        )
+        self.simulated_routing_attempts_table.update_rows_in_table(
+            data={
+                "max_attempt_num": attempt_number + 1,
+                "initiated_datetime_est": initiated_datetime_est,
+                "initiated_part_of_day": initiated_part_of_day,
+            },
+            row_identifier={"call_key": call_key},
+        )
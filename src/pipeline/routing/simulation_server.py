@@ -0,0 +1,469 @@
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import yaml
+import click
+import joblib
+from config.project_constants import MODELING_CONFIG_FILE
+from src.pipeline.routing import split_data, cohort_creator
+from src.pipeline.routing.routing_table import (
+    compile_routing_table,
+    remove_compiled_routing_tables,
+)
+from src.pipeline.routing.run import (
+    get_trial_kwargs,
+    initialize_trial_worker,
+    run_trials,
+)
+from src.pipeline.routing.simulator import load_simulation_resources
+from src.utils.logging_util import set_logging_configuration
+from src.utils.random_util import get_trial_random_seeds
+from src.utils.sql_util import get_db_conn, get_network_metrics_from_db
+from src.utils.util import create_file_hash
+
+# Network metrics averaged over the trials of a job in its results.
+JOB_SUMMARY_METRICS = [
+    "answer_rate",
+    "abandonment_rate",
+    "flowout_rate",
+    "calls_flowout_network_fraction",
+]
+
+
+class SimulationServer(object):
+    def __init__(self, modeling_config, log_path, number_of_workers=1):
+        """Resident simulation server that keeps the inputs of the simulation loaded between evaluations.
+            * The cohort and lookup tables are created, and the model, the active calls, the lookup caches
+              and the historical feature state are loaded once when the server starts.
+            * The routing tables are compiled once per content (see `get_compiled_routing_table_path`).
+            * Each job evaluates a routing table over several trials. The jobs are queued, and their trials
+              run in a pool of <number_of_workers> processes, or in the server process if it is 1.
+
+        Keyword arguments:
+            modeling_config (dict) -- dictionary with the modeling configuration.
+            log_path (str) -- path to the logs of the server, shared by all the jobs.
+            number_of_workers (int, optional) -- number of trials to run in parallel. Defaults to 1.
+
+        Raises:
+            ValueError -- if the simulation mode is not in_memory.
+        """
+        self.modeling_config = modeling_config
+        self.routing_level_config = modeling_config["routing_level_config"]
+        self.log_path = log_path
+        self.number_of_workers = number_of_workers
+
+        simulation_mode = self.routing_level_config.get("simulator_config", {}).get(
+            "simulation_mode", "database"
+        )
+        if simulation_mode != "in_memory":
+            logging.error(
+                f"The simulation server can only run in the in_memory simulation mode, not in {simulation_mode}."
+            )
+            raise ValueError(
+                f"The simulation server can only run in the in_memory simulation mode, not in {simulation_mode}."
+            )
+
+        self.best_model_path = self.routing_level_config["best_model_config"][
+            "model_pickle_path"
+        ]
+        self.routing_table_cache_folder_path = self.routing_level_config.get(
+            "simulator_config", {}
+        ).get("routing_table_cache_folder_path")
+
+        # Create time splits, cohort and lookup tables once for all the jobs.
+        self.db_conn = get_db_conn()
+        self.split_datetime = split_data(
+            temporal_config=self.routing_level_config["temporal_config"],
+            output_filename=None,
+        )
+        cohort_creator(
+            db_conn=self.db_conn,
+            split_datetime=self.split_datetime,
+            config=self.routing_level_config,
+        )
+
+        # Load the active calls, lookup tables and historical feature state once.
+        logging.info("Loading of the shared inputs of the simulation started.")
+        self.shared_resources = load_simulation_resources(
+            db_conn=self.db_conn,
+            config_routing_level=self.routing_level_config,
+            config_feature=self.modeling_config["feature_config"],
+        )
+        logging.info("Loading of the shared inputs of the simulation finished.")
+
+        # The trials run in a pool of processes that load the model once, or in the server process.
+        self.model = None
+        self.trial_executor = None
+        if number_of_workers > 1:
+            self.trial_executor = ProcessPoolExecutor(
+                max_workers=number_of_workers,
+                initializer=initialize_trial_worker,
+                initargs=(self.best_model_path, self.shared_resources),
+            )
+        else:
+            logging.info("Loading of best model started.")
+            self.model = joblib.load(self.best_model_path)
+            logging.info("Loading of best model finished.")
+
+        # The jobs share the trial executor, so as many jobs as workers can run at the same time.
+        self.job_executor = ThreadPoolExecutor(max_workers=number_of_workers)
+        self.jobs = {}
+        self.compiled_routing_table_paths = {}
+        self.lock = threading.Lock()
+        self.db_lock = threading.Lock()
+
+    def get_compiled_routing_table_path(self, routing_table_path):
+        """Get the directory of the compiled routing table, compiling it the first time its content is seen.
+
+        Keyword arguments:
+            routing_table_path (str) -- path to the routing table of interest.
+
+        Returns:
+            compiled_routing_table_path (str) -- directory with the arrays of the compiled routing table.
+        """
+        routing_table_hash = create_file_hash(routing_table_path)
+        with self.lock:
+            if routing_table_hash not in self.compiled_routing_table_paths:
+                self.compiled_routing_table_paths[
+                    routing_table_hash
+                ] = compile_routing_table(
+                    routing_table_path=routing_table_path,
+                    cache_folder_path=self.routing_table_cache_folder_path,
+                )
+            return self.compiled_routing_table_paths[routing_table_hash]
+
+    def submit_job(self, routing_table_path, number_of_trials=1, random_seed=None):
+        """Queue the evaluation of a routing table.
+
+        Keyword arguments:
+            routing_table_path (str) -- path to the routing table to be tested.
+            number_of_trials (int, optional) -- number of times to simulate the routing table. Defaults to 1.
+            random_seed (int, optional) -- random seed of the job, from which the random seed of each trial
+                                           is derived. Defaults to NoneType, i.e., new random seeds.
+
+        Raises:
+            ValueError -- if the routing table does not exist or the number of trials is not positive.
+
+        Returns:
+            job (dict) -- status of the job (see `get_job`).
+        """
+        if not os.path.isfile(routing_table_path):
+            logging.error(f"There is no routing table in {routing_table_path}.")
+            raise ValueError(f"There is no routing table in {routing_table_path}.")
+        if int(number_of_trials) < 1:
+            logging.error(
+                f"The number of trials should be positive, not {number_of_trials}."
+            )
+            raise ValueError(
+                f"The number of trials should be positive, not {number_of_trials}."
+            )
+
+        with self.lock:
+            job_id = len(self.jobs) + 1
+            self.jobs[job_id] = {
+                "job_id": job_id,
+                "status": "queued",
+                "routing_table_path": routing_table_path,
+                "number_of_trials": int(number_of_trials),
+                "random_seed": random_seed,
+                "submission_datetime_utc": str(datetime.utcnow()),
+                "start_datetime_utc": None,
+                "end_datetime_utc": None,
+                "evaluation_ids": [],
+                "metrics": None,
+                "trial_metrics": None,
+                "error": None,
+            }
+        logging.info(
+            f"Job {job_id} queued: {number_of_trials} trials of {routing_table_path}."
+        )
+        self.job_executor.submit(self.run_job, job_id)
+        return self.get_job(job_id)
+
+    def get_job(self, job_id):
+        """Get the status of a job, and its results once it is finished.
+
+        Keyword arguments:
+            job_id (int) -- identifier of the job.
+
+        Returns:
+            job (dict) -- status ("queued", "running", "finished" or "failed"), parameters, evaluations, and
+                          metrics of the job: the mean of <JOB_SUMMARY_METRICS> over the trials and the network
+                          metrics of each trial. None if there is no such job.
+        """
+        with self.lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def get_jobs(self):
+        """Get the status of all the jobs.
+
+        Returns:
+            jobs (list[dict]) -- status of each job (see `get_job`).
+        """
+        with self.lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def update_job(self, job_id, **job_fields):
+        """Update the status of a job.
+
+        Keyword arguments:
+            job_id (int) -- identifier of the job.
+            job_fields (dict) -- fields of the job to update.
+        """
+        with self.lock:
+            self.jobs[job_id].update(job_fields)
+
+    def get_trials_kwargs(
+        self,
+        routing_table_path,
+        trial_numbers,
+        random_seeds,
+        number_of_trials,
+        table_name_suffix,
+    ):
+        """Get the keyword arguments of `run_trial` for several trials of a routing table.
+
+        Keyword arguments:
+            routing_table_path (str) -- path to the routing table to be tested.
+            trial_numbers (list[int]) -- numbers of the trials, starting at 1.
+            random_seeds (list[int]) -- random seed of each trial.
+            number_of_trials (int) -- number of trials of the experiment.
+            table_name_suffix (str) -- suffix of the tables with the simulated routing attempts of the trials,
+                                       which must be unique among the trials that can run at the same time.
+
+        Returns:
+            trials kwargs (list[dict]) -- keyword arguments of `run_trial` other than the model and the database
+                                          connection, one per trial.
+        """
+        compiled_routing_table_path = self.get_compiled_routing_table_path(
+            routing_table_path=routing_table_path
+        )
+        return [
+            get_trial_kwargs(
+                best_model_path=self.best_model_path,
+                routing_table_path=routing_table_path,
+                routing_level_config=self.routing_level_config,
+                feature_config=self.modeling_config["feature_config"],
+                split_datetime=self.split_datetime,
+                trial_number=trial_number,
+                number_of_trials=number_of_trials,
+                log_path=self.log_path,
+                compiled_routing_table_path=compiled_routing_table_path,
+                random_seed=random_seed,
+                is_parallel=self.trial_executor is not None,
+                table_name_suffix=table_name_suffix,
+            )
+            for trial_number, random_seed in zip(trial_numbers, random_seeds)
+        ]
+
+    def run_trials(self, trials_kwargs):
+        """Run several trials in the pool of processes, or one after the other in the server process.
+
+        Keyword arguments:
+            trials_kwargs (list[dict]) -- keyword arguments of the trials (see `get_trials_kwargs`).
+
+        Returns:
+            evaluation_ids (list[int]) -- identifiers of the evaluations, in the order of <trials_kwargs>.
+        """
+        if self.trial_executor is not None:
+            return run_trials(trials_kwargs=trials_kwargs, executor=self.trial_executor)
+
+        # The trials that run in the server process share its database connection.
+        with self.db_lock:
+            return run_trials(
+                trials_kwargs=trials_kwargs,
+                db_conn=self.db_conn,
+                model=self.model,
+                shared_resources=self.shared_resources,
+            )
+
+    def run_job(self, job_id):
+        """Run the trials of a job and save their metrics in the job.
+
+        Keyword arguments:
+            job_id (int) -- identifier of the job.
+        """
+        job = self.get_job(job_id)
+        self.update_job(
+            job_id, status="running", start_datetime_utc=str(datetime.utcnow())
+        )
+        logging.info(f"Job {job_id} started.")
+        try:
+            random_seeds = get_trial_random_seeds(
+                number_of_trials=job["number_of_trials"],
+                random_seed=job["random_seed"],
+            )
+            evaluation_ids = self.run_trials(
+                trials_kwargs=self.get_trials_kwargs(
+                    routing_table_path=job["routing_table_path"],
+                    trial_numbers=range(1, job["number_of_trials"] + 1),
+                    random_seeds=random_seeds,
+                    number_of_trials=job["number_of_trials"],
+                    table_name_suffix=f"job_{job_id}",
+                )
+            )
+
+            with self.db_lock:
+                trial_metrics = get_network_metrics_from_db(
+                    db_conn=self.db_conn, evaluation_ids=evaluation_ids
+                )
+            self.update_job(
+                job_id,
+                status="finished",
+                end_datetime_utc=str(datetime.utcnow()),
+                evaluation_ids=[int(evaluation_id) for evaluation_id in evaluation_ids],
+                metrics={
+                    metric: float(trial_metrics[metric].astype(float).mean())
+                    for metric in JOB_SUMMARY_METRICS
+                },
+                trial_metrics=json.loads(
+                    trial_metrics.to_json(orient="records", date_format="iso")
+                ),
+            )
+            logging.info(f"Job {job_id} finished. Evaluations: {evaluation_ids}.")
+        except Exception as error:
+            logging.exception(f"Job {job_id} failed.")
+            self.update_job(
+                job_id,
+                status="failed",
+                end_datetime_utc=str(datetime.utcnow()),
+                error=str(error),
+            )
+
+    def shutdown(self):
+        """Wait for the queued jobs, stop the pools and remove the temporary compiled routing tables."""
+        self.job_executor.shutdown()
+        if self.trial_executor is not None:
+            self.trial_executor.shutdown()
+        remove_compiled_routing_tables(
+            compiled_routing_table_paths=self.compiled_routing_table_paths,
+            cache_folder_path=self.routing_table_cache_folder_path,
+        )
+
+
+def get_request_handler(simulation_server):
+    """Get the handler of the HTTP requests to the simulation server.
+        * POST /jobs with a json body {"routing_table_path": ..., "number_of_trials": ..., "random_seed": ...}
+          queues a job and returns its status (202).
+        * GET /jobs returns the status of all the jobs.
+        * GET /jobs/<job_id> returns the status of a job, and its results once it is finished.
+
+    Keyword arguments:
+        simulation_server (SimulationServer) -- simulation server that runs the jobs.
+
+    Returns:
+        request handler (type) -- subclass of `BaseHTTPRequestHandler`.
+    """
+
+    class SimulationRequestHandler(BaseHTTPRequestHandler):
+        def send_json(self, status_code, content):
+            body = json.dumps(content, default=str).encode("utf-8")
+            self.send_response(status_code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path_parts = self.path.strip("/").split("/")
+            if path_parts == ["jobs"]:
+                self.send_json(200, simulation_server.get_jobs())
+            elif len(path_parts) == 2 and path_parts[0] == "jobs":
+                job = (
+                    simulation_server.get_job(int(path_parts[1]))
+                    if path_parts[1].isdigit()
+                    else None
+                )
+                if job is None:
+                    self.send_json(404, {"error": f"Unknown job: {path_parts[1]}."})
+                else:
+                    self.send_json(200, job)
+            else:
+                self.send_json(404, {"error": f"Unknown path: {self.path}."})
+
+        def do_POST(self):
+            if self.path.strip("/") != "jobs":
+                self.send_json(404, {"error": f"Unknown path: {self.path}."})
+                return
+            try:
+                content_length = int(self.headers.get("Content-Length", 0))
+                job_parameters = json.loads(self.rfile.read(content_length) or b"{}")
+                job = simulation_server.submit_job(
+                    routing_table_path=job_parameters["routing_table_path"],
+                    number_of_trials=job_parameters.get("number_of_trials", 1),
+                    random_seed=job_parameters.get("random_seed"),
+                )
+            except KeyError as error:
+                self.send_json(400, {"error": f"Missing job parameter: {error}."})
+                return
+            except (TypeError, ValueError) as error:
+                self.send_json(400, {"error": str(error)})
+                return
+            self.send_json(202, job)
+
+        def log_message(self, format, *args):
+            logging.debug(f"{self.address_string()} - {format % args}")
+
+    return SimulationRequestHandler
+
+
+@click.command()
+@click.option(
+    "--port",
+    prompt="Port of the local HTTP endpoint of the simulation server.",
+    default=8765,
+)
+@click.option(
+    "--number_of_workers",
+    prompt="How many trials to run in parallel.",
+    default=1,
+)
+def run_server(port, number_of_workers):
+    """Function that runs the simulation server until it is interrupted.
+    The server only listens on the local host. Example of a job:
+        curl -X POST localhost:8765/jobs -d '{"routing_table_path": "table.csv", "number_of_trials": 3}'
+        curl localhost:8765/jobs/1
+
+    Keyword arguments:
+        port (int) -- Port of the local HTTP endpoint.
+        number_of_workers (int) -- Number of trials to run in parallel. Each worker loads the model
+                                   and the shared inputs of the simulation once.
+    """
+    # Read yaml file containing database configuration for modeling.
+    with open(MODELING_CONFIG_FILE) as f:
+        modeling_config = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Set logging configuration and return the complete path where the logs are saved.
+    log_path = set_logging_configuration(
+        log_folder_path=modeling_config["log_folder_path"]
+    )
+    logging.info("Execution of the simulation server started.")
+    logging.debug(json.dumps(modeling_config, indent=4))
+
+    simulation_server = SimulationServer(
+        modeling_config=modeling_config,
+        log_path=log_path,
+        number_of_workers=number_of_workers,
+    )
+    http_server = ThreadingHTTPServer(
+        ("127.0.0.1", port), get_request_handler(simulation_server)
+    )
+    logging.info(f"Simulation server listening on 127.0.0.1:{port}.")
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        logging.info("Simulation server interrupted.")
+    finally:
+        http_server.server_close()
+        simulation_server.shutdown()
+    logging.info("Execution of the simulation server finished.")
+
+
+if __name__ == "__main__":
+    run_server()
@@ -1,5 +1,11 @@
+import copy
 import logging
 import heapq
+import multiprocessing
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 import time
 
@@ -10,18 +16,513 @@ import pandas as pd
 import yaml
 from config.project_constants import MODELING_CONFIG_FILE, FEATURES_COLUMNS_TO_RENAME
 from src.pipeline.routing.cohort_creator import cohort_creator
-from src.pipeline.routing.split_data import split_data
+from src.pipeline.routing.split_data import split_data, split_simulation_datetime
 from src.pipeline.routing.feature_creator import feature_creator
 from src.pipeline.routing.matrix_creator import matrix_creator
-from src.pipeline.routing.populate_simulation_table import PopulateSimulationTable
+from src.pipeline.routing.populate_simulation_table import (
+    PopulateSimulationTable,
+    InMemorySimulationTable,
+)
+from src.pipeline.routing.feature_state import (
+    RoutingFeatureState,
+    AUGMENT_JOIN_INTERVAL,
+)
+from src.pipeline.routing.routing_table import CompiledRoutingTable, load_routing_table
+from src.pipeline.routing.simulation_engine import RoutingSimulationEngine
 from src.pipeline.routing.predict import predict
+from src.utils.checkpoint_util import load_checkpoint, save_checkpoint
+from src.utils.profiling_util import SimulationProfiler
+from src.utils.random_util import draw_bernoulli, get_random_seed
 from src.utils.sql_util import (
     create_table_with_sql_query,
     get_db_conn,
-    get_wait_time_from_center,
     get_saved_model_info_from_db,
+    get_historical_routing_attempts,
 )
 
+# Resources set once by each worker of the pool of processes that simulate the partitions of the calls.
+PARTITION_WORKER_RESOURCES = {}
+
+
+def get_active_calls(db_conn, config_routing_level):
+    """Load the active calls whose routing is simulated.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+
+    Returns:
+        active calls (pd.DataFrame) -- active calls whose behaviour will be simulated.
+    """
+    active_calls_table_name = [
+        table["name"]
+        for table in config_routing_level["tables_to_create"]
+        if table["tag"] == "future"
+    ][0]
+    active_calls = db_conn.execute(
+        f"select * from {config_routing_level['database_config']['schema_name']}.{active_calls_table_name}"
+    )
+    return pd.DataFrame(active_calls)
+
+
+def get_historical_table_name(config_routing_level):
+    """Get the name of the table with the historical routing attempts that the features look back at.
+
+    Keyword arguments:
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+
+    Returns:
+        table_name (str) -- name of the snapshot table, if it is created (see the `snapshot` tag of the
+                            `cohort_creator`), or of the whole historical table otherwise. The configuration
+                            of a trial marks the tables created by the experiment with `is_created`
+                            (see `get_trial_config`).
+    """
+    snapshot_table_names = [
+        table["name"]
+        for table in config_routing_level["tables_to_create"]
+        if table["tag"] == "snapshot" and table.get("is_created", table["table_flag"])
+    ]
+    if snapshot_table_names:
+        return snapshot_table_names[0]
+    return config_routing_level["feature_config"]["source_data_table_name"]
+
+
+def get_historical_feature_state(
+    db_conn, active_calls, config_routing_level, config_feature
+):
+    """Create a feature state with the historical routing attempts that the features of the first simulated
+    calls look back at.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        active_calls (pd.DataFrame) -- active calls whose behaviour will be simulated.
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+        config_feature (dict) -- information about the features to be created.
+
+    Returns:
+        feature_state (RoutingFeatureState) -- feature state with the historical routing attempts.
+    """
+    feature_state = RoutingFeatureState(feature_config=config_feature)
+    historical_start_datetime_est = (
+        pd.to_datetime(active_calls["initiated_datetime_est"]).min()
+        - AUGMENT_JOIN_INTERVAL
+    )
+    historical_routing_attempts = get_historical_routing_attempts(
+        db_conn=db_conn,
+        schema_name=config_routing_level["database_config"]["schema_name"],
+        table_name=get_historical_table_name(config_routing_level=config_routing_level),
+        start_datetime_est=historical_start_datetime_est,
+        columns=feature_state.get_historical_columns(),
+    )
+    logging.info(
+        f"{len(historical_routing_attempts)} historical routing attempts loaded into the feature state."
+    )
+    feature_state.add_historical_routing_attempts(
+        historical_routing_attempts=historical_routing_attempts
+    )
+    return feature_state
+
+
+def load_simulation_resources(db_conn, config_routing_level, config_feature):
+    """Load once the inputs of the in-memory simulation that do not depend on the routing table,
+    so several routing tables can be simulated without loading them again.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+        config_feature (dict) -- information about the features to be created.
+
+    Returns:
+        shared_resources (dict) -- active calls, lookup tables of the simulation table, and feature state
+                                   with the historical routing attempts.
+    """
+    active_calls = get_active_calls(
+        db_conn=db_conn, config_routing_level=config_routing_level
+    )
+    lookup_tables = InMemorySimulationTable(
+        db_conn=db_conn,
+        schema_name=config_routing_level["database_config"]["schema_name"],
+        table_name=config_routing_level["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ],
+        use_lookup_cache=config_routing_level.get("simulator_config", {}).get(
+            "use_lookup_cache", True
+        ),
+    ).get_lookup_tables()
+    feature_state = get_historical_feature_state(
+        db_conn=db_conn,
+        active_calls=active_calls,
+        config_routing_level=config_routing_level,
+        config_feature=config_feature,
+    )
+    return {
+        "active_calls": active_calls,
+        "lookup_tables": lookup_tables,
+        "feature_state": feature_state,
+    }
+
+
+def get_call_partitions(routing_table, active_calls, number_of_partitions):
+    """Split the active calls into partitions that can be simulated independently.
+    The calls only affect each other through the features of the centers they reach, so the connected
+    components of the routing table are never split. The components are assigned to the partitions from
+    the largest to the smallest one, each to the partition with the fewest calls.
+
+    Keyword arguments:
+        routing_table (CompiledRoutingTable) -- compiled routing table.
+        active_calls (pd.DataFrame) -- active calls whose behaviour will be simulated.
+        number_of_partitions (int) -- maximum number of partitions.
+
+    Returns:
+        partitions (list[dict]) -- active calls and centers ((center_key, termination_number) pairs)
+                                   of each non-empty partition.
+    """
+    component_ids, centers_by_component = routing_table.get_connected_components()
+
+    # The calls whose exchange code is not in the routing table only reach the national backup network,
+    # so they are put in an extra component without centers.
+    number_of_components = len(centers_by_component)
+    call_component_ids = np.append(component_ids, number_of_components)[
+        [
+            routing_table.get_row_id(exchange_code)
+            for exchange_code in active_calls["caller_npanxx"]
+        ]
+    ]
+    centers_by_component.append(set())
+    calls_by_component = np.bincount(
+        call_component_ids, minlength=number_of_components + 1
+    )
+
+    # Assign the largest components first, each to the partition with the fewest calls.
+    partition_ids = np.full(number_of_components + 1, -1)
+    calls_by_partition = np.zeros(number_of_partitions, dtype=np.int64)
+    for component_id in np.argsort(-calls_by_component, kind="stable"):
+        if calls_by_component[component_id] == 0:
+            break
+        partition_id = int(np.argmin(calls_by_partition))
+        partition_ids[component_id] = partition_id
+        calls_by_partition[partition_id] += calls_by_component[component_id]
+
+    # The largest component can not be split, which bounds the speedup of the partitions.
+    largest_component_fraction = calls_by_component.max(initial=0) / max(
+        len(active_calls), 1
+    )
+    logging.info(
+        f"{np.count_nonzero(calls_by_component)} independent components of calls in the routing table. "
+        f"The largest one has {largest_component_fraction:.1%} of the calls. "
+        f"Calls per partition: {calls_by_partition[calls_by_partition > 0].tolist()}."
+    )
+
+    call_partition_ids = partition_ids[call_component_ids]
+    return [
+        {
+            "active_calls": active_calls[call_partition_ids == partition_id],
+            "centers": set().union(
+                *[
+                    centers_by_component[component_id]
+                    for component_id in np.flatnonzero(partition_ids == partition_id)
+                ]
+            ),
+        }
+        for partition_id in range(number_of_partitions)
+        if calls_by_partition[partition_id] > 0
+    ]
+
+
+def get_time_shards(active_calls, simulation_datetime, number_of_time_shards, warm_up):
+    """Split the active calls into consecutive time shards that can be simulated concurrently.
+    Each shard also simulates the calls of its warm-up prefix, so the features of the centers are
+    warm at the start of the shard, but only keeps the routing attempts of the calls initiated in the shard.
+
+    Keyword arguments:
+        active_calls (pd.DataFrame) -- active calls whose behaviour will be simulated.
+        simulation_datetime (dict) -- start and end datetimes of the simulation (see `split_data`).
+        number_of_time_shards (int) -- number of time shards.
+        warm_up (datetime.timedelta) -- length of the warm-up prefix of each shard.
+
+    Returns:
+        time_shards (list[dict]) -- active calls (warm-up included), keys of the calls to keep and
+                                    datetimes of each time shard.
+    """
+    initiated_datetimes = pd.to_datetime(active_calls["initiated_datetime_est"])
+    shard_datetimes = split_simulation_datetime(
+        simulation_datetime=simulation_datetime,
+        number_of_shards=number_of_time_shards,
+        warm_up=warm_up,
+    )
+
+    time_shards = []
+    for shard_number, shard_datetime in enumerate(shard_datetimes):
+        # The first and last shards also keep the calls initiated out of the simulation window, if any.
+        is_after_start = (
+            initiated_datetimes >= pd.Timestamp(shard_datetime["start_datetime_est"])
+            if shard_number > 0
+            else True
+        )
+        is_before_end = (
+            initiated_datetimes < pd.Timestamp(shard_datetime["end_datetime_est"])
+            if shard_number < len(shard_datetimes) - 1
+            else True
+        )
+        is_after_warm_up_start = (
+            initiated_datetimes
+            >= pd.Timestamp(shard_datetime["warm_up_start_datetime_est"])
+            if shard_number > 0
+            else True
+        )
+        time_shards.append(
+            {
+                **shard_datetime,
+                "active_calls": active_calls[is_after_warm_up_start & is_before_end],
+                "call_keys": set(
+                    active_calls.loc[is_after_start & is_before_end, "call_key"]
+                ),
+            }
+        )
+
+    logging.info(
+        f"{number_of_time_shards} time shards with a warm-up of {warm_up}. "
+        f"Calls per shard (warm-up included): {[len(time_shard['active_calls']) for time_shard in time_shards]}."
+    )
+    return time_shards
+
+
+def get_time_shard_boundary_error(
+    sequential_routing_attempts, sharded_routing_attempts, time_shards
+):
+    """Compare the routing attempts of a sharded simulation with the ones of a sequential simulation.
+    The random draws are keyed by call, so the calls only differ when the features of their centers
+    were not warm enough at the start of their shard.
+
+    Keyword arguments:
+        sequential_routing_attempts (list[dict]) -- routing attempts of the sequential simulation.
+        sharded_routing_attempts (list[dict]) -- routing attempts of the sharded simulation.
+        time_shards (list[dict]) -- time shards returned by `get_time_shards`.
+
+    Returns:
+        boundary_error (dict) -- number and fraction of the calls whose routing attempts differ, overall
+                                 and per shard, and difference of the answer rate.
+    """
+    outcome_columns = [
+        "center_key",
+        "termination_number",
+        "answered_at_center",
+        "abandoned_at_center",
+        "flowout_from_center",
+    ]
+
+    def get_outcomes_by_call_key(routing_attempts):
+        outcomes_by_call_key = {}
+        for row in sorted(
+            routing_attempts, key=lambda row: (row["call_key"], row["attempt_number"])
+        ):
+            outcomes_by_call_key.setdefault(row["call_key"], []).append(
+                tuple(row.get(column) for column in outcome_columns)
+            )
+        return outcomes_by_call_key
+
+    sequential_outcomes = get_outcomes_by_call_key(sequential_routing_attempts)
+    sharded_outcomes = get_outcomes_by_call_key(sharded_routing_attempts)
+    different_call_keys = {
+        call_key
+        for call_key in set(sequential_outcomes) | set(sharded_outcomes)
+        if sequential_outcomes.get(call_key) != sharded_outcomes.get(call_key)
+    }
+
+    def get_answer_rate(outcomes_by_call_key):
+        return sum(
+            any(outcome[2] == 1 for outcome in outcomes)
+            for outcomes in outcomes_by_call_key.values()
+        ) / max(len(outcomes_by_call_key), 1)
+
+    return {
+        "calls_count": len(sequential_outcomes),
+        "different_calls_count": len(different_call_keys),
+        "different_calls_fraction": len(different_call_keys)
+        / max(len(sequential_outcomes), 1),
+        "different_calls_count_by_shard": [
+            len(different_call_keys & time_shard["call_keys"])
+            for time_shard in time_shards
+        ],
+        "answer_rate_difference": get_answer_rate(sharded_outcomes)
+        - get_answer_rate(sequential_outcomes),
+    }
+
+
+def simulate_partition(
+    model,
+    routing_table,
+    active_calls,
+    feature_state,
+    lookup_tables,
+    config_routing_level,
+    random_seed,
+    call_keys=None,
+):
+    """Simulate the routing of a partition of the calls in memory, in a worker process.
+
+    Keyword arguments:
+        model (object) -- model used to predict whether a call will be picked up or not a given call center.
+        routing_table (CompiledRoutingTable) -- compiled routing table.
+        active_calls (pd.DataFrame) -- active calls of the partition.
+        feature_state (RoutingFeatureState) -- feature state with the historical routing attempts of the
+                                               centers of the partition.
+        lookup_tables (dict) -- lookup tables of the simulation table (see `get_lookup_tables`).
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+        random_seed (int) -- random seed of the simulation.
+        call_keys (set, optional) -- keys of the calls whose routing attempts are kept, e.g., to discard the
+                                     calls of a warm-up period. Defaults to NoneType, i.e., all the calls.
+
+    Returns:
+        partition results (dict) -- simulated routing attempts ("rows") and trajectory of the partition.
+    """
+    simulated_routing_attempts_table = InMemorySimulationTable(
+        db_conn=None,
+        schema_name=config_routing_level["database_config"]["schema_name"],
+        table_name=config_routing_level["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ],
+        lookup_tables=lookup_tables,
+    )
+    simulation_engine = RoutingSimulationEngine(
+        model=model,
+        routing_table=routing_table,
+        simulated_routing_attempts_table=simulated_routing_attempts_table,
+        feature_state=feature_state,
+        random_seed=random_seed,
+        batch_window_seconds=config_routing_level.get("simulator_config", {}).get(
+            "batch_window_seconds", 0
+        ),
+    )
+    simulation_engine.add_active_calls(active_calls=active_calls)
+    simulation_engine.run()
+
+    if call_keys is None:
+        return {
+            "rows": simulated_routing_attempts_table.rows,
+            "trajectory": simulation_engine.trajectory,
+        }
+    return {
+        "rows": [
+            row
+            for row in simulated_routing_attempts_table.rows
+            if row["call_key"] in call_keys
+        ],
+        "trajectory": {
+            routing_attempt_key: routing_attempt
+            for routing_attempt_key, routing_attempt in simulation_engine.trajectory.items()
+            if routing_attempt_key[0] in call_keys
+        },
+    }
+
+
+def initialize_partition_worker(model, compiled_routing_table_path, lookup_tables):
+    """Set the model, the compiled routing table and the lookup tables once per worker of the pool of
+    processes that simulate the partitions of the calls.
+
+    Keyword arguments:
+        model (object) -- model used to predict whether a call will be picked up or not a given call center.
+        compiled_routing_table_path (str) -- directory with the arrays of the compiled routing table, which
+                                             are memory-mapped (see `CompiledRoutingTable.load`).
+        lookup_tables (dict) -- lookup tables of the simulation table (see `get_lookup_tables`).
+    """
+    PARTITION_WORKER_RESOURCES["model"] = model
+    PARTITION_WORKER_RESOURCES["routing_table"] = CompiledRoutingTable.load(
+        compiled_routing_table_path
+    )
+    PARTITION_WORKER_RESOURCES["lookup_tables"] = lookup_tables
+
+
+def simulate_partition_in_worker(partition_kwargs):
+    """Simulate a partition of the calls in a worker of the pool of processes.
+
+    Keyword arguments:
+        partition_kwargs (dict) -- keyword arguments of `simulate_partition` other than the model, the routing
+                                   table and the lookup tables.
+
+    Returns:
+        partition results (dict) -- simulated routing attempts ("rows") and trajectory of the partition.
+    """
+    return simulate_partition(
+        model=PARTITION_WORKER_RESOURCES["model"],
+        routing_table=PARTITION_WORKER_RESOURCES["routing_table"],
+        lookup_tables=PARTITION_WORKER_RESOURCES["lookup_tables"],
+        **partition_kwargs,
+    )
+
+
+def simulate_partitions(
+    model,
+    compiled_routing_table_path,
+    partitions,
+    feature_state,
+    simulated_routing_attempts_table,
+    config_routing_level,
+    random_seed,
+):
+    """Simulate partitions of the calls in parallel worker processes and merge their simulated routing
+    attempts into <simulated_routing_attempts_table>. The random draws are keyed by call, so the results
+    of independent partitions are the same as when all the calls are simulated together.
+
+    Keyword arguments:
+        model (object) -- model used to predict whether a call will be picked up or not a given call center.
+        compiled_routing_table_path (str) -- directory with the arrays of the compiled routing table.
+        partitions (list[dict]) -- active calls of each partition and, optionally, the centers they reach
+                                   and the keys of the calls to keep (see `get_call_partitions` and
+                                   `get_time_shards`).
+        feature_state (RoutingFeatureState) -- feature state with the historical routing attempts.
+        simulated_routing_attempts_table (InMemorySimulationTable) -- table where the routing attempts are merged.
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+        random_seed (int) -- random seed of the simulation.
+
+    Returns:
+        trajectory (dict) -- trajectory of the simulation (see `RoutingSimulationEngine`).
+    """
+    # There are never more worker processes than cores, whatever the number of partitions. The model and the
+    # lookup tables are sent once per worker, which memory-maps the routing table, instead of once per partition.
+    with ProcessPoolExecutor(
+        max_workers=min(len(partitions), os.cpu_count() or 1),
+        initializer=initialize_partition_worker,
+        initargs=(
+            model,
+            compiled_routing_table_path,
+            simulated_routing_attempts_table.get_lookup_tables(),
+        ),
+    ) as executor:
+        futures = []
+        for partition in partitions:
+            # Each worker only needs the historical routing attempts of the centers of its partition.
+            partition_feature_state = feature_state
+            if "centers" in partition:
+                partition_feature_state = copy.copy(feature_state)
+                partition_feature_state.center_buffers = {
+                    center: center_buffer
+                    for center, center_buffer in feature_state.center_buffers.items()
+                    if center in partition["centers"]
+                }
+            futures.append(
+                executor.submit(
+                    simulate_partition_in_worker,
+                    {
+                        "active_calls": partition["active_calls"],
+                        "feature_state": partition_feature_state,
+                        "config_routing_level": config_routing_level,
+                        "random_seed": random_seed,
+                        "call_keys": partition.get("call_keys"),
+                    },
+                )
+            )
+
+        trajectory = {}
+        for future in futures:
+            partition_results = future.result()
+            for row in partition_results["rows"]:
+                simulated_routing_attempts_table.insert_data_into_table(data=row)
+            trajectory.update(partition_results["trajectory"])
+
+    logging.info(f"Simulated routing attempts of {len(partitions)} partitions merged.")
+    return trajectory
+
 
 def simulate_routing(
     db_conn,
@@ -30,6 +531,13 @@ def simulate_routing(
     config_routing_level,
     config_feature,
     random_seed=None,
+    compiled_routing_table_path=None,
+    checkpoint_path=None,
+    resume=False,
+    profiler=None,
+    shared_resources=None,
+    trajectory_path=None,
+    baseline_trajectory_path=None,
 ):
     """Simulate the routing of calls.
 
@@ -39,62 +547,108 @@ def simulate_routing(
         routing_table_path (str) -- path where to find the routing table of interest.
         config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
         config_feature (dict) -- information about the features to be created.
-        random_seed (int, optional) -- used to set the random state of the random number generator to ensure reproducibility.
+        random_seed (int, optional) -- random seed of the simulation, from which the random draws of each call are derived.
                                        Defaults to NoneType.
+        compiled_routing_table_path (str, optional) -- directory where the routing table has already been compiled
+                                                       (see `CompiledRoutingTable.save`). If None, the routing table
+                                                       is compiled from <routing_table_path>. Defaults to NoneType.
+        checkpoint_path (str, optional) -- path of the checkpoint file of the simulation. Checkpoints are only
+                                           saved in the in_memory mode. Defaults to NoneType.
+        resume (bool, optional) -- whether to restart the simulation from the checkpoint in <checkpoint_path>,
+                                   if there is one. Defaults to False.
+        profiler (SimulationProfiler, optional) -- profiler that times the phases of the simulation.
+                                                   Defaults to NoneType, i.e., no profiling.
+        shared_resources (dict, optional) -- inputs of the simulation shared by several routing tables, returned by
+                                             `load_simulation_resources`. Only used in the in_memory mode.
+                                             Defaults to NoneType, i.e., the inputs are loaded from the database.
+        trajectory_path (str, optional) -- path where to save the trajectory of the simulation, so it can be the
+                                           baseline of other simulations. Only used in the in_memory mode.
+                                           Defaults to NoneType.
+        baseline_trajectory_path (str, optional) -- path of the trajectory of a baseline simulation of another
+                                                    routing table. Only the calls that can be routed differently
+                                                    are simulated again. Only used in the in_memory mode.
+                                                    Defaults to NoneType.
+
+    Returns:
+        random_seed (int) -- random seed of the simulation.
+        simulated routing attempts (pd.DataFrame) -- simulated routing attempts, in the in_memory mode. NoneType in
+                                                     the database mode, where they are only in the database.
     """
+    if profiler is None:
+        profiler = SimulationProfiler(enabled=False)
 
-    if random_seed is not None:
-        # Set simulation random seed for reproducibility.
-        np.random.seed(random_seed)
-    else:
-        # Reset the initial random state.
-        np.random.seed(None)
-        # Get the random seed used for this experiment.
-        random_seed = np.random.choice(np.random.get_state()[1][0])
-        # Set the random seed for reproducibility.
-        np.random.seed(random_seed)
+    # Get the random seed used for this experiment. The random draws of each call are derived from it
+    # (see `draw_bernoulli`), so they do not depend on the order in which the calls are processed.
+    random_seed = get_random_seed(random_seed=random_seed)
 
     logging.debug(f"The random seed for this simulation is {random_seed}")
 
-    # Load routing table to pd.DataFrame and set column names to lower case.
-    routing_table = pd.read_csv(routing_table_path)
-    routing_table.columns = routing_table.columns.str.lower()
-
-    # Set the exchange code as index in the routing table to ease upcoming lookups.
-    routing_table["npanxx"] = pd.to_numeric(routing_table["npanxx"])
-    routing_table = routing_table.set_index("npanxx")
-
-    # Replace NULL values with None.
-    routing_table = routing_table.replace({np.nan: None})
-
-    # Create dictionary with the terminology used in the routing table to
-    # name the call centers per attempt number.
-    center_key_map = {0: "center1id", 1: "center2id", 2: "center3id", 3: "center4id"}
-    termination_number_map = {
-        0: "center1termination",
-        1: "center2termination",
-        2: "center3termination",
-        3: "center4termination",
-    }
+    # Load the routing table as integer-coded arrays to ease upcoming lookups.
+    with profiler.phase("load_routing_table"):
+        routing_table = load_routing_table(
+            routing_table_path=routing_table_path,
+            compiled_routing_table_path=compiled_routing_table_path,
+            cache_folder_path=config_routing_level.get("simulator_config", {}).get(
+                "routing_table_cache_folder_path"
+            ),
+        )
 
     # Load active calls data based on input from config routing level.
-    active_calls_table_name = [
-        table["name"]
-        for table in config_routing_level["tables_to_create"]
-        if table["tag"] == "future"
-    ][0]
-    active_calls = db_conn.execute(
-        f"select * from {config_routing_level['database_config']['schema_name']}.{active_calls_table_name}"
+    if shared_resources is not None:
+        active_calls = shared_resources["active_calls"]
+    else:
+        active_calls = get_active_calls(
+            db_conn=db_conn, config_routing_level=config_routing_level
+        )
+
+    # Check whether the simulation runs in memory or against the database.
+    simulation_mode = config_routing_level.get("simulator_config", {}).get(
+        "simulation_mode", "database"
+    )
+    logging.info(f"The simulation mode is {simulation_mode}.")
+    if simulation_mode == "in_memory":
+        return simulate_routing_in_memory(
+            db_conn=db_conn,
+            model=model,
+            routing_table=routing_table,
+            active_calls=active_calls,
+            config_routing_level=config_routing_level,
+            config_feature=config_feature,
+            random_seed=random_seed,
+            routing_table_path=routing_table_path,
+            compiled_routing_table_path=compiled_routing_table_path,
+            checkpoint_path=checkpoint_path,
+            resume=resume,
+            profiler=profiler,
+            shared_resources=shared_resources,
+            trajectory_path=trajectory_path,
+            baseline_trajectory_path=baseline_trajectory_path,
+        )
+    elif simulation_mode != "database":
+        logging.error(f"Unknown simulation mode: {simulation_mode}.")
+        raise ValueError(f"Unknown simulation mode: {simulation_mode}.")
+
+    # The features only look back at the snapshot of the historical routing attempts, if there is one.
+    historical_table_name = get_historical_table_name(
+        config_routing_level=config_routing_level
     )
-    active_calls = pd.DataFrame(active_calls)
 
-    # Instantiate populate simulation table's class.
-    simulated_routing_attempts_table = PopulateSimulationTable(
+    # Instantiate populate simulation table's class. With write-behind, the simulated routing attempts
+    # are kept in memory and only written to the database before the feature tables read them. Since
+    # the feature tables read them at every routing attempt, write-behind is off by default in this mode.
+    simulator_config = config_routing_level.get("simulator_config", {})
+    simulation_table_class = (
+        InMemorySimulationTable
+        if simulator_config.get("write_behind", False)
+        else PopulateSimulationTable
+    )
+    simulated_routing_attempts_table = simulation_table_class(
         db_conn=db_conn,
         schema_name=config_routing_level["database_config"]["schema_name"],
         table_name=config_routing_level["feature_config"][
             "simulated_routing_attempts_table_name"
         ],
+        use_lookup_cache=simulator_config.get("use_lookup_cache", True),
     )
 
     # Setup the queue of calls. The priority will be based on the first element of the queue.
@@ -133,10 +687,9 @@ def simulate_routing(
         total_ring_time_sec = next_call[4]
 
         # Get the center_key and termination_number where to route the call.
-        center_key = routing_table.loc[exchange_code, center_key_map[attempt_number]]
-        termination_number = routing_table.loc[
-            exchange_code, termination_number_map[attempt_number]
-        ]
+        center_key, termination_number = routing_table.get_center(
+            exchange_code=exchange_code, attempt_number=attempt_number
+        )
         logging.debug(
             f"Exchange code {exchange_code} at attempt number {attempt_number+1}"
             f"will be routed to center_key: {center_key} and termination_number: {termination_number}."
@@ -146,7 +699,7 @@ def simulate_routing(
         # Check if routing attempt is possible for this call.
         routing_attempt_is_possible = all(
             [
-                len(center_key_map) >= attempt_number + 1,
+                routing_table.number_of_attempts >= attempt_number + 1,
                 center_key is not None,
             ]
         )
@@ -161,72 +714,83 @@ def simulate_routing(
 
         if routing_attempt_is_possible:
             # Get the attributes needed for feature computation for this call's routing attempt.
-            routing_attempt_attributes_dict = (
-                simulated_routing_attempts_table.get_routing_attempt_attributes(
-                    routing_attempt_id=routing_attempt_id
+            with profiler.phase("routing_attempt_attributes"):
+                routing_attempt_attributes_dict = (
+                    simulated_routing_attempts_table.get_routing_attempt_attributes(
+                        routing_attempt_id=routing_attempt_id
+                    )
                 )
-            )
 
             # Update the routing attempts attributes dictionary with the routing attempt id.
             routing_attempt_attributes_dict.update(routing_attempt_id)
 
             # Insert the current call's routing attempts attributes into the simulated routing attempts table.
             logging.debug(f"Inserting... {routing_attempt_attributes_dict}")
-            simulated_routing_attempts_table.insert_data_into_table(
-                data=routing_attempt_attributes_dict
-            )
+            with profiler.phase("insert_routing_attempt"):
+                simulated_routing_attempts_table.insert_data_into_table(
+                    data=routing_attempt_attributes_dict
+                )
+
+            # Persist the pending changes, so the feature tables see all the simulated routing attempts.
+            # There is always a pending change, i.e., the routing attempt that was just inserted.
+            with profiler.phase("flush_to_database"):
+                simulated_routing_attempts_table.flush_to_database()
 
             # Create all the feature tables.
-            feature_creator(
-                db_conn=db_conn,
-                source_data_schema_name=config_routing_level["database_config"][
-                    "schema_name"
-                ],
-                source_data_table_name=config_routing_level["feature_config"][
-                    "source_data_table_name"
-                ],
-                feature_schema_name=config_routing_level["feature_config"][
-                    "feature_schema_name"
-                ],
-                feature_config_dict=config_feature,
-                incoming_call_dict=routing_attempt_id,
-                simulated_routing_attempts_table_name=config_routing_level[
-                    "feature_config"
-                ]["simulated_routing_attempts_table_name"],
-            )
+            with profiler.phase("feature_creator"):
+                feature_creator(
+                    db_conn=db_conn,
+                    source_data_schema_name=config_routing_level["database_config"][
+                        "schema_name"
+                    ],
+                    source_data_table_name=historical_table_name,
+                    feature_schema_name=config_routing_level["feature_config"][
+                        "feature_schema_name"
+                    ],
+                    feature_config_dict=config_feature,
+                    incoming_call_dict=routing_attempt_id,
+                    simulated_routing_attempts_table_name=config_routing_level[
+                        "feature_config"
+                    ]["simulated_routing_attempts_table_name"],
+                )
             # Create cohort table to later join the features tables.
-            create_table_with_sql_query(
-                db_conn=db_conn,
-                schema_name=config_routing_level["database_config"]["schema_name"],
-                table_name=config_routing_level["database_config"]["cohort_table_name"],
-                table_content=config_routing_level["cohort_config"][
-                    "cohort_query"
-                ].format(
-                    call_key=call_key,
-                    center_key=center_key,
-                    termination_number=termination_number,
-                    arrived_datetime_est=call_arrived_datetime_est,
-                ),
-            )
+            with profiler.phase("cohort_creator"):
+                create_table_with_sql_query(
+                    db_conn=db_conn,
+                    schema_name=config_routing_level["database_config"]["schema_name"],
+                    table_name=config_routing_level["database_config"][
+                        "cohort_table_name"
+                    ],
+                    table_content=config_routing_level["cohort_config"][
+                        "cohort_query"
+                    ].format(
+                        call_key=call_key,
+                        center_key=center_key,
+                        termination_number=termination_number,
+                        arrived_datetime_est=call_arrived_datetime_est,
+                    ),
+                )
 
             # Create a matrix with the cohort and the features.
-            matrix = matrix_creator(
-                db_conn=db_conn,
-                schema_name=config_routing_level["database_config"]["schema_name"],
-                database_config_dict=config_routing_level["database_config"],
-                feature_config_dict=config_feature,
-                matrix_config_dict=config_routing_level["matrix_creator_config"],
-            )
+            with profiler.phase("matrix_creator"):
+                matrix = matrix_creator(
+                    db_conn=db_conn,
+                    schema_name=config_routing_level["database_config"]["schema_name"],
+                    database_config_dict=config_routing_level["database_config"],
+                    feature_config_dict=config_feature,
+                    matrix_config_dict=config_routing_level["matrix_creator_config"],
+                )
 
-            # Rename feature columns if needed.
-            matrix.rename(columns=FEATURES_COLUMNS_TO_RENAME, inplace=True)
+                # Rename feature columns if needed.
+                matrix.rename(columns=FEATURES_COLUMNS_TO_RENAME, inplace=True)
 
             # Compute the score of the call being picked up at the given call center.
-            pick_up_score = predict(
-                matrix=matrix,
-                model=model,
-                columns_to_remove=routing_attempt_id,
-            )
+            with profiler.phase("predict"):
+                pick_up_score = predict(
+                    matrix=matrix,
+                    model=model,
+                    columns_to_remove=routing_attempt_id,
+                )
 
             assert (
                 pick_up_score <= 1.0 and pick_up_score >= 0.0
@@ -235,7 +799,13 @@ def simulate_routing(
 
             # Follow logic for the routing simulator.
             # Check if the call would be picked up.
-            call_was_picked_up = np.random.binomial(n=1, p=pick_up_score)
+            call_was_picked_up = draw_bernoulli(
+                random_seed=random_seed,
+                call_key=call_key,
+                attempt_number=attempt_number,
+                purpose="pick_up",
+                probability=pick_up_score,
+            )
             if call_was_picked_up:
                 logging.debug(
                     "Call was picked up based on biased coin flip. "
@@ -296,10 +866,11 @@ def simulate_routing(
                 )
 
                 # Update the simulated routing attempts table with the disposition call's data.
-                simulated_routing_attempts_table.update_row_in_table(
-                    data=incoming_call_disposition_dict,
-                    row_identifier=routing_attempt_id,
-                )
+                with profiler.phase("update_routing_attempt"):
+                    simulated_routing_attempts_table.update_row_in_table(
+                        data=incoming_call_disposition_dict,
+                        row_identifier=routing_attempt_id,
+                    )
 
                 logging.debug(
                     f"Updating the caller's max attempt number and initiated datetime est... {routing_attempt_id}",
@@ -321,23 +892,25 @@ def simulate_routing(
                 )
                 # Update the max_attempt_num, initiated_datetime_est, and initiated_part_of_day
                 # attribute of all the routing attempts for this caller.
-                simulated_routing_attempts_table.update_rows_in_table(
-                    data={
-                        "max_attempt_num": attempt_number + 1,
-                        "initiated_datetime_est": initiated_datetime_est,
-                        "initiated_part_of_day": initiated_part_of_day,
-                    },
-                    row_identifier={"call_key": call_key},
-                )
+                with profiler.phase("update_routing_attempt"):
+                    simulated_routing_attempts_table.update_rows_in_table(
+                        data={
+                            "max_attempt_num": attempt_number + 1,
+                            "initiated_datetime_est": initiated_datetime_est,
+                            "initiated_part_of_day": initiated_part_of_day,
+                        },
+                        row_identifier={"call_key": call_key},
+                    )
             else:
                 logging.debug(
                     "Call was not picked up based on biased coin flip. "
                     f"Predicted score from model is: {pick_up_score}."
                 )
-                wait_time_at_center_minute = get_wait_time_from_center(
-                    db_conn=db_conn,
-                    center_key=center_key,
-                    termination_number=termination_number,
+                wait_time_at_center_minute = (
+                    simulated_routing_attempts_table.get_wait_time_from_center(
+                        center_key=center_key,
+                        termination_number=termination_number,
+                    )
                 )
                 wait_time_at_center_sec = wait_time_at_center_minute * 60
                 logging.debug(
@@ -357,7 +930,13 @@ def simulate_routing(
                 total_ring_time_sec += wait_time_at_center_sec
 
                 # Apply logic based on whether the call was abandoned or not.
-                call_was_abandoned = np.random.binomial(n=1, p=proba_abandonment)
+                call_was_abandoned = draw_bernoulli(
+                    random_seed=random_seed,
+                    call_key=call_key,
+                    attempt_number=attempt_number,
+                    purpose="abandonment",
+                    probability=proba_abandonment,
+                )
                 if call_was_abandoned:
                     logging.debug(
                         "Call was abandoned based on biased coin flip. "
@@ -404,10 +983,11 @@ def simulate_routing(
                         f"Updating... {routing_attempt_id} with {incoming_call_disposition_dict}",
                     )
                     # Update the simulated routing attempts table with the disposition call's data.
-                    simulated_routing_attempts_table.update_row_in_table(
-                        data=incoming_call_disposition_dict,
-                        row_identifier=routing_attempt_id,
-                    )
+                    with profiler.phase("update_routing_attempt"):
+                        simulated_routing_attempts_table.update_row_in_table(
+                            data=incoming_call_disposition_dict,
+                            row_identifier=routing_attempt_id,
+                        )
 
                     logging.debug(
                         f"Updating the caller's max attempt number and initiated datetime est... {routing_attempt_id}",
@@ -429,14 +1009,15 @@ def simulate_routing(
                     )
                     # Update the max_attempt_num, initiated_datetime_est, and initiated_part_of_day
                     # attribute of all the routing attempts for this caller.
-                    simulated_routing_attempts_table.update_rows_in_table(
-                        data={
-                            "max_attempt_num": attempt_number + 1,
-                            "initiated_datetime_est": initiated_datetime_est,
-                            "initiated_part_of_day": initiated_part_of_day,
-                        },
-                        row_identifier={"call_key": call_key},
-                    )
+                    with profiler.phase("update_routing_attempt"):
+                        simulated_routing_attempts_table.update_rows_in_table(
+                            data={
+                                "max_attempt_num": attempt_number + 1,
+                                "initiated_datetime_est": initiated_datetime_est,
+                                "initiated_part_of_day": initiated_part_of_day,
+                            },
+                            row_identifier={"call_key": call_key},
+                        )
                 else:
                     logging.debug(
                         "Call was not abandoned based on biased coin flip. "
@@ -498,10 +1079,11 @@ def simulate_routing(
                         f"Updating... {routing_attempt_id} with {incoming_call_disposition_dict}",
                     )
                     # Update the simulated routing attempts table with the disposition call's data.
-                    simulated_routing_attempts_table.update_row_in_table(
-                        data=incoming_call_disposition_dict,
-                        row_identifier=routing_attempt_id,
-                    )
+                    with profiler.phase("update_routing_attempt"):
+                        simulated_routing_attempts_table.update_row_in_table(
+                            data=incoming_call_disposition_dict,
+                            row_identifier=routing_attempt_id,
+                        )
         else:
             # If routing attempt is not possible, we assume that the
             # call flowed out to the national backup network.
@@ -509,11 +1091,12 @@ def simulate_routing(
             logging.info("This is the backup network.")
 
             # Get the attributes needed for feature computation for this call's routing attempt.
-            routing_attempt_attributes_dict = (
-                simulated_routing_attempts_table.get_routing_attempt_attributes(
-                    routing_attempt_id=routing_attempt_id
+            with profiler.phase("routing_attempt_attributes"):
+                routing_attempt_attributes_dict = (
+                    simulated_routing_attempts_table.get_routing_attempt_attributes(
+                        routing_attempt_id=routing_attempt_id
+                    )
                 )
-            )
 
             # Sql does not understand None. "NULL" also does not work.
             routing_attempt_id.update(
@@ -543,9 +1126,10 @@ def simulate_routing(
 
             # Insert routing attempt attributes and disposition data for the call
             # to the simulated routing attempts table.
-            simulated_routing_attempts_table.insert_data_into_table(
-                data=routing_attempt_attributes_dict
-            )
+            with profiler.phase("insert_routing_attempt"):
+                simulated_routing_attempts_table.insert_data_into_table(
+                    data=routing_attempt_attributes_dict
+                )
 
             logging.debug(
                 f"Updating the caller's max attempt number and initiated datetime est... {routing_attempt_id}",
@@ -566,21 +1150,298 @@ def simulate_routing(
             )
             # Update the max_attempt_num, initiated_datetime_est, and initiated_part_of_day
             # attribute of all the routing attempts for this caller.
-            simulated_routing_attempts_table.update_rows_in_table(
-                data={
-                    "max_attempt_num": attempt_number + 1,
-                    "initiated_datetime_est": initiated_datetime_est,
-                    "initiated_part_of_day": initiated_part_of_day,
-                },
-                row_identifier={"call_key": call_key},
-            )
+            with profiler.phase("update_routing_attempt"):
+                simulated_routing_attempts_table.update_rows_in_table(
+                    data={
+                        "max_attempt_num": attempt_number + 1,
+                        "initiated_datetime_est": initiated_datetime_est,
+                        "initiated_part_of_day": initiated_part_of_day,
+                    },
+                    row_identifier={"call_key": call_key},
+                )
 
         logging.info("End of call attempt lifecycle.")
 
+    # Persist the pending changes.
+    with profiler.phase("flush_to_database"):
+        simulated_routing_attempts_table.flush_to_database()
+
     # End the timer.
     end_time = time.time() - start_time
     logging.info(f"Calls simulation ended. Total elapsed time: {end_time} seconds")
-    return random_seed
+    return random_seed, None
+
+
+def simulate_routing_in_memory(
+    db_conn,
+    model,
+    routing_table,
+    active_calls,
+    config_routing_level,
+    config_feature,
+    random_seed,
+    routing_table_path,
+    compiled_routing_table_path=None,
+    checkpoint_path=None,
+    resume=False,
+    profiler=None,
+    shared_resources=None,
+    trajectory_path=None,
+    baseline_trajectory_path=None,
+):
+    """Simulate the routing of calls in memory.
+    The database is only used to load the inputs of the simulation and to persist the
+    simulated routing attempts once the simulation is over.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        model (object) -- model used to predict whether a call will be picked up or not a given call center.
+        routing_table (CompiledRoutingTable) -- compiled routing table.
+        active_calls (pd.DataFrame) -- active calls whose behaviour will be simulated.
+        config_routing_level (dict) -- dictionary with the elements that characterise the routing level configuration.
+        config_feature (dict) -- information about the features to be created.
+        random_seed (int) -- random seed of the simulation.
+        routing_table_path (str) -- path of the routing table, saved with the checkpoints.
+        compiled_routing_table_path (str, optional) -- directory where <routing_table> is saved, which the workers
+                                                       that simulate the partitions of the calls memory-map. If None,
+                                                       <routing_table> is saved in a temporary directory for them.
+                                                       Defaults to NoneType.
+        checkpoint_path (str, optional) -- path of the checkpoint file of the simulation. Defaults to NoneType.
+        resume (bool, optional) -- whether to restart the simulation from the checkpoint in <checkpoint_path>,
+                                   if there is one. Defaults to False.
+        profiler (SimulationProfiler, optional) -- profiler that times the phases of the simulation.
+                                                   Defaults to NoneType, i.e., no profiling.
+        shared_resources (dict, optional) -- lookup tables and historical feature state shared by several routing
+                                             tables (see `load_simulation_resources`). Defaults to NoneType.
+        trajectory_path (str, optional) -- path where to save the trajectory of the simulation. Defaults to NoneType.
+        baseline_trajectory_path (str, optional) -- path of the trajectory of a baseline simulation whose scores
+                                                    are reused. The random seed of the baseline is used.
+                                                    Defaults to NoneType.
+
+    Returns:
+        random_seed (int) -- random seed of the simulation, which is the one of the checkpoint when resuming.
+        simulated routing attempts (pd.DataFrame) -- simulated routing attempts, as they are persisted.
+    """
+    if profiler is None:
+        profiler = SimulationProfiler(enabled=False)
+    schema_name = config_routing_level["database_config"]["schema_name"]
+
+    # Load the checkpoint to resume from, if it belongs to a simulation of the same routing table.
+    checkpoint_state = None
+    if resume and checkpoint_path is not None:
+        checkpoint_state = load_checkpoint(checkpoint_path=checkpoint_path)
+        if checkpoint_state is not None and (
+            "calls_queue" not in checkpoint_state
+            or checkpoint_state["routing_table_path"] != routing_table_path
+        ):
+            logging.warning(
+                f"The checkpoint {checkpoint_path} does not belong to this simulation. Starting from scratch."
+            )
+            checkpoint_state = None
+    if checkpoint_state is not None:
+        random_seed = checkpoint_state["random_seed"]
+
+    # Load the trajectory of the baseline simulation. Its scores can only be reused with its random seed.
+    baseline_trajectory = None
+    if baseline_trajectory_path is not None:
+        baseline_trajectory = load_checkpoint(checkpoint_path=baseline_trajectory_path)
+    if baseline_trajectory is not None:
+        random_seed = baseline_trajectory["random_seed"]
+        logging.info(
+            f"Re-simulating the calls routed differently than in {baseline_trajectory['routing_table_path']}."
+        )
+
+    # Instantiate the in-memory simulation table's class.
+    simulated_routing_attempts_table = InMemorySimulationTable(
+        db_conn=db_conn,
+        schema_name=schema_name,
+        table_name=config_routing_level["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ],
+        use_lookup_cache=config_routing_level.get("simulator_config", {}).get(
+            "use_lookup_cache", True
+        ),
+        flush_interval=config_routing_level.get("simulator_config", {}).get(
+            "flush_interval", 0
+        ),
+        lookup_tables=(
+            shared_resources["lookup_tables"] if shared_resources is not None else None
+        ),
+    )
+
+    # The independent components of the routing table, or consecutive time shards, can be simulated
+    # in parallel, but only from scratch and with the lookup cache, which the worker processes receive.
+    simulator_config = config_routing_level.get("simulator_config", {})
+    number_of_partitions = simulator_config.get("number_of_partitions", 1)
+    number_of_time_shards = simulator_config.get("number_of_time_shards", 1)
+    if multiprocessing.parent_process() is not None and (
+        number_of_partitions > 1 or number_of_time_shards > 1
+    ):
+        # The trials that run in a pool of worker processes already use the cores.
+        logging.info(
+            "The trial runs in a worker process. Simulating the calls in a single process."
+        )
+        number_of_partitions = number_of_time_shards = 1
+    if number_of_partitions > 1 or number_of_time_shards > 1:
+        if checkpoint_state is not None:
+            logging.error(
+                f"The simulation can not resume from the checkpoint {checkpoint_path} in partitions or time shards!"
+            )
+            raise ValueError(
+                f"The simulation can not resume from the checkpoint {checkpoint_path} in partitions or time shards!"
+            )
+        if baseline_trajectory is not None:
+            logging.error(
+                "The simulation from a baseline trajectory can not run in partitions or time shards!"
+            )
+            raise ValueError(
+                "The simulation from a baseline trajectory can not run in partitions or time shards!"
+            )
+        if not simulated_routing_attempts_table.use_lookup_cache:
+            logging.error(
+                "The simulation can only run in partitions or time shards with the lookup cache!"
+            )
+            raise ValueError(
+                "The simulation can only run in partitions or time shards with the lookup cache!"
+            )
+
+    # Load the historical routing attempts that the features of the first simulated calls look back at.
+    # The feature state of a checkpoint already contains them, and the shared one is copied since the
+    # simulation modifies it.
+    feature_state = None
+    if checkpoint_state is None and shared_resources is not None:
+        feature_state = copy.deepcopy(shared_resources["feature_state"])
+    elif checkpoint_state is None:
+        with profiler.phase("load_historical_routing_attempts"):
+            feature_state = get_historical_feature_state(
+                db_conn=db_conn,
+                active_calls=active_calls,
+                config_routing_level=config_routing_level,
+                config_feature=config_feature,
+            )
+
+    partitions = None
+    if number_of_time_shards > 1:
+        # The warm-up must cover the largest window of the features of the centers.
+        largest_window = max(feature_state.windows, default=timedelta(0))
+        warm_up = (
+            timedelta(minutes=simulator_config["time_shard_warm_up_minutes"])
+            if simulator_config.get("time_shard_warm_up_minutes") is not None
+            else largest_window
+        )
+        if warm_up < largest_window:
+            logging.error(
+                f"The warm-up of the time shards ({warm_up}) is shorter than the largest feature window ({largest_window})."
+            )
+            raise ValueError(
+                f"The warm-up of the time shards ({warm_up}) is shorter than the largest feature window ({largest_window})."
+            )
+        partitions = get_time_shards(
+            active_calls=active_calls,
+            simulation_datetime=split_data(
+                temporal_config=config_routing_level["temporal_config"]
+            )["simulation"],
+            number_of_time_shards=number_of_time_shards,
+            warm_up=warm_up,
+        )
+    elif number_of_partitions > 1:
+        partitions = get_call_partitions(
+            routing_table=routing_table,
+            active_calls=active_calls,
+            number_of_partitions=number_of_partitions,
+        )
+
+    # Run the simulation.
+    if partitions is not None:
+        with profiler.phase("simulate_partitions"):
+            partitions_routing_table_path = compiled_routing_table_path
+            if partitions_routing_table_path is None:
+                partitions_routing_table_path = tempfile.mkdtemp(
+                    prefix="compiled_routing_table_"
+                )
+                routing_table.save(
+                    compiled_routing_table_path=partitions_routing_table_path
+                )
+            try:
+                trajectory = simulate_partitions(
+                    model=model,
+                    compiled_routing_table_path=partitions_routing_table_path,
+                    partitions=partitions,
+                    feature_state=feature_state,
+                    simulated_routing_attempts_table=simulated_routing_attempts_table,
+                    config_routing_level=config_routing_level,
+                    random_seed=random_seed,
+                )
+            finally:
+                if compiled_routing_table_path is None:
+                    shutil.rmtree(partitions_routing_table_path, ignore_errors=True)
+
+        # Compare the time shards with a sequential simulation to choose a safe warm-up.
+        if number_of_time_shards > 1 and simulator_config.get(
+            "validate_time_shards", False
+        ):
+            sequential_results = simulate_partition(
+                model=model,
+                routing_table=routing_table,
+                active_calls=active_calls,
+                feature_state=feature_state,
+                lookup_tables=simulated_routing_attempts_table.get_lookup_tables(),
+                config_routing_level=config_routing_level,
+                random_seed=random_seed,
+            )
+            boundary_error = get_time_shard_boundary_error(
+                sequential_routing_attempts=sequential_results["rows"],
+                sharded_routing_attempts=simulated_routing_attempts_table.rows,
+                time_shards=partitions,
+            )
+            logging.info(f"Boundary error of the time shards: {boundary_error}.")
+    else:
+        simulation_engine = RoutingSimulationEngine(
+            model=model,
+            routing_table=routing_table,
+            simulated_routing_attempts_table=simulated_routing_attempts_table,
+            feature_state=feature_state,
+            random_seed=random_seed,
+            batch_window_seconds=config_routing_level.get("simulator_config", {}).get(
+                "batch_window_seconds", 0
+            ),
+            profiler=profiler,
+        )
+        if checkpoint_state is None:
+            simulation_engine.add_active_calls(active_calls=active_calls)
+        else:
+            simulation_engine.set_state(state=checkpoint_state)
+        if baseline_trajectory is not None:
+            simulation_engine.set_baseline_trajectory(
+                baseline_trajectory=baseline_trajectory["trajectory"]
+            )
+        simulation_engine.run(
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=config_routing_level.get("simulator_config", {}).get(
+                "checkpoint_interval", 0
+            ),
+            checkpoint_info={
+                "random_seed": random_seed,
+                "routing_table_path": routing_table_path,
+            },
+        )
+        trajectory = simulation_engine.trajectory
+
+    # Persist the simulated routing attempts.
+    with profiler.phase("flush_to_database"):
+        simulated_routing_attempts_table.flush_to_database()
+
+    # Save the trajectory, so other routing tables can be simulated incrementally from it.
+    if trajectory_path is not None:
+        save_checkpoint(
+            checkpoint_path=trajectory_path,
+            state={
+                "trajectory": trajectory,
+                "random_seed": random_seed,
+                "routing_table_path": routing_table_path,
+            },
+        )
+    return random_seed, simulated_routing_attempts_table.get_routing_attempts()
 
 
 def main():
@@ -127,6 +127,76 @@ def split_data(temporal_config, output_filename=None):
     return split_datetime
 
 
+def split_simulation_datetime(simulation_datetime, number_of_shards, warm_up):
+    """Split the simulation window into consecutive shards of the same length, each one with a warm-up
+    prefix that overlaps the previous shard.
+
+    Keyword arguments:
+        simulation_datetime (dict) -- start and end datetimes of the simulation (see `split_data`).
+        number_of_shards (int) -- number of shards.
+        warm_up (datetime.timedelta) -- length of the warm-up prefix of each shard but the first one.
+
+    Raises:
+        ValueError -- if the number of shards is not positive.
+
+    Returns:
+        shard_datetimes (list[dict]) -- warm-up start, start and end datetimes (EST) of each shard.
+                                        Example of the output:
+                                          [
+                                              {
+                                                  "warm_up_start_datetime_est": "2022-05-26 00:00:00",
+                                                  "start_datetime_est": "2022-05-26 00:00:00",
+                                                  "end_datetime_est": "2022-05-27 00:00:00"
+                                              },
+                                              {
+                                                  "warm_up_start_datetime_est": "2022-05-26 23:00:00",
+                                                  "start_datetime_est": "2022-05-27 00:00:00",
+                                                  "end_datetime_est": "2022-05-28 00:00:00"
+                                              }
+                                          ]
+    """
+    if number_of_shards < 1:
+        logging.error(
+            f"The number of shards should be positive, not {number_of_shards}."
+        )
+        raise ValueError(
+            f"The number of shards should be positive, not {number_of_shards}."
+        )
+
+    simulation_start_datetime = datetime.fromisoformat(
+        simulation_datetime["start_datetime_est"]
+    )
+    simulation_end_datetime = datetime.fromisoformat(
+        simulation_datetime["end_datetime_est"]
+    )
+    shard_duration = (
+        simulation_end_datetime - simulation_start_datetime
+    ) / number_of_shards
+
+    shard_datetimes = []
+    for shard_number in range(number_of_shards):
+        shard_start_datetime = (
+            simulation_start_datetime + shard_number * shard_duration
+        )
+        shard_end_datetime = (
+            simulation_end_datetime
+            if shard_number == number_of_shards - 1
+            else shard_start_datetime + shard_duration
+        )
+        shard_datetimes.append(
+            {
+                "warm_up_start_datetime_est": str(
+                    max(shard_start_datetime - warm_up, simulation_start_datetime)
+                ),
+                "start_datetime_est": str(shard_start_datetime),
+                "end_datetime_est": str(shard_end_datetime),
+            }
+        )
+
+    logging.debug(f"shard_datetimes: \n{shard_datetimes}")
+    return shard_datetimes
+
+
 def main():
     """Main function to exemplify how to use the function."""
     # Read yaml file containing database configuration for modeling
@@ -0,0 +1,375 @@
+import os
+import json
+import time
+import shutil
+import logging
+
+import yaml
+import click
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+
+from config.project_constants import MODELING_CONFIG_FILE
+from src.pipeline.routing.routing_table import (
+    CENTER_KEY_COLUMNS,
+    load_routing_table_dataframe,
+)
+from src.pipeline.routing.run_batch import get_routing_table_paths
+from src.pipeline.routing.simulator import get_active_calls
+from src.utils.logging_util import set_logging_configuration
+from src.utils.metric_util import NETWORK_METRIC_DIRECTIONS
+from src.utils.sql_util import get_db_conn, get_model_network_metrics_from_db
+
+
+def get_exchange_code_loads(active_calls):
+    """Get the number of active calls from each exchange code.
+
+    Keyword arguments:
+        active_calls (pd.DataFrame) -- active calls whose behaviour is simulated (see `get_active_calls`).
+
+    Returns:
+        exchange code loads (pd.Series) -- number of active calls, indexed by exchange code (npanxx).
+    """
+    exchange_codes = pd.to_numeric(active_calls["caller_npanxx"], errors="coerce")
+    return exchange_codes.dropna().astype(np.int64).value_counts()
+
+
+def get_routing_table_features(
+    routing_table, baseline_routing_table, exchange_code_loads
+):
+    """Describe a routing table by its changes with the baseline routing table and the load of its centers.
+        * changed_row_count -- number of exchange codes whose centers differ from the baseline.
+        * changed_load_fraction -- fraction of the active calls from those exchange codes.
+        * load_<center_key>_attempt_<attempt_number> -- number of active calls routed to the center at the
+          attempt number.
+
+    Keyword arguments:
+        routing_table (pd.DataFrame) -- routing table of interest (see `load_routing_table_dataframe`).
+        baseline_routing_table (pd.DataFrame) -- routing table the others are compared with.
+        exchange_code_loads (pd.Series) -- number of active calls per exchange code (see `get_exchange_code_loads`).
+
+    Returns:
+        features (dict) -- features of the routing table.
+    """
+    routing_table = routing_table.drop_duplicates(subset="npanxx").set_index("npanxx")
+    baseline_routing_table = baseline_routing_table.drop_duplicates(
+        subset="npanxx"
+    ).set_index("npanxx")
+    exchange_codes = routing_table.index.union(baseline_routing_table.index)
+
+    center_keys = routing_table.reindex(exchange_codes)[CENTER_KEY_COLUMNS].fillna("")
+    baseline_center_keys = baseline_routing_table.reindex(exchange_codes)[
+        CENTER_KEY_COLUMNS
+    ].fillna("")
+    is_changed = (center_keys != baseline_center_keys).any(axis=1)
+    loads = exchange_code_loads.reindex(exchange_codes, fill_value=0)
+
+    features = {
+        "changed_row_count": int(is_changed.sum()),
+        "changed_load_fraction": float(loads[is_changed].sum() / max(loads.sum(), 1)),
+    }
+    for attempt_number, column in enumerate(CENTER_KEY_COLUMNS, start=1):
+        center_loads = loads.groupby(center_keys[column]).sum()
+        for center_key, load in center_loads.items():
+            if center_key != "":
+                features[f"load_{center_key}_attempt_{attempt_number}"] = int(load)
+    return features
+
+
+def get_training_data(
+    db_conn,
+    model_path,
+    baseline_routing_table,
+    exchange_code_loads,
+    cache_folder_path=None,
+):
+    """Get the features and network metrics of the trials that were simulated with the model.
+    Only the trials of the latest period of active calls are used, since the metrics of other periods
+    do not depend on the routing table alone.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        model_path (str) -- path to the model of the trials.
+        baseline_routing_table (pd.DataFrame) -- routing table the others are compared with.
+        exchange_code_loads (pd.Series) -- number of active calls per exchange code (see `get_exchange_code_loads`).
+        cache_folder_path (str, optional) -- folder of the routing table cache. Defaults to NoneType.
+
+    Raises:
+        ValueError -- if less than two routing tables of the trials can be read.
+
+    Returns:
+        features (pd.DataFrame) -- features of the routing table of each trial (see `get_routing_table_features`).
+        metrics (pd.DataFrame) -- network metrics of each trial, with their routing_table_path.
+    """
+    metrics = get_model_network_metrics_from_db(db_conn=db_conn, model_path=model_path)
+    if len(metrics) > 0:
+        latest_trial = metrics.sort_values("evaluation_id").iloc[-1]
+        metrics = metrics[
+            (
+                metrics["active_calls_start_datetime_est"]
+                == latest_trial["active_calls_start_datetime_est"]
+            )
+            & (
+                metrics["active_calls_end_datetime_est"]
+                == latest_trial["active_calls_end_datetime_est"]
+            )
+        ]
+
+    # The routing tables that were moved or deleted since their trials can not be described.
+    routing_table_features = {}
+    for routing_table_path in metrics["routing_table_path"].unique():
+        if not os.path.isfile(routing_table_path):
+            logging.warning(
+                f"The trials of {routing_table_path} are not used, since the routing table does not exist anymore."
+            )
+            continue
+        routing_table_features[routing_table_path] = get_routing_table_features(
+            routing_table=load_routing_table_dataframe(
+                routing_table_path=routing_table_path,
+                cache_folder_path=cache_folder_path,
+            ),
+            baseline_routing_table=baseline_routing_table,
+            exchange_code_loads=exchange_code_loads,
+        )
+    if len(routing_table_features) < 2:
+        logging.error(
+            f"The surrogate needs the trials of at least two routing tables, but {len(routing_table_features)} were found."
+        )
+        raise ValueError(
+            f"The surrogate needs the trials of at least two routing tables, but {len(routing_table_features)} were found."
+        )
+
+    metrics = metrics[
+        metrics["routing_table_path"].isin(routing_table_features)
+    ].reset_index(drop=True)
+    features = pd.DataFrame(
+        [routing_table_features[path] for path in metrics["routing_table_path"]]
+    ).fillna(0)
+    logging.info(
+        f"Surrogate training data: {len(metrics)} trials of {len(routing_table_features)} routing tables."
+    )
+    return features, metrics
+
+
+def fit_surrogate(features, metrics, number_of_trees=200):
+    """Fit a random forest that predicts the network metrics of a routing table from its features.
+
+    Keyword arguments:
+        features (pd.DataFrame) -- features of the routing table of each trial.
+        metrics (pd.DataFrame) -- network metrics of each trial.
+        number_of_trees (int, optional) -- number of trees of the random forest. Defaults to 200.
+
+    Returns:
+        surrogate (RandomForestRegressor) -- random forest fitted on the <NETWORK_METRIC_DIRECTIONS>.
+    """
+    surrogate = RandomForestRegressor(
+        n_estimators=number_of_trees, random_state=0, n_jobs=-1
+    )
+    surrogate.fit(features, metrics[list(NETWORK_METRIC_DIRECTIONS)].astype(float))
+    return surrogate
+
+
+def predict_metrics(surrogate, features):
+    """Predict the network metrics of routing tables, along with the uncertainty of the predictions.
+    The uncertainty is the standard deviation of the predictions of the trees of the random forest.
+
+    Keyword arguments:
+        surrogate (RandomForestRegressor) -- random forest fitted by `fit_surrogate`.
+        features (pd.DataFrame) -- features of the routing tables. The features the surrogate was not
+                                   fitted on are ignored, and the missing ones are 0.
+
+    Returns:
+        predictions (pd.DataFrame) -- <metric>_mean and <metric>_std of each metric of <NETWORK_METRIC_DIRECTIONS>.
+    """
+    features = features.reindex(columns=surrogate.feature_names_in_, fill_value=0)
+    tree_predictions = np.stack(
+        [tree.predict(features.to_numpy()) for tree in surrogate.estimators_]
+    )
+
+    predictions = pd.DataFrame(index=features.index)
+    for metric_number, metric in enumerate(NETWORK_METRIC_DIRECTIONS):
+        predictions[f"{metric}_mean"] = tree_predictions[:, :, metric_number].mean(
+            axis=0
+        )
+        predictions[f"{metric}_std"] = tree_predictions[:, :, metric_number].std(axis=0)
+    return predictions
+
+
+def select_routing_tables(
+    predictions, metric, number_of_promising, number_of_uncertain
+):
+    """Select the routing tables to simulate in full: the most promising ones according to the predicted
+    metric, and then the ones whose prediction is the most uncertain among the others.
+
+    Keyword arguments:
+        predictions (pd.DataFrame) -- predictions of the routing tables (see `predict_metrics`).
+        metric (str) -- metric of <NETWORK_METRIC_DIRECTIONS> the routing tables are ranked by.
+        number_of_promising (int) -- number of routing tables with the best predicted metric.
+        number_of_uncertain (int) -- number of other routing tables with the most uncertain prediction.
+
+    Returns:
+        selection (pd.Series) -- "promising", "uncertain" or None for each routing table.
+    """
+    selection = pd.Series(None, index=predictions.index, dtype=object)
+    promising_index = (
+        (NETWORK_METRIC_DIRECTIONS[metric] * predictions[f"{metric}_mean"])
+        .sort_values(ascending=False, kind="stable")
+        .index[:number_of_promising]
+    )
+    selection[promising_index] = "promising"
+    uncertain_index = (
+        predictions.loc[selection.isna(), f"{metric}_std"]
+        .sort_values(ascending=False, kind="stable")
+        .index[:number_of_uncertain]
+    )
+    selection[uncertain_index] = "uncertain"
+    return selection
+
+
+@click.command()
+@click.option(
+    "--routing_tables",
+    prompt="Directory or glob pattern of the routing tables to be screened.",
+    default="/mnt/data/projects/vibrant-routing/data/generated_routing_tables/",
+)
+@click.option(
+    "--baseline_routing_table_path",
+    prompt="Path to the routing table the others are compared with.",
+    default="/mnt/data/projects/vibrant-routing/data/20220604/vibrant_RoutingTable_202206031725.csv",
+)
+@click.option(
+    "--metric",
+    prompt="Network metric the routing tables are ranked by.",
+    type=click.Choice(list(NETWORK_METRIC_DIRECTIONS)),
+    default="answer_rate",
+)
+@click.option(
+    "--number_of_promising",
+    prompt="How many routing tables with the best predicted metric to select.",
+    default=10,
+)
+@click.option(
+    "--number_of_uncertain",
+    prompt="How many routing tables with the most uncertain prediction to select.",
+    default=5,
+)
+@click.option(
+    "--selected_folder_path",
+    prompt="Folder where to copy the selected routing tables.",
+    default="/mnt/data/projects/vibrant-routing/data/screened_routing_tables/",
+)
+def screen_routing_tables(
+    routing_tables,
+    baseline_routing_table_path,
+    metric,
+    number_of_promising,
+    number_of_uncertain,
+    selected_folder_path,
+):
+    """Function that screens a batch of routing tables with a surrogate of the simulation.
+    The surrogate is fitted on the trials that were already simulated with the best model, predicts the
+    network metrics of the routing tables of the batch, and selects the most promising and the most uncertain
+    ones. The selected routing tables are copied to <selected_folder_path>, to be simulated in full with
+    `run_batch.py`, whose trials improve the surrogate the next time it is fitted.
+
+    Keyword arguments:
+        routing_tables (str) -- Directory or glob pattern of the routing tables to be screened.
+        baseline_routing_table_path (str) -- Path to the routing table the others are compared with.
+        metric (str) -- Network metric the routing tables are ranked by.
+        number_of_promising (int) -- Number of routing tables with the best predicted metric to select.
+        number_of_uncertain (int) -- Number of routing tables with the most uncertain prediction to select.
+        selected_folder_path (str) -- Folder where to copy the selected routing tables.
+    """
+    # Read yaml file containing database configuration for modeling.
+    with open(MODELING_CONFIG_FILE) as f:
+        modeling_config = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Set logging configuration and return the complete path where the logs are saved.
+    log_path = set_logging_configuration(
+        log_folder_path=modeling_config["log_folder_path"]
+    )
+    logging.info("Execution of the surrogate screening started.")
+    logging.debug(json.dumps(modeling_config, indent=4))
+
+    routing_level_config = modeling_config["routing_level_config"]
+    cache_folder_path = routing_level_config.get("simulator_config", {}).get(
+        "routing_table_cache_folder_path"
+    )
+    routing_table_paths = get_routing_table_paths(
+        routing_tables=routing_tables,
+        baseline_routing_table_path=baseline_routing_table_path,
+    )[1:]
+
+    # Describe the routing tables by the active calls of the cohort tables of the latest experiment.
+    db_conn = get_db_conn()
+    exchange_code_loads = get_exchange_code_loads(
+        active_calls=get_active_calls(
+            db_conn=db_conn, config_routing_level=routing_level_config
+        )
+    )
+    baseline_routing_table = load_routing_table_dataframe(
+        routing_table_path=baseline_routing_table_path,
+        cache_folder_path=cache_folder_path,
+    )
+
+    features, metrics = get_training_data(
+        db_conn=db_conn,
+        model_path=routing_level_config["best_model_config"]["model_pickle_path"],
+        baseline_routing_table=baseline_routing_table,
+        exchange_code_loads=exchange_code_loads,
+        cache_folder_path=cache_folder_path,
+    )
+    surrogate = fit_surrogate(
+        features=features,
+        metrics=metrics,
+        number_of_trees=routing_level_config.get("simulator_config", {}).get(
+            "surrogate_number_of_trees", 200
+        ),
+    )
+
+    start_time = time.time()
+    candidate_features = pd.DataFrame(
+        [
+            get_routing_table_features(
+                routing_table=load_routing_table_dataframe(
+                    routing_table_path=path, cache_folder_path=cache_folder_path
+                ),
+                baseline_routing_table=baseline_routing_table,
+                exchange_code_loads=exchange_code_loads,
+            )
+            for path in routing_table_paths
+        ]
+    )
+    predictions = predict_metrics(surrogate=surrogate, features=candidate_features)
+    predictions.insert(0, "routing_table_path", routing_table_paths)
+    predictions["selection"] = select_routing_tables(
+        predictions=predictions,
+        metric=metric,
+        number_of_promising=number_of_promising,
+        number_of_uncertain=number_of_uncertain,
+    )
+    logging.info(
+        f"{len(routing_table_paths)} routing tables screened in {time.time() - start_time:.2f} seconds."
+    )
+
+    screening_path = f"{os.path.splitext(log_path)[0]}_surrogate_screening.csv"
+    predictions.to_csv(screening_path, index=False)
+    logging.info(f"Predictions of the surrogate saved in {screening_path}.")
+
+    os.makedirs(selected_folder_path, exist_ok=True)
+    for row in predictions[predictions["selection"].notna()].itertuples():
+        shutil.copy(row.routing_table_path, selected_folder_path)
+        logging.info(
+            f"{row.routing_table_path} selected ({row.selection}): predicted {metric} of "
+            f"{getattr(row, f'{metric}_mean'):.6f} +/- {getattr(row, f'{metric}_std'):.6f}."
+        )
+    logging.info(
+        f"Simulate the selected routing tables with: python -m src.pipeline.routing.run_batch "
+        f"--routing_tables {selected_folder_path} --baseline_routing_table_path {baseline_routing_table_path}"
+    )
+    logging.info("Surrogate screening finished.")
+
+
+if __name__ == "__main__":
+    screen_routing_tables()
@@ -6,6 +6,7 @@ import click
 
 from config.project_constants import MODELING_CONFIG_FILE
 from config.data_for_table_generator import list_of_states, area_codes_to_state_mapping
+from src.pipeline.routing.routing_table import load_routing_table_dataframe
 
 # TODO: set up logging
 
@@ -213,13 +214,15 @@ def change_one_row(routing_table, npanxx_to_change, new_assignment_package):
     return routing_table, is_allowed
 
 
-def generate_table(original_table_filepath, change_dict):
+def generate_table(original_table_filepath, change_dict, cache_folder_path=None):
     """From an existing table, change the table by taking a subset of exchange codes and changing the call centers assigned to it.
 
     Keyword arguments:
         original_table_filepath (str) -- path where to find the routing table of interest.
         change_dict (dict[int:tuple]) -- dictionary about which rows to change.
                               Maps npanxx: (center_key, termination_number, center_role])
+        cache_folder_path (str, optional) -- folder of the routing table cache, so the original table
+                                             is only parsed once. Defaults to NoneType.
 
     Returns:
         routing_table (pd.DataFrame) -- the new routing table.
@@ -233,12 +236,12 @@ def generate_table(original_table_filepath, change_dict):
                 new_assignment_package[i] = None
         change_dict[npanxx_to_change] = new_assignment_package
 
-    # Load routing table to pd.DataFrame and set column names to lower case.
-    routing_table = pd.read_csv(original_table_filepath, low_memory=False)
-    routing_table.columns = routing_table.columns.str.lower()
+    # Load routing table to pd.DataFrame with the column names in lower case.
+    routing_table = load_routing_table_dataframe(
+        routing_table_path=original_table_filepath, cache_folder_path=cache_folder_path
+    )
 
     # Set the exchange code as index in the routing table to ease upcoming lookups.
-    routing_table["npanxx"] = pd.to_numeric(routing_table["npanxx"])
     routing_table = routing_table.set_index("npanxx")
 
     # List of the columns that are supposed to indicate whether a row was changed from the previous routing table.
@@ -345,11 +348,10 @@ def main(num_tables_to_create):
 
     simulator_config = modeling_config["routing_level_config"]["simulator_config"]
     original_table_filepath = simulator_config["original_table_filepath"]
-    original_table = pd.read_csv(
-        original_table_filepath,
-        low_memory=False,
+    cache_folder_path = simulator_config.get("routing_table_cache_folder_path")
+    original_table = load_routing_table_dataframe(
+        routing_table_path=original_table_filepath, cache_folder_path=cache_folder_path
     )
-    original_table.columns = original_table.columns.str.lower()
 
     # TODO: error checking -- what if the npanxx or area code isn't real?
 
@@ -381,6 +383,7 @@ def main(num_tables_to_create):
             new_table = generate_table(
                 original_table_filepath=original_table_filepath,
                 change_dict=change_dict,
+                cache_folder_path=cache_folder_path,
             )
 
             # Save the new routing table to disk.
@@ -398,4 +401,5 @@ def main(num_tables_to_create):
     )
 
 
-main()
+if __name__ == "__main__":
+    main()
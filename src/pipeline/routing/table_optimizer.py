@@ -0,0 +1,543 @@
+import os
+import json
+import math
+import random
+import logging
+
+import yaml
+import click
+import pandas as pd
+
+from config.project_constants import MODELING_CONFIG_FILE
+from src.pipeline.routing import compare_routing_tables
+from src.pipeline.routing.routing_table import (
+    CENTER_KEY_COLUMNS,
+    TERMINATION_NUMBER_COLUMNS,
+    load_routing_table_dataframe,
+)
+from src.pipeline.routing.simulation_server import SimulationServer
+from src.pipeline.routing.table_generator import generate_table
+from src.utils.logging_util import set_logging_configuration
+from src.utils.metric_util import NETWORK_METRIC_DIRECTIONS, get_paired_differences
+from src.utils.random_util import get_trial_random_seeds
+from src.utils.sql_util import get_network_metrics_from_db
+
+# Name of the columns of the routing table that contain the role of the center per attempt number.
+CENTER_ROLE_COLUMNS = ["center1role", "center2role", "center3role", "center4role"]
+
+
+def get_assignment_package(row):
+    """Get the centers assigned to a row of the routing table, in the format of `generate_table`.
+
+    Keyword arguments:
+        row (pd.Series) -- row of the routing table.
+
+    Returns:
+        assignment package (list[tuple]) -- (center_key, termination_number, center_role) of the four centers.
+    """
+    return [
+        (row[center_key_column], row[termination_column], row[role_column])
+        for center_key_column, termination_column, role_column in zip(
+            CENTER_KEY_COLUMNS, TERMINATION_NUMBER_COLUMNS, CENTER_ROLE_COLUMNS
+        )
+    ]
+
+
+def propose_change(routing_table, centers, random_generator):
+    """Propose a change of the centers assigned to a random row of the routing table. Either two consecutive
+    centers are swapped, or a center is replaced by another center of the same state.
+
+    Keyword arguments:
+        routing_table (pd.DataFrame) -- routing table indexed by exchange code (npanxx).
+        centers (dict[str:tuple]) -- (center_key, termination_number, center_role) of each center key.
+        random_generator (random.Random) -- generator of the random choices.
+
+    Returns:
+        (npanxx, new_assignment_package) (tuple) -- row to change and its new centers, or None if the row
+                                                    that was drawn can not be changed.
+    """
+    npanxx = random_generator.choice(routing_table.index)
+    new_assignment_package = get_assignment_package(row=routing_table.loc[npanxx])
+    assigned_center_keys = [
+        center_key
+        for center_key, _, _ in new_assignment_package
+        if isinstance(center_key, str)
+    ]
+    if not assigned_center_keys:
+        return None
+
+    if len(assigned_center_keys) > 1 and random_generator.random() < 0.5:
+        i = random_generator.randrange(len(assigned_center_keys) - 1)
+        new_assignment_package[i], new_assignment_package[i + 1] = (
+            new_assignment_package[i + 1],
+            new_assignment_package[i],
+        )
+    else:
+        i = random_generator.randrange(len(assigned_center_keys))
+        state = assigned_center_keys[i][:2]
+        replacement_center_keys = sorted(
+            center_key
+            for center_key in centers
+            if center_key[:2] == state and center_key not in assigned_center_keys
+        )
+        if not replacement_center_keys:
+            return None
+        new_assignment_package[i] = centers[
+            random_generator.choice(replacement_center_keys)
+        ]
+    return npanxx, new_assignment_package
+
+
+def generate_candidates(
+    incumbent_routing_table_path,
+    number_of_candidates,
+    number_of_changes,
+    output_folder_path,
+    random_generator,
+    cache_folder_path=None,
+):
+    """Generate candidate routing tables by changing a few rows of the incumbent routing table.
+    The changes are validated by `generate_table`, which discards the changes that are not allowed.
+
+    Keyword arguments:
+        incumbent_routing_table_path (str) -- path to the routing table the candidates are generated from.
+        number_of_candidates (int) -- number of candidate routing tables to generate.
+        number_of_changes (int) -- number of rows changed in each candidate routing table.
+        output_folder_path (str) -- folder where to save the candidate routing tables.
+        random_generator (random.Random) -- generator of the random choices.
+        cache_folder_path (str, optional) -- folder of the routing table cache. Defaults to NoneType.
+
+    Returns:
+        candidate_routing_table_paths (list[str]) -- paths of the candidate routing tables. There may be less
+                                                     than <number_of_candidates> if few changes are allowed.
+    """
+    # Like the simulations, only the first row of a duplicated exchange code is kept, so each change
+    # proposed for an exchange code is about a single row.
+    routing_table = (
+        load_routing_table_dataframe(
+            routing_table_path=incumbent_routing_table_path,
+            cache_folder_path=cache_folder_path,
+        )
+        .drop_duplicates(subset="npanxx", keep="first")
+        .set_index("npanxx")
+    )
+
+    # Termination number and role of each center, as they first appear in the routing table.
+    centers = {}
+    for columns in zip(
+        CENTER_KEY_COLUMNS, TERMINATION_NUMBER_COLUMNS, CENTER_ROLE_COLUMNS
+    ):
+        for center in routing_table[list(columns)].itertuples(index=False):
+            if isinstance(center[0], str):
+                centers.setdefault(center[0], tuple(center))
+
+    os.makedirs(output_folder_path, exist_ok=True)
+    candidate_routing_table_paths = []
+    proposed_changes = set()
+
+    # Give up after a number of proposals, in case few changes of the routing table are allowed.
+    for _ in range(10 * number_of_candidates):
+        if len(candidate_routing_table_paths) == number_of_candidates:
+            break
+
+        change_dict = {}
+        for _ in range(number_of_changes):
+            change = propose_change(
+                routing_table=routing_table,
+                centers=centers,
+                random_generator=random_generator,
+            )
+            if change is not None:
+                change_dict[change[0]] = change[1]
+        if not change_dict or str(change_dict) in proposed_changes:
+            continue
+        proposed_changes.add(str(change_dict))
+
+        # Assumption: the KeyError is due to unknown area codes (see `table_generator.main`).
+        try:
+            candidate_routing_table = generate_table(
+                original_table_filepath=incumbent_routing_table_path,
+                change_dict=change_dict,
+                cache_folder_path=cache_folder_path,
+            )
+        except KeyError:
+            continue
+        if candidate_routing_table is None:
+            continue
+
+        candidate_routing_table_path = os.path.join(
+            output_folder_path,
+            f"candidate_{len(candidate_routing_table_paths) + 1}_"
+            f"{'_'.join(str(npanxx) for npanxx in change_dict)}.csv",
+        )
+        candidate_routing_table.to_csv(candidate_routing_table_path)
+        candidate_routing_table_paths.append(candidate_routing_table_path)
+
+    logging.info(
+        f"{len(candidate_routing_table_paths)} candidate routing tables generated from {incumbent_routing_table_path}."
+    )
+    return candidate_routing_table_paths
+
+
+def get_rungs(maximum_number_of_trials, reduction_factor):
+    """Get the number of trials of each rung of the successive halving.
+
+    Keyword arguments:
+        maximum_number_of_trials (int) -- number of trials of the candidates that reach the last rung.
+        reduction_factor (int) -- factor by which the number of trials grows from one rung to the next.
+
+    Returns:
+        rungs (list[int]) -- increasing number of trials, ending with <maximum_number_of_trials>.
+
+    Raises:
+        ValueError -- if <maximum_number_of_trials> is less than 1 or <reduction_factor> is less than 2.
+    """
+    if maximum_number_of_trials < 1 or reduction_factor < 2:
+        logging.error(
+            f"The successive halving needs at least 1 trial and a reduction factor of at least 2, "
+            f"got {maximum_number_of_trials} trials and a reduction factor of {reduction_factor}."
+        )
+        raise ValueError(
+            f"The successive halving needs at least 1 trial and a reduction factor of at least 2, "
+            f"got {maximum_number_of_trials} trials and a reduction factor of {reduction_factor}."
+        )
+
+    # The rungs are built down from the last one, so every rung has <reduction_factor> times the trials of the
+    # previous one, except the first one, which has at least 1 trial.
+    rungs = [maximum_number_of_trials]
+    while rungs[0] // reduction_factor >= 1:
+        rungs.insert(0, rungs[0] // reduction_factor)
+    return rungs
+
+
+def rank_candidates(paired_differences, metric):
+    """Rank the candidate routing tables by the paired difference of a metric with the incumbent.
+
+    Keyword arguments:
+        paired_differences (pd.DataFrame) -- paired differences with the incumbent (see `get_paired_differences`).
+        metric (str) -- metric of <NETWORK_METRIC_DIRECTIONS> the candidates are ranked by.
+
+    Returns:
+        ranking (pd.DataFrame) -- paired differences of the metric, from the best candidate to the worst, with
+                                  whether the candidate is clearly worse than the incumbent, i.e., whether its
+                                  confidence interval is on the wrong side of 0.
+    """
+    direction = NETWORK_METRIC_DIRECTIONS[metric]
+    ranking = paired_differences[paired_differences["metric"] == metric].copy()
+    ranking["improvement"] = direction * ranking["mean_difference"]
+    ranking["is_clearly_worse"] = (
+        ranking["ci_upper"] < 0 if direction > 0 else ranking["ci_lower"] > 0
+    )
+    ranking["is_clearly_better"] = (
+        ranking["ci_lower"] > 0 if direction > 0 else ranking["ci_upper"] < 0
+    )
+    return ranking.sort_values("improvement", ascending=False, kind="stable")
+
+
+def successive_halving(
+    simulation_server,
+    incumbent_routing_table_path,
+    candidate_routing_table_paths,
+    evaluation_ids,
+    random_seeds,
+    rungs,
+    reduction_factor,
+    metric,
+    confidence_level=0.95,
+):
+    """Race candidate routing tables against the incumbent with successive halving.
+    At each rung, the remaining candidates and the incumbent are simulated up to the number of trials of the rung
+    with common random numbers. The candidates that are clearly worse than the incumbent are dropped, and only
+    the best 1/<reduction_factor> of the others go on to the next rung, so most trials are spent on the
+    competitive candidates.
+
+    Keyword arguments:
+        simulation_server (SimulationServer) -- session that runs the trials.
+        incumbent_routing_table_path (str) -- path to the routing table the candidates are compared with.
+        candidate_routing_table_paths (list[str]) -- paths to the candidate routing tables.
+        evaluation_ids (dict[str:dict]) -- evaluation of each trial number of each routing table that was already
+                                           simulated. It is updated with the new trials.
+        random_seeds (list[int]) -- random seed of each trial number.
+        rungs (list[int]) -- number of trials of each rung (see `get_rungs`).
+        reduction_factor (int) -- factor by which the number of candidates shrinks from one rung to the next.
+        metric (str) -- metric of <NETWORK_METRIC_DIRECTIONS> the candidates are ranked by.
+        confidence_level (float, optional) -- confidence level of the paired differences. Defaults to 0.95.
+
+    Returns:
+        ranking (pd.DataFrame) -- paired differences of the metric of the candidates at each rung
+                                  (see `rank_candidates`), with the rung and whether the candidate went on.
+    """
+    remaining_routing_table_paths = list(candidate_routing_table_paths)
+    rankings = []
+    for rung_number, number_of_trials in enumerate(rungs, start=1):
+        # Only the trials that were not simulated before are run.
+        trials_kwargs = []
+        for path in [incumbent_routing_table_path] + remaining_routing_table_paths:
+            table_evaluation_ids = evaluation_ids.setdefault(path, {})
+            trial_numbers = [
+                trial_number
+                for trial_number in range(1, number_of_trials + 1)
+                if trial_number not in table_evaluation_ids
+            ]
+            trials_kwargs += simulation_server.get_trials_kwargs(
+                routing_table_path=path,
+                trial_numbers=trial_numbers,
+                random_seeds=[
+                    random_seeds[trial_number - 1] for trial_number in trial_numbers
+                ],
+                number_of_trials=rungs[-1],
+                table_name_suffix=f"table_{list(evaluation_ids).index(path) + 1}",
+            )
+        logging.info(
+            f"Rung {rung_number}/{len(rungs)}: {len(remaining_routing_table_paths)} candidates, "
+            f"{number_of_trials} trials each, {len(trials_kwargs)} new trials."
+        )
+        for trial_kwargs, evaluation_id in zip(
+            trials_kwargs, simulation_server.run_trials(trials_kwargs=trials_kwargs)
+        ):
+            evaluation_ids[trial_kwargs["routing_table_path"]][
+                trial_kwargs["trial_number"]
+            ] = evaluation_id
+
+        network_metrics = get_network_metrics_from_db(
+            db_conn=simulation_server.db_conn,
+            evaluation_ids=[
+                evaluation_ids[path][trial_number]
+                for path in [incumbent_routing_table_path]
+                + remaining_routing_table_paths
+                for trial_number in range(1, number_of_trials + 1)
+            ],
+        )
+        ranking = rank_candidates(
+            paired_differences=get_paired_differences(
+                metrics=network_metrics,
+                metric_columns=[metric],
+                baseline_label=incumbent_routing_table_path,
+                pair_column="trial_number",
+                label_column="routing_table_path",
+                confidence_level=confidence_level,
+            ),
+            metric=metric,
+        )
+
+        # The best candidate goes on even if it is clearly worse, so the last rung is never empty.
+        if rung_number < len(rungs):
+            number_of_promoted = max(
+                math.ceil(len(remaining_routing_table_paths) / reduction_factor), 1
+            )
+            promoted = ranking[~ranking["is_clearly_worse"]].head(number_of_promoted)
+            if promoted.empty:
+                promoted = ranking.head(1)
+            remaining_routing_table_paths = list(promoted["routing_table_path"])
+        ranking["rung"] = rung_number
+        ranking["is_promoted"] = ranking["routing_table_path"].isin(
+            remaining_routing_table_paths
+        )
+        rankings.append(ranking)
+
+        for row in ranking.itertuples():
+            logging.info(
+                f"Rung {rung_number}: {metric} of {row.routing_table_path} - incumbent: {row.mean_difference:.6f} "
+                f"[{row.ci_lower:.6f}, {row.ci_upper:.6f}] over {row.pair_count} paired trials."
+            )
+    return pd.concat(rankings, ignore_index=True)
+
+
+@click.command()
+@click.option(
+    "--baseline_routing_table_path",
+    prompt="Path to the routing table the search starts from.",
+    default="/mnt/data/projects/vibrant-routing/data/20220604/vibrant_RoutingTable_202206031725.csv",
+)
+@click.option(
+    "--metric",
+    prompt="Network metric to optimize.",
+    type=click.Choice(list(NETWORK_METRIC_DIRECTIONS)),
+    default="answer_rate",
+)
+@click.option(
+    "--number_of_generations",
+    prompt="How many times to generate candidates from the best routing table found.",
+    default=3,
+)
+@click.option(
+    "--number_of_candidates",
+    prompt="How many candidate routing tables to generate per generation.",
+    default=9,
+)
+@click.option(
+    "--number_of_changes",
+    prompt="How many rows to change in each candidate routing table.",
+    default=1,
+)
+@click.option(
+    "--maximum_number_of_trials",
+    prompt="How many trials the candidates that reach the last rung are simulated.",
+    default=9,
+)
+@click.option(
+    "--reduction_factor",
+    prompt="Factor by which the number of candidates shrinks from one rung to the next.",
+    default=3,
+)
+@click.option(
+    "--number_of_workers",
+    prompt="How many trials to run in parallel.",
+    default=1,
+)
+@click.option(
+    "--output_folder_path",
+    prompt="Folder where to save the candidate routing tables.",
+    default="/mnt/data/projects/vibrant-routing/data/optimized_routing_tables/",
+)
+@click.option(
+    "--random_seed",
+    type=int,
+    default=None,
+    help="Random seed of the search, to repeat it exactly. Defaults to new random seeds.",
+)
+def optimize_routing_table(
+    baseline_routing_table_path,
+    metric,
+    number_of_generations,
+    number_of_candidates,
+    number_of_changes,
+    maximum_number_of_trials,
+    reduction_factor,
+    number_of_workers,
+    output_folder_path,
+    random_seed,
+):
+    """Function that searches for a better routing table with simulation feedback.
+    Each generation changes a few rows of the best routing table found so far (the incumbent), races the
+    candidates against it with successive halving, and the best candidate replaces the incumbent if it is
+    clearly better after <maximum_number_of_trials> trials. The best routing tables found are finally
+    compared with the baseline routing table, and their paired metric differences are saved.
+
+    Keyword arguments:
+        baseline_routing_table_path (str) -- Path to the routing table the search starts from.
+        metric (str) -- Network metric to optimize.
+        number_of_generations (int) -- Number of times to generate candidates from the incumbent.
+        number_of_candidates (int) -- Number of candidate routing tables per generation.
+        number_of_changes (int) -- Number of rows changed in each candidate routing table.
+        maximum_number_of_trials (int) -- Number of trials of the candidates that reach the last rung.
+        reduction_factor (int) -- Factor by which the number of candidates shrinks from one rung to the next.
+        number_of_workers (int) -- Number of trials to run in parallel.
+        output_folder_path (str) -- Folder where to save the candidate routing tables.
+        random_seed (int) -- Random seed of the search. Defaults to NoneType, i.e., new random seeds.
+    """
+    # Read yaml file containing database configuration for modeling.
+    with open(MODELING_CONFIG_FILE) as f:
+        modeling_config = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Set logging configuration and return the complete path where the logs are saved.
+    log_path = set_logging_configuration(
+        log_folder_path=modeling_config["log_folder_path"]
+    )
+    logging.info("Execution of the routing table search started.")
+    logging.debug(json.dumps(modeling_config, indent=4))
+
+    routing_level_config = modeling_config["routing_level_config"]
+    confidence_level = routing_level_config["simulator_config"].get(
+        "confidence_level", 0.95
+    )
+    cache_folder_path = routing_level_config["simulator_config"].get(
+        "routing_table_cache_folder_path"
+    )
+
+    # The cohort and lookup tables, the model and the shared inputs are loaded once for the whole search.
+    simulation_server = SimulationServer(
+        modeling_config=modeling_config,
+        log_path=log_path,
+        number_of_workers=number_of_workers,
+    )
+    random_generator = random.Random(random_seed)
+    random_seeds = get_trial_random_seeds(
+        number_of_trials=maximum_number_of_trials, random_seed=random_seed
+    )
+    rungs = get_rungs(
+        maximum_number_of_trials=maximum_number_of_trials,
+        reduction_factor=reduction_factor,
+    )
+
+    incumbent_routing_table_path = baseline_routing_table_path
+    best_routing_table_paths = [baseline_routing_table_path]
+    evaluation_ids = {}
+    rankings = []
+    try:
+        for generation in range(1, number_of_generations + 1):
+            candidate_routing_table_paths = generate_candidates(
+                incumbent_routing_table_path=incumbent_routing_table_path,
+                number_of_candidates=number_of_candidates,
+                number_of_changes=number_of_changes,
+                output_folder_path=os.path.join(
+                    output_folder_path, f"generation_{generation}"
+                ),
+                random_generator=random_generator,
+                cache_folder_path=cache_folder_path,
+            )
+            if not candidate_routing_table_paths:
+                logging.warning(f"No candidate generated in generation {generation}.")
+                break
+
+            ranking = successive_halving(
+                simulation_server=simulation_server,
+                incumbent_routing_table_path=incumbent_routing_table_path,
+                candidate_routing_table_paths=candidate_routing_table_paths,
+                evaluation_ids=evaluation_ids,
+                random_seeds=random_seeds,
+                rungs=rungs,
+                reduction_factor=reduction_factor,
+                metric=metric,
+                confidence_level=confidence_level,
+            ).assign(
+                generation=generation,
+                incumbent_routing_table_path=incumbent_routing_table_path,
+            )
+            rankings.append(ranking)
+
+            best_candidate = ranking[ranking["rung"] == len(rungs)].iloc[0]
+            if best_candidate["is_clearly_better"]:
+                incumbent_routing_table_path = best_candidate["routing_table_path"]
+                best_routing_table_paths.append(incumbent_routing_table_path)
+                logging.info(
+                    f"Generation {generation}: {incumbent_routing_table_path} is the new incumbent."
+                )
+            else:
+                logging.info(
+                    f"Generation {generation}: no candidate is clearly better than {incumbent_routing_table_path}."
+                )
+    finally:
+        simulation_server.shutdown()
+
+    if rankings:
+        rankings_path = f"{os.path.splitext(log_path)[0]}_search_rankings.csv"
+        pd.concat(rankings, ignore_index=True).to_csv(rankings_path, index=False)
+        logging.info(f"Rankings of the candidates saved in {rankings_path}.")
+
+    # Compare the best routing tables found with the baseline routing table.
+    if len(best_routing_table_paths) > 1:
+        paired_comparison = compare_routing_tables(
+            db_conn=simulation_server.db_conn,
+            evaluation_ids=[
+                evaluation_ids[path][trial_number]
+                for path in best_routing_table_paths
+                for trial_number in range(1, maximum_number_of_trials + 1)
+            ],
+            baseline_routing_table_path=baseline_routing_table_path,
+            log_path=log_path,
+            confidence_level=confidence_level,
+        )
+        summary_path = f"{os.path.splitext(log_path)[0]}_search_summary.csv"
+        paired_comparison.to_csv(summary_path, index=False)
+        logging.info(f"Best routing tables found: {best_routing_table_paths[1:]}.")
+        logging.info(f"Summary of the search saved in {summary_path}.")
+    else:
+        logging.info(
+            f"No routing table clearly better than {baseline_routing_table_path} was found."
+        )
+    logging.info("Routing table search finished.")
+
+
+if __name__ == "__main__":
+    optimize_routing_table()
@@ -20,8 +20,10 @@ create table if not exists :schema_name.evaluations (
     active_calls_keys text[] not null,
     active_calls_count bigint not null,
     evaluation_config_hash text,
-    log_path text not null
+    log_path text not null,
+    stopping_reason text
 );
+alter table :schema_name.evaluations add column if not exists stopping_reason text;
 create index on :schema_name.evaluations (evaluation_id);
 
 -- Create table: metrics_network
@@ -120,4 +122,39 @@ create table if not exists :schema_name.metrics_call_centers (
 );
 create index on :schema_name.metrics_call_centers (evaluation_id);
 create index on :schema_name.metrics_call_centers (center_key);
-create index on :schema_name.metrics_call_centers (termination_number);
\ No newline at end of file
+create index on :schema_name.metrics_call_centers (termination_number);
+
+-- Create table: simulation_profiles
+-- drop table if exists :schema_name.simulation_profiles cascade;
+create table if not exists :schema_name.simulation_profiles ( 
+    evaluation_id bigint not null,
+    phase text not null,
+    call_count bigint not null,
+    total_time_sec numeric,
+    mean_time_ms numeric,
+    p50_time_ms numeric,
+    p95_time_ms numeric,
+    p99_time_ms numeric,
+    constraint evaluation_id foreign key(evaluation_id)
+		references :schema_name.evaluations(evaluation_id)
+);
+create index on :schema_name.simulation_profiles (evaluation_id);
+
+-- Create table: paired_comparisons
+-- drop table if exists :schema_name.paired_comparisons cascade;
+create table if not exists :schema_name.paired_comparisons ( 
+    creation_datetime_utc timestamp not null,
+    baseline_routing_table_path text not null,
+    routing_table_path text not null,
+    metric text not null,
+    pair_count bigint not null,
+    baseline_mean numeric,
+    mean numeric,
+    mean_difference numeric,
+    std_difference numeric,
+    ci_lower numeric,
+    ci_upper numeric,
+    confidence_level numeric,
+    log_path text not null
+);
+create index on :schema_name.paired_comparisons (routing_table_path);
@@ -0,0 +1,84 @@
+import logging
+import os
+import pickle
+
+
+def save_checkpoint(checkpoint_path, state):
+    """Save the state of a simulation in a checkpoint file.
+    The state is written to a temporary file that atomically replaces the previous checkpoint,
+    so a simulation that dies while saving never leaves a partial checkpoint behind.
+
+    Keyword arguments:
+        checkpoint_path (str) -- path of the checkpoint file.
+        state (dict) -- state of the simulation. It must be picklable.
+    """
+    checkpoint_folder_path = os.path.dirname(checkpoint_path)
+    if checkpoint_folder_path:
+        os.makedirs(checkpoint_folder_path, exist_ok=True)
+
+    temporary_checkpoint_path = f"{checkpoint_path}.tmp"
+    with open(temporary_checkpoint_path, "wb") as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporary_checkpoint_path, checkpoint_path)
+    logging.debug(f"Checkpoint saved in {checkpoint_path}.")
+
+
+def load_checkpoint(checkpoint_path):
+    """Load the state of a simulation from a checkpoint file.
+
+    Keyword arguments:
+        checkpoint_path (str) -- path of the checkpoint file.
+
+    Raises:
+        ValueError -- if the checkpoint file can not be read.
+
+    Returns:
+        state (dict) -- state of the simulation, or None if there is no checkpoint file.
+    """
+    if not os.path.exists(checkpoint_path):
+        logging.info(f"There is no checkpoint in {checkpoint_path}.")
+        return None
+
+    try:
+        with open(checkpoint_path, "rb") as f:
+            state = pickle.load(f)
+        logging.info(f"Checkpoint loaded from {checkpoint_path}.")
+        return state
+    except:
+        logging.error(f"Failed to load the checkpoint {checkpoint_path}!")
+        raise ValueError(f"Failed to load the checkpoint {checkpoint_path}!")
+
+
+def get_checkpoint_path(
+    checkpoint_folder_path, trial_number, routing_table_number=None
+):
+    """Get the path of the checkpoint file of a trial.
+
+    Keyword arguments:
+        checkpoint_folder_path (str) -- folder where the checkpoints are saved.
+        trial_number (int) -- number of the trial, starting at 1.
+        routing_table_number (int, optional) -- number of the routing table of the trial, starting at 1, when
+                                                several routing tables are compared. Defaults to NoneType.
+
+    Returns:
+        checkpoint_path (str) -- path of the checkpoint file of the trial.
+    """
+    if routing_table_number is not None:
+        return os.path.join(
+            checkpoint_folder_path,
+            f"routing_table_{routing_table_number}_trial_{trial_number}.pkl",
+        )
+    return os.path.join(checkpoint_folder_path, f"trial_{trial_number}.pkl")
+
+
+def remove_checkpoint(checkpoint_path):
+    """Remove a checkpoint file, if it exists.
+
+    Keyword arguments:
+        checkpoint_path (str) -- path of the checkpoint file.
+    """
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+        logging.debug(f"Checkpoint {checkpoint_path} removed.")
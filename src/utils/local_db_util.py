@@ -0,0 +1,194 @@
+import os
+import re
+import glob
+import logging
+
+import yaml
+import click
+import duckdb
+import pandas as pd
+from config.project_constants import (
+    DB_BACKEND,
+    EXPERIMENT_SCHEMA_NAME_ROUTING,
+    MODELING_CONFIG_FILE,
+    SOURCE_DATA_SCHEMA_NAME,
+)
+from src.utils.logging_util import set_logging_configuration
+from src.utils.sql_util import create_schema, create_table_with_sql_query, get_db_conn
+
+# Tables of the source data schema that the routing-level pipeline reads.
+ROUTING_LEVEL_SOURCE_TABLES = [
+    "routing_attempts",
+    "center_lookup",
+    "state_center_data",
+]
+
+# Script that sets up the experiments logging of the routing-level pipeline in Postgres.
+EXPERIMENTS_LOGGING_ROUTING_LEVEL_FILE = (
+    "src/prep/experiment/setup_experiments_logging_routing_level.sql"
+)
+
+
+def export_parquet_extracts(db_conn, schema_name, table_names, extract_folder_path):
+    """Save tables of the Postgres database as parquet extracts, one file per table.
+
+    Keyword arguments:
+        db_conn (object) -- connection to the Postgres database.
+        schema_name (str) -- schema of the tables to extract.
+        table_names (list[str]) -- name of the tables to extract.
+        extract_folder_path (str) -- folder where to save the <table_name>.parquet files.
+    """
+    os.makedirs(extract_folder_path, exist_ok=True)
+    for table_name in table_names:
+        extract_path = os.path.join(extract_folder_path, f"{table_name}.parquet")
+        logging.info(f"Extracting {schema_name}.{table_name} to {extract_path}.")
+        table = pd.read_sql_query(f"select * from {schema_name}.{table_name}", db_conn)
+
+        # DuckDB writes the parquet file, so no other parquet library is needed.
+        duckdb.from_df(table).write_parquet(extract_path)
+        logging.info(f"{len(table)} rows of {schema_name}.{table_name} extracted.")
+
+
+def load_parquet_extracts(db_conn, extract_folder_path, schema_name):
+    """Create a table in the embedded database from each parquet extract of a folder.
+    The existing tables with the same name are replaced.
+
+    Keyword arguments:
+        db_conn (object) -- connection to the embedded database.
+        extract_folder_path (str) -- folder with the <table_name>.parquet files.
+        schema_name (str) -- schema where to create the tables.
+
+    Raises:
+        ValueError -- if there are no parquet files in <extract_folder_path>.
+    """
+    extract_paths = sorted(glob.glob(os.path.join(extract_folder_path, "*.parquet")))
+    if not extract_paths:
+        logging.error(f"There are no parquet extracts in {extract_folder_path}.")
+        raise ValueError(f"There are no parquet extracts in {extract_folder_path}.")
+
+    create_schema(db_conn=db_conn, schema_name=schema_name)
+    for extract_path in extract_paths:
+        table_name = os.path.splitext(os.path.basename(extract_path))[0]
+        logging.info(f"Loading {extract_path} into {schema_name}.{table_name}.")
+        create_table_with_sql_query(
+            db_conn=db_conn,
+            schema_name=schema_name,
+            table_name=table_name,
+            table_content=f"select * from read_parquet('{extract_path}')",
+        )
+
+
+def create_experiments_logging_tables(db_conn, schema_name):
+    """Create the experiments logging tables of the routing-level pipeline in the embedded database.
+    The Postgres script is translated to DuckDB:
+        * there are no roles, so the role is not set.
+        * the serial evaluation ids are drawn from a sequence.
+        * the foreign keys to the evaluations are removed, since DuckDB can not alter a table that other
+          tables depend on (e.g., to index it), nor delete the evaluations that have metrics.
+        * the index on the primary key of the evaluations is removed, since the primary key is indexed.
+        * the other indexes are named.
+        * the numeric columns are doubles, since a numeric column of DuckDB only keeps 3 decimals.
+
+    Keyword arguments:
+        db_conn (object) -- connection to the embedded database.
+        schema_name (str) -- schema of the experiments logging tables.
+    """
+    with open(EXPERIMENTS_LOGGING_ROUTING_LEVEL_FILE) as f:
+        script = f.read()
+
+    script = re.sub(r"(?m)^set role .*$", "", script)
+    script = script.replace(
+        "create table if not exists :schema_name.evaluations",
+        "create sequence if not exists :schema_name.evaluation_id_seq;\n"
+        "create table if not exists :schema_name.evaluations",
+    )
+    script = script.replace(
+        "evaluation_id serial not null",
+        "evaluation_id bigint default nextval(':schema_name.evaluation_id_seq') not null",
+    )
+    script = re.sub(
+        r",\s*constraint \w+ foreign key\s*\(\w+\)\s*references [\w:.]+\s*\(\w+\)",
+        "",
+        script,
+    )
+    script = script.replace(
+        "create index on :schema_name.evaluations (evaluation_id);", ""
+    )
+    script = re.sub(
+        r"create index on :schema_name\.(\w+) \((\w+)\)",
+        r"create index if not exists \1_\2_idx on :schema_name.\1 (\2)",
+        script,
+    )
+    script = re.sub(r"\bnumeric\b", "double", script)
+    script = script.replace(":schema_name", schema_name)
+
+    # Remove the comments before splitting the script into statements.
+    script = re.sub(r"(?m)--.*$", "", script)
+    for statement in script.split(";"):
+        if statement.strip():
+            db_conn.execute(statement)
+    logging.info(f"Experiments logging tables created in {schema_name}.")
+
+
+@click.command()
+@click.option(
+    "--action",
+    prompt="Whether to export parquet extracts from Postgres or load them into the embedded database.",
+    type=click.Choice(["export", "load"]),
+    default="load",
+)
+@click.option(
+    "--extract_folder_path",
+    prompt="Folder of the parquet extracts.",
+    default="/mnt/data/projects/vibrant-routing/data/parquet_extracts/",
+)
+def main(action, extract_folder_path):
+    """Export the source data that the routing-level pipeline reads as parquet extracts, or load them
+    into the embedded database together with the experiments logging tables.
+    * Export with DB_BACKEND=postgres, so the tables are read from the shared server.
+    * Load with DB_BACKEND=duckdb, so the tables are written in DUCKDB_PATH.
+
+    Keyword arguments:
+        action (str) -- `export` or `load`.
+        extract_folder_path (str) -- folder of the parquet extracts.
+
+    Raises:
+        ValueError -- if the database backend does not match the action.
+    """
+    # Read yaml file containing database configuration for modeling.
+    with open(MODELING_CONFIG_FILE) as f:
+        modeling_config = yaml.load(f, Loader=yaml.FullLoader)
+
+    # Set logging configuration.
+    set_logging_configuration(log_folder_path=modeling_config["log_folder_path"])
+
+    expected_db_backend = "postgres" if action == "export" else "duckdb"
+    if DB_BACKEND != expected_db_backend:
+        logging.error(
+            f"The parquet extracts are {action}ed with DB_BACKEND={expected_db_backend}, not {DB_BACKEND}."
+        )
+        raise ValueError(
+            f"The parquet extracts are {action}ed with DB_BACKEND={expected_db_backend}, not {DB_BACKEND}."
+        )
+
+    db_conn = get_db_conn()
+    if action == "export":
+        export_parquet_extracts(
+            db_conn=db_conn,
+            schema_name=SOURCE_DATA_SCHEMA_NAME,
+            table_names=ROUTING_LEVEL_SOURCE_TABLES,
+            extract_folder_path=extract_folder_path,
+        )
+    else:
+        load_parquet_extracts(
+            db_conn=db_conn,
+            extract_folder_path=extract_folder_path,
+            schema_name=SOURCE_DATA_SCHEMA_NAME,
+        )
+        create_experiments_logging_tables(
+            db_conn=db_conn, schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -3,8 +3,17 @@ import random
 import logging
 import numpy as np
 import pandas as pd
+from scipy import stats
 from sklearn import metrics
 
+# Network metrics of the routing tables that are optimized, and whether higher values are better (1) or worse (-1).
+NETWORK_METRIC_DIRECTIONS = {
+    "answer_rate": 1,
+    "abandonment_rate": -1,
+    "flowout_rate": -1,
+    "calls_flowout_network_fraction": -1,
+}
+
 
 def false_positive_rate_at_threshold(y_true, y_predicted, threshold):
     """Calculate false positive rate at a specified threshold.
@@ -220,3 +229,99 @@ def check_if_metric_exists(metrics_to_evaluate, validation_metrics):
         logging.warning(
             f"The following metrics are invalid and thus not present in the list of metrics designed to evaluate the predictions: {invalid_metrics}."
         )
+
+
+def get_mean_confidence_interval(values, confidence_level=0.95):
+    """Compute the mean of a sample and the half-width of its Student's t confidence interval.
+
+    Keyword arguments:
+        values (1d array) -- values of the sample, e.g., a metric of each trial.
+        confidence_level (float, optional) -- confidence level of the interval. Defaults to 0.95.
+
+    Returns:
+        (mean, half_width) (tuple) -- mean of the sample and half-width of its confidence interval.
+                                      The half-width is NaN if there are less than 2 values.
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.nan, np.nan
+    if len(values) == 1:
+        return values.mean(), np.nan
+
+    half_width = (
+        stats.t.ppf((1 + confidence_level) / 2, df=len(values) - 1)
+        * values.std(ddof=1)
+        / np.sqrt(len(values))
+    )
+    return values.mean(), half_width
+
+
+def get_paired_differences(
+    metrics,
+    metric_columns,
+    baseline_label,
+    pair_column,
+    label_column,
+    confidence_level=0.95,
+):
+    """Compare the metrics of several configurations evaluated in pairs, e.g., routing tables simulated
+    with the same random numbers. The difference of each metric with the baseline is computed per pair,
+    so the noise that the configurations share cancels out of the confidence interval.
+
+    Keyword arguments:
+        metrics (pd.DataFrame) -- metrics of each configuration, one row per configuration and pair.
+        metric_columns (list[str]) -- columns of the metrics to compare.
+        baseline_label (str) -- label of the configuration the others are compared with.
+        pair_column (str) -- column that identifies the pairs, e.g., trial_number.
+        label_column (str) -- column that identifies the configurations, e.g., routing_table_path.
+        confidence_level (float, optional) -- confidence level of the intervals. Defaults to 0.95.
+
+    Returns:
+        paired differences (pd.DataFrame) -- one row per configuration other than the baseline and metric, with
+                                             the number of pairs, the mean of the metric for the baseline and the
+                                             configuration, and the mean, standard deviation and confidence
+                                             interval of the paired differences.
+
+    Raises:
+        ValueError -- if the baseline is not one of the configurations of the metrics.
+    """
+    if baseline_label not in set(metrics[label_column]):
+        logging.error(
+            f"The baseline {baseline_label} is not one of the configurations in {label_column}."
+        )
+        raise ValueError(
+            f"The baseline {baseline_label} is not one of the configurations in {label_column}."
+        )
+
+    metrics = metrics.pivot_table(
+        index=pair_column, columns=label_column, values=metric_columns, aggfunc="mean"
+    )
+
+    paired_differences = []
+    for label in metrics.columns.get_level_values(label_column).unique():
+        if label == baseline_label:
+            continue
+        for metric in metric_columns:
+            pairs = metrics[metric][[baseline_label, label]].astype(float).dropna()
+            differences = pairs[label] - pairs[baseline_label]
+            pair_count = len(differences)
+            std_difference = differences.std(ddof=1) if pair_count > 1 else np.nan
+            mean_difference, half_width = get_mean_confidence_interval(
+                values=differences, confidence_level=confidence_level
+            )
+            paired_differences.append(
+                {
+                    label_column: label,
+                    "metric": metric,
+                    "pair_count": pair_count,
+                    "baseline_mean": pairs[baseline_label].mean(),
+                    "mean": pairs[label].mean(),
+                    "mean_difference": mean_difference,
+                    "std_difference": std_difference,
+                    "ci_lower": mean_difference - half_width,
+                    "ci_upper": mean_difference + half_width,
+                    "confidence_level": confidence_level,
+                }
+            )
+    return pd.DataFrame(paired_differences)
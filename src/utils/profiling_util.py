@@ -0,0 +1,150 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Percentiles of the latency reported for each phase.
+PROFILE_PERCENTILES = [50, 95, 99]
+
+# Prefix of the phases that time the SQL statements, followed by the statement type (select, insert, etc.).
+SQL_PHASE_PREFIX = "sql"
+
+
+def get_statement_type(statement):
+    """Get the type of a SQL statement from its first keyword.
+
+    Keyword arguments:
+        statement (str) -- SQL statement.
+
+    Returns:
+        statement type (str) -- first keyword of the statement in lower case, e.g., "select" or "insert".
+    """
+    keywords = statement.lstrip(" \t\n(").split(None, 1)
+    return keywords[0].lower() if keywords else "unknown"
+
+
+class SimulationProfiler:
+    def __init__(self, enabled=True):
+        """Records the wall time of each phase of the simulation and of each SQL statement type.
+        * `phase` times a block of code.
+        * `listen_to_sql` times every statement run by any SQLAlchemy engine until `stop_listening_to_sql`.
+        * A disabled profiler does nothing, so the code can be profiled unconditionally.
+
+        Keyword arguments:
+            enabled (bool, optional) -- whether to record the wall times. Defaults to True.
+        """
+        self.enabled = enabled
+
+        # Wall times (in seconds) of each call, by phase.
+        self.wall_times = {}
+        self.is_listening_to_sql = False
+
+    @contextmanager
+    def phase(self, phase_name):
+        """Time the block of code run within the context.
+
+        Keyword arguments:
+            phase_name (str) -- name of the phase.
+        """
+        if not self.enabled:
+            yield
+            return
+
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_wall_time(
+                phase_name=phase_name, wall_time=time.perf_counter() - start_time
+            )
+
+    def add_wall_time(self, phase_name, wall_time):
+        """Record the wall time of a call of a phase.
+
+        Keyword arguments:
+            phase_name (str) -- name of the phase.
+            wall_time (float) -- wall time of the call (in seconds).
+        """
+        self.wall_times.setdefault(phase_name, []).append(wall_time)
+
+    def before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        """Keep the start time of a SQL statement (SQLAlchemy event)."""
+        conn.info.setdefault("profiler_start_times", []).append(time.perf_counter())
+
+    def after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        """Record the wall time of a SQL statement by statement type (SQLAlchemy event)."""
+        start_time = conn.info["profiler_start_times"].pop()
+        self.add_wall_time(
+            phase_name=f"{SQL_PHASE_PREFIX}:{get_statement_type(statement)}",
+            wall_time=time.perf_counter() - start_time,
+        )
+
+    def listen_to_sql(self):
+        """Start timing the SQL statements of all the SQLAlchemy engines.
+        The statements copied in bulk with `pg_copy_to` do not go through SQLAlchemy and are not timed.
+        """
+        if not self.enabled or self.is_listening_to_sql:
+            return
+        event.listen(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", self.after_cursor_execute)
+        self.is_listening_to_sql = True
+
+    def stop_listening_to_sql(self):
+        """Stop timing the SQL statements."""
+        if not self.is_listening_to_sql:
+            return
+        event.remove(Engine, "before_cursor_execute", self.before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", self.after_cursor_execute)
+        self.is_listening_to_sql = False
+
+    def get_summary(self):
+        """Summarize the wall times of each phase.
+
+        Returns:
+            summary (pd.DataFrame) -- one row per phase with the number of calls, the total wall time (in seconds),
+                                      and the mean and percentiles of the latency (in milliseconds).
+        """
+        summary = []
+        for phase_name, wall_times in sorted(self.wall_times.items()):
+            wall_times = np.array(wall_times)
+            phase_summary = {
+                "phase": phase_name,
+                "call_count": len(wall_times),
+                "total_time_sec": wall_times.sum(),
+                "mean_time_ms": wall_times.mean() * 1000,
+            }
+            for percentile, value in zip(
+                PROFILE_PERCENTILES,
+                np.percentile(wall_times, PROFILE_PERCENTILES) * 1000,
+            ):
+                phase_summary[f"p{percentile}_time_ms"] = value
+            summary.append(phase_summary)
+        return pd.DataFrame(
+            summary,
+            columns=["phase", "call_count", "total_time_sec", "mean_time_ms"]
+            + [f"p{percentile}_time_ms" for percentile in PROFILE_PERCENTILES],
+        )
+
+    def save_summary(self, profile_path):
+        """Save the summary of the wall times in a JSON file.
+
+        Keyword arguments:
+            profile_path (str) -- path of the JSON file.
+        """
+        with open(profile_path, "w") as f:
+            json.dump(self.get_summary().to_dict(orient="records"), f, indent=4)
+        logging.info(f"Simulation profile saved in {profile_path}.")
+
+    def log_summary(self):
+        """Log the summary of the wall times, sorted by total wall time."""
+        summary = self.get_summary().sort_values("total_time_sec", ascending=False)
+        logging.info(f"Simulation profile:\n{summary.to_string(index=False)}")
@@ -0,0 +1,117 @@
+import hashlib
+import logging
+
+import numpy as np
+
+# Purposes of the random draws of the simulator. Each purpose has its own stream of random numbers.
+RANDOM_DRAW_PURPOSES = {"pick_up": 0, "abandonment": 1}
+
+
+def get_random_seed(random_seed=None):
+    """Get the random seed of a simulation.
+
+    Keyword arguments:
+        random_seed (int, optional) -- random seed set by the user. Defaults to NoneType, i.e., a new random seed
+                                       is drawn from the entropy of the operating system.
+
+    Returns:
+        random_seed (int) -- random seed of the simulation. It fits in a bigint column of the database.
+    """
+    if random_seed is not None:
+        return int(random_seed)
+    return int(np.random.SeedSequence().generate_state(1, dtype=np.uint32)[0])
+
+
+def get_trial_random_seeds(number_of_trials, random_seed=None):
+    """Get the random seed of each trial of an experiment.
+
+    Keyword arguments:
+        number_of_trials (int) -- number of trials of the experiment.
+        random_seed (int, optional) -- random seed of the experiment. If set, the random seeds of the trials are
+                                       derived from it, so an experiment can be repeated exactly.
+                                       Defaults to NoneType, i.e., a new random seed for each trial.
+
+    Returns:
+        random_seeds (list[int]) -- random seed of each trial.
+    """
+    if random_seed is None:
+        return [get_random_seed() for _ in range(number_of_trials)]
+    # The first states of a seed sequence do not depend on how many states are generated, so the
+    # random seeds of the first trials do not change when more trials are run.
+    seed_sequence = np.random.SeedSequence(int(random_seed))
+    return [
+        int(trial_random_seed)
+        for trial_random_seed in seed_sequence.generate_state(
+            number_of_trials, dtype=np.uint32
+        )
+    ]
+
+
+def get_call_key_hash(call_key):
+    """Hash a call key into a 64-bit integer that is stable across processes.
+    The built-in `hash` is salted per process for strings, so it can not be used to key the random streams.
+
+    Keyword arguments:
+        call_key (str) -- key of the call.
+
+    Returns:
+        call key hash (int) -- 64-bit hash of the call key.
+    """
+    return int.from_bytes(
+        hashlib.blake2b(str(call_key).encode(), digest_size=8).digest(), "little"
+    )
+
+
+def get_random_generator(random_seed, call_key, attempt_number, purpose):
+    """Get the random number generator of a draw of the simulator.
+    The generator is derived from `SeedSequence(random_seed)` and keyed by the call, the attempt number and the
+    purpose of the draw, so the outcome of a routing attempt does not depend on the order in which the calls
+    are processed (batches, workers, shards).
+
+    Keyword arguments:
+        random_seed (int) -- random seed of the simulation.
+        call_key (str) -- key of the call.
+        attempt_number (int) -- number of times the call has already been routed.
+        purpose (str) -- purpose of the draw. See <RANDOM_DRAW_PURPOSES>.
+
+    Raises:
+        ValueError -- if the purpose of the draw is unknown.
+
+    Returns:
+        generator (np.random.Generator) -- random number generator of the draw.
+    """
+    if purpose not in RANDOM_DRAW_PURPOSES:
+        logging.error(f"Unknown purpose of random draw: {purpose}.")
+        raise ValueError(f"Unknown purpose of random draw: {purpose}.")
+
+    seed_sequence = np.random.SeedSequence(
+        entropy=random_seed,
+        spawn_key=(
+            get_call_key_hash(call_key),
+            int(attempt_number),
+            RANDOM_DRAW_PURPOSES[purpose],
+        ),
+    )
+    return np.random.Generator(np.random.PCG64(seed_sequence))
+
+
+def draw_bernoulli(random_seed, call_key, attempt_number, purpose, probability):
+    """Flip a biased coin with the random stream of a draw of the simulator.
+
+    Keyword arguments:
+        random_seed (int) -- random seed of the simulation.
+        call_key (str) -- key of the call.
+        attempt_number (int) -- number of times the call has already been routed.
+        purpose (str) -- purpose of the draw. See <RANDOM_DRAW_PURPOSES>.
+        probability (float) -- probability of success.
+
+    Returns:
+        outcome (int) -- 1 on success, 0 otherwise.
+    """
+    generator = get_random_generator(
+        random_seed=random_seed,
+        call_key=call_key,
+        attempt_number=attempt_number,
+        purpose=purpose,
+    )
+    return int(generator.binomial(n=1, p=probability))
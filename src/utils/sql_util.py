@@ -1,10 +1,13 @@
 from datetime import datetime
+from functools import lru_cache
 import logging
 import pandas as pd
 import ohio.ext.pandas
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import bindparam, create_engine, event, text
 from config.project_constants import (
+    DB_BACKEND,
+    DUCKDB_PATH,
     EXPERIMENT_SCHEMA_NAME,
     EXPERIMENT_SCHEMA_NAME_ROUTING,
     ROLE_NAME,
@@ -16,30 +19,71 @@ from config.project_constants import (
 from src.utils.util import create_hash
 
 
+@lru_cache(maxsize=None)
+def get_duckdb_engine(database_path):
+    """Get the engine of an embedded DuckDB database. The engine is shared by the whole process,
+    because a DuckDB database file can only be opened once for writing.
+
+    Keyword arguments:
+        database_path (str) -- path of the DuckDB database file.
+
+    Returns:
+        engine (object) -- database engine.
+    """
+    database_folder_path = os.path.dirname(database_path)
+    if database_folder_path:
+        os.makedirs(database_folder_path, exist_ok=True)
+    engine = create_engine(f"duckdb:///{database_path}")
+
+    @event.listens_for(engine, "connect")
+    def fold_identifiers_to_lowercase(dbapi_connection, connection_record):
+        # Postgres folds the unquoted identifiers to lowercase, so the queries of the configuration name
+        # their columns, e.g., the features the model was trained with, the same way in both databases.
+        cursor = dbapi_connection.cursor()
+        cursor.execute("set preserve_identifier_case = false")
+        cursor.close()
+
+    return engine
+
+
 def get_db_conn(return_engine=False):
     """Get credentials from environment variables.
+    * With the `postgres` backend, connect to the shared Postgres server.
+    * With the `duckdb` backend, connect to the embedded database in DUCKDB_PATH.
+
+    Raises:
+        ValueError -- if the DB_BACKEND environment variable is not recognized.
 
     Returns:
         db_conn (object) -- database connection.
     """
+    if DB_BACKEND == "duckdb":
+        engine = get_duckdb_engine(database_path=DUCKDB_PATH)
+    elif DB_BACKEND == "postgres":
+        user = os.getenv("PGUSER")
+        password = os.getenv("PGPASSWORD")
+        host = os.getenv("PGHOST")
+        port = os.getenv("PGPORT")
+        database = os.getenv("PGDATABASE")
+
+        # Configure connection to postgres
+        engine = create_engine(
+            "postgresql://{}:{}@{}:{}/{}".format(user, password, host, port, database)
+        )
+    else:
+        logging.error(
+            f"`{DB_BACKEND}` database backend is not recognized. Should be `postgres` or `duckdb`."
+        )
+        raise ValueError(
+            f"`{DB_BACKEND}` database backend is not recognized. Should be `postgres` or `duckdb`."
+        )
 
-    user = os.getenv("PGUSER")
-    password = os.getenv("PGPASSWORD")
-    host = os.getenv("PGHOST")
-    port = os.getenv("PGPORT")
-    database = os.getenv("PGDATABASE")
-
-    # Configure connection to postgres
-    engine = create_engine(
-        "postgresql://{}:{}@{}:{}/{}".format(user, password, host, port, database)
-    )
+    if return_engine:
+        return engine
 
     # Open a connection
     db_conn = engine.connect()
 
-    if return_engine:
-        return engine
-
     return db_conn
 
 
@@ -50,6 +94,9 @@ def set_role(db_conn, role_name="vibrant-routing-role"):
         db_conn (object) -- datebase connection.
         role_name (str) -- role name. It defaults to "vibrant-routing-role".
     """
+    # The embedded database has no roles.
+    if DB_BACKEND != "postgres":
+        return
 
     # Query to run.
     query = f"""
@@ -114,6 +161,9 @@ def grant_permission(db_conn, schema_name, table_name, role_name):
         table_name (str) -- table name.
         role_name (str) -- role name.
     """
+    # The embedded database has no roles.
+    if DB_BACKEND != "postgres":
+        return
 
     # Query to run.
     query = f"""
@@ -140,6 +190,10 @@ def create_index(db_conn, schema_name, table_name, column_name):
         table_name (str) -- table name.
         column_name (str) -- column name to create the index on.
     """
+    # The embedded database filters the tables with their zone maps instead. Its indexes would only slow
+    # down the writes, and DuckDB 0.8 can hang serializing them once rows were deleted from the table.
+    if DB_BACKEND != "postgres":
+        return
 
     # Query to run.
     query = f"""
@@ -157,6 +211,37 @@ def create_index(db_conn, schema_name, table_name, column_name):
         )
 
 
+def copy_data_to_table(data, db_conn, schema_name, table_name):
+    """Append the rows of a data frame to <schema_name>.<table_name> in bulk.
+    * With the `postgres` backend, the rows are copied with the method pg_copy_to from ohio.
+    * With the `duckdb` backend, the data frame is scanned in place by an insert statement.
+
+    Keyword arguments:
+        data (pd.DataFrame) -- rows whose columns are a subset of the table's columns.
+        db_conn (object) -- database connection.
+        schema_name (str) -- name of schema where table is located.
+        table_name (str) -- name of table to append the rows to.
+    """
+    if DB_BACKEND != "duckdb":
+        data.pg_copy_to(
+            name=table_name,
+            schema=schema_name,
+            con=db_conn,
+            if_exists="append",
+            index=False,
+        )
+        return
+
+    column_names = ", ".join(data.columns)
+    db_conn.connection.register("data_to_copy", data)
+    try:
+        db_conn.execute(
+            f"insert into {schema_name}.{table_name} ({column_names}) select {column_names} from data_to_copy"
+        )
+    finally:
+        db_conn.connection.unregister("data_to_copy")
+
+
 def get_statedata(db_conn, area_code):
     """Get information about the state given an area code.
 
@@ -540,16 +625,15 @@ def add_feature_importance_to_db(feature_rankings):
     """
     # Loop over all the evaluation metrics.
     try:
-        # Use the method pg_copy_to from ohio to copy data in bulk.
+        # Copy the data in bulk.
         engine = get_db_conn(return_engine=True)
         with engine.connect() as conn:
             with conn.begin():
-                feature_rankings.pg_copy_to(
-                    name="feature_importance",
-                    schema=EXPERIMENT_SCHEMA_NAME,
-                    con=conn,
-                    if_exists="append",
-                    index=False,
+                copy_data_to_table(
+                    data=feature_rankings,
+                    db_conn=conn,
+                    schema_name=EXPERIMENT_SCHEMA_NAME,
+                    table_name="feature_importance",
                 )
         logging.debug(
             f"Entry successfully added to {EXPERIMENT_SCHEMA_NAME}.feature_importance!"
@@ -596,16 +680,15 @@ def add_predictions_to_db(
     )
 
     try:
-        # Use the method pg_copy_to from ohio to copy data in bulk.
+        # Copy the data in bulk.
         engine = get_db_conn(return_engine=True)
         with engine.connect() as conn:
             with conn.begin():
-                results.pg_copy_to(
-                    name="predictions",
-                    schema=EXPERIMENT_SCHEMA_NAME,
-                    con=conn,
-                    if_exists="append",
-                    index=False,
+                copy_data_to_table(
+                    data=results,
+                    db_conn=conn,
+                    schema_name=EXPERIMENT_SCHEMA_NAME,
+                    table_name="predictions",
                 )
         logging.debug(
             f"Entry successfully added to {EXPERIMENT_SCHEMA_NAME}.predictions!"
@@ -1111,6 +1194,256 @@ def get_caller_info(db_conn, call_key):
         raise ValueError(f"Failed to get caller info!")
 
 
+def get_all_caller_info(db_conn):
+    """Get information about all the callers at once.
+    It returns the same information as `get_caller_info` for every call in the <active_calls_in_queue> table.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+
+    Returns:
+        caller_info (dict) -- dictionary whose keys are the call keys and whose values are dictionaries
+                              with details about the caller like state, timezone, etc.
+    """
+    query = f"""
+        select
+            call_key,
+            caller_is_cell_phone,
+            caller_state_abbrev,
+            caller_time_zone
+        from {ROUTING_LEVEL_SCHEMA_NAME}.active_calls_in_queue aciq
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        caller_info = pd.read_sql_query(query, db_conn)
+        caller_info = caller_info.drop_duplicates(subset=["call_key"], keep="first")
+        caller_info = caller_info.set_index(keys="call_key").to_dict(orient="index")
+        return caller_info
+    except:
+        logging.error(f"Failed to get all caller info!")
+        raise ValueError(f"Failed to get all caller info!")
+
+
+def get_all_center_info(db_conn):
+    """Get information about all the centers at once.
+    It returns the same information as `get_center_info` for every center in the <center_lookup> table.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+
+    Returns:
+        center infomation (dict) -- dictionary whose keys are (center_key, termination_number) pairs and whose
+                                    values are dictionaries with details about the center like timezone, state, etc.
+    """
+    query = f"""
+        select
+            center_key,
+            termination_number,
+            center_state_abbrev,
+            center_uses_dst,
+            center_time_zone
+        from {SOURCE_DATA_SCHEMA_NAME}.center_lookup
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        center_info = pd.read_sql_query(query, db_conn)
+        center_info = center_info.drop_duplicates(
+            subset=["center_key", "termination_number"], keep="first"
+        )
+        center_info = center_info.set_index(
+            keys=["center_key", "termination_number"]
+        ).to_dict(orient="index")
+        return center_info
+    except:
+        logging.error(f"Failed to get all center info!")
+        raise ValueError(f"Failed to get all center info!")
+
+
+def get_all_number_nspl_in_state(db_conn):
+    """Get the computed number of local (nspl) call centers in every state.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+
+    Returns:
+        num_nspl_in_state (dict) -- dictionary with the state abbreviation as keys and
+                                    the number of nspl call centers in the state as values.
+    """
+    query = f"""
+        select
+            state_abbrev,
+            num_nspl_centers_in_center_state
+        from {SOURCE_DATA_SCHEMA_NAME}.state_center_data scd
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        num_nspl_in_state = pd.read_sql_query(query, db_conn)
+        num_nspl_in_state = num_nspl_in_state.drop_duplicates(
+            subset=["state_abbrev"], keep="first"
+        )
+        return dict(
+            zip(
+                num_nspl_in_state["state_abbrev"],
+                num_nspl_in_state["num_nspl_centers_in_center_state"],
+            )
+        )
+    except:
+        logging.error(f"Failed to get the number of NSPL call centers in all states!")
+        raise ValueError(
+            f"Failed to get the number of NSPL call centers in all states!"
+        )
+
+
+def get_all_wait_times_from_center(db_conn):
+    """Get the waiting time of every combination of center_key and termination_number.
+    Combinations that are not returned should use the default waiting time of `get_wait_time_from_center`.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+
+    Returns:
+        waiting times (dict) -- dictionary whose keys are (center_key, termination_number) pairs
+                                and whose values are the anticipated waiting times in minutes.
+    """
+    query = f"""
+        select
+            center_key,
+            termination_number,
+            wait_time
+        from {ROUTING_LEVEL_SCHEMA_NAME}.center_waiting_times
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        wait_times = pd.read_sql_query(query, db_conn)
+        return {
+            (center_key, int(termination_number)): wait_time
+            for center_key, termination_number, wait_time in wait_times.itertuples(
+                index=False
+            )
+        }
+    except:
+        logging.error(f"Failed to get the waiting times of the centers!")
+        raise ValueError(f"Failed to get the waiting times of the centers!")
+
+
+def get_historical_routing_attempts(
+    db_conn, schema_name, table_name, start_datetime_est, columns
+):
+    """Get the historical routing attempts that arrived at a center after <start_datetime_est>.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        schema_name (str) -- name of schema where table is located.
+        table_name (str) -- name of table with the historical routing attempts.
+        start_datetime_est (Union(str, datetime.datetime)) -- earliest arrival datetime to include.
+        columns (list[str]) -- columns to select.
+
+    Returns:
+        historical routing attempts (pd.DataFrame) -- routing attempts ordered by arrival datetime.
+    """
+    query = f"""
+        select {", ".join(columns)}
+        from {schema_name}.{table_name}
+        where
+            arrived_datetime_est >= '{start_datetime_est}'
+            and center_key is not null
+            and termination_number is not null
+        order by arrived_datetime_est asc
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        return pd.read_sql_query(query, db_conn)
+    except:
+        logging.error(f"Failed to get the historical routing attempts!")
+        raise ValueError(f"Failed to get the historical routing attempts!")
+
+
+def get_simulated_routing_attempts(db_conn, schema_name, table_name):
+    """Get all the routing attempts of a simulation.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        schema_name (str) -- name of schema where table is located.
+        table_name (str) -- name of table with the simulated routing attempts.
+
+    Returns:
+        simulated routing attempts (pd.DataFrame) -- routing attempts of the simulation.
+    """
+    query = f"select * from {schema_name}.{table_name}"
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        return pd.read_sql_query(query, db_conn)
+    except:
+        logging.error(f"Failed to get the simulated routing attempts!")
+        raise ValueError(f"Failed to get the simulated routing attempts!")
+
+
+def add_routing_attempts_to_db(
+    routing_attempts,
+    schema_name,
+    table_name,
+    call_keys_to_replace=None,
+    delete_all_rows=False,
+):
+    """Add the routing attempts to <schema_name>.<table_name> in bulk and in a single transaction.
+
+    Keyword arguments:
+        routing_attempts (pd.DataFrame) -- routing attempts whose columns are a subset of the table's columns.
+        schema_name (str) -- name of schema where table is located.
+        table_name (str) -- name of table to append the routing attempts to.
+        call_keys_to_replace (list, optional) -- call keys whose routing attempts are deleted from the table,
+                                                 in the same transaction, before adding the <routing_attempts>.
+                                                 Defaults to NoneType.
+        delete_all_rows (bool, optional) -- whether to delete all the rows of the table, in the same
+                                            transaction, before adding the <routing_attempts>. Defaults to False.
+    """
+    # Use nullable data types so integer columns with missing values are copied as integers.
+    routing_attempts = routing_attempts.convert_dtypes()
+
+    try:
+        # Copy the data in bulk.
+        engine = get_db_conn(return_engine=True)
+        with engine.connect() as conn:
+            with conn.begin():
+                if ROLE_NAME is not None:
+                    set_role(db_conn=conn, role_name=ROLE_NAME)
+                if delete_all_rows:
+                    conn.execute(f"delete from {schema_name}.{table_name}")
+                elif call_keys_to_replace:
+                    # The call keys are bound as parameters instead of being formatted into the query.
+                    conn.execute(
+                        text(
+                            f"delete from {schema_name}.{table_name} where call_key in :call_keys"
+                        ).bindparams(bindparam("call_keys", expanding=True)),
+                        {
+                            "call_keys": [
+                                str(call_key) for call_key in call_keys_to_replace
+                            ]
+                        },
+                    )
+                if not routing_attempts.empty:
+                    copy_data_to_table(
+                        data=routing_attempts,
+                        db_conn=conn,
+                        schema_name=schema_name,
+                        table_name=table_name,
+                    )
+        logging.debug(
+            f"{len(routing_attempts)} routing attempts successfully added to {schema_name}.{table_name}!"
+        )
+    except:
+        logging.error(f"Failed to add routing attempts to {schema_name}.{table_name}!")
+        raise ValueError(
+            f"Failed to add routing attempts to {schema_name}.{table_name}!"
+        )
+
+
 class ModifyDBTable(object):
     def __init__(
         self,
@@ -1148,8 +1481,8 @@ class ModifyDBTable(object):
         self.schema_name = schema_name
         self.table_name = table_name
 
-        # Set role to role_name.
-        if role_name is not None:
+        # Set role to role_name. There is no connection when the rows are only kept in memory.
+        if role_name is not None and db_conn is not None:
             set_role(db_conn=self.db_conn, role_name=role_name)
 
     def insert_data_into_table(self, data):
@@ -1554,6 +1887,208 @@ def add_routing_evaluation_entry_to_db(
         )
 
 
+def add_simulation_profile_to_db(evaluation_id, simulation_profile):
+    """Add the profile of the simulation of an evaluation to the {EXPERIMENT_SCHEMA_NAME_ROUTING}.simulation_profiles table.
+
+    Keyword arguments:
+        evaluation_id (int) -- identifier of the evaluation of interest.
+        simulation_profile (pd.DataFrame) -- wall time, number of calls and latency percentiles of each phase
+                                             of the simulation (see `SimulationProfiler.get_summary`).
+    """
+    simulation_profile = simulation_profile.copy()
+    simulation_profile.insert(0, "evaluation_id", evaluation_id)
+    try:
+        # Copy the data in bulk.
+        engine = get_db_conn(return_engine=True)
+        with engine.connect() as conn:
+            with conn.begin():
+                if ROLE_NAME is not None:
+                    set_role(db_conn=conn, role_name=ROLE_NAME)
+                copy_data_to_table(
+                    data=simulation_profile,
+                    db_conn=conn,
+                    schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING,
+                    table_name="simulation_profiles",
+                )
+        logging.debug(
+            f"Simulation profile of evaluation {evaluation_id} successfully added to {EXPERIMENT_SCHEMA_NAME_ROUTING}.simulation_profiles!"
+        )
+    except:
+        logging.error(
+            f"Failed to add the simulation profile of evaluation {evaluation_id} to {EXPERIMENT_SCHEMA_NAME_ROUTING}.simulation_profiles!"
+        )
+
+
+def is_evaluation_in_db(db_conn, evaluation_id):
+    """Check whether an evaluation and its network metrics are in the {EXPERIMENT_SCHEMA_NAME_ROUTING} schema.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_id (int) -- identifier of the evaluation of interest.
+
+    Returns:
+        is evaluation in db (bool) -- whether the evaluation has network metrics.
+    """
+    query = f"""
+        select count(*)
+        from {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations
+        join {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network using(evaluation_id)
+        where evaluation_id = {evaluation_id};
+        """
+    try:
+        return db_conn.execute(query).fetchone()[0] > 0
+    except:
+        logging.error(f"Failed to check whether evaluation {evaluation_id} exists!")
+        return False
+
+
+def get_last_evaluation_id(db_conn):
+    """Get the identifier of the last evaluation added to the {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations table.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+
+    Returns:
+        evaluation_id (int) -- identifier of the last evaluation, or 0 if there are no evaluations.
+    """
+    query = f"select coalesce(max(evaluation_id), 0) from {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations;"
+    return db_conn.execute(query).fetchone()[0]
+
+
+def add_stopping_reason_to_db(db_conn, evaluation_ids, stopping_reason):
+    """Record why the trials of an experiment stopped in the {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations table.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of the trials of the experiment.
+        stopping_reason (str) -- reason why no more trials were run, e.g., "target_half_width".
+    """
+    if len(evaluation_ids) == 0:
+        return
+
+    query = f"""
+        update {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations
+        set stopping_reason = '{stopping_reason}'
+        where evaluation_id in ({", ".join(str(evaluation_id) for evaluation_id in evaluation_ids)});
+        """
+    try:
+        db_conn.execute(query)
+        logging.debug(
+            f"Stopping reason {stopping_reason} successfully added to {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations!"
+        )
+    except:
+        logging.error(
+            f"Failed to add the stopping reason {stopping_reason} to {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations!"
+        )
+
+
+def get_network_metrics_from_db(db_conn, evaluation_ids, instance="simulation"):
+    """Get the network metrics of several evaluations along with their routing table and trial number.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        evaluation_ids (list[int]) -- identifiers of the evaluations of interest.
+        instance (str, optional) -- instance of the metrics, either "simulation" or "real". Defaults to "simulation".
+
+    Raises:
+        ValueError -- if the metrics can not be retrieved.
+
+    Returns:
+        network metrics (pd.DataFrame) -- rows of {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network with the columns
+                                          routing_table_path, trial_number and random_seed of the evaluation.
+    """
+    query = f"""
+        select e.routing_table_path, e.trial_number, e.random_seed, mn.*
+        from {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network mn
+        left join {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations e
+            using(evaluation_id)
+        where
+            mn.evaluation_id in ({", ".join(str(evaluation_id) for evaluation_id in evaluation_ids)})
+            and mn.instance = '{instance}'
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        return pd.read_sql_query(query, db_conn)
+    except:
+        logging.error(
+            f"Failed to get the network metrics of evaluations {evaluation_ids}!"
+        )
+        raise ValueError(
+            f"Failed to get the network metrics of evaluations {evaluation_ids}!"
+        )
+
+
+def get_model_network_metrics_from_db(db_conn, model_path, instance="simulation"):
+    """Get the network metrics of all the evaluations of a model along with their routing table and active calls.
+
+    Keyword arguments:
+        db_conn (object) -- database connection.
+        model_path (str) -- path to the model of the evaluations of interest.
+        instance (str, optional) -- instance of the metrics, either "simulation" or "real". Defaults to "simulation".
+
+    Raises:
+        ValueError -- if the metrics can not be retrieved.
+
+    Returns:
+        network metrics (pd.DataFrame) -- rows of {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network with the columns
+                                          routing_table_path, trial_number, active_calls_start_datetime_est and
+                                          active_calls_end_datetime_est of the evaluation.
+    """
+    query = f"""
+        select
+            e.routing_table_path,
+            e.trial_number,
+            e.active_calls_start_datetime_est,
+            e.active_calls_end_datetime_est,
+            mn.*
+        from {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network mn
+        join {EXPERIMENT_SCHEMA_NAME_ROUTING}.evaluations e
+            using(evaluation_id)
+        where
+            e.model_path = '{model_path}'
+            and mn.instance = '{instance}'
+    """
+
+    logging.debug(f"This is the query:\n{query}")
+    try:
+        return pd.read_sql_query(query, db_conn)
+    except:
+        logging.error(f"Failed to get the network metrics of the model {model_path}!")
+        raise ValueError(
+            f"Failed to get the network metrics of the model {model_path}!"
+        )
+
+
+def add_paired_comparison_to_db(paired_comparison):
+    """Add the paired comparison of several routing tables to the {EXPERIMENT_SCHEMA_NAME_ROUTING}.paired_comparisons table.
+
+    Keyword arguments:
+        paired_comparison (pd.DataFrame) -- paired differences of the metrics of each routing table with the baseline
+                                            routing table (see `compare_routing_tables`).
+    """
+    try:
+        # Copy the data in bulk.
+        engine = get_db_conn(return_engine=True)
+        with engine.connect() as conn:
+            with conn.begin():
+                if ROLE_NAME is not None:
+                    set_role(db_conn=conn, role_name=ROLE_NAME)
+                copy_data_to_table(
+                    data=paired_comparison,
+                    db_conn=conn,
+                    schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING,
+                    table_name="paired_comparisons",
+                )
+        logging.debug(
+            f"Paired comparison successfully added to {EXPERIMENT_SCHEMA_NAME_ROUTING}.paired_comparisons!"
+        )
+    except:
+        logging.error(
+            f"Failed to add the paired comparison to {EXPERIMENT_SCHEMA_NAME_ROUTING}.paired_comparisons!"
+        )
+
+
 def main():
     """Function that exemplifies the usage of some of the functions."""
     import yaml
@@ -46,6 +46,20 @@ def create_hash(dict_to_hash):
     return md5(str(str_to_hash).encode("utf-8")).hexdigest()
 
 
+def create_file_hash(file_path, chunk_size=1 << 20):
+    """Calculate md5sum hash from the content of a file.
+
+    Keyword arguments:
+        file_path (str) -- path of the file to hash.
+        chunk_size (int, optional) -- number of bytes read at once. Defaults to 1 MiB.
+    """
+    file_hash = md5()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
 def get_feature_groups_dict(feature_config):
     """Get the feature groups and feature names from the config file.
 
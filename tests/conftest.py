@@ -0,0 +1,423 @@
+"""Fixtures shared by the tests: the configuration of the project and a small synthetic routing scenario."""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+import sqlalchemy
+import yaml
+from packaging.version import Version
+
+from config.project_constants import (
+    EXPERIMENT_SCHEMA_NAME_ROUTING,
+    MODELING_CONFIG_FILE,
+    ROLE_NAME,
+    SOURCE_DATA_ROUTING_ATTEMTPS_TABLE_NAME,
+    SOURCE_DATA_SCHEMA_NAME,
+)
+from src.pipeline.routing.feature_state import RoutingFeatureState
+from src.pipeline.routing.populate_simulation_table import (
+    get_abandonment_survival_table,
+)
+from src.pipeline.routing.routing_table import (
+    CENTER_KEY_COLUMNS,
+    TERMINATION_NUMBER_COLUMNS,
+    CompiledRoutingTable,
+)
+from src.utils import sql_util
+from src.utils.local_db_util import (
+    create_experiments_logging_tables,
+    load_parquet_extracts,
+)
+
+# Start of the simulation window of the synthetic scenario. The historical routing attempts arrive
+# during the <HISTORY_MINUTES> before it and the active calls are initiated during the <SIMULATION_MINUTES> after it.
+SIMULATION_START_DATETIME = datetime(2022, 5, 26)
+HISTORY_MINUTES = 150
+SIMULATION_MINUTES = 60
+
+# Centers of the synthetic scenario: (center_key, termination_number, state, time zone, whether it is ACD).
+CENTERS = [
+    ("CA123530", 5302315514, "CA", "America/Los_Angeles", 1),
+    ("IL460000", 6304823616, "IL", "America/Chicago", 0),
+    ("NY000118", 7181234567, "NY", "America/New_York", 1),
+    ("TX152000", 9151234567, "TX", "America/Chicago", 0),
+]
+
+# Centers where each exchange code is routed to, by attempt number. The exchange codes of the first two rows
+# and of the last two rows share no center, so the routing table has two connected components. Calls of
+# exchange codes that are not in the routing table flow out to the national backup.
+ROUTING_TABLE_ROWS = {
+    530231: ["CA123530", "IL460000"],
+    630482: ["IL460000", "CA123530", "IL460000"],
+    718123: ["NY000118", "TX152000"],
+    915123: ["TX152000", "NY000118", "TX152000"],
+}
+EXCHANGE_CODES = list(ROUTING_TABLE_ROWS) + [212555]
+
+# Caller information by exchange code: (state, time zone).
+CALLERS = {
+    530231: ("CA", "America/Los_Angeles"),
+    630482: ("IL", "America/Chicago"),
+    718123: ("NY", "America/New_York"),
+    915123: ("TX", "America/Chicago"),
+    212555: ("NY", "America/New_York"),
+}
+
+
+class StubModel:
+    def __init__(self):
+        """Model whose score only depends on a few routing-level features of the routing attempt.
+        It keeps the features of every routing attempt it scores in <scored_rows>.
+        """
+        self.scored_rows = []
+
+    def predict_proba(self, X):
+        self.scored_rows.extend(X.to_dict(orient="records"))
+        pick_up_score = (
+            0.2
+            + 0.5 * X["fraction_calls_answered_at_center_60_mins_before"]
+            + 0.02 * X["number_calls_at_center_10_mins_before"].clip(upper=10)
+            + 0.001 * X["stddev_ring_time_center_60_mins_before"]
+        ).clip(0.05, 0.95)
+        return np.column_stack([1 - pick_up_score, pick_up_score])
+
+
+def get_part_of_day(datetime_value):
+    """Get the part of day of a datetime with the thresholds of `PopulateSimulationTable.get_part_of_day`."""
+    hour = str(datetime_value.hour)
+    if "6" < hour <= "12":
+        return "morning"
+    elif "12" < hour <= "18":
+        return "afternoon"
+    elif "18" < hour <= "24":
+        return "evening"
+    return "night"
+
+
+def get_synthetic_routing_attempts(number_of_calls=60, random_seed=0):
+    """Create the source routing attempts of the synthetic scenario, with the columns of `processed.routing_attempts`
+    read by the routing-level tables of the configuration.
+
+    Keyword arguments:
+        number_of_calls (int, optional) -- number of active calls. Defaults to 60.
+        random_seed (int, optional) -- random seed of the scenario. Defaults to 0.
+
+    Returns:
+        routing_attempts (pd.DataFrame) -- historical routing attempts, which arrived before the start of the
+                                           simulation, and first routing attempt of the active calls.
+    """
+    rng = np.random.RandomState(random_seed)
+    rows = []
+
+    # Historical routing attempts, roughly every minute, with their disposition.
+    for number in range(HISTORY_MINUTES):
+        arrived_datetime_est = SIMULATION_START_DATETIME - timedelta(
+            minutes=HISTORY_MINUTES - number, seconds=int(rng.randint(60))
+        )
+        center_key, termination_number, center_state, center_time_zone, is_acd = CENTERS[
+            rng.randint(len(CENTERS))
+        ]
+        exchange_code = EXCHANGE_CODES[rng.randint(len(EXCHANGE_CODES))]
+        outcome = rng.choice(["answered", "abandoned", "flowout"], p=[0.6, 0.15, 0.25])
+        ring_time_center = float(rng.randint(20, 180))
+        time_to_answer_center = ring_time_center if outcome == "answered" else 0.0
+        talk_time_center = float(rng.randint(60, 900)) if outcome == "answered" else 0.0
+        time_to_leave_center = ring_time_center + talk_time_center
+        rows.append(
+            {
+                "call_key": f"historical-{number}",
+                "caller_npanxx": exchange_code,
+                "caller_state_abbrev": CALLERS[exchange_code][0],
+                "center_key": center_key,
+                "termination_number": termination_number,
+                "center_state_abbrev": center_state,
+                "initiated_datetime_est": arrived_datetime_est,
+                "arrived_datetime_est": arrived_datetime_est,
+                "arrived_datetime_local": arrived_datetime_est,
+                "attempt_number": 1,
+                "max_attempt_num": 1,
+                "completed_at_center": int(outcome != "flowout"),
+                "answered_at_center": int(outcome == "answered"),
+                "abandoned_at_center": int(outcome == "abandoned"),
+                "flowout_from_center": int(outcome == "flowout"),
+                "answered_in_state": int(
+                    outcome == "answered" and center_state == CALLERS[exchange_code][0]
+                ),
+                "answered_out_state": int(
+                    outcome == "answered" and center_state != CALLERS[exchange_code][0]
+                ),
+                "time_to_abandon_center": ring_time_center
+                if outcome == "abandoned"
+                else 0.0,
+                "time_to_leave_center": time_to_leave_center,
+                "talk_time_center": talk_time_center,
+                "ring_time_center": ring_time_center,
+                "time_to_answer_center": time_to_answer_center,
+                "network_is_ll": 1,
+                "network_is_ll_spanish": 0,
+                "network_is_ll_backup": 0,
+                "network_is_va": 0,
+                "network_is_ddh": 0,
+                "network_is_ddh_spanish": 0,
+                "arrived_part_of_day": get_part_of_day(arrived_datetime_est),
+                "initiated_part_of_day": get_part_of_day(arrived_datetime_est),
+                "datetime_to_disposition_est": arrived_datetime_est
+                + timedelta(seconds=ring_time_center + 1),
+                "datetime_to_leave_center_est": arrived_datetime_est
+                + timedelta(seconds=time_to_leave_center + 1),
+                "center_time_zone": center_time_zone,
+                "caller_time_zone": CALLERS[exchange_code][1],
+                "caller_is_cell_phone": int(rng.randint(2)),
+                "center_uses_dst": 1,
+                "num_nspl_centers_in_center_state": 2,
+                "center_is_acd": is_acd,
+            }
+        )
+
+    # Active calls, with their caller and the datetime they were initiated, and the center where they arrived.
+    initiated_seconds = np.sort(rng.randint(SIMULATION_MINUTES * 60, size=number_of_calls))
+    for number, seconds in enumerate(initiated_seconds):
+        initiated_datetime_est = SIMULATION_START_DATETIME + timedelta(seconds=int(seconds))
+        exchange_code = EXCHANGE_CODES[rng.randint(len(EXCHANGE_CODES))]
+        center_key, termination_number, _, _, is_acd = CENTERS[rng.randint(len(CENTERS))]
+        rows.append(
+            {
+                "call_key": f"active-{number}",
+                "caller_npanxx": exchange_code,
+                "caller_state_abbrev": CALLERS[exchange_code][0],
+                "center_key": center_key,
+                "termination_number": termination_number,
+                "initiated_datetime_est": initiated_datetime_est,
+                "arrived_datetime_est": initiated_datetime_est,
+                "caller_time_zone": CALLERS[exchange_code][1],
+                "caller_is_cell_phone": int(rng.randint(2)),
+                "network_is_ll": 1,
+                "network_is_ll_backup": 0,
+                "center_is_acd": is_acd,
+            }
+        )
+
+    return pd.DataFrame(rows)
+
+
+def get_center_lookup():
+    """Get the center lookup of the synthetic scenario, with the columns of `processed.center_lookup`."""
+    return pd.DataFrame(
+        [
+            {
+                "center_key": center_key,
+                "termination_number": termination_number,
+                "center_state_abbrev": center_state,
+                "center_uses_dst": 1,
+                "center_time_zone": center_time_zone,
+            }
+            for center_key, termination_number, center_state, center_time_zone, _ in CENTERS
+        ]
+    )
+
+
+def get_state_center_data():
+    """Get the number of centers by state of the synthetic scenario, with the columns of `processed.state_center_data`."""
+    return pd.DataFrame(
+        {
+            "state_abbrev": ["CA", "IL", "NY", "TX"],
+            "num_nspl_centers_in_center_state": [3, 2, 4, 1],
+        }
+    )
+
+
+def get_routing_table(routing_table_rows=None):
+    """Get the routing table of the synthetic scenario, with the columns of the routing table files.
+
+    Keyword arguments:
+        routing_table_rows (dict, optional) -- centers of each exchange code by attempt number.
+                                               Defaults to NoneType, i.e., <ROUTING_TABLE_ROWS>.
+    """
+    termination_numbers = {center[0]: center[1] for center in CENTERS}
+    rows = []
+    for exchange_code, center_keys in (routing_table_rows or ROUTING_TABLE_ROWS).items():
+        row = {"npanxx": exchange_code}
+        for attempt_number, (center_key_column, termination_number_column) in enumerate(
+            zip(CENTER_KEY_COLUMNS, TERMINATION_NUMBER_COLUMNS)
+        ):
+            center_key = (
+                center_keys[attempt_number]
+                if attempt_number < len(center_keys)
+                else None
+            )
+            row[center_key_column] = center_key
+            row[termination_number_column] = termination_numbers.get(center_key)
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def modeling_config():
+    with open(MODELING_CONFIG_FILE) as f:
+        return yaml.load(f, Loader=yaml.FullLoader)
+
+
+@pytest.fixture
+def routing_level_config(modeling_config):
+    return modeling_config["routing_level_config"]
+
+
+@pytest.fixture
+def feature_config(modeling_config):
+    return modeling_config["feature_config"]
+
+
+@pytest.fixture
+def routing_table_path(tmp_path):
+    routing_table_path = tmp_path / "routing_table.csv"
+    get_routing_table().to_csv(routing_table_path, index=False)
+    return str(routing_table_path)
+
+
+@pytest.fixture
+def simulation_inputs(feature_config):
+    """Inputs of the in-memory simulation of the synthetic scenario, without a database. The lookup tables
+    hold what the routing-level tables of the configuration would compute from the synthetic routing attempts.
+    """
+    routing_attempts = get_synthetic_routing_attempts()
+    is_active = routing_attempts["call_key"].str.startswith("active")
+    historical_routing_attempts = routing_attempts[~is_active]
+    active_calls = routing_attempts.loc[
+        is_active,
+        [
+            "call_key",
+            "caller_npanxx",
+            "initiated_datetime_est",
+            "caller_is_cell_phone",
+            "caller_state_abbrev",
+            "caller_time_zone",
+        ],
+    ].reset_index(drop=True)
+
+    prob_abandon_by_min = {minute: 0.04 + 0.01 * minute for minute in range(1, 20)}
+    hazard, survival = get_abandonment_survival_table(
+        prob_abandon_by_min=prob_abandon_by_min
+    )
+    answered_routing_attempts = historical_routing_attempts[
+        historical_routing_attempts["answered_at_center"] == 1
+    ]
+    lookup_tables = {
+        "PROB_ABANDON_BY_MIN": prob_abandon_by_min,
+        "ABANDON_HAZARD_BY_MIN": hazard,
+        "ABANDON_SURVIVAL_BY_MIN": survival,
+        "CENTER_HISTORICAL_DISPOSITION_STAT": answered_routing_attempts.groupby(
+            ["center_key", "termination_number"]
+        )
+        .agg(
+            answered_avg_time_to_answer=("time_to_answer_center", "mean"),
+            answered_avg_time_to_leave=("time_to_leave_center", "mean"),
+        ),
+        "CALLER_INFO": active_calls.set_index("call_key")[
+            ["caller_is_cell_phone", "caller_state_abbrev", "caller_time_zone"]
+        ].to_dict(orient="index"),
+        "CENTER_INFO": get_center_lookup()
+        .set_index(["center_key", "termination_number"])
+        .to_dict(orient="index"),
+        "NUMBER_NSPL_IN_STATE": dict(
+            get_state_center_data().itertuples(index=False, name=None)
+        ),
+        "CENTER_WAIT_TIMES": {
+            (center_key, termination_number): 3 if is_acd else 1
+            for center_key, termination_number, _, _, is_acd in CENTERS
+        },
+    }
+
+    feature_state = RoutingFeatureState(feature_config=feature_config)
+    feature_state.add_historical_routing_attempts(
+        historical_routing_attempts=historical_routing_attempts.sort_values(
+            "arrived_datetime_est"
+        )
+    )
+
+    return {
+        "routing_table": CompiledRoutingTable.from_dataframe(get_routing_table()),
+        "active_calls": active_calls,
+        "lookup_tables": lookup_tables,
+        "feature_state": feature_state,
+    }
+
+
+def get_synthetic_source_tables():
+    """Get the tables of the source data schema of the synthetic scenario, by table name."""
+    return {
+        SOURCE_DATA_ROUTING_ATTEMTPS_TABLE_NAME: get_synthetic_routing_attempts(),
+        "center_lookup": get_center_lookup(),
+        "state_center_data": get_state_center_data(),
+    }
+
+
+def skip_if_pandas_can_not_read_from_the_database():
+    """Skip the test if the installed pandas can not read query results from a SQLAlchemy connection."""
+    if Version(pd.__version__) >= Version("2.2") and Version(
+        sqlalchemy.__version__
+    ) < Version("2"):
+        pytest.skip("pandas only reads from SQLAlchemy 1.4 connections before 2.2.")
+
+
+@pytest.fixture
+def duckdb_db_conn(tmp_path, monkeypatch):
+    """Connection to an embedded DuckDB database with the synthetic scenario as source data, loaded from
+    parquet extracts like the local database of `src/utils/local_db_util.py`.
+    """
+    skip_if_pandas_can_not_read_from_the_database()
+    duckdb = pytest.importorskip("duckdb")
+    pytest.importorskip("duckdb_engine")
+    monkeypatch.setattr(sql_util, "DB_BACKEND", "duckdb")
+    monkeypatch.setattr(
+        sql_util, "DUCKDB_PATH", str(tmp_path / "vibrant-routing.duckdb")
+    )
+
+    extract_folder_path = tmp_path / "extracts"
+    extract_folder_path.mkdir()
+    for table_name, data in get_synthetic_source_tables().items():
+        duckdb.from_df(data).write_parquet(
+            str(extract_folder_path / f"{table_name}.parquet")
+        )
+
+    db_conn = sql_util.get_db_conn()
+    load_parquet_extracts(
+        db_conn=db_conn,
+        extract_folder_path=str(extract_folder_path),
+        schema_name=SOURCE_DATA_SCHEMA_NAME,
+    )
+    sql_util.create_schema(db_conn=db_conn, schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING)
+    create_experiments_logging_tables(
+        db_conn=db_conn, schema_name=EXPERIMENT_SCHEMA_NAME_ROUTING
+    )
+    yield db_conn
+    db_conn.close()
+
+
+@pytest.fixture
+def postgres_db_conn(tmp_path, monkeypatch):
+    """Connection to a disposable Postgres server with the synthetic scenario as source data."""
+    skip_if_pandas_can_not_read_from_the_database()
+    pgserver = pytest.importorskip("pgserver")
+    server = pgserver.get_server(tmp_path / "pgdata", cleanup_mode="stop")
+
+    # The server only listens on a unix socket, whose directory is passed as a parameter of the URL
+    # that `get_db_conn` builds from the PG* environment variables.
+    socket_directory = server.get_uri().split("host=")[1]
+    monkeypatch.setattr(sql_util, "DB_BACKEND", "postgres")
+    monkeypatch.setenv("PGUSER", "postgres")
+    monkeypatch.setenv("PGPASSWORD", "")
+    monkeypatch.setenv("PGHOST", "")
+    monkeypatch.setenv("PGPORT", "5432")
+    monkeypatch.setenv("PGDATABASE", f"postgres?host={socket_directory}")
+
+    db_conn = sql_util.get_db_conn()
+    db_conn.execute(f'create role "{ROLE_NAME}" superuser')
+    sql_util.create_schema(db_conn=db_conn, schema_name=SOURCE_DATA_SCHEMA_NAME)
+    for table_name, data in get_synthetic_source_tables().items():
+        data.to_sql(
+            name=table_name, con=db_conn, schema=SOURCE_DATA_SCHEMA_NAME, index=False
+        )
+    yield db_conn
+    db_conn.close()
+    server.cleanup()
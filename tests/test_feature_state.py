@@ -0,0 +1,263 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.pipeline.routing.feature_state import RoutingFeatureState, WindowAggregate
+from tests.conftest import SIMULATION_START_DATETIME, get_synthetic_routing_attempts
+
+WINDOW = timedelta(minutes=10)
+START_DATETIME = datetime(2022, 5, 26)
+
+
+def get_expected_aggregates(dispositions, window_end, column):
+    """Aggregate the values of a column disposed between the start and the end of the window, both included,
+    like the `BETWEEN` filters of the `query_fillings_augment` families.
+    """
+    values = np.array(
+        [
+            values[column]
+            for datetime_to_disposition_est, values in dispositions
+            if window_end - WINDOW <= datetime_to_disposition_est <= window_end
+            and column in values
+        ]
+    )
+    if len(values) == 0:
+        return {
+            "count": 0,
+            "sum": 0,
+            "min": 0,
+            "max": 0,
+            "avg": 0,
+            "stddev": 0,
+            "variance": 0,
+        }
+    return {
+        "count": len(values),
+        "sum": values.sum(),
+        "min": values.min(),
+        "max": values.max(),
+        "avg": values.mean(),
+        "stddev": values.std(ddof=1) if len(values) > 1 else 0,
+        "variance": values.var(ddof=1) if len(values) > 1 else 0,
+    }
+
+
+def assert_aggregates(window_aggregate, dispositions, window_end, column):
+    expected = get_expected_aggregates(
+        dispositions=dispositions, window_end=window_end, column=column
+    )
+    assert window_aggregate.count[column] == expected["count"]
+    aggregations = ["sum", "avg", "stddev", "variance"]
+    if column in window_aggregate.minimum:
+        aggregations += ["min", "max"]
+    for aggregation in aggregations:
+        assert window_aggregate.get_aggregate(
+            column=column, aggregation=aggregation
+        ) == pytest.approx(expected[aggregation], rel=1e-9, abs=1e-9), aggregation
+
+
+def test_window_aggregate_matches_a_recomputation_of_the_window():
+    rng = np.random.RandomState(0)
+    window_aggregate = WindowAggregate(
+        window=WINDOW,
+        value_columns=["ring_time_center", "answered_at_center"],
+        extremum_columns=["ring_time_center"],
+    )
+
+    # Dispositions every few seconds, with gaps longer than the window that empty it, and missing values.
+    dispositions = []
+    datetime_to_disposition_est = START_DATETIME
+    for _ in range(500):
+        values = {"answered_at_center": int(rng.randint(2))}
+        if rng.rand() < 0.9:
+            values["ring_time_center"] = float(rng.randint(1, 300)) + rng.rand()
+
+        window_aggregate.evict(window_end=datetime_to_disposition_est)
+        window_aggregate.add(
+            datetime_to_disposition_est=datetime_to_disposition_est, values=values
+        )
+        dispositions.append((datetime_to_disposition_est, values))
+
+        # Query the window at the disposition and before the next one, as the features of the arrivals do.
+        gap = timedelta(
+            seconds=int(rng.choice([0, 5, 30, 90, 900], p=[0.1, 0.4, 0.3, 0.15, 0.05]))
+        )
+        for window_end in [
+            datetime_to_disposition_est,
+            datetime_to_disposition_est + gap * rng.rand(),
+        ]:
+            window_aggregate.evict(window_end=window_end)
+            for column in ["ring_time_center", "answered_at_center"]:
+                assert_aggregates(
+                    window_aggregate=window_aggregate,
+                    dispositions=dispositions,
+                    window_end=window_end,
+                    column=column,
+                )
+        datetime_to_disposition_est += gap
+
+
+def test_window_aggregate_includes_both_edges_of_the_window():
+    window_aggregate = WindowAggregate(
+        window=WINDOW,
+        value_columns=["ring_time_center"],
+        extremum_columns=["ring_time_center"],
+    )
+    dispositions = [
+        (START_DATETIME, {"ring_time_center": 10.0}),
+        (START_DATETIME + timedelta(minutes=5), {"ring_time_center": 30.0}),
+        (START_DATETIME + WINDOW, {"ring_time_center": 20.0}),
+    ]
+    for datetime_to_disposition_est, values in dispositions:
+        window_aggregate.add(
+            datetime_to_disposition_est=datetime_to_disposition_est, values=values
+        )
+
+    # The first disposition is exactly at the start of the window.
+    window_aggregate.evict(window_end=START_DATETIME + WINDOW)
+    assert window_aggregate.count["ring_time_center"] == 3
+    assert window_aggregate.get_aggregate("ring_time_center", "min") == 10.0
+    assert_aggregates(
+        window_aggregate=window_aggregate,
+        dispositions=dispositions,
+        window_end=START_DATETIME + WINDOW,
+        column="ring_time_center",
+    )
+
+    # One microsecond later, it leaves the window.
+    window_end = START_DATETIME + WINDOW + timedelta(microseconds=1)
+    window_aggregate.evict(window_end=window_end)
+    assert window_aggregate.count["ring_time_center"] == 2
+    assert window_aggregate.get_aggregate("ring_time_center", "min") == 20.0
+    assert_aggregates(
+        window_aggregate=window_aggregate,
+        dispositions=dispositions,
+        window_end=window_end,
+        column="ring_time_center",
+    )
+
+
+def test_window_aggregate_restarts_from_zero_once_the_window_is_empty():
+    window_aggregate = WindowAggregate(
+        window=WINDOW,
+        value_columns=["ring_time_center"],
+        extremum_columns=["ring_time_center"],
+    )
+    for seconds, value in [(0, 0.1), (1, 1e8 + 0.2), (2, 0.3)]:
+        window_aggregate.add(
+            datetime_to_disposition_est=START_DATETIME + timedelta(seconds=seconds),
+            values={"ring_time_center": value},
+        )
+
+    window_aggregate.evict(window_end=START_DATETIME + 2 * WINDOW)
+    assert window_aggregate.count["ring_time_center"] == 0
+    assert window_aggregate.sum["ring_time_center"] == 0
+    assert window_aggregate.sum_squares["ring_time_center"] == 0
+    for aggregation in ["sum", "min", "max", "avg", "stddev", "variance"]:
+        assert window_aggregate.get_aggregate("ring_time_center", aggregation) == 0
+
+    # The large value that left the window does not leave rounding errors behind.
+    dispositions = [
+        (
+            START_DATETIME + 2 * WINDOW + timedelta(seconds=seconds),
+            {"ring_time_center": value},
+        )
+        for seconds, value in [(0, 0.1), (1, 0.2), (2, 0.4)]
+    ]
+    for datetime_to_disposition_est, values in dispositions:
+        window_aggregate.add(
+            datetime_to_disposition_est=datetime_to_disposition_est, values=values
+        )
+    assert_aggregates(
+        window_aggregate=window_aggregate,
+        dispositions=dispositions,
+        window_end=dispositions[-1][0],
+        column="ring_time_center",
+    )
+
+
+def test_window_aggregate_variance_of_equal_values_is_not_negative():
+    window_aggregate = WindowAggregate(
+        window=WINDOW, value_columns=["ring_time_center"], extremum_columns=[]
+    )
+    # The sum of squares minus the squared sum is slightly negative in floating point for these values,
+    # so the variance is clamped at 0.
+    for seconds in range(3):
+        window_aggregate.add(
+            datetime_to_disposition_est=START_DATETIME + timedelta(seconds=seconds),
+            values={"ring_time_center": 0.1},
+        )
+    assert window_aggregate.sum_squares["ring_time_center"] - window_aggregate.sum[
+        "ring_time_center"
+    ] ** 2 / 3 < 0
+    assert window_aggregate.get_aggregate("ring_time_center", "variance") == 0
+    assert window_aggregate.get_aggregate("ring_time_center", "stddev") == 0
+
+
+def test_routing_feature_state_matches_a_recomputation_of_the_window_features(
+    feature_config,
+):
+    routing_attempts = get_synthetic_routing_attempts()
+    historical_routing_attempts = routing_attempts[
+        routing_attempts["call_key"].str.startswith("historical")
+    ].sort_values("arrived_datetime_est")
+    feature_state = RoutingFeatureState(
+        feature_config=feature_config,
+        historical_routing_attempts=historical_routing_attempts,
+    )
+
+    center_key = "CA123530"
+    termination_number = 5302315514
+    center_routing_attempts = historical_routing_attempts[
+        historical_routing_attempts["center_key"] == center_key
+    ]
+    arrived_datetime_est = SIMULATION_START_DATETIME
+    feature_state.add_routing_attempt(
+        center_key=center_key,
+        termination_number=termination_number,
+        arrived_datetime_est=arrived_datetime_est,
+    )
+    window_features = feature_state.get_window_features(
+        center=(center_key, termination_number),
+        arrived_datetime_est=arrived_datetime_est,
+    )
+
+    for minutes in [5, 30, 120]:
+        window_start = arrived_datetime_est - timedelta(minutes=minutes)
+        arrived = center_routing_attempts[
+            center_routing_attempts["arrived_datetime_est"].between(
+                window_start, arrived_datetime_est
+            )
+        ]
+        disposed = center_routing_attempts[
+            center_routing_attempts["datetime_to_disposition_est"].between(
+                window_start, arrived_datetime_est
+            )
+        ]
+        ring_times = disposed["ring_time_center"]
+        assert window_features[f"number_calls_at_center_{minutes}_mins_before"] == len(
+            arrived
+        )
+        assert window_features[
+            f"number_calls_answered_at_center_{minutes}_mins_before"
+        ] == disposed["answered_at_center"].sum()
+        assert window_features[
+            f"fraction_calls_answered_at_center_{minutes}_mins_before"
+        ] == pytest.approx(
+            disposed["answered_at_center"].sum() / (len(arrived) + 1)
+        )
+        for aggregation, expected in [
+            ("min", ring_times.min()),
+            ("max", ring_times.max()),
+            ("avg", ring_times.mean()),
+            ("stddev", ring_times.std()),
+            ("variance", ring_times.var()),
+        ]:
+            assert window_features[
+                f"{aggregation}_ring_time_center_{minutes}_mins_before"
+            ] == pytest.approx(0 if pd.isna(expected) else expected), (
+                aggregation,
+                minutes,
+            )
@@ -0,0 +1,212 @@
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine
+
+pytest.importorskip("duckdb_engine")
+
+from config.project_constants import EXPERIMENT_SCHEMA_NAME_ROUTING
+from src.pipeline.routing.cohort_creator import cohort_creator
+from src.pipeline.routing.evaluate import evaluate_routing
+from src.pipeline.routing.simulator import simulate_routing
+from src.pipeline.routing.split_data import split_data
+from src.utils.local_db_util import create_experiments_logging_tables
+from src.utils.sql_util import (
+    add_routing_evaluation_entry_to_db,
+    create_schema,
+    get_simulated_routing_attempts,
+)
+from tests.conftest import (
+    HISTORY_MINUTES,
+    SIMULATION_START_DATETIME,
+    StubModel,
+    get_synthetic_routing_attempts,
+)
+
+SCHEMA_NAME = "experiments_routing"
+
+
+@pytest.fixture
+def db_conn():
+    engine = create_engine("duckdb:///:memory:")
+    with engine.connect() as db_conn:
+        create_schema(db_conn=db_conn, schema_name=SCHEMA_NAME)
+        yield db_conn
+
+
+def test_experiments_logging_tables_are_created(db_conn):
+    create_experiments_logging_tables(db_conn=db_conn, schema_name=SCHEMA_NAME)
+
+    table_names = {
+        row[0]
+        for row in db_conn.execute(
+            f"select table_name from information_schema.tables where table_schema = '{SCHEMA_NAME}'"
+        )
+    }
+    assert {
+        "evaluations",
+        "metrics_network",
+        "metrics_call_centers",
+        "simulation_profiles",
+        "paired_comparisons",
+    } <= table_names
+
+
+def test_experiments_logging_tables_can_be_created_again(db_conn):
+    create_experiments_logging_tables(db_conn=db_conn, schema_name=SCHEMA_NAME)
+    create_experiments_logging_tables(db_conn=db_conn, schema_name=SCHEMA_NAME)
+
+
+def test_evaluation_ids_are_drawn_from_a_sequence(db_conn):
+    create_experiments_logging_tables(db_conn=db_conn, schema_name=SCHEMA_NAME)
+
+    evaluation_ids = [
+        db_conn.execute(
+            f"""
+            insert into {SCHEMA_NAME}.evaluations (
+                model_path, trial_number, creation_datetime_utc, routing_table_path,
+                config_routing_hash, config_feature_hash, random_seed,
+                active_calls_start_datetime_est, active_calls_end_datetime_est,
+                active_calls_keys, active_calls_count, log_path
+            )
+            values (
+                'model', {trial_number}, now(), 'table.csv', 'a', 'b', 1,
+                '2022-01-01', '2022-01-02', ['1'], 1, 'log'
+            )
+            returning evaluation_id
+            """
+        ).fetchone()[0]
+        for trial_number in [1, 2]
+    ]
+    assert evaluation_ids == [1, 2]
+
+    db_conn.execute(
+        f"insert into {SCHEMA_NAME}.metrics_network (evaluation_id, instance, answer_rate) "
+        f"values ({evaluation_ids[0]}, 'simulation', 0.5)"
+    )
+    assert (
+        db_conn.execute(
+            f"select count(*) from {SCHEMA_NAME}.metrics_network"
+        ).fetchone()[0]
+        == 1
+    )
+
+
+def test_metrics_keep_their_decimals(db_conn):
+    create_experiments_logging_tables(db_conn=db_conn, schema_name=SCHEMA_NAME)
+
+    db_conn.execute(
+        f"insert into {SCHEMA_NAME}.metrics_network (evaluation_id, instance, answer_rate) "
+        f"values (1, 'simulation', 1 / 3)"
+    )
+    assert db_conn.execute(
+        f"select answer_rate from {SCHEMA_NAME}.metrics_network"
+    ).fetchone()[0] == pytest.approx(1 / 3)
+
+
+def test_routing_level_pipeline_runs_on_the_embedded_database(
+    duckdb_db_conn, routing_level_config, feature_config, routing_table_path
+):
+    # The database mode queries the features of every routing attempt, so the simulation window is short.
+    simulation_minutes = 10
+    routing_level_config["temporal_config"].update(
+        {
+            "historical_start_datetime": str(
+                SIMULATION_START_DATETIME - pd.Timedelta(minutes=HISTORY_MINUTES)
+            ),
+            "simulation_start_datetime": str(SIMULATION_START_DATETIME),
+            "simulation_duration": f"{simulation_minutes} minutes",
+        }
+    )
+    routing_level_config["simulator_config"] = {
+        "simulation_mode": "database",
+        "batch_window_seconds": 30,
+        "write_behind": True,
+    }
+    cohort_creator(
+        db_conn=duckdb_db_conn,
+        config=routing_level_config,
+        split_datetime=split_data(
+            temporal_config=routing_level_config["temporal_config"]
+        ),
+    )
+
+    # The routing-level tables of the configuration are created from the source data.
+    schema_name = routing_level_config["database_config"]["schema_name"]
+    table_names = {
+        row[0]
+        for row in duckdb_db_conn.execute(
+            f"select table_name from information_schema.tables where table_schema = '{schema_name}'"
+        )
+    }
+    assert {
+        table["name"]
+        for table in routing_level_config["tables_to_create"]
+        if table["table_flag"]
+    } <= table_names
+    routing_attempts = get_synthetic_routing_attempts()
+    active_call_keys = set(
+        routing_attempts.loc[
+            routing_attempts["call_key"].str.startswith("active")
+            & (
+                routing_attempts["initiated_datetime_est"]
+                < SIMULATION_START_DATETIME + pd.Timedelta(minutes=simulation_minutes)
+            ),
+            "call_key",
+        ]
+    )
+    assert active_call_keys
+    assert {
+        row[0]
+        for row in duckdb_db_conn.execute(
+            f"select call_key from {schema_name}.active_calls_in_queue"
+        )
+    } == active_call_keys
+
+    model = StubModel()
+    simulate_routing(
+        db_conn=duckdb_db_conn,
+        model=model,
+        routing_table_path=routing_table_path,
+        config_routing_level=routing_level_config,
+        config_feature=feature_config,
+        random_seed=1234,
+    )
+
+    # Every active call is routed, and the features of each routing attempt are created and scored.
+    simulated_routing_attempts = get_simulated_routing_attempts(
+        db_conn=duckdb_db_conn,
+        schema_name=schema_name,
+        table_name=routing_level_config["feature_config"][
+            "simulated_routing_attempts_table_name"
+        ],
+    )
+    assert set(simulated_routing_attempts["call_key"]) == active_call_keys
+    assert len(model.scored_rows) == (
+        simulated_routing_attempts["center_key"] != "National Backup"
+    ).sum()
+    assert all(
+        pd.notna(value) for row in model.scored_rows for value in row.values()
+    )
+
+    # The simulation is evaluated in the database.
+    evaluation_id = add_routing_evaluation_entry_to_db(
+        db_conn=duckdb_db_conn,
+        model_path="model.pickle",
+        trial_number=1,
+        routing_table_path=routing_table_path,
+        config_routing=routing_level_config,
+        config_feature=feature_config,
+        random_seed=1234,
+        log_path="log",
+    )
+    evaluate_routing(db_conn=duckdb_db_conn, evaluation_id=evaluation_id)
+
+    # The outcomes of the active calls of the synthetic scenario are unknown, so only the simulation has metrics.
+    answer_rates = dict(
+        duckdb_db_conn.execute(
+            f"select instance, answer_rate from {EXPERIMENT_SCHEMA_NAME_ROUTING}.metrics_network "
+            f"where evaluation_id = {evaluation_id}"
+        ).fetchall()
+    )
+    assert answer_rates["real"] is None
+    assert 0 < answer_rates["simulation"] < 1
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.utils.metric_util import get_paired_differences
+
+CONFIDENCE_LEVEL = 0.9
+
+
+def get_paired_metrics():
+    # Three routing tables evaluated on the same six trials, with noise that the tables share.
+    random_generator = np.random.default_rng(0)
+    shared_noise = random_generator.normal(scale=0.05, size=6)
+    metrics = []
+    for label, shift in [("baseline", 0.0), ("better", 0.02), ("worse", -0.01)]:
+        answer_rates = (
+            0.8 + shift + shared_noise + random_generator.normal(scale=0.005, size=6)
+        )
+        for trial_number, answer_rate in enumerate(answer_rates):
+            metrics.append(
+                {
+                    "trial_number": trial_number,
+                    "routing_table_path": label,
+                    "answer_rate": answer_rate,
+                    "abandonment_rate": 1 - answer_rate,
+                }
+            )
+    return pd.DataFrame(metrics)
+
+
+def test_paired_differences_match_the_paired_t_test_of_scipy():
+    metrics = get_paired_metrics()
+    paired_differences = get_paired_differences(
+        metrics=metrics,
+        metric_columns=["answer_rate", "abandonment_rate"],
+        baseline_label="baseline",
+        pair_column="trial_number",
+        label_column="routing_table_path",
+        confidence_level=CONFIDENCE_LEVEL,
+    )
+
+    assert len(paired_differences) == 4
+    for row in paired_differences.itertuples():
+        baseline_values = metrics.loc[
+            metrics["routing_table_path"] == "baseline", row.metric
+        ].to_numpy()
+        values = metrics.loc[
+            metrics["routing_table_path"] == row.routing_table_path, row.metric
+        ].to_numpy()
+        differences = values - baseline_values
+        t_test = stats.ttest_rel(values, baseline_values)
+        ci_lower, ci_upper = stats.t.interval(
+            CONFIDENCE_LEVEL,
+            df=len(differences) - 1,
+            loc=differences.mean(),
+            scale=stats.sem(differences),
+        )
+
+        assert row.pair_count == len(differences)
+        assert row.mean_difference == pytest.approx(differences.mean())
+        # The t statistic of scipy is the mean difference over its standard error.
+        assert row.mean_difference / (
+            row.std_difference / np.sqrt(row.pair_count)
+        ) == pytest.approx(t_test.statistic)
+        assert row.ci_lower == pytest.approx(ci_lower)
+        assert row.ci_upper == pytest.approx(ci_upper)
+
+
+def test_paired_differences_fail_without_the_baseline():
+    with pytest.raises(ValueError, match="baseline incumbent"):
+        get_paired_differences(
+            metrics=get_paired_metrics(),
+            metric_columns=["answer_rate"],
+            baseline_label="incumbent",
+            pair_column="trial_number",
+            label_column="routing_table_path",
+        )
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from src.utils.random_util import (
+    draw_bernoulli,
+    get_random_generator,
+    get_trial_random_seeds,
+)
+
+RANDOM_SEED = 1234
+DRAW_KEYS = [
+    (call_key, attempt_number, purpose)
+    for call_key in ["call_1", "call_2", "call_3"]
+    for attempt_number in [1, 2]
+    for purpose in ["pick_up", "abandonment"]
+]
+
+
+def draw_uniform(call_key, attempt_number, purpose):
+    return get_random_generator(
+        random_seed=RANDOM_SEED,
+        call_key=call_key,
+        attempt_number=attempt_number,
+        purpose=purpose,
+    ).random()
+
+
+def test_draws_do_not_depend_on_the_order_of_the_keys():
+    draws = {draw_key: draw_uniform(*draw_key) for draw_key in DRAW_KEYS}
+
+    shuffled_draw_keys = DRAW_KEYS.copy()
+    random.Random(0).shuffle(shuffled_draw_keys)
+    shuffled_draws = {
+        draw_key: draw_uniform(*draw_key) for draw_key in reversed(shuffled_draw_keys)
+    }
+
+    assert shuffled_draws == draws
+
+
+def test_draws_of_different_purposes_have_different_streams():
+    pick_up_generator = get_random_generator(
+        random_seed=RANDOM_SEED,
+        call_key="call_1",
+        attempt_number=1,
+        purpose="pick_up",
+    )
+    abandonment_generator = get_random_generator(
+        random_seed=RANDOM_SEED,
+        call_key="call_1",
+        attempt_number=1,
+        purpose="abandonment",
+    )
+
+    assert list(pick_up_generator.random(10)) != list(abandonment_generator.random(10))
+
+
+def test_draws_are_distinct_for_each_key():
+    draws = [draw_uniform(*draw_key) for draw_key in DRAW_KEYS]
+
+    assert len(set(draws)) == len(DRAW_KEYS)
+
+
+def test_bernoulli_draws_are_repeatable():
+    outcomes = [
+        draw_bernoulli(
+            random_seed=RANDOM_SEED,
+            call_key=call_key,
+            attempt_number=attempt_number,
+            purpose=purpose,
+            probability=0.5,
+        )
+        for call_key, attempt_number, purpose in DRAW_KEYS
+    ]
+
+    assert outcomes == [
+        draw_bernoulli(
+            random_seed=RANDOM_SEED,
+            call_key=call_key,
+            attempt_number=attempt_number,
+            purpose=purpose,
+            probability=0.5,
+        )
+        for call_key, attempt_number, purpose in DRAW_KEYS
+    ]
+    assert set(outcomes) == {0, 1}
+
+
+def test_draws_fail_with_an_unknown_purpose():
+    with pytest.raises(ValueError, match="Unknown purpose"):
+        draw_uniform("call_1", 1, "transfer")
+
+
+def test_first_trial_random_seeds_do_not_change_with_more_trials():
+    assert get_trial_random_seeds(number_of_trials=10, random_seed=RANDOM_SEED)[
+        :3
+    ] == get_trial_random_seeds(number_of_trials=3, random_seed=RANDOM_SEED)
@@ -0,0 +1,89 @@
+import pandas as pd
+
+from config.project_constants import (
+    EXPERIMENT_SCHEMA_NAME_ROUTING,
+    ROUTING_LEVEL_SCHEMA_NAME,
+)
+from src.pipeline.routing.evaluate import evaluate_routing
+from src.pipeline.routing.results_store import get_routing_metrics
+from src.utils.sql_util import create_schema, create_table_with_sql_query
+from tests.conftest import StubModel, get_synthetic_routing_attempts
+from tests.test_simulation_engine import get_routing_attempts, get_simulation_engine
+
+
+def test_routing_metrics_match_the_evaluation_in_the_database(
+    duckdb_db_conn, simulation_inputs
+):
+    simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs, model=StubModel()
+    )
+    simulation_engine.run()
+    simulated_routing_attempts = get_routing_attempts(simulation_engine)
+
+    # The metrics of the simulation leave out the calls that flow out to the national backup.
+    assert (simulated_routing_attempts["center_key"] == "National Backup").any()
+
+    # The real routing attempts are the ones of the active calls, whose outcomes are unknown in the
+    # synthetic scenario, so their metrics are NULL.
+    real_routing_attempts = simulation_inputs["active_calls"][
+        ["call_key", "caller_npanxx", "initiated_datetime_est"]
+    ].merge(
+        get_synthetic_routing_attempts(),
+        on=["call_key", "caller_npanxx", "initiated_datetime_est"],
+        how="left",
+    )
+
+    create_schema(db_conn=duckdb_db_conn, schema_name=ROUTING_LEVEL_SCHEMA_NAME)
+    for table_name, routing_attempts in [
+        ("simulated_routing_attempts", simulated_routing_attempts),
+        ("active_calls_in_queue", simulation_inputs["active_calls"]),
+    ]:
+        duckdb_db_conn.connection.register("routing_attempts", routing_attempts)
+        create_table_with_sql_query(
+            db_conn=duckdb_db_conn,
+            schema_name=ROUTING_LEVEL_SCHEMA_NAME,
+            table_name=table_name,
+            table_content="select * from routing_attempts",
+        )
+        duckdb_db_conn.connection.unregister("routing_attempts")
+    evaluate_routing(db_conn=duckdb_db_conn, evaluation_id=1)
+
+    for table_name, by_center in [
+        ("metrics_network", False),
+        ("metrics_call_centers", True),
+    ]:
+        routing_metrics = pd.concat(
+            [
+                get_routing_metrics(
+                    routing_attempts=routing_attempts.assign(evaluation_id=1),
+                    instance=instance,
+                    by_center=by_center,
+                )
+                for instance, routing_attempts in [
+                    ("real", real_routing_attempts),
+                    ("simulation", simulated_routing_attempts),
+                ]
+            ],
+            ignore_index=True,
+        )
+        sort_columns = ["instance"] + (
+            ["center_key", "termination_number"] if by_center else []
+        )
+        routing_metrics = routing_metrics.sort_values(sort_columns).reset_index(
+            drop=True
+        )
+        database_routing_metrics = (
+            pd.read_sql_query(
+                f"select {', '.join(routing_metrics.columns)} "
+                f"from {EXPERIMENT_SCHEMA_NAME_ROUTING}.{table_name}",
+                duckdb_db_conn,
+            )
+            .sort_values(sort_columns)
+            .reset_index(drop=True)
+        )
+
+        # The standard deviations and variances are the ones of the samples, as stddev_samp and var_samp.
+        assert routing_metrics["talk_time_center_std"].notna().any()
+        pd.testing.assert_frame_equal(
+            routing_metrics, database_routing_metrics, check_dtype=False
+        )
@@ -0,0 +1,90 @@
+import logging
+
+from src.pipeline.routing import routing_table as routing_table_module
+from src.pipeline.routing.routing_table import (
+    CompiledRoutingTable,
+    get_cached_routing_table_path,
+    load_routing_table,
+    load_routing_table_dataframe,
+)
+from tests.conftest import CENTERS, ROUTING_TABLE_ROWS, get_routing_table
+
+
+def test_calls_of_unknown_exchange_codes_are_reported_once(caplog):
+    routing_table = CompiledRoutingTable.from_dataframe(get_routing_table())
+    termination_numbers = {center[0]: center[1] for center in CENTERS}
+
+    with caplog.at_level(logging.WARNING):
+        for exchange_code, center_keys in ROUTING_TABLE_ROWS.items():
+            for attempt_number, center_key in enumerate(center_keys):
+                assert routing_table.get_center(
+                    exchange_code=float(exchange_code), attempt_number=attempt_number
+                ) == (center_key, termination_numbers[center_key])
+            assert routing_table.get_center(
+                exchange_code=float(exchange_code), attempt_number=len(center_keys)
+            ) == (None, None)
+        assert not caplog.records
+
+        for attempt_number in range(3):
+            assert routing_table.get_center(
+                exchange_code=212555.0, attempt_number=attempt_number
+            ) == (None, None)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "Exchange code 212555.0 is not in the routing table, "
+        "so its calls are routed to the national backup."
+    ]
+
+
+def test_routing_table_cache_is_reused_until_the_csv_is_edited(
+    routing_table_path, tmp_path, monkeypatch
+):
+    cache_folder_path = str(tmp_path / "routing_table_cache")
+    parsed_routing_table_paths = []
+    read_routing_table_csv = routing_table_module.read_routing_table_csv
+
+    def count_parsed_routing_tables(routing_table_path):
+        parsed_routing_table_paths.append(routing_table_path)
+        return read_routing_table_csv(routing_table_path)
+
+    monkeypatch.setattr(
+        routing_table_module, "read_routing_table_csv", count_parsed_routing_tables
+    )
+
+    # The unchanged csv file is parsed once and then read from the cache.
+    cached_routing_table_path = get_cached_routing_table_path(
+        routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+    )
+    assert (
+        get_cached_routing_table_path(
+            routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+        )
+        == cached_routing_table_path
+    )
+    assert len(
+        load_routing_table_dataframe(
+            routing_table_path=routing_table_path,
+            cache_folder_path=cache_folder_path,
+        )
+    ) == len(ROUTING_TABLE_ROWS)
+    assert parsed_routing_table_paths == [routing_table_path]
+
+    # The edited csv file has a new hash, so it is parsed again into another directory of the cache.
+    edited_routing_table_rows = {**ROUTING_TABLE_ROWS, 530231: ["IL460000"]}
+    get_routing_table(edited_routing_table_rows).to_csv(routing_table_path, index=False)
+    edited_cached_routing_table_path = get_cached_routing_table_path(
+        routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+    )
+    assert edited_cached_routing_table_path != cached_routing_table_path
+    assert parsed_routing_table_paths == [routing_table_path, routing_table_path]
+
+    compiled_routing_table = load_routing_table(
+        routing_table_path=routing_table_path, cache_folder_path=cache_folder_path
+    )
+    assert compiled_routing_table.get_center(
+        exchange_code=530231.0, attempt_number=0
+    ) == ("IL460000", 6304823616)
+    assert compiled_routing_table.get_center(
+        exchange_code=530231.0, attempt_number=1
+    ) == (None, None)
+    assert len(parsed_routing_table_paths) == 2
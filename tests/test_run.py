@@ -0,0 +1,191 @@
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from src.pipeline.routing import run
+from src.pipeline.routing.run import (
+    get_memoization_key,
+    get_stopping_reason,
+    get_trial_config,
+    get_trial_kwargs,
+    save_memoized_trial,
+)
+from src.pipeline.routing.simulator import get_historical_table_name
+
+
+def get_snapshot_table(routing_level_config):
+    return [
+        table
+        for table in routing_level_config["tables_to_create"]
+        if table["tag"] == "snapshot"
+    ][0]
+
+
+def test_trial_config_reads_the_historical_feature_snapshot(routing_level_config):
+    trial_config = get_trial_config(
+        routing_level_config=routing_level_config,
+        simulated_routing_attempts_table_name="simulated_routing_attempts_trial_1",
+    )
+
+    snapshot_table_name = get_snapshot_table(routing_level_config)["name"]
+    assert get_historical_table_name(routing_level_config) == snapshot_table_name
+    assert get_historical_table_name(trial_config) == snapshot_table_name
+
+    # The snapshot is not created again by the trial.
+    assert not get_snapshot_table(trial_config)["table_flag"]
+
+
+def test_trial_config_reads_the_historical_table_without_snapshot(
+    routing_level_config,
+):
+    get_snapshot_table(routing_level_config)["table_flag"] = False
+    trial_config = get_trial_config(
+        routing_level_config=routing_level_config,
+        simulated_routing_attempts_table_name="simulated_routing_attempts_trial_1",
+    )
+
+    historical_table_name = routing_level_config["feature_config"][
+        "source_data_table_name"
+    ]
+    assert get_historical_table_name(trial_config) == historical_table_name
+
+
+def test_trial_config_of_a_trial_config_is_the_same(routing_level_config):
+    trial_config = get_trial_config(
+        routing_level_config=routing_level_config,
+        simulated_routing_attempts_table_name="simulated_routing_attempts_trial_1",
+    )
+    assert (
+        get_trial_config(
+            routing_level_config=trial_config,
+            simulated_routing_attempts_table_name="simulated_routing_attempts_trial_1",
+        )
+        == trial_config
+    )
+
+
+def test_trials_that_run_in_parallel_have_their_own_table(routing_level_config):
+    def get_trial_table_name(trial_number, is_parallel, table_name_suffix=None):
+        return get_trial_kwargs(
+            best_model_path="model.pkl",
+            routing_table_path="routing_table.csv",
+            routing_level_config=routing_level_config,
+            feature_config={},
+            split_datetime={},
+            trial_number=trial_number,
+            number_of_trials=2,
+            log_path="run.log",
+            compiled_routing_table_path=None,
+            random_seed=1234,
+            is_parallel=is_parallel,
+            table_name_suffix=table_name_suffix,
+        )["simulated_routing_attempts_table_name"]
+
+    table_name = routing_level_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ]
+    assert get_trial_table_name(trial_number=2, is_parallel=False) == table_name
+    assert (
+        get_trial_table_name(
+            trial_number=2, is_parallel=False, table_name_suffix="job_1"
+        )
+        == table_name
+    )
+    assert (
+        get_trial_table_name(trial_number=2, is_parallel=True)
+        == f"{table_name}_trial_2"
+    )
+    assert (
+        get_trial_table_name(
+            trial_number=2, is_parallel=True, table_name_suffix="job_1"
+        )
+        == f"{table_name}_job_1_trial_2"
+    )
+
+
+def test_routing_tables_with_the_same_content_are_memoized_separately(
+    routing_level_config, feature_config, routing_table_path, tmp_path
+):
+    model_path = str(tmp_path / "model.pkl")
+    with open(model_path, "wb") as f:
+        f.write(b"model")
+    copied_routing_table_path = str(tmp_path / "copied_routing_table.csv")
+    shutil.copyfile(routing_table_path, copied_routing_table_path)
+
+    def get_memoization_path(routing_table_path):
+        memoization_key = get_memoization_key(
+            best_model_path=model_path,
+            routing_table_path=routing_table_path,
+            routing_level_config=routing_level_config,
+            feature_config=feature_config,
+            split_datetime={},
+            trial_number=1,
+            random_seed=1234,
+        )
+        return str(tmp_path / "memoization" / f"{memoization_key}.pkl")
+
+    # The trial of the routing table is memoized, and found again for the same routing table.
+    save_memoized_trial(
+        memoization_path=get_memoization_path(routing_table_path), evaluation_id=1
+    )
+    assert get_memoization_path(routing_table_path) == get_memoization_path(
+        routing_table_path
+    )
+
+    # The copy is evaluated on its own, so its metrics are labelled with its path when the tables are compared.
+    assert not os.path.exists(get_memoization_path(copied_routing_table_path))
+
+
+@pytest.mark.parametrize(
+    "half_width, number_of_finished_trials, elapsed_time_sec, stopping_reason",
+    [
+        (0.001, 4, 0, "target_half_width"),
+        (0.1, 4, 600, "time_budget"),
+        (0.1, 10, 0, "maximum_number_of_trials"),
+        (0.1, 4, 0, None),
+        # The confidence intervals are not trusted before the minimum number of trials.
+        (0.001, 2, 0, None),
+    ],
+)
+def test_adaptive_mode_stops_for_the_first_reached_criterion(
+    half_width,
+    number_of_finished_trials,
+    elapsed_time_sec,
+    stopping_reason,
+    monkeypatch,
+):
+    def get_metric_confidence_intervals(
+        db_conn, evaluation_ids, metric_columns, **kwargs
+    ):
+        return pd.DataFrame(
+            {
+                "routing_table_path": "routing_table.csv",
+                "metric": metric_columns,
+                "trial_count": number_of_finished_trials,
+                "mean": 0.5,
+                "half_width": half_width,
+            }
+        )
+
+    monkeypatch.setattr(
+        run, "get_metric_confidence_intervals", get_metric_confidence_intervals
+    )
+    assert (
+        get_stopping_reason(
+            db_conn=None,
+            evaluation_ids=list(range(1, number_of_finished_trials + 1)),
+            stopping_config={
+                "enabled": True,
+                "minimum_number_of_trials": 3,
+                "target_half_width": 0.01,
+                "metrics": ["answer_rate", "abandonment_rate"],
+                "time_budget_minutes": 10,
+            },
+            number_of_finished_trials=number_of_finished_trials,
+            maximum_number_of_trials=10,
+            elapsed_time_sec=elapsed_time_sec,
+        )
+        == stopping_reason
+    )
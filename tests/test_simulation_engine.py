@@ -0,0 +1,173 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from src.pipeline.routing.populate_simulation_table import InMemorySimulationTable
+from src.pipeline.routing.routing_table import CompiledRoutingTable
+from src.pipeline.routing.simulation_engine import RoutingSimulationEngine
+from src.utils.checkpoint_util import load_checkpoint
+from tests.conftest import ROUTING_TABLE_ROWS, StubModel, get_routing_table
+
+RANDOM_SEED = 1234
+
+
+class InterruptedModel(StubModel):
+    def __init__(self, number_of_batches):
+        """Model that fails after scoring <number_of_batches> batches, like a simulation that dies midway."""
+        super(InterruptedModel, self).__init__()
+        self.number_of_batches = number_of_batches
+
+    def predict_proba(self, X):
+        if self.number_of_batches == 0:
+            raise RuntimeError("Simulation interrupted.")
+        self.number_of_batches -= 1
+        return super(InterruptedModel, self).predict_proba(X)
+
+
+class BatchCountingModel(StubModel):
+    def __init__(self):
+        """Model that counts the batches of routing attempts it scores."""
+        super(BatchCountingModel, self).__init__()
+        self.number_of_batches = 0
+
+    def predict_proba(self, X):
+        self.number_of_batches += 1
+        return super(BatchCountingModel, self).predict_proba(X)
+
+
+def get_simulation_engine(
+    simulation_inputs, model, routing_table=None, batch_window_seconds=30
+):
+    """Get a simulation engine of the synthetic scenario with its own copy of the feature state."""
+    simulation_engine = RoutingSimulationEngine(
+        model=model,
+        routing_table=routing_table or simulation_inputs["routing_table"],
+        simulated_routing_attempts_table=InMemorySimulationTable(
+            db_conn=None,
+            schema_name="routing",
+            table_name="simulated_routing_attempts",
+            lookup_tables=simulation_inputs["lookup_tables"],
+        ),
+        feature_state=copy.deepcopy(simulation_inputs["feature_state"]),
+        random_seed=RANDOM_SEED,
+        batch_window_seconds=batch_window_seconds,
+    )
+    simulation_engine.add_active_calls(active_calls=simulation_inputs["active_calls"])
+    return simulation_engine
+
+
+def get_routing_attempts(simulation_engine):
+    return pd.DataFrame(simulation_engine.simulated_routing_attempts_table.rows)
+
+
+def test_batched_simulation_matches_a_simulation_of_one_call_at_a_time(
+    simulation_inputs,
+):
+    routing_attempts = {}
+    number_of_batches = {}
+    for batch_window_seconds in [0, 30]:
+        model = BatchCountingModel()
+        simulation_engine = get_simulation_engine(
+            simulation_inputs=simulation_inputs,
+            model=model,
+            batch_window_seconds=batch_window_seconds,
+        )
+        simulation_engine.run()
+        routing_attempts[batch_window_seconds] = get_routing_attempts(
+            simulation_engine
+        )
+        number_of_batches[batch_window_seconds] = model.number_of_batches
+
+    # The routing attempts of the calls of a batch window are scored together.
+    assert number_of_batches[30] < number_of_batches[0]
+    pd.testing.assert_frame_equal(routing_attempts[0], routing_attempts[30])
+
+
+def test_simulation_resumed_from_a_checkpoint_matches_an_uninterrupted_simulation(
+    simulation_inputs, tmp_path
+):
+    simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs, model=StubModel()
+    )
+    simulation_engine.run()
+
+    checkpoint_path = str(tmp_path / "trial_1.pkl")
+    interrupted_simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs,
+        model=InterruptedModel(number_of_batches=20),
+    )
+    with pytest.raises(RuntimeError):
+        interrupted_simulation_engine.run(
+            checkpoint_path=checkpoint_path,
+            checkpoint_interval=5,
+            checkpoint_info={"random_seed": RANDOM_SEED},
+        )
+
+    # The simulation resumes from the last checkpoint in a new process, i.e., from the pickled state only.
+    state = load_checkpoint(checkpoint_path=checkpoint_path)
+    assert state["random_seed"] == RANDOM_SEED
+    assert 0 < len(state["simulated_routing_attempts"]["rows"]) < len(
+        simulation_engine.simulated_routing_attempts_table.rows
+    )
+    resumed_simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs, model=StubModel()
+    )
+    resumed_simulation_engine.set_state(state=state)
+    resumed_simulation_engine.run()
+
+    pd.testing.assert_frame_equal(
+        get_routing_attempts(resumed_simulation_engine),
+        get_routing_attempts(simulation_engine),
+        check_exact=True,
+    )
+    assert resumed_simulation_engine.trajectory == simulation_engine.trajectory
+
+
+def test_simulation_from_a_baseline_trajectory_matches_a_full_simulation(
+    simulation_inputs,
+):
+    baseline_simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs, model=StubModel()
+    )
+    baseline_simulation_engine.run()
+
+    # The calls of one exchange code are routed to its centers in another order.
+    routing_table = CompiledRoutingTable.from_dataframe(
+        get_routing_table(
+            routing_table_rows={
+                **ROUTING_TABLE_ROWS,
+                630482: ["CA123530", "IL460000", "CA123530"],
+            }
+        )
+    )
+    model = StubModel()
+    simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs, model=model, routing_table=routing_table
+    )
+    simulation_engine.run()
+
+    delta_model = StubModel()
+    delta_simulation_engine = get_simulation_engine(
+        simulation_inputs=simulation_inputs,
+        model=delta_model,
+        routing_table=routing_table,
+    )
+    delta_simulation_engine.set_baseline_trajectory(
+        baseline_trajectory=baseline_simulation_engine.trajectory
+    )
+    delta_simulation_engine.run()
+
+    # Only the calls that can be routed differently are scored again.
+    assert delta_simulation_engine.number_reused_routing_attempts > 0
+    assert 0 < len(delta_model.scored_rows) < len(model.scored_rows)
+    assert len(delta_model.scored_rows) + (
+        delta_simulation_engine.number_reused_routing_attempts
+    ) == len(model.scored_rows)
+
+    pd.testing.assert_frame_equal(
+        get_routing_attempts(delta_simulation_engine),
+        get_routing_attempts(simulation_engine),
+        check_exact=True,
+    )
+    assert delta_simulation_engine.trajectory == simulation_engine.trajectory
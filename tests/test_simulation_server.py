@@ -0,0 +1,136 @@
+import os
+import shutil
+import threading
+
+import joblib
+import pandas as pd
+import pytest
+
+from src.pipeline.routing import run, simulation_server
+from src.pipeline.routing.simulation_server import (
+    JOB_SUMMARY_METRICS,
+    SimulationServer,
+)
+from tests.conftest import StubModel
+
+
+@pytest.fixture
+def server(modeling_config, routing_level_config, tmp_path, monkeypatch):
+    """Simulation server whose cohort, inputs and model are stubbed, so its trials run without a database.
+    The trials of the routing tables named "failing_*" raise an error, and the other trials wait for
+    the <trials_may_run> event before returning their evaluation identifier.
+    """
+    routing_level_config["simulator_config"]["simulation_mode"] = "in_memory"
+    routing_level_config["simulator_config"]["routing_table_cache_folder_path"] = None
+    monkeypatch.setattr(simulation_server, "get_db_conn", lambda: None)
+    monkeypatch.setattr(
+        simulation_server, "split_data", lambda temporal_config, output_filename: {}
+    )
+    monkeypatch.setattr(
+        simulation_server,
+        "cohort_creator",
+        lambda db_conn, split_datetime, config: None,
+    )
+    monkeypatch.setattr(
+        simulation_server,
+        "load_simulation_resources",
+        lambda db_conn, config_routing_level, config_feature: {},
+    )
+    monkeypatch.setattr(joblib, "load", lambda model_path: StubModel())
+
+    trials_may_run = threading.Event()
+    evaluated_trials = []
+
+    def run_trial(routing_table_path, trial_number, random_seed, **trial_kwargs):
+        if os.path.basename(routing_table_path).startswith("failing_"):
+            raise RuntimeError(f"Trial {trial_number} failed.")
+        trials_may_run.wait(timeout=10)
+        evaluated_trials.append((routing_table_path, trial_number, random_seed))
+        return len(evaluated_trials)
+
+    def get_network_metrics_from_db(db_conn, evaluation_ids):
+        return pd.DataFrame(
+            {
+                "evaluation_id": evaluation_ids,
+                **{
+                    metric: [evaluation_id / 10 for evaluation_id in evaluation_ids]
+                    for metric in JOB_SUMMARY_METRICS
+                },
+            }
+        )
+
+    monkeypatch.setattr(run, "run_trial", run_trial)
+    monkeypatch.setattr(
+        simulation_server, "get_network_metrics_from_db", get_network_metrics_from_db
+    )
+
+    server = SimulationServer(
+        modeling_config=modeling_config, log_path=str(tmp_path / "server.log")
+    )
+    server.trials_may_run = trials_may_run
+    server.evaluated_trials = evaluated_trials
+    yield server
+    trials_may_run.set()
+    server.shutdown()
+
+
+def test_jobs_are_queued_run_and_return_their_metrics(server, routing_table_path):
+    job = server.submit_job(
+        routing_table_path=routing_table_path, number_of_trials=2, random_seed=1234
+    )
+    assert job["job_id"] == 1
+    assert job["status"] in ["queued", "running"]
+    assert job["metrics"] is None
+    assert [job["job_id"] for job in server.get_jobs()] == [1]
+
+    server.trials_may_run.set()
+    server.job_executor.shutdown()
+
+    job = server.get_job(1)
+    assert job["status"] == "finished"
+    assert job["error"] is None
+    assert job["evaluation_ids"] == [1, 2]
+    assert [trial[:2] for trial in server.evaluated_trials] == [
+        (routing_table_path, 1),
+        (routing_table_path, 2),
+    ]
+    assert job["metrics"] == {
+        metric: pytest.approx(0.15) for metric in JOB_SUMMARY_METRICS
+    }
+    assert [
+        trial_metrics["evaluation_id"] for trial_metrics in job["trial_metrics"]
+    ] == [
+        1,
+        2,
+    ]
+
+    # The routing table is compiled once, and the temporary compilation is removed with the server.
+    compiled_routing_table_paths = list(server.compiled_routing_table_paths.values())
+    assert len(compiled_routing_table_paths) == 1
+    assert os.path.isdir(compiled_routing_table_paths[0])
+    server.shutdown()
+    assert not os.path.exists(compiled_routing_table_paths[0])
+
+
+def test_jobs_with_failing_trials_report_their_error(
+    server, routing_table_path, tmp_path
+):
+    failing_routing_table_path = str(tmp_path / "failing_routing_table.csv")
+    shutil.copy(routing_table_path, failing_routing_table_path)
+
+    server.submit_job(routing_table_path=failing_routing_table_path)
+    server.trials_may_run.set()
+    server.job_executor.shutdown()
+
+    job = server.get_job(1)
+    assert job["status"] == "failed"
+    assert job["error"] == "Trial 1 failed."
+    assert job["metrics"] is None
+    assert job["end_datetime_utc"] is not None
+
+
+def test_jobs_fail_to_be_submitted_without_a_routing_table(server, tmp_path):
+    with pytest.raises(ValueError, match="There is no routing table"):
+        server.submit_job(routing_table_path=str(tmp_path / "missing.csv"))
+    assert server.get_jobs() == []
+    assert server.get_job(1) is None
@@ -0,0 +1,438 @@
+import copy
+
+import pandas as pd
+import pytest
+
+from src.pipeline.routing.cohort_creator import cohort_creator
+from src.pipeline.routing.populate_simulation_table import InMemorySimulationTable
+from src.pipeline.routing.results_store import (
+    get_pooled_routing_metrics,
+    get_routing_metrics,
+    save_routing_attempts,
+)
+from src.pipeline.routing.simulator import (
+    get_call_partitions,
+    get_time_shard_boundary_error,
+    get_time_shards,
+    simulate_partition,
+    simulate_partitions,
+    simulate_routing,
+    simulate_routing_in_memory,
+)
+from src.utils.checkpoint_util import save_checkpoint
+from src.pipeline.routing.split_data import split_data
+from src.utils.sql_util import get_simulated_routing_attempts
+from tests.conftest import (
+    HISTORY_MINUTES,
+    SIMULATION_MINUTES,
+    SIMULATION_START_DATETIME,
+    StubModel,
+)
+
+
+@pytest.fixture(params=["duckdb", "postgres"])
+def db_conn(request):
+    """Connection to a database of each backend with the synthetic scenario as source data."""
+    return request.getfixturevalue(f"{request.param}_db_conn")
+
+
+def create_synthetic_cohort(db_conn, routing_level_config):
+    """Create the cohort of the synthetic scenario, with the history before the simulation."""
+    routing_level_config["temporal_config"].update(
+        {
+            "historical_start_datetime": str(
+                SIMULATION_START_DATETIME - pd.Timedelta(minutes=HISTORY_MINUTES)
+            ),
+            "simulation_start_datetime": str(SIMULATION_START_DATETIME),
+            "simulation_duration": f"{SIMULATION_MINUTES} minutes",
+        }
+    )
+    cohort_creator(
+        db_conn=db_conn,
+        config=routing_level_config,
+        split_datetime=split_data(
+            temporal_config=routing_level_config["temporal_config"]
+        ),
+    )
+
+
+def test_database_and_in_memory_modes_simulate_the_same_routing_attempts(
+    db_conn, routing_level_config, feature_config, routing_table_path, tmp_path
+):
+    create_synthetic_cohort(db_conn=db_conn, routing_level_config=routing_level_config)
+
+    schema_name = routing_level_config["database_config"]["schema_name"]
+    table_name = routing_level_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ]
+    routing_attempts = {}
+    returned_routing_attempts = {}
+    scored_rows = {}
+    for simulation_mode in ["database", "in_memory"]:
+        routing_level_config["simulator_config"] = {
+            "simulation_mode": simulation_mode,
+            "batch_window_seconds": 30,
+            "write_behind": True,
+        }
+        db_conn.execute(f"delete from {schema_name}.{table_name}")
+        model = StubModel()
+        _, returned_routing_attempts[simulation_mode] = simulate_routing(
+            db_conn=db_conn,
+            model=model,
+            routing_table_path=routing_table_path,
+            config_routing_level=routing_level_config,
+            config_feature=feature_config,
+            random_seed=1234,
+        )
+        routing_attempts[simulation_mode] = (
+            get_simulated_routing_attempts(
+                db_conn=db_conn, schema_name=schema_name, table_name=table_name
+            )
+            .sort_values(["call_key", "attempt_number"])
+            .reset_index(drop=True)
+        )
+        scored_rows[simulation_mode] = model.scored_rows
+
+    # Both modes score the same features, in the order of the queue of calls.
+    assert len(scored_rows["database"]) == len(scored_rows["in_memory"])
+    for database_row, in_memory_row in zip(
+        scored_rows["database"], scored_rows["in_memory"]
+    ):
+        assert set(database_row) == set(in_memory_row)
+        for column, value in database_row.items():
+            assert float(in_memory_row[column]) == pytest.approx(
+                float(value), abs=1e-6
+            ), column
+
+    # Some calls are routed several times and some flow out to the national backup.
+    assert (
+        len(routing_attempts["database"])
+        > routing_attempts["database"]["call_key"].nunique()
+    )
+    assert (routing_attempts["database"]["center_key"] == "National Backup").any()
+    pd.testing.assert_frame_equal(
+        routing_attempts["database"], routing_attempts["in_memory"]
+    )
+
+    # The in_memory mode returns its routing attempts, so the trials neither read them back from the
+    # database to evaluate them nor to keep them in the results store.
+    assert returned_routing_attempts["database"] is None
+    for by_center in [False, True]:
+        pd.testing.assert_frame_equal(
+            get_routing_metrics(
+                routing_attempts=returned_routing_attempts["in_memory"].assign(
+                    evaluation_id=1
+                ),
+                by_center=by_center,
+            ),
+            get_routing_metrics(
+                routing_attempts=routing_attempts["in_memory"].assign(evaluation_id=1),
+                by_center=by_center,
+            ),
+            check_dtype=False,
+        )
+    results_folder_path = str(tmp_path / "results")
+    save_routing_attempts(
+        routing_attempts=returned_routing_attempts["in_memory"],
+        results_folder_path=results_folder_path,
+        evaluation_id=1,
+    )
+    save_routing_attempts(
+        routing_attempts=routing_attempts["database"],
+        results_folder_path=results_folder_path,
+        evaluation_id=2,
+    )
+    pooled_routing_metrics = get_pooled_routing_metrics(
+        results_folder_path=results_folder_path, evaluation_ids=[1, 2]
+    )
+    assert pooled_routing_metrics["evaluation_count"].iloc[0] == 2
+
+
+def test_cached_lookups_score_the_same_features_as_the_live_queries(
+    db_conn, routing_level_config, feature_config, routing_table_path
+):
+    create_synthetic_cohort(db_conn=db_conn, routing_level_config=routing_level_config)
+
+    schema_name = routing_level_config["database_config"]["schema_name"]
+    table_name = routing_level_config["feature_config"][
+        "simulated_routing_attempts_table_name"
+    ]
+    routing_attempts = {}
+    scored_rows = {}
+    for use_lookup_cache in [True, False]:
+        routing_level_config["simulator_config"] = {
+            "simulation_mode": "database",
+            "batch_window_seconds": 30,
+            "use_lookup_cache": use_lookup_cache,
+        }
+        db_conn.execute(f"delete from {schema_name}.{table_name}")
+        model = StubModel()
+        simulate_routing(
+            db_conn=db_conn,
+            model=model,
+            routing_table_path=routing_table_path,
+            config_routing_level=routing_level_config,
+            config_feature=feature_config,
+            random_seed=1234,
+        )
+        routing_attempts[use_lookup_cache] = (
+            get_simulated_routing_attempts(
+                db_conn=db_conn, schema_name=schema_name, table_name=table_name
+            )
+            .sort_values(["call_key", "attempt_number"])
+            .reset_index(drop=True)
+        )
+        scored_rows[use_lookup_cache] = model.scored_rows
+
+    # The lookups answered from memory give the features that the database queries give.
+    assert len(scored_rows[True]) == len(scored_rows[False]) > 0
+    for cached_row, live_row in zip(scored_rows[True], scored_rows[False]):
+        assert set(cached_row) == set(live_row)
+        for column, value in live_row.items():
+            assert float(cached_row[column]) == pytest.approx(
+                float(value), abs=1e-6
+            ), column
+    pd.testing.assert_frame_equal(routing_attempts[True], routing_attempts[False])
+
+
+def test_partitions_simulate_the_same_routing_attempts_as_a_single_process(
+    simulation_inputs, routing_level_config, tmp_path
+):
+    routing_level_config["simulator_config"]["batch_window_seconds"] = 30
+    results = simulate_partition(
+        model=StubModel(),
+        routing_table=simulation_inputs["routing_table"],
+        active_calls=simulation_inputs["active_calls"],
+        feature_state=copy.deepcopy(simulation_inputs["feature_state"]),
+        lookup_tables=simulation_inputs["lookup_tables"],
+        config_routing_level=routing_level_config,
+        random_seed=1234,
+    )
+
+    # The two components of the routing table and the calls that flow out to the national backup.
+    partitions = get_call_partitions(
+        routing_table=simulation_inputs["routing_table"],
+        active_calls=simulation_inputs["active_calls"],
+        number_of_partitions=3,
+    )
+    assert len(partitions) == 3
+    simulated_routing_attempts_table = InMemorySimulationTable(
+        db_conn=None,
+        schema_name="routing",
+        table_name="simulated_routing_attempts",
+        lookup_tables=simulation_inputs["lookup_tables"],
+    )
+    compiled_routing_table_path = str(tmp_path / "compiled_routing_table")
+    simulation_inputs["routing_table"].save(
+        compiled_routing_table_path=compiled_routing_table_path
+    )
+    trajectory = simulate_partitions(
+        model=StubModel(),
+        compiled_routing_table_path=compiled_routing_table_path,
+        partitions=partitions,
+        feature_state=copy.deepcopy(simulation_inputs["feature_state"]),
+        simulated_routing_attempts_table=simulated_routing_attempts_table,
+        config_routing_level=routing_level_config,
+        random_seed=1234,
+    )
+
+    pd.testing.assert_frame_equal(
+        pd.DataFrame(simulated_routing_attempts_table.rows)
+        .sort_values(["call_key", "attempt_number"])
+        .reset_index(drop=True),
+        pd.DataFrame(results["rows"])
+        .sort_values(["call_key", "attempt_number"])
+        .reset_index(drop=True),
+        check_exact=True,
+        check_like=True,
+    )
+    assert trajectory == results["trajectory"]
+
+
+def simulate_time_shards(simulation_inputs, routing_level_config, tmp_path, warm_up):
+    """Simulate the synthetic scenario sequentially and in 3 time shards.
+
+    Returns:
+        sequential results (dict) -- routing attempts ("rows") and trajectory of the sequential simulation.
+        time_shards (list[dict]) -- time shards returned by `get_time_shards`.
+        sharded routing attempts (list[dict]) -- routing attempts of the time shards, stitched together.
+    """
+    routing_level_config["simulator_config"]["batch_window_seconds"] = 30
+    sequential_results = simulate_partition(
+        model=StubModel(),
+        routing_table=simulation_inputs["routing_table"],
+        active_calls=simulation_inputs["active_calls"],
+        feature_state=copy.deepcopy(simulation_inputs["feature_state"]),
+        lookup_tables=simulation_inputs["lookup_tables"],
+        config_routing_level=routing_level_config,
+        random_seed=1234,
+    )
+
+    time_shards = get_time_shards(
+        active_calls=simulation_inputs["active_calls"],
+        simulation_datetime={
+            "start_datetime_est": str(SIMULATION_START_DATETIME),
+            "end_datetime_est": str(
+                SIMULATION_START_DATETIME + pd.Timedelta(minutes=SIMULATION_MINUTES)
+            ),
+        },
+        number_of_time_shards=3,
+        warm_up=warm_up,
+    )
+    compiled_routing_table_path = str(tmp_path / "compiled_routing_table")
+    simulation_inputs["routing_table"].save(
+        compiled_routing_table_path=compiled_routing_table_path
+    )
+    simulated_routing_attempts_table = InMemorySimulationTable(
+        db_conn=None,
+        schema_name="routing",
+        table_name="simulated_routing_attempts",
+        lookup_tables=simulation_inputs["lookup_tables"],
+    )
+    simulate_partitions(
+        model=StubModel(),
+        compiled_routing_table_path=compiled_routing_table_path,
+        partitions=time_shards,
+        feature_state=copy.deepcopy(simulation_inputs["feature_state"]),
+        simulated_routing_attempts_table=simulated_routing_attempts_table,
+        config_routing_level=routing_level_config,
+        random_seed=1234,
+    )
+    return sequential_results, time_shards, simulated_routing_attempts_table.rows
+
+
+def test_time_shards_match_a_sequential_simulation_up_to_the_boundary_error(
+    simulation_inputs, routing_level_config, tmp_path
+):
+    # The warm-up is shorter than the feature windows, so some calls after the boundaries can differ.
+    sequential_results, time_shards, sharded_routing_attempts = simulate_time_shards(
+        simulation_inputs=simulation_inputs,
+        routing_level_config=routing_level_config,
+        tmp_path=tmp_path,
+        warm_up=pd.Timedelta(minutes=5),
+    )
+    boundary_error = get_time_shard_boundary_error(
+        sequential_routing_attempts=sequential_results["rows"],
+        sharded_routing_attempts=sharded_routing_attempts,
+        time_shards=time_shards,
+    )
+
+    sequential_routing_attempts = pd.DataFrame(sequential_results["rows"])
+    sharded_routing_attempts = pd.DataFrame(sharded_routing_attempts)
+    assert boundary_error["calls_count"] == len(simulation_inputs["active_calls"])
+    assert boundary_error["different_calls_count"] == sum(
+        boundary_error["different_calls_count_by_shard"]
+    )
+
+    # The first shard starts with the simulation, so it has no boundary error.
+    assert boundary_error["different_calls_count_by_shard"][0] == 0
+
+    # The outcomes of the calls that are not reported as different are reproduced.
+    outcome_columns = [
+        "call_key",
+        "attempt_number",
+        "center_key",
+        "termination_number",
+        "answered_at_center",
+        "abandoned_at_center",
+        "flowout_from_center",
+    ]
+    sequential_outcomes = sequential_routing_attempts[outcome_columns].set_index(
+        ["call_key", "attempt_number"]
+    )
+    sharded_outcomes = sharded_routing_attempts[outcome_columns].set_index(
+        ["call_key", "attempt_number"]
+    )
+    different_call_keys = {
+        call_key
+        for call_key in sequential_outcomes.index.get_level_values("call_key")
+        if not sequential_outcomes.loc[call_key].equals(sharded_outcomes.loc[call_key])
+    }
+    assert 0 < len(different_call_keys) == boundary_error["different_calls_count"]
+    assert boundary_error["different_calls_fraction"] == pytest.approx(
+        len(different_call_keys) / boundary_error["calls_count"]
+    )
+    sequential_answer_rate = (
+        sequential_routing_attempts.groupby("call_key")["answered_at_center"].max() == 1
+    ).mean()
+    sharded_answer_rate = (
+        sharded_routing_attempts.groupby("call_key")["answered_at_center"].max() == 1
+    ).mean()
+    assert boundary_error["answer_rate_difference"] == pytest.approx(
+        sharded_answer_rate - sequential_answer_rate
+    )
+
+
+def test_time_shards_drop_their_warm_up_calls(
+    simulation_inputs, routing_level_config, tmp_path
+):
+    sequential_results, time_shards, sharded_routing_attempts = simulate_time_shards(
+        simulation_inputs=simulation_inputs,
+        routing_level_config=routing_level_config,
+        tmp_path=tmp_path,
+        warm_up=max(simulation_inputs["feature_state"].windows),
+    )
+
+    # The shards after the first one also simulate the calls of their warm-up, which belong to the previous shard.
+    assert all(
+        len(time_shard["active_calls"]) > len(time_shard["call_keys"])
+        for time_shard in time_shards[1:]
+    )
+    for time_shard in time_shards:
+        assert time_shard["call_keys"] <= set(time_shard["active_calls"]["call_key"])
+    assert sum(len(time_shard["call_keys"]) for time_shard in time_shards) == len(
+        set.union(*[time_shard["call_keys"] for time_shard in time_shards])
+    )
+
+    # Each call is kept by a single shard, so its routing attempts are neither lost nor duplicated.
+    sharded_routing_attempts = pd.DataFrame(sharded_routing_attempts)
+    assert not sharded_routing_attempts.duplicated(["call_key", "attempt_number"]).any()
+    assert set(sharded_routing_attempts["call_key"]) == set(
+        pd.DataFrame(sequential_results["rows"])["call_key"]
+    )
+    for _, call_routing_attempts in sharded_routing_attempts.groupby("call_key"):
+        assert sorted(call_routing_attempts["attempt_number"]) == list(
+            range(1, len(call_routing_attempts) + 1)
+        )
+
+    # The warm-up covers the largest window of the features, so the shards reproduce the sequential simulation.
+    pd.testing.assert_frame_equal(
+        sharded_routing_attempts.sort_values(
+            ["call_key", "attempt_number"]
+        ).reset_index(drop=True),
+        pd.DataFrame(sequential_results["rows"])
+        .sort_values(["call_key", "attempt_number"])
+        .reset_index(drop=True),
+        check_like=True,
+    )
+
+
+def test_partitions_fail_with_a_baseline_trajectory(
+    simulation_inputs, routing_level_config, routing_table_path, tmp_path
+):
+    routing_level_config["simulator_config"]["number_of_partitions"] = 2
+    baseline_trajectory_path = str(tmp_path / "trajectory.pkl")
+    save_checkpoint(
+        checkpoint_path=baseline_trajectory_path,
+        state={
+            "trajectory": {},
+            "random_seed": 1234,
+            "routing_table_path": routing_table_path,
+        },
+    )
+    with pytest.raises(ValueError, match="baseline trajectory"):
+        simulate_routing_in_memory(
+            db_conn=None,
+            model=StubModel(),
+            routing_table=simulation_inputs["routing_table"],
+            active_calls=simulation_inputs["active_calls"],
+            config_routing_level=routing_level_config,
+            config_feature=None,
+            random_seed=1234,
+            routing_table_path=routing_table_path,
+            shared_resources={
+                "lookup_tables": simulation_inputs["lookup_tables"],
+                "feature_state": simulation_inputs["feature_state"],
+            },
+            baseline_trajectory_path=baseline_trajectory_path,
+        )
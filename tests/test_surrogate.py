@@ -0,0 +1,149 @@
+import itertools
+
+import pandas as pd
+import pytest
+
+from src.pipeline.routing.surrogate import (
+    fit_surrogate,
+    get_exchange_code_loads,
+    get_routing_table_features,
+    predict_metrics,
+    select_routing_tables,
+)
+from tests.conftest import ROUTING_TABLE_ROWS, get_routing_table
+
+# Number of active calls from each exchange code of the routing table.
+EXCHANGE_CODE_LOADS = pd.Series({530231: 10, 630482: 20, 718123: 30, 915123: 40})
+
+
+def route_first_attempts_to(center_key, exchange_codes):
+    """Get the routing table of the synthetic scenario with the first attempt of some exchange codes
+    routed to another center.
+    """
+    routing_table = get_routing_table()
+    routing_table.loc[
+        routing_table["npanxx"].isin(exchange_codes), "center1id"
+    ] = center_key
+    return routing_table
+
+
+def test_exchange_code_loads_count_the_active_calls_of_each_exchange_code():
+    active_calls = pd.DataFrame(
+        {"caller_npanxx": ["530231", "530231", "630482", None, "unknown"]}
+    )
+
+    assert get_exchange_code_loads(active_calls).to_dict() == {530231: 2, 630482: 1}
+
+
+def test_features_describe_the_changes_and_the_load_of_the_centers():
+    features = get_routing_table_features(
+        routing_table=route_first_attempts_to("CA123530", [718123]),
+        baseline_routing_table=get_routing_table(),
+        exchange_code_loads=EXCHANGE_CODE_LOADS,
+    )
+
+    assert features == {
+        "changed_row_count": 1,
+        "changed_load_fraction": 0.3,
+        "load_CA123530_attempt_1": 40,
+        "load_IL460000_attempt_1": 20,
+        "load_TX152000_attempt_1": 40,
+        "load_IL460000_attempt_2": 10,
+        "load_CA123530_attempt_2": 20,
+        "load_TX152000_attempt_2": 30,
+        "load_NY000118_attempt_2": 40,
+        "load_IL460000_attempt_3": 20,
+        "load_TX152000_attempt_3": 40,
+    }
+
+
+def test_surrogate_ranks_the_better_routing_table_first():
+    # The trials moved the first attempt of some exchange codes to CA123530 or IL460000, and the calls
+    # whose first attempt is routed to CA123530 are answered more often.
+    baseline_routing_table = get_routing_table()
+    features = []
+    metrics = []
+    for center_key, number_of_exchange_codes in itertools.product(
+        ["CA123530", "IL460000"], range(len(ROUTING_TABLE_ROWS) + 1)
+    ):
+        for exchange_codes in itertools.combinations(
+            ROUTING_TABLE_ROWS, number_of_exchange_codes
+        ):
+            routing_table_features = get_routing_table_features(
+                routing_table=route_first_attempts_to(center_key, exchange_codes),
+                baseline_routing_table=baseline_routing_table,
+                exchange_code_loads=EXCHANGE_CODE_LOADS,
+            )
+            answer_rate = 0.5 + 0.004 * routing_table_features.get(
+                "load_CA123530_attempt_1", 0
+            )
+            features.append(routing_table_features)
+            metrics.append(
+                {
+                    "answer_rate": answer_rate,
+                    "abandonment_rate": 0.8 * (1 - answer_rate),
+                    "flowout_rate": 0.2 * (1 - answer_rate),
+                    "calls_flowout_network_fraction": 0.1 * (1 - answer_rate),
+                }
+            )
+    surrogate = fit_surrogate(
+        features=pd.DataFrame(features).fillna(0),
+        metrics=pd.DataFrame(metrics),
+        number_of_trees=50,
+    )
+
+    candidate_routing_tables = {
+        "worse": route_first_attempts_to("IL460000", ROUTING_TABLE_ROWS),
+        "baseline": baseline_routing_table,
+        "better": route_first_attempts_to("CA123530", ROUTING_TABLE_ROWS),
+    }
+    candidate_features = pd.DataFrame(
+        [
+            get_routing_table_features(
+                routing_table=routing_table,
+                baseline_routing_table=baseline_routing_table,
+                exchange_code_loads=EXCHANGE_CODE_LOADS,
+            )
+            for routing_table in candidate_routing_tables.values()
+        ],
+        index=list(candidate_routing_tables),
+    )
+    predictions = predict_metrics(surrogate=surrogate, features=candidate_features)
+
+    # Higher answer rates and lower abandonment rates are better.
+    for metric in ["answer_rate", "abandonment_rate"]:
+        selection = select_routing_tables(
+            predictions=predictions,
+            metric=metric,
+            number_of_promising=1,
+            number_of_uncertain=0,
+        )
+        assert selection.dropna().to_dict() == {"better": "promising"}
+    assert (
+        predictions.loc["better", "answer_rate_mean"]
+        > predictions.loc["baseline", "answer_rate_mean"]
+        > predictions.loc["worse", "answer_rate_mean"]
+    )
+
+
+def test_selection_adds_the_most_uncertain_of_the_other_routing_tables():
+    predictions = pd.DataFrame(
+        {
+            "answer_rate_mean": [0.70, 0.90, 0.80, 0.60],
+            "answer_rate_std": [0.01, 0.05, 0.02, 0.03],
+        },
+        index=["a", "b", "c", "d"],
+    )
+
+    selection = select_routing_tables(
+        predictions=predictions,
+        metric="answer_rate",
+        number_of_promising=2,
+        number_of_uncertain=1,
+    )
+
+    assert selection.dropna().to_dict() == {
+        "b": "promising",
+        "c": "promising",
+        "d": "uncertain",
+    }
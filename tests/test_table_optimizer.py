@@ -0,0 +1,94 @@
+import random
+
+import pandas as pd
+import pytest
+
+from src.pipeline.routing import table_optimizer
+from src.pipeline.routing.routing_table import CENTER_KEY_COLUMNS
+from src.pipeline.routing.table_optimizer import (
+    CENTER_ROLE_COLUMNS,
+    generate_candidates,
+    get_rungs,
+)
+from tests.conftest import get_routing_table
+
+
+@pytest.mark.parametrize(
+    "maximum_number_of_trials, reduction_factor, rungs",
+    [
+        (1, 3, [1]),
+        (2, 3, [2]),
+        (9, 3, [1, 3, 9]),
+        (10, 3, [1, 3, 10]),
+        (27, 3, [1, 3, 9, 27]),
+        (100, 2, [1, 3, 6, 12, 25, 50, 100]),
+    ],
+)
+def test_rungs_grow_by_the_reduction_factor_up_to_the_maximum_number_of_trials(
+    maximum_number_of_trials, reduction_factor, rungs
+):
+    assert (
+        get_rungs(
+            maximum_number_of_trials=maximum_number_of_trials,
+            reduction_factor=reduction_factor,
+        )
+        == rungs
+    )
+
+
+def test_rungs_fail_with_a_reduction_factor_that_does_not_reduce():
+    with pytest.raises(ValueError, match="reduction factor"):
+        get_rungs(maximum_number_of_trials=9, reduction_factor=1)
+
+
+def test_candidates_change_the_first_row_of_a_duplicated_exchange_code(
+    tmp_path, monkeypatch
+):
+    # The routing table has each exchange code twice, with the centers in another order the second time.
+    routing_table = get_routing_table()
+    for center_key_column, role_column in zip(CENTER_KEY_COLUMNS, CENTER_ROLE_COLUMNS):
+        routing_table[role_column] = routing_table[center_key_column].where(
+            routing_table[center_key_column].isna(), "Primary"
+        )
+    duplicated_routing_table = routing_table.copy()
+    duplicated_routing_table[CENTER_KEY_COLUMNS] = duplicated_routing_table[
+        CENTER_KEY_COLUMNS[::-1]
+    ].to_numpy()
+    routing_table_path = str(tmp_path / "routing_table.csv")
+    pd.concat([routing_table, duplicated_routing_table]).to_csv(
+        routing_table_path, index=False
+    )
+
+    # The changes are recorded instead of being validated against the contracts of the centers.
+    change_dicts = []
+
+    def generate_table(original_table_filepath, change_dict, cache_folder_path=None):
+        change_dicts.append(change_dict)
+        return routing_table
+
+    monkeypatch.setattr(table_optimizer, "generate_table", generate_table)
+    candidate_routing_table_paths = generate_candidates(
+        incumbent_routing_table_path=routing_table_path,
+        number_of_candidates=5,
+        number_of_changes=1,
+        output_folder_path=str(tmp_path / "candidates"),
+        random_generator=random.Random(0),
+    )
+
+    assert len(candidate_routing_table_paths) == 5
+    first_rows = routing_table.set_index("npanxx")
+    for change_dict in change_dicts:
+        for npanxx, new_assignment_package in change_dict.items():
+            # Each change swaps two centers of the first row or replaces one of them.
+            changed_attempt_numbers = [
+                attempt_number
+                for attempt_number, (center_key, (new_center_key, _, _)) in enumerate(
+                    zip(
+                        first_rows.loc[npanxx, CENTER_KEY_COLUMNS],
+                        new_assignment_package,
+                    )
+                )
+                if not (pd.isna(center_key) and pd.isna(new_center_key))
+                and center_key != new_center_key
+            ]
+            assert len(changed_attempt_numbers) in [1, 2]